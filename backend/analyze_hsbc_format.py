@@ -2,7 +2,7 @@ import os
 import sys
 sys.path.append('.')
 
-from app.main import extract_text_with_ocr_fallback
+from app.extraction import extract_text_with_ocr_fallback
 
 def analyze_hsbc_format():
     """Analiza el formato del PDF de HSBC para encontrar patrones de transacciones"""
@@ -2,7 +2,7 @@ import os
 import sys
 sys.path.append('.')
 
-from app.main import extract_text_with_ocr_fallback
+from app.extraction import extract_text_with_ocr_fallback
 
 def analyze_new_bank():
     """Analiza el nuevo PDF para identificar el banco y su formato"""
@@ -3,6 +3,10 @@ import re
 from typing import List, Dict, Any, Optional
 import os
 
+from . import logs, telemetry, usage
+
+log = logs.get_logger("agentic_extractor")
+
 class AgenticDocumentExtractor:
     def __init__(self, api_key: str):
         from openai import OpenAI
@@ -24,7 +28,7 @@ class AgenticDocumentExtractor:
         try:
             self.client = OpenAI(api_key=api_key)
         except Exception as e:
-            print(f"❌ Error inicializando OpenAI client: {e}")
+            log.error("Error inicializando el cliente de OpenAI: %s", e)
             # Fallback: usar configuración básica
             self.client = None
         
@@ -38,7 +42,7 @@ class AgenticDocumentExtractor:
         
         # Verificar si el cliente está disponible
         if self.client is None:
-            print("❌ Cliente OpenAI no disponible, usando fallback")
+            log.warning("Cliente OpenAI no disponible, usando fallback")
             return []
             
         # Split text into manageable chunks if too long
@@ -47,18 +51,18 @@ class AgenticDocumentExtractor:
         all_transactions = []
         
         for i, chunk in enumerate(chunks):
-            print(f"🤖 Procesando chunk {i+1}/{len(chunks)} con extractor agéntico...")
+            log.debug("Procesando chunk con extractor agéntico", extra={"chunk": i + 1, "chunks": len(chunks)})
             
             try:
                 chunk_transactions = self._process_chunk_agentic(chunk, bank_name, i+1, len(chunks))
                 all_transactions.extend(chunk_transactions)
             except Exception as e:
-                print(f"❌ Error procesando chunk {i+1} con extractor agéntico: {e}")
+                log.warning("Error procesando chunk con extractor agéntico: %s", e, extra={"chunk": i + 1})
                 continue
                 
         # Remove duplicates and validate
         unique_transactions = self._deduplicate_transactions(all_transactions)
-        print(f"📊 Total de transacciones extraídas con extractor agéntico: {len(unique_transactions)}")
+        log.info("Extractor agéntico terminó", extra={"chunks": len(chunks), "rows": len(unique_transactions)})
         
         return unique_transactions
     
@@ -68,27 +72,30 @@ class AgenticDocumentExtractor:
         """
         # Verificar si el cliente está disponible
         if self.client is None:
-            print(f"❌ Cliente OpenAI no disponible en chunk {chunk_num}")
+            log.warning("Cliente OpenAI no disponible", extra={"chunk": chunk_num})
             return []
             
         prompt = self._create_agentic_prompt(text, bank_name, chunk_num, total_chunks)
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",  # Using GPT-4o-mini for better reasoning
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert financial document analyzer. Your task is to extract transaction information from bank statements with high accuracy."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                max_tokens=4000,
-                temperature=0.1  # Low temperature for consistent extraction
-            )
+            with telemetry.span("llm_chunk", chunk=chunk_num, characters=len(text)):
+                response = usage.chat(
+                    self.client,
+                    "_process_chunk_agentic",
+                    model="gpt-4o-mini",  # Using GPT-4o-mini for better reasoning
+                    messages=[
+                        {
+                            "role": "system",
+                            "content": "You are an expert financial document analyzer. Your task is to extract transaction information from bank statements with high accuracy."
+                        },
+                        {
+                            "role": "user", 
+                            "content": prompt
+                        }
+                    ],
+                    max_tokens=4000,
+                    temperature=0.1  # Low temperature for consistent extraction
+                )
             
             content = response.choices[0].message.content
             
@@ -100,14 +107,14 @@ class AgenticDocumentExtractor:
                 elif isinstance(result, list):
                     return result
                 else:
-                    print(f"⚠️ Respuesta inesperada del extractor agéntico en chunk {chunk_num}")
+                    log.warning("Respuesta inesperada del extractor agéntico", extra={"chunk": chunk_num})
                     return []
             except json.JSONDecodeError:
                 # Fallback: try to extract from text response
                 return self._parse_text_response(content)
                 
         except Exception as e:
-            print(f"❌ Error en extractor agéntico chunk {chunk_num}: {e}")
+            log.error("Error en extractor agéntico: %s", e, extra={"chunk": chunk_num})
             return []
     
     def _create_agentic_prompt(self, text: str, bank_name: str, chunk_num: int, total_chunks: int) -> str:
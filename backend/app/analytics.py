@@ -0,0 +1,218 @@
+"""
+Motor de analítica en memoria: las transacciones de cada usuario se cargan una vez en
+arreglos columnares de NumPy y los resúmenes se calculan con reducciones vectorizadas.
+
+- fechas como días desde 1970-01-01 (int32), ordenadas
+- montos en centavos (int64), así las sumas son exactas
+- categorías codificadas por diccionario (int32); el código 0 es "sin categoría"
+
+La caché es LRU con presupuesto en bytes y se indexa por (user_id, versión de datos):
+cualquier escritura hecha con crud incrementa la versión, así una entrada vieja nunca se
+sirve aunque un lector la haya cargado en paralelo con la escritura.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from sqlalchemy import String, cast, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def _to_days(value: date) -> int:
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+@dataclass
+class UserFrame:
+    days: np.ndarray        # int32, orden ascendente
+    months: np.ndarray      # int32, año * 12 + (mes - 1)
+    cents: np.ndarray       # int64
+    codes: np.ndarray       # int32, índice en categories
+    categories: List[Optional[str]]
+    nbytes: int
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[Union[date, str], float, Optional[str]]]) -> "UserFrame":
+        """Construye el frame a partir de tuplas (fecha o 'YYYY-MM-DD', amount, category) en cualquier orden"""
+        rows = list(rows)
+        dates, amounts, raw_categories = zip(*rows) if rows else ((), (), ())
+
+        days = np.array(dates, dtype="datetime64[D]").astype(np.int64)
+        order = np.argsort(days, kind="stable")
+        days = days[order].astype(np.int32)
+        cents = np.rint(np.asarray(amounts, dtype=np.float64) * 100).astype(np.int64)[order]
+
+        # Orden del diccionario como el GROUP BY de SQLite: NULL primero y luego alfabético
+        categories = sorted(set(raw_categories), key=lambda c: (c is not None, c or ""))
+        if None not in categories:
+            categories.insert(0, None)
+        lookup = {category: code for code, category in enumerate(categories)}
+        codes = np.fromiter((lookup[c] for c in raw_categories), dtype=np.int32, count=len(raw_categories))[order]
+
+        # datetime64[M] cuenta meses desde 1970-01
+        months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int32) + 1970 * 12
+
+        nbytes = days.nbytes + months.nbytes + cents.nbytes + codes.nbytes
+        nbytes += sys.getsizeof(categories) + sum(sys.getsizeof(c) for c in categories if c is not None)
+        return cls(days=days, months=months, cents=cents, codes=codes, categories=categories, nbytes=nbytes)
+
+    def __len__(self):
+        return len(self.days)
+
+    def _range(self, start_date: Optional[date], end_date: Optional[date]) -> slice:
+        """Rango [start_date, end_date] como slice (las fechas están ordenadas)"""
+        lo = 0 if start_date is None else int(np.searchsorted(self.days, _to_days(start_date), side="left"))
+        hi = len(self.days) if end_date is None else int(np.searchsorted(self.days, _to_days(end_date), side="right"))
+        return slice(lo, max(lo, hi))
+
+    def monthly_totals(self) -> List[dict]:
+        """Equivalente a crud.monthly_summary_statement"""
+        if not len(self):
+            return []
+        # months ya viene ordenado: reduceat sobre los inicios de cada grupo
+        starts = np.flatnonzero(np.r_[True, self.months[1:] != self.months[:-1]])
+        totals = np.add.reduceat(self.cents, starts)
+        keys = self.months[starts]
+        return [
+            {"year": int(key // 12), "month": int(key % 12) + 1, "total": int(total) / 100}
+            for key, total in zip(keys, totals)
+        ]
+
+    def category_totals(self, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                        expenses_only: bool = True) -> List[dict]:
+        """Total por categoría (por defecto solo gastos, como crud.category_summary_statement)"""
+        window = self._range(start_date, end_date)
+        cents, codes = self.cents[window], self.codes[window]
+        if expenses_only:
+            mask = cents < 0
+            cents, codes = cents[mask], codes[mask]
+        totals = np.bincount(codes, weights=cents, minlength=len(self.categories))
+        counts = np.bincount(codes, minlength=len(self.categories))
+        return [
+            {"category": self.categories[code], "total": round(float(totals[code]) / 100, 2), "count": int(counts[code])}
+            for code in np.flatnonzero(counts)
+        ]
+
+    def category_month_totals(self) -> List[dict]:
+        """Equivalente a crud.summary_table_statement (solo gastos)"""
+        mask = self.cents < 0
+        if not mask.any():
+            return []
+        width = len(self.categories)
+        keys = self.months[mask].astype(np.int64) * width + self.codes[mask]
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        totals = np.bincount(inverse, weights=self.cents[mask])
+        return [
+            {
+                "year": int(key // width // 12),
+                "month": int(key // width % 12) + 1,
+                "category": self.categories[int(key % width)],
+                "total": round(float(total) / 100, 2),
+            }
+            for key, total in zip(unique_keys, totals)
+        ]
+
+    def range_totals(self, start_date: Optional[date] = None, end_date: Optional[date] = None) -> dict:
+        """Ingresos, gastos, neto y número de transacciones en el rango"""
+        cents = self.cents[self._range(start_date, end_date)]
+        income = int(cents[cents > 0].sum())
+        expenses = int(cents[cents < 0].sum())
+        return {
+            "income": income / 100,
+            "expenses": expenses / 100,
+            "net": (income + expenses) / 100,
+            "count": int(len(cents)),
+        }
+
+
+class AnalyticsCache:
+    """LRU de UserFrame por usuario, acotada por bytes totales"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[int, Tuple[int, UserFrame]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, user_id: int, version: int) -> Optional[UserFrame]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, version: int, frame: UserFrame):
+        with self._lock:
+            old = self._entries.get(user_id)
+            # No reemplazar una versión más nueva cargada por otro request
+            if old is not None and old[0] > version:
+                return
+            if old is not None:
+                del self._entries[user_id]
+                self._bytes -= old[1].nbytes
+            if frame.nbytes > self.max_bytes:
+                return
+            self._entries[user_id] = (version, frame)
+            self._bytes += frame.nbytes
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            entry = self._entries.pop(user_id, None)
+            if entry is not None:
+                self._bytes -= entry[1].nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+analytics_cache = AnalyticsCache(max_bytes=int(os.getenv("ANALYTICS_CACHE_MB", "256")) * 1024 * 1024)
+
+
+def invalidate(user_id: int):
+    """Descarta el frame del usuario (crud lo llama en cada escritura)"""
+    analytics_cache.invalidate(user_id)
+
+
+def frame_statement(user_id: int):
+    """Columnas del frame; la fecha se lee como texto ISO y NumPy la convierte en bloque"""
+    return select(
+        cast(models.Transaction.date, String), models.Transaction.amount, models.Transaction.category
+    ).where(models.Transaction.user_id == user_id)
+
+
+async def get_frame(db: AsyncSession, user_id: int, version: int) -> UserFrame:
+    """Frame del usuario para su versión de datos actual (lo carga si no está en caché)"""
+    frame = analytics_cache.get(user_id, version)
+    if frame is None:
+        # Por la conexión (Core) y no por la sesión: evita el costo ORM por fila
+        connection = await db.connection()
+        result = await connection.execute(frame_statement(user_id))
+        frame = UserFrame.from_rows(result.tuples())
+        analytics_cache.put(user_id, version, frame)
+    return frame
@@ -0,0 +1,210 @@
+"""
+Detección de gastos inusuales con estadísticas móviles vectorizadas (NumPy).
+
+Se marcan dos tipos de anomalía sobre los gastos (amount < 0):
+
+- category_spike: el monto supera con holgura la mediana móvil de los últimos WINDOW gastos
+  de su categoría (z robusto con MAD >= Z_THRESHOLD y al menos MIN_RATIO veces la mediana).
+- new_merchant: primer cargo de un comercio nunca visto (según recurring_series) con un monto
+  por encima del percentil NEW_MERCHANT_QUANTILE de los últimos USER_WINDOW gastos del usuario.
+
+El estado por categoría (la ventana de gastos recientes) se guarda en `anomaly_state`, así
+que revisar un estado de cuenta nuevo solo procesa las filas con id mayor al último revisado:
+O(filas nuevas × WINDOW) con WINDOW constante. Las filas se procesan en orden de fecha a
+continuación de la ventana guardada. Editar o borrar una fila ya revisada invalida las ventanas:
+revise() las descarta y vuelve a revisar todo el historial del usuario (O(historial), vectorizado).
+"""
+import os
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from . import crud, models, recurring
+
+WINDOW = int(os.getenv("ANOMALY_WINDOW", "30"))
+USER_WINDOW = 200
+MIN_HISTORY = 5
+Z_THRESHOLD = 3.5
+MIN_RATIO = 1.5
+NEW_MERCHANT_QUANTILE = 0.95
+NEW_MERCHANT_MIN_CENTS = 100000  # $1,000
+ALL_CATEGORIES = "*"
+
+# 1.4826 * MAD estima la desviación estándar en datos normales
+_MAD_SCALE = 1.4826
+_BLOCK_ROWS = 4096
+
+
+def _prior_windows(history: np.ndarray, new: np.ndarray, window: int) -> np.ndarray:
+    """
+    Matriz (len(new), window): la fila i tiene los `window` valores anteriores a new[i]
+    (historial guardado + nuevos previos), rellenada con NaN al principio si faltan.
+    """
+    values = np.concatenate([np.full(window, np.nan), history.astype(np.float64), new.astype(np.float64)])
+    start = window + len(history)
+    return sliding_window_view(values, window)[start - window: start - window + len(new)]
+
+
+def _rolling_median_mad(windows: np.ndarray):
+    counts = np.count_nonzero(~np.isnan(windows), axis=1)
+    median = np.full(len(windows), np.nan)
+    mad = np.full(len(windows), np.nan)
+    valid = counts > 0
+    if valid.any():
+        median[valid] = np.nanmedian(windows[valid], axis=1)
+        mad[valid] = np.nanmedian(np.abs(windows[valid] - median[valid, None]), axis=1)
+    return median, mad, counts
+
+
+def _blocks(history: np.ndarray, new: np.ndarray, window: int):
+    """Recorre `new` en bloques (la matriz de ventanas es len × window) con su historial previo"""
+    for start in range(0, len(new), _BLOCK_ROWS):
+        previous = np.concatenate([history, new[max(0, start - window):start]])[-window:]
+        yield start, previous, new[start:start + _BLOCK_ROWS]
+
+
+def category_spikes(history: np.ndarray, cents: np.ndarray):
+    """Índices de `cents` que son picos respecto a la ventana móvil, con su z y la mediana"""
+    found_index, found_z, found_median = [], [], []
+    for offset, previous, block in _blocks(history, cents, WINDOW):
+        median, mad, counts = _rolling_median_mad(_prior_windows(previous, block, WINDOW))
+        # Piso de la escala: 5% de la mediana o $1, para categorías de monto casi fijo
+        scale = np.fmax(mad * _MAD_SCALE, np.fmax(median * 0.05, 100.0))
+        with np.errstate(invalid="ignore"):
+            z = (block - median) / scale
+            hits = (counts >= MIN_HISTORY) & (z >= Z_THRESHOLD) & (block >= median * MIN_RATIO)
+        index = np.flatnonzero(hits)
+        found_index.append(index + offset)
+        found_z.append(z[index])
+        found_median.append(median[index])
+    if not found_index:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+    return np.concatenate(found_index), np.concatenate(found_z), np.concatenate(found_median)
+
+
+def new_merchant_thresholds(history: np.ndarray, cents: np.ndarray) -> np.ndarray:
+    """Umbral por fila: percentil alto de los gastos anteriores del usuario (o el mínimo fijo)"""
+    thresholds = np.full(len(cents), float(NEW_MERCHANT_MIN_CENTS))
+    for offset, previous, block in _blocks(history, cents, USER_WINDOW):
+        windows = _prior_windows(previous, block, USER_WINDOW)
+        valid = np.count_nonzero(~np.isnan(windows), axis=1) >= MIN_HISTORY
+        if valid.any():
+            quantile = np.nanquantile(windows[valid], NEW_MERCHANT_QUANTILE, axis=1)
+            thresholds[offset + np.flatnonzero(valid)] = np.fmax(quantile, NEW_MERCHANT_MIN_CENTS)
+    return thresholds
+
+
+def _state_window(state: Optional[models.AnomalyState]) -> np.ndarray:
+    if state is None:
+        return np.empty(0, dtype=np.int64)
+    return np.frombuffer(state.window, dtype=np.int64)
+
+
+def _store_state(db: Session, states: Dict[str, models.AnomalyState], user_id: int, category: str,
+                 window: np.ndarray, last_id: int):
+    state = states.get(category)
+    if state is None:
+        state = models.AnomalyState(user_id=user_id, category=category)
+        db.add(state)
+        states[category] = state
+    state.window = np.ascontiguousarray(window, dtype=np.int64).tobytes()
+    state.last_transaction_id = last_id
+
+
+def scan_new(db: Session, user_id: int) -> List[models.Anomaly]:
+    """
+    Revisa las transacciones del usuario posteriores a la última revisada, guarda las
+    anomalías encontradas y actualiza las ventanas. No hace commit; si guarda anomalías
+    incrementa la versión de datos (el ETag de /transactions/anomalies cambia).
+    """
+    states = {s.category: s for s in db.scalars(select(models.AnomalyState).where(models.AnomalyState.user_id == user_id))}
+    all_state = states.get(ALL_CATEGORIES)
+    since_id = all_state.last_transaction_id if all_state is not None else 0
+
+    rows = db.execute(
+        select(models.Transaction.id, models.Transaction.amount, models.Transaction.category, models.Transaction.description)
+        .where(models.Transaction.user_id == user_id, models.Transaction.id > since_id)
+        .order_by(models.Transaction.date, models.Transaction.id)
+    ).all()
+    if not rows:
+        return []
+    last_id = max(row.id for row in rows)
+    expenses = [row for row in rows if row.amount < 0]
+    if not expenses:
+        _store_state(db, states, user_id, ALL_CATEGORIES, _state_window(all_state), last_id)
+        db.flush()
+        return []
+
+    ids = np.fromiter((row.id for row in expenses), dtype=np.int64, count=len(expenses))
+    cents = np.rint(np.fromiter((-row.amount for row in expenses), dtype=np.float64, count=len(expenses)) * 100).astype(np.int64)
+    categories = np.array([row.category or "" for row in expenses], dtype=object)
+    flags = {}
+
+    for category in dict.fromkeys(categories.tolist()):
+        index = np.flatnonzero(categories == category)
+        history = _state_window(states.get(category))
+        hits, z, median = category_spikes(history, cents[index])
+        for hit, score, expected in zip(hits, z, median):
+            flags[int(ids[index[hit]])] = ("category_spike", float(score), float(expected) / 100)
+        window = np.concatenate([history, cents[index]])[-WINDOW:]
+        _store_state(db, states, user_id, category, window, last_id)
+
+    # Comercios sin ocurrencias fuera de este lote (recurring_series ya incluye las filas nuevas)
+    keys = [recurring.series_key(row.description, row.amount) for row in expenses]
+    in_scan: Dict[tuple, int] = {}
+    for key in keys:
+        in_scan[key] = in_scan.get(key, 0) + 1
+    seen = {
+        (s.merchant_key, s.kind): s.occurrences
+        for s in db.scalars(select(models.RecurringSeries).where(
+            models.RecurringSeries.user_id == user_id,
+            models.RecurringSeries.merchant_key.in_({key[0] for key in keys}),
+        ))
+    }
+    user_history = _state_window(all_state)
+    thresholds = new_merchant_thresholds(user_history, cents)
+    first_in_scan = set()
+    for i, key in enumerate(keys):
+        if key in first_in_scan:
+            continue
+        first_in_scan.add(key)
+        prior = seen.get(key, in_scan[key]) - in_scan[key]
+        if prior <= 0 and cents[i] >= thresholds[i] and int(ids[i]) not in flags:
+            flags[int(ids[i])] = ("new_merchant", float(cents[i] / thresholds[i]), None)
+    _store_state(db, states, user_id, ALL_CATEGORIES, np.concatenate([user_history, cents])[-USER_WINDOW:], last_id)
+
+    anomalies = [
+        models.Anomaly(transaction_id=transaction_id, user_id=user_id, kind=kind, score=round(score, 2), expected=expected)
+        for transaction_id, (kind, score, expected) in flags.items()
+    ]
+    if anomalies:
+        db.add_all(anomalies)
+        crud.bump_data_version(db, user_id)
+    db.flush()
+    return anomalies
+
+
+def reset(db: Session, user_id: int):
+    """Borra anomalías y ventanas del usuario; el siguiente scan_new revisa todo el historial"""
+    db.execute(delete(models.Anomaly).where(models.Anomaly.user_id == user_id))
+    db.execute(delete(models.AnomalyState).where(models.AnomalyState.user_id == user_id))
+    crud.bump_data_version(db, user_id)
+
+
+def revise(db: Session, user_id: int, transaction_ids: Iterable[int]):
+    """
+    Tras editar o borrar transacciones: si alguna ya estaba revisada, recalcula las anomalías
+    del usuario desde cero. Las filas aún no revisadas las cubre el siguiente scan_new. No hace commit.
+    """
+    transaction_ids = list(transaction_ids)
+    last_id = db.scalar(select(models.AnomalyState.last_transaction_id).where(
+        models.AnomalyState.user_id == user_id, models.AnomalyState.category == ALL_CATEGORIES,
+    ))
+    if not transaction_ids or last_id is None or min(transaction_ids) > last_id:
+        return
+    db.flush()
+    reset(db, user_id)
+    scan_new(db, user_id)
@@ -0,0 +1,159 @@
+"""
+Artefactos de depuración (p. ej. el texto extraído de cada PDF), opcionales y fuera del request.
+
+- Desactivados por defecto; DEBUG_ARTIFACTS=1 los activa.
+- `submit(texto, kind, source)` calcula el hash y encola: la compresión (zstd si está
+  instalado `zstandard`, si no gzip) y la escritura las hace un hilo aparte. Si la cola está
+  llena el artefacto se descarta: la subida nunca espera al disco por algo de depuración.
+- Se guardan por contenido en ARTIFACT_DIR/<kind>/<2 primeros del hash>/<hash>.txt.<gz|zst>;
+  el mismo texto no se vuelve a escribir.
+- Retención: se borran los de más de ARTIFACT_MAX_AGE_DAYS y, si se pasa de
+  ARTIFACT_MAX_FILES o ARTIFACT_MAX_MB, los más viejos primero.
+"""
+import gzip
+import hashlib
+import os
+import queue
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from . import logs, telemetry
+
+log = logs.get_logger("artifacts")
+
+DEBUG_ARTIFACTS = os.getenv("DEBUG_ARTIFACTS", "0").lower() in ("1", "true", "yes")
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "debug_artifacts")
+ARTIFACT_MAX_FILES = int(os.getenv("ARTIFACT_MAX_FILES", "500"))
+ARTIFACT_MAX_MB = float(os.getenv("ARTIFACT_MAX_MB", "200"))
+ARTIFACT_MAX_AGE_DAYS = float(os.getenv("ARTIFACT_MAX_AGE_DAYS", "7"))
+ARTIFACT_QUEUE_SIZE = int(os.getenv("ARTIFACT_QUEUE_SIZE", "64"))
+
+ARTIFACTS = telemetry.registry.counter(
+    "pfm_debug_artifacts_total", "Artefactos de depuración por resultado (written, duplicate, dropped, pruned)", ("result",)
+)
+
+try:
+    import zstandard
+
+    COMPRESSION = "zst"
+    compress = zstandard.ZstdCompressor(level=10).compress
+    decompress = zstandard.ZstdDecompressor().decompress
+except ImportError:
+    COMPRESSION = "gz"
+    compress = lambda data: gzip.compress(data, compresslevel=6)  # noqa: E731
+    decompress = gzip.decompress
+
+
+def artifact_path(kind: str, key: str) -> str:
+    return os.path.join(ARTIFACT_DIR, kind, key[:2], f"{key}.txt.{COMPRESSION}")
+
+
+def read(kind: str, key: str) -> Optional[str]:
+    """Texto de un artefacto guardado (para inspeccionarlo), o None si ya no existe"""
+    try:
+        with open(artifact_path(kind, key), "rb") as f:
+            return decompress(f.read()).decode("utf-8")
+    except FileNotFoundError:
+        return None
+
+
+class _Writer:
+    """Hilo que comprime y escribe los artefactos encolados y aplica la retención"""
+
+    def __init__(self):
+        self.queue: "queue.Queue[Tuple[str, str, bytes, str]]" = queue.Queue(maxsize=ARTIFACT_QUEUE_SIZE)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def put(self, item) -> bool:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="pfm-artifacts", daemon=True)
+                self._thread.start()
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            return False
+
+    def _run(self):
+        while True:
+            kind, key, data, source = self.queue.get()
+            try:
+                self._write(kind, key, data, source)
+            except OSError as e:
+                log.warning("No se pudo guardar el artefacto de depuración: %s", e, extra={"key": key})
+            finally:
+                self.queue.task_done()
+
+    def _write(self, kind: str, key: str, data: bytes, source: str):
+        path = artifact_path(kind, key)
+        if os.path.exists(path):
+            os.utime(path)  # cuenta como reciente para la retención
+            ARTIFACTS.inc(result="duplicate")
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(compress(data))
+        os.replace(tmp_path, path)
+        ARTIFACTS.inc(result="written")
+        log.debug("Artefacto de depuración guardado", extra={"key": key, "kind": kind, "source": source, "bytes": len(data)})
+        prune()
+
+
+_writer = _Writer()
+
+
+def submit(text: str, kind: str = "ocr_text", source: str = "") -> Optional[str]:
+    """Encola el texto si DEBUG_ARTIFACTS está activo; devuelve su clave (sha256) o None"""
+    if not DEBUG_ARTIFACTS:
+        return None
+    data = text.encode("utf-8")
+    key = hashlib.sha256(data).hexdigest()
+    if not _writer.put((kind, key, data, source)):
+        ARTIFACTS.inc(result="dropped")
+        return None
+    return key
+
+
+def flush():
+    """Espera a que se escriban los artefactos encolados (pruebas y apagado ordenado)"""
+    _writer.queue.join()
+
+
+def _files() -> List[os.DirEntry]:
+    entries = []
+    stack = [ARTIFACT_DIR]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif not entry.name.endswith(".tmp"):
+                        entries.append(entry)
+        except FileNotFoundError:
+            continue
+    return entries
+
+
+def prune(now: Optional[float] = None) -> int:
+    """Aplica la retención por edad, cantidad y tamaño; devuelve cuántos archivos borró"""
+    now = now or time.time()
+    files = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in _files()), reverse=True)
+    keep_bytes = ARTIFACT_MAX_MB * 1024 * 1024
+    total = 0
+    removed = 0
+    for index, (mtime, size, path) in enumerate(files):
+        total += size
+        if index >= ARTIFACT_MAX_FILES or total > keep_bytes or now - mtime > ARTIFACT_MAX_AGE_DAYS * 86400:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    if removed:
+        ARTIFACTS.inc(removed, result="pruned")
+    return removed
@@ -0,0 +1,42 @@
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from .database import DATABASE_URL, apply_sqlite_pragmas, is_sqlite, is_sqlite_memory, pool_kwargs, _env_int
+
+
+def to_async_url(url: str) -> str:
+    """
+    Convierte la URL síncrona a su driver asíncrono:
+    sqlite -> sqlite+aiosqlite, postgresql -> postgresql+asyncpg.
+    """
+    scheme, rest = url.split("://", 1)
+    if scheme.startswith("sqlite"):
+        return "sqlite+aiosqlite://" + rest
+    if scheme in ("postgres", "postgresql") or scheme.startswith("postgresql+"):
+        return "postgresql+asyncpg://" + rest
+    return url
+
+
+def create_async_db_engine(url: str = None, **engine_kwargs):
+    """Crea el engine asíncrono con los mismos pragmas y parámetros de pool que el síncrono"""
+    url = url or DATABASE_URL
+    kwargs = {}
+    if is_sqlite(url):
+        kwargs["connect_args"] = {"timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000) / 1000}
+    kwargs.update(pool_kwargs(url))
+    kwargs.update(engine_kwargs)
+
+    async_engine = create_async_engine(to_async_url(url), **kwargs)
+    if is_sqlite(url):
+        # Los eventos de conexión se registran sobre el engine síncrono subyacente
+        apply_sqlite_pragmas(async_engine.sync_engine, is_sqlite_memory(url))
+    return async_engine
+
+
+async_engine = create_async_db_engine(DATABASE_URL)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+
+# Dependency para obtener la sesión asíncrona (endpoints de solo lectura)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
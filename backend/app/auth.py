@@ -1,16 +1,26 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Dict, Any, Tuple
+from collections import OrderedDict
+import threading
+import time
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from .schemas import TokenData
+from . import logs
+import logging
 import os
 
+log = logs.get_logger("auth")
+
 # Configuración de seguridad
 SECRET_KEY = os.getenv("SECRET_KEY", "tu_clave_secreta_aqui_cambiala_en_produccion")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Emails con acceso a las herramientas de diagnóstico (/admin/...), separados por comas
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
 # Esquema OAuth2
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
@@ -43,16 +53,88 @@ def verify_token(token: str) -> Optional[TokenData]:
         email: str = payload.get("sub")
         if email is None:
             return None
-        return TokenData(email=email)
+        return TokenData(email=email, user_id=payload.get("uid"), exp=payload.get("exp"))
     except JWTError:
         return None
 
+def is_admin(email: Optional[str]) -> bool:
+    """Indica si el email está en ADMIN_EMAILS"""
+    return bool(email) and email.lower() in ADMIN_EMAILS
+
+# ----------- Caché de usuarios resueltos (get_current_user) -----------
+class PrincipalCache:
+    """
+    Caché LRU acotada con TTL de usuarios ya resueltos, indexada por (sub, exp) del token.
+    Guarda un snapshot de las columnas del usuario (no la instancia ORM, que pertenece a otra sesión).
+    Es por proceso: entre workers un cambio de usuario se propaga como máximo en `ttl` segundos.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Tuple[str, Optional[int]], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sub: str, exp: Optional[int]) -> Optional[Dict[str, Any]]:
+        if self.maxsize <= 0:
+            return None
+        key = (sub, exp)
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, snapshot = item
+            if expires_at < now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return snapshot
+
+    def put(self, sub: str, exp: Optional[int], snapshot: Dict[str, Any]):
+        if self.maxsize <= 0:
+            return
+        # No cachear más allá de la expiración del propio token
+        expires_at = time.monotonic() + self.ttl
+        if exp is not None:
+            expires_at = min(expires_at, time.monotonic() + max(0, exp - time.time()))
+        with self._lock:
+            self._data[(sub, exp)] = (expires_at, snapshot)
+            self._data.move_to_end((sub, exp))
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, email: Optional[str] = None, user_id: Optional[int] = None):
+        """Elimina las entradas de un usuario (por email o id)"""
+        with self._lock:
+            for key in [
+                k for k, (_, snap) in self._data.items()
+                if (email is not None and snap.get("email") == email)
+                or (user_id is not None and snap.get("id") == user_id)
+            ]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+principal_cache = PrincipalCache(
+    maxsize=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60")),
+)
+
+def invalidate_principal(email: Optional[str] = None, user_id: Optional[int] = None):
+    """Invalida el usuario cacheado; se llama desde crud cuando un usuario cambia"""
+    principal_cache.invalidate(email=email, user_id=user_id)
+
 # ----------- AI para extraer transacciones del texto del PDF -----------
 def extract_transactions_with_ai(pdf_text: str) -> list:
     import openai
     from openai import OpenAI
     import json
     import re
+    from . import telemetry, usage
 
     api_key = os.getenv("OPENAI_API_KEY")
     # Elimina cualquier argumento proxies en la inicialización del cliente OpenAI
@@ -85,12 +167,12 @@ def extract_transactions_with_ai(pdf_text: str) -> list:
 
     # Dividir el texto en chunks
     text_chunks = split_text_into_chunks(pdf_text)
-    print(f"📄 Texto dividido en {len(text_chunks)} chunks para procesamiento AI")
+    log.info("Texto dividido para procesamiento AI", extra={"chunks": len(text_chunks)})
 
     all_transactions = []
     
     for i, chunk in enumerate(text_chunks):
-        print(f"🤖 Procesando chunk {i+1}/{len(text_chunks)}...")
+        log.debug("Procesando chunk con AI", extra={"chunk": i + 1, "chunks": len(text_chunks)})
         
         prompt = (
             "Eres un experto en análisis de estados de cuenta bancarios MEXICANOS. Extrae TODAS las transacciones REALES del texto proporcionado.\n\n"
@@ -118,22 +200,23 @@ def extract_transactions_with_ai(pdf_text: str) -> list:
         )
         
         try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=3000,
-                temperature=0
-            )
+            with telemetry.span("llm_chunk", chunk=i + 1, characters=len(chunk)):
+                response = usage.chat(
+                    client,
+                    "extract_transactions_with_ai",
+                    model="gpt-3.5-turbo",
+                    messages=[{"role": "user", "content": prompt}],
+                    max_tokens=3000,
+                    temperature=0
+                )
             raw_content = response.choices[0].message.content
             try:
                 result = json.loads(raw_content)
             except Exception as parse_err:
-                print(f"❌ Error parseando JSON en chunk {i+1}: {parse_err}")
-                print(f"🔎 Respuesta cruda de OpenAI (chunk {i+1}):\n{raw_content}\n--- FIN RESPUESTA ---")
-                if not raw_content.strip():
-                    print(f"⚠️ Respuesta de OpenAI vacía en chunk {i+1}")
+                log.warning("Error parseando JSON de OpenAI: %s", parse_err, extra={"chunk": i + 1, "empty": not raw_content.strip()})
+                log.debug("Respuesta cruda de OpenAI:\n%s", raw_content, extra={"chunk": i + 1})
                 continue
-            print(f"✅ Chunk {i+1}: {len(result)} transacciones encontradas")
+            log.debug("Chunk procesado", extra={"chunk": i + 1, "rows": len(result)})
             
             # Filtrar transacciones válidas
             for transaction in result:
@@ -152,13 +235,13 @@ def extract_transactions_with_ai(pdf_text: str) -> list:
                         len(descripcion.strip()) > 2):  # Descripción válida (reducida)
                         
                         all_transactions.append(transaction)
-                        print(f"✅ Transacción válida: {transaction.get('fecha_operacion', '')} - {transaction.get('descripcion', '')[:40]} - ${monto}")
+                        logs.sampled(log, "ai.row", "Transacción válida", date=transaction.get('fecha_operacion', ''), description=transaction.get('descripcion', '')[:40], amount=monto)
                 except Exception as e:
-                    print(f"❌ Error validando transacción en chunk {i+1}: {e}")
+                    logs.sampled(log, "ai.row_error", "Error validando transacción: %s", e, level=logging.WARNING, chunk=i + 1)
                     continue
                     
         except Exception as e:
-            print(f"❌ Error procesando chunk {i+1}: {e}")
+            log.error("Error procesando chunk con AI: %s", e, extra={"chunk": i + 1})
             continue
     
     # Eliminar duplicados basados en fecha, descripción y monto
@@ -177,5 +260,5 @@ def extract_transactions_with_ai(pdf_text: str) -> list:
             seen.add(key)
             unique_transactions.append(transaction)
     
-    print(f"📊 Total de transacciones únicas encontradas: {len(unique_transactions)}")
+    log.info("Extracción con AI terminó", extra={"rows": len(unique_transactions)})
     return unique_transactions
\ No newline at end of file
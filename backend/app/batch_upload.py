@@ -0,0 +1,211 @@
+"""
+Subida por lotes: varios PDFs o un ZIP de estados de cuenta, procesados en paralelo.
+
+- `iter_pdfs` recorre un ZIP miembro por miembro: cada PDF se descomprime a un archivo
+  temporal (en memoria solo hasta SPOOL_BYTES), así el ZIP nunca se extrae completo en memoria.
+- La extracción y la categorización (lo lento: OCR y OpenAI) corren en un pool de
+  BATCH_WORKERS procesos; con BATCH_WORKERS=0 usan hilos del propio proceso (desarrollo).
+- Cada usuario tiene a lo más BATCH_PER_USER archivos en el pool a la vez, sumando todos
+  sus lotes: un año de estados de cuenta no acapara a los workers.
+- La persistencia corre en este proceso (el pool no abre conexiones a la base), con la misma
+  función que /upload_pdf. El avance del lote sale del estado de cada subida (uploads).
+"""
+import contextlib
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import extraction, logs, models, telemetry
+from .database import _env_int
+
+log = logs.get_logger("batch_upload")
+
+BATCH_WORKERS = _env_int("BATCH_WORKERS", os.cpu_count() or 2)
+BATCH_PER_USER = max(1, _env_int("BATCH_PER_USER", 2))
+BATCH_MAX_FILES = _env_int("BATCH_MAX_FILES", 120)
+BATCH_MAX_FILE_MB = float(os.getenv("BATCH_MAX_FILE_MB", "50"))
+SPOOL_BYTES = 1024 * 1024
+
+BATCH_FILES = telemetry.registry.counter("pfm_batch_files_total", "Archivos de lotes procesados por resultado", ("status",))
+
+
+class BatchError(ValueError):
+    """El lote no se puede aceptar (formato, cantidad o tamaño)"""
+
+
+def _is_pdf(name: str) -> bool:
+    base = os.path.basename(name)
+    return base.lower().endswith(".pdf") and not base.startswith("._") and not name.startswith("__MACOSX/")
+
+
+def iter_pdfs(filename: str, fileobj: BinaryIO) -> Iterator[Tuple[str, BinaryIO]]:
+    """(nombre, archivo) de cada PDF subido: el archivo mismo o, si es ZIP, cada miembro .pdf"""
+    if filename.lower().endswith(".pdf"):
+        yield filename, fileobj
+        return
+    if not filename.lower().endswith(".zip"):
+        raise BatchError(f"{filename}: solo se permiten archivos PDF o ZIP")
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise BatchError(f"{filename}: el ZIP está dañado")
+    limit = BATCH_MAX_FILE_MB * 1024 * 1024
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or not _is_pdf(info.filename):
+                continue
+            if info.file_size > limit:
+                raise BatchError(f"{info.filename}: pasa de {BATCH_MAX_FILE_MB:g} MB")
+            spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+            with archive.open(info) as member:
+                # file_size viene del propio ZIP: se copia con tope por si miente
+                shutil.copyfileobj(member, spooled, 64 * 1024)
+                if spooled.tell() > limit:
+                    spooled.close()
+                    raise BatchError(f"{info.filename}: pasa de {BATCH_MAX_FILE_MB:g} MB")
+            spooled.seek(0)
+            try:
+                yield os.path.basename(info.filename), spooled
+            finally:
+                spooled.close()
+
+
+def process(path: str, api_key: str) -> dict:
+    """Corre en el worker: extrae y categoriza un PDF y devuelve lo necesario para persistirlo"""
+    with telemetry.trace() as pipeline:
+        result = extraction.process_bank_statement_pdf(path, api_key)
+    return {
+        "banco": result.get("banco", "Desconocido"),
+        "transacciones": result.get("transacciones", []),
+        "tiempos": pipeline.summary(),
+        "llm_calls": pipeline.llm_calls,
+    }
+
+
+_pool: Optional[Executor] = None
+_pool_lock = threading.Lock()
+_slots: Dict[int, threading.BoundedSemaphore] = {}
+_slots_lock = threading.Lock()
+
+
+def _executor() -> Executor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if BATCH_WORKERS > 0:
+                # spawn: hacer fork de un servidor con hilos puede heredar locks tomados
+                _pool = ProcessPoolExecutor(BATCH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                _pool = ThreadPoolExecutor(BATCH_PER_USER * 4, thread_name_prefix="pfm-batch")
+        return _pool
+
+
+def _reset_pool(broken: Executor):
+    """Un worker que muere rompe el pool entero; el siguiente archivo crea otro"""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _user_slots(user_id: int) -> threading.BoundedSemaphore:
+    with _slots_lock:
+        if user_id not in _slots:
+            _slots[user_id] = threading.BoundedSemaphore(BATCH_PER_USER)
+        return _slots[user_id]
+
+
+Persist = Callable[[str, Union[dict, BaseException]], None]
+
+
+def _run(batch_id: str, user_id: int, items: List[Tuple[str, str]], api_key: str, persist: Persist):
+    slots = _user_slots(user_id)
+    queue = list(items)
+    pending = {}
+    while queue or pending:
+        # Sin nada en vuelo se espera un lugar (otro lote del usuario puede tenerlos todos)
+        while queue and slots.acquire(blocking=not pending):
+            upload_id, path = queue.pop(0)
+            pool = _executor()
+            try:
+                pending[pool.submit(process, path, api_key)] = (upload_id, pool)
+            except (BrokenProcessPool, RuntimeError) as e:
+                slots.release()
+                _reset_pool(pool)
+                persist(upload_id, e)
+        if not pending:
+            continue
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            upload_id, pool = pending.pop(future)
+            slots.release()
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                _reset_pool(pool)
+            BATCH_FILES.inc(status="failed" if error else "processed")
+            try:
+                persist(upload_id, error or future.result())
+            except Exception as e:
+                log.exception("No se pudo guardar el resultado del lote", extra={"batch_id": batch_id, "upload_id": upload_id})
+                if error is None:
+                    # Que la subida quede como fallida y no pendiente para siempre
+                    with contextlib.suppress(Exception):
+                        persist(upload_id, e)
+    log.info("Lote terminado", extra={"batch_id": batch_id, "files": len(items)})
+
+
+def submit(batch_id: str, user_id: int, items: List[Tuple[str, str]], api_key: str, persist: Persist) -> threading.Thread:
+    """Procesa en segundo plano los (upload_id, ruta del PDF) del lote; `persist` recibe el resultado o la excepción"""
+    thread = threading.Thread(
+        target=_run, args=(batch_id, user_id, items, api_key, persist), name=f"pfm-batch-{batch_id[:8]}", daemon=True
+    )
+    thread.start()
+    return thread
+
+
+def progress(db: Session, user_id: int, batch_id: str) -> Optional[dict]:
+    """Avance de un lote del usuario, o None si no existe"""
+    upload = models.Upload
+    rows = db.execute(
+        select(upload.id, upload.filename, upload.status, upload.bank, upload.transactions_saved)
+        .join(models.UploadBatchItem, models.UploadBatchItem.upload_id == upload.id)
+        .where(models.UploadBatchItem.batch_id == batch_id, upload.user_id == user_id)
+        .order_by(models.UploadBatchItem.position)
+    ).all()
+    if not rows:
+        return None
+    counts = {status: sum(row.status == status for row in rows) for status in ("received", "processed", "failed")}
+    done = counts["processed"] + counts["failed"]
+    return {
+        "batch_id": batch_id,
+        "total": len(rows),
+        "pending": counts["received"],
+        "processed": counts["processed"],
+        "failed": counts["failed"],
+        "progress": round(done / len(rows), 3),
+        "done": done == len(rows),
+        "transactions_saved": sum(row.transactions_saved or 0 for row in rows),
+        "files": [
+            {"upload_id": row.id, "filename": row.filename, "status": row.status, "bank": row.bank,
+             "transactions_saved": row.transactions_saved}
+            for row in rows
+        ],
+    }
@@ -0,0 +1,180 @@
+"""
+Almacén de archivos por contenido para las subidas.
+
+Antes cada PDF se guardaba como UPLOAD_DIR/<nombre original>: dos usuarios con "estado.pdf" se
+pisaban, el mismo archivo se escribía otra vez en cada subida y todo quedaba en un solo
+directorio. Ahora:
+
+- El archivo se identifica por su sha256 y vive en BLOB_DIR/ab/cd/<sha256>.<kind>
+  (dos niveles de 256 directorios: ningún directorio crece sin límite).
+- `store` calcula el hash leyendo el archivo subido sin escribirlo; solo escribe si el
+  contenido no existía. La fila de `blobs` lleva la cuenta de referencias (una por fila de
+  `uploads`); al borrar una subida (DELETE /uploads/{id}) `release` la descuenta, y el GC
+  (app/retention.py) borra los blobs que quedan sin referencias o fuera de retención.
+"""
+import hashlib
+import os
+import uuid
+from typing import BinaryIO, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+BLOB_DIR = os.getenv("BLOB_DIR", os.path.join("uploaded_pdfs", "blobs"))
+CHUNK_SIZE = 1024 * 1024
+
+
+def blob_path(sha256: str, kind: str = "pdf") -> str:
+    return os.path.join(BLOB_DIR, sha256[:2], sha256[2:4], f"{sha256}.{kind}")
+
+
+def path_for(blob: models.Blob) -> str:
+    return blob_path(blob.sha256, blob.kind)
+
+
+def _hash(fileobj: BinaryIO) -> tuple:
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+def _write(fileobj: BinaryIO, path: str) -> int:
+    """Escribe de forma atómica (temporal + rename); devuelve los bytes en disco"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "wb") as f:
+        for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+            f.write(chunk)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+
+def _upsert(db: Session, values: dict):
+    """Inserta el blob con refcount 1 o, si ya existe, suma una referencia (seguro con subidas simultáneas)"""
+    dialect = db.bind.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = (sqlite if dialect == "sqlite" else postgresql).insert
+        stmt = insert(models.Blob).values(**values, refcount=1)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[models.Blob.sha256], set_={"refcount": models.Blob.refcount + 1}
+        ))
+        return
+    blob = db.get(models.Blob, values["sha256"])
+    if blob is None:
+        db.add(models.Blob(**values, refcount=1))
+    else:
+        blob.refcount += 1
+    db.flush()
+
+
+def store(db: Session, fileobj: BinaryIO, kind: str = "pdf", reference: bool = True,
+          written: Optional[List[Tuple[str, str]]] = None) -> models.Blob:
+    """
+    Guarda el contenido de `fileobj` si no existía y devuelve su fila de `blobs` (sin commit).
+    Con reference=False no suma referencia (blob temporal que el GC puede borrar).
+    Si se pasa `written`, se le agregan (sha256, ruta) de los archivos que esta llamada
+    escribió, para que quien llama los pase a `discard` si su transacción se revierte.
+    """
+    sha256, size = _hash(fileobj)
+    path = blob_path(sha256, kind)
+    if os.path.exists(path):
+        stored_size = os.path.getsize(path)
+    else:
+        stored_size = _write(fileobj, path)
+        if written is not None:
+            written.append((sha256, path))
+    values = {"sha256": sha256, "kind": kind, "size": size, "stored_size": stored_size}
+    if reference:
+        _upsert(db, values)
+    elif db.get(models.Blob, sha256) is None:
+        db.add(models.Blob(**values, refcount=0))
+        db.flush()
+    if not os.path.exists(path):
+        # El GC (app/retention.py) lo borró entre la primera verificación y el upsert
+        fileobj.seek(0)
+        _write(fileobj, path)
+        if written is not None and (sha256, path) not in written:
+            written.append((sha256, path))
+    blob = db.get(models.Blob, sha256)
+    db.refresh(blob)
+    return blob
+
+
+def read(blob: models.Blob) -> bytes:
+    with open(path_for(blob), "rb") as f:
+        return f.read()
+
+
+def discard(written: List[Tuple[str, str]]):
+    """
+    Borra los archivos que escribió una transacción revertida. Si otra subida con el mismo
+    contenido ya guardó su fila de `blobs` (se consulta en una sesión nueva), el archivo es
+    suyo y se deja; lo que quede sin referencias lo borra el GC.
+    """
+    if not written:
+        return
+    with SessionLocal() as db:
+        committed = set(db.scalars(select(models.Blob.sha256).where(models.Blob.sha256.in_({sha for sha, _ in written}))))
+    for sha256, path in written:
+        if sha256 in committed:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def release(db: Session, sha256: str):
+    """Descuenta una referencia (sin commit) al borrar una subida; el archivo lo borra el GC"""
+    db.execute(
+        update(models.Blob).where(models.Blob.sha256 == sha256, models.Blob.refcount > 0)
+        .values(refcount=models.Blob.refcount - 1)
+    )
+
+
+def storage_report(db: Session) -> dict:
+    """Uso de disco: bytes subidos (con duplicados), bytes guardados y lo que ahorró la deduplicación"""
+    blob = models.Blob
+    uploads, uploaded_bytes = db.execute(
+        select(func.count(), func.coalesce(func.sum(blob.size), 0))
+        .select_from(models.Upload).join(blob, models.Upload.blob_sha256 == blob.sha256)
+    ).one()
+    referenced_bytes = db.execute(
+        select(func.coalesce(func.sum(blob.size), 0)).where(blob.sha256.in_(select(models.Upload.blob_sha256)))
+    ).scalar()
+    by_kind = {
+        kind: {"blobs": count, "bytes": int(size), "stored_bytes": int(stored)}
+        for kind, count, size, stored in db.execute(
+            select(blob.kind, func.count(), func.sum(blob.size), func.sum(blob.stored_size)).group_by(blob.kind)
+        )
+    }
+    unreferenced, unreferenced_bytes = db.execute(
+        select(func.count(), func.coalesce(func.sum(blob.stored_size), 0)).where(blob.refcount == 0)
+    ).one()
+    reclaimed = {
+        reason: {"files": count, "bytes": int(size)}
+        for reason, count, size in db.execute(
+            select(models.BlobTombstone.reason, func.count(), func.sum(models.BlobTombstone.stored_size))
+            .group_by(models.BlobTombstone.reason)
+        )
+    }
+    return {
+        "uploads": uploads,
+        "uploaded_bytes": int(uploaded_bytes),
+        "blobs": sum(item["blobs"] for item in by_kind.values()),
+        "stored_bytes": sum(item["stored_bytes"] for item in by_kind.values()),
+        "deduplicated_bytes": int(uploaded_bytes) - int(referenced_bytes),
+        "unreferenced_blobs": unreferenced,
+        "unreferenced_bytes": int(unreferenced_bytes),
+        "by_kind": by_kind,
+        "reclaimed": reclaimed,
+    }
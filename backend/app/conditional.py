@@ -0,0 +1,54 @@
+"""
+GET condicional (ETag / If-None-Match) para los endpoints de lectura.
+
+El ETag se deriva de la versión de datos del usuario (crud.bump_data_version la incrementa
+en cada escritura) y de la URL pedida. Si el cliente envía un If-None-Match que coincide,
+se responde 304 sin agregar en la base de datos ni serializar el cuerpo.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud
+
+# El cliente puede guardar la respuesta pero debe revalidar siempre con el ETag
+CACHE_CONTROL = "private, no-cache"
+
+
+def compute_etag(user_id: int, version: int, request: Request) -> str:
+    """ETag fuerte: cambia con la versión de datos del usuario y con la ruta/query pedida"""
+    key = f"{user_id}:{version}:{request.url.path}?{request.url.query}"
+    return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Compara If-None-Match con el ETag (comparación débil, como indica RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+async def check_not_modified(request: Request, response: Response, db: AsyncSession, user_id: int) -> Optional[Response]:
+    """
+    Devuelve una respuesta 304 si el cliente ya tiene la versión actual.
+    En caso contrario agrega ETag y Cache-Control a la respuesta y devuelve None.
+    La versión queda en request.state.data_version para reutilizarla (p. ej. analytics).
+    """
+    version = await crud.get_data_version_async(db, user_id)
+    request.state.data_version = version
+    etag = compute_etag(user_id, version, request)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return None
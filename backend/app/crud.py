@@ -1,6 +1,12 @@
-from sqlalchemy.orm import Session
-from . import models, schemas
-from .auth import get_password_hash, verify_password
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, extract, func, update, insert, delete, cast, Date
+from sqlalchemy.exc import SQLAlchemyError
+from pydantic import ValidationError
+from datetime import date, timedelta
+from typing import Optional, Iterable, List, Sequence
+from . import models, schemas, analytics, recurring, anomalies
+from .auth import get_password_hash, verify_password, invalidate_principal
 
 # Funciones para Usuario
 def get_user(db: Session, user_id: int):
@@ -24,10 +30,23 @@ def create_user(db: Session, user: schemas.UserCreate):
         name=user.name
     )
     db.add(db_user)
+    db.flush()
+    db.add(models.UserDataVersion(user_id=db_user.id, version=0))
     db.commit()
     db.refresh(db_user)
+    invalidate_principal(email=db_user.email)
     return db_user
 
+def user_snapshot(user: models.User) -> dict:
+    """Copia de las columnas del usuario para la caché de principals"""
+    return {column.key: getattr(user, column.key) for column in models.User.__table__.columns}
+
+def user_from_snapshot(db: Session, snapshot: dict) -> models.User:
+    """Reconstruye el usuario cacheado y lo asocia a la sesión sin consultar la base"""
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
 def authenticate_user(db: Session, email: str, password: str):
     """Autentica un usuario"""
     user = get_user_by_email(db, email)
@@ -37,6 +56,27 @@ def authenticate_user(db: Session, email: str, password: str):
         return False
     return user
 
+# Versión de datos por usuario (ETags)
+def bump_data_version(db: Session, user_id: int):
+    """Incrementa la versión de datos del usuario dentro de la transacción actual (sin commit)"""
+    result = db.execute(
+        update(models.UserDataVersion)
+        .where(models.UserDataVersion.user_id == user_id)
+        .values(version=models.UserDataVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        # Usuarios creados antes de existir la tabla de versiones
+        db.add(models.UserDataVersion(user_id=user_id, version=1))
+        db.flush()
+    analytics.invalidate(user_id)
+
+def get_data_version(db: Session, user_id: int) -> int:
+    """Versión actual de los datos del usuario (0 si nunca ha escrito)"""
+    version = db.execute(
+        select(models.UserDataVersion.version).where(models.UserDataVersion.user_id == user_id)
+    ).scalar()
+    return version or 0
+
 # Funciones para Transacción
 def get_transactions(db: Session, user_id: int, skip: int = 0, limit: int = 100):
     """Obtiene transacciones de un usuario"""
@@ -48,10 +88,52 @@ def create_transaction(db: Session, transaction: schemas.TransactionCreate, user
     """Crea una nueva transacción"""
     db_transaction = models.Transaction(**transaction.dict(), user_id=user_id)
     db.add(db_transaction)
+    recurring.observe(db, user_id, [transaction.dict()])
+    bump_data_version(db, user_id)
     db.commit()
     db.refresh(db_transaction)
     return db_transaction
 
+def add_transactions(db: Session, user_id: int, transactions: Sequence[schemas.TransactionCreate]) -> list:
+    """
+    Agrega varias transacciones sin commit (las guarda quien llama, junto con lo demás de su
+    transacción): un flush para tener ids, una sola observación de recurrentes y un solo
+    incremento de la versión de datos.
+    """
+    db_transactions = [models.Transaction(**t.dict(), user_id=user_id) for t in transactions]
+    if db_transactions:
+        db.add_all(db_transactions)
+        db.flush()
+        recurring.observe(db, user_id, [t.dict() for t in transactions])
+        bump_data_version(db, user_id)
+    return db_transactions
+
+def bulk_create_transactions(db: Session, user_id: int, rows: Iterable[dict], batch_size: int = 5000) -> int:
+    """
+    Inserta transacciones en lotes (executemany) sin crear instancias ORM y sin commit: quien
+    llama guarda la importación junto con lo que haga después (p. ej. anomalies.scan_new).
+    Consume `rows` de forma incremental, así la memoria queda acotada por batch_size.
+    """
+    total = 0
+    batch = []
+    # Solo las claves de comercio: las series tocadas se recalculan al final con una sola lectura
+    series_keys = set()
+    for row in rows:
+        batch.append({**row, "user_id": user_id})
+        if len(batch) >= batch_size:
+            db.execute(insert(models.Transaction), batch)
+            series_keys.update(recurring.series_key(r["description"], r["amount"]) for r in batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        db.execute(insert(models.Transaction), batch)
+        series_keys.update(recurring.series_key(r["description"], r["amount"]) for r in batch)
+        total += len(batch)
+    if total:
+        recurring.rebuild(db, user_id, series_keys)
+        bump_data_version(db, user_id)
+    return total
+
 def get_transaction(db: Session, transaction_id: int, user_id: int):
     """Obtiene una transacción específica de un usuario"""
     return db.query(models.Transaction).filter(
@@ -63,8 +145,12 @@ def update_transaction(db: Session, transaction_id: int, user_id: int, transacti
     """Actualiza una transacción"""
     db_transaction = get_transaction(db, transaction_id, user_id)
     if db_transaction:
+        previous_key = recurring.series_key(db_transaction.description, db_transaction.amount)
         for key, value in transaction.dict().items():
             setattr(db_transaction, key, value)
+        recurring.rebuild(db, user_id, {previous_key, recurring.series_key(db_transaction.description, db_transaction.amount)})
+        anomalies.revise(db, user_id, [transaction_id])
+        bump_data_version(db, user_id)
         db.commit()
         db.refresh(db_transaction)
     return db_transaction
@@ -73,7 +159,352 @@ def delete_transaction(db: Session, transaction_id: int, user_id: int):
     """Elimina una transacción"""
     db_transaction = get_transaction(db, transaction_id, user_id)
     if db_transaction:
+        # SQLite no aplica ON DELETE CASCADE sin PRAGMA foreign_keys
+        db.execute(delete(models.Anomaly).where(models.Anomaly.transaction_id == transaction_id))
         db.delete(db_transaction)
+        recurring.rebuild(db, user_id, {recurring.series_key(db_transaction.description, db_transaction.amount)})
+        anomalies.revise(db, user_id, [transaction_id])
+        bump_data_version(db, user_id)
         db.commit()
         return True
-    return False
\ No newline at end of file
+    return False
+
+class _BatchItemError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def _validation_message(error: Exception) -> str:
+    if isinstance(error, ValidationError) and error.errors():
+        first = error.errors()[0]
+        return f"{'.'.join(str(part) for part in first['loc'])}: {first['msg']}"
+    return str(error)
+
+def _apply_batch_operation(db: Session, user_id: int, operation: schemas.BatchOperation, existing: dict):
+    """Aplica una operación del lote; devuelve (status, transacción o None)"""
+    if operation.op == "create":
+        try:
+            data = schemas.TransactionCreate(**(operation.data or {}))
+        except ValidationError as e:
+            raise _BatchItemError(422, _validation_message(e))
+        db_transaction = models.Transaction(**data.dict(), user_id=user_id)
+        db.add(db_transaction)
+        db.flush()
+        existing[db_transaction.id] = db_transaction
+        return 201, db_transaction
+
+    if operation.id is None:
+        raise _BatchItemError(422, f"{operation.op} requiere id")
+    db_transaction = existing.get(operation.id)
+    if db_transaction is None:
+        raise _BatchItemError(404, "Transaction not found")
+
+    if operation.op == "update":
+        try:
+            changes = schemas.TransactionUpdate(**(operation.data or {})).changes()
+        except ValueError as e:
+            raise _BatchItemError(422, _validation_message(e))
+        if not changes:
+            raise _BatchItemError(422, "update requiere al menos un campo en data")
+        for key, value in changes.items():
+            setattr(db_transaction, key, value)
+        db.flush()
+        return 200, db_transaction
+
+    db.execute(delete(models.Anomaly).where(models.Anomaly.transaction_id == operation.id))
+    db.delete(db_transaction)
+    db.flush()
+    del existing[operation.id]
+    return 200, None
+
+def apply_transaction_batch(db: Session, user_id: int, operations: List[schemas.BatchOperation], atomic: bool = False) -> dict:
+    """
+    Aplica operaciones create/update/delete en una sola transacción de base de datos y un solo commit.
+    Cada operación corre en su propio SAVEPOINT: si falla se revierte solo esa, o todo el lote si atomic.
+    """
+    # Una sola consulta para todas las filas que se actualizan o borran
+    ids = {operation.id for operation in operations if operation.op != "create" and operation.id is not None}
+    existing = {}
+    if ids:
+        existing = {
+            t.id: t for t in db.scalars(
+                select(models.Transaction).where(models.Transaction.user_id == user_id, models.Transaction.id.in_(ids))
+            )
+        }
+
+    # El UPDATE de la versión abre la transacción antes del primer SAVEPOINT: pysqlite no emite
+    # BEGIN hasta el primer DML y un SAVEPOINT fuera de transacción se confirmaría al liberarlo
+    bump_data_version(db, user_id)
+
+    results = []
+    failed_at = None
+    created_rows = []
+    rebuild_keys = set()
+    for index, operation in enumerate(operations):
+        result = {"index": index, "op": operation.op, "id": operation.id}
+        previous = existing.get(operation.id) if operation.op != "create" else None
+        previous_key = recurring.series_key(previous.description, previous.amount) if previous is not None else None
+        savepoint = db.begin_nested()
+        try:
+            status, db_transaction = _apply_batch_operation(db, user_id, operation, existing)
+            savepoint.commit()
+            result["status"] = status
+            if db_transaction is not None:
+                result["id"] = db_transaction.id
+            if operation.op == "create":
+                created_rows.append({"description": db_transaction.description, "amount": db_transaction.amount, "date": db_transaction.date})
+            else:
+                rebuild_keys.add(previous_key)
+                if db_transaction is not None:
+                    rebuild_keys.add(recurring.series_key(db_transaction.description, db_transaction.amount))
+        except _BatchItemError as e:
+            savepoint.rollback()
+            result.update(status=e.status, error=str(e))
+        except SQLAlchemyError as e:
+            savepoint.rollback()
+            result.update(status=409, error=str(e.orig) if getattr(e, "orig", None) else str(e))
+        results.append(result)
+        if atomic and "error" in result:
+            failed_at = index
+            break
+
+    succeeded = sum(1 for r in results if "error" not in r)
+    if failed_at is not None or succeeded == 0:
+        db.rollback()
+        if failed_at is not None:
+            for r in results[:failed_at]:
+                r.update(status=424, error="No aplicada: otra operación del lote atómico falló")
+            results += [
+                {"index": i, "op": op.op, "id": op.id, "status": 424, "error": "No aplicada: otra operación del lote atómico falló"}
+                for i, op in enumerate(operations[failed_at + 1:], start=failed_at + 1)
+            ]
+        return {"committed": False, "succeeded": 0, "failed": len(results), "results": results}
+
+    # Series recurrentes: los grupos editados o borrados se recalculan (ya incluyen las filas nuevas)
+    recurring.rebuild(db, user_id, rebuild_keys)
+    recurring.observe(db, user_id, [
+        row for row in created_rows if recurring.series_key(row["description"], row["amount"]) not in rebuild_keys
+    ])
+    anomalies.revise(db, user_id, [r["id"] for r in results if "error" not in r and r["op"] != "create"])
+    db.commit()
+    # Recargar en una sola consulta las filas devueltas (el commit las expira y created_at viene del servidor)
+    touched = [r["id"] for r in results if "error" not in r and r["op"] != "delete"]
+    if touched:
+        loaded = {
+            t.id: t for t in db.scalars(select(models.Transaction).where(models.Transaction.id.in_(touched)))
+        }
+        for r in results:
+            if "error" not in r and r["op"] != "delete":
+                r["transaction"] = loaded.get(r["id"])
+    return {"committed": True, "succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+# Consultas de lectura compartidas por los endpoints síncronos y asíncronos
+# Orden de /transactions/filter; id desempata para que la paginación sea estable
+FILTER_SORTS = {
+    "-date": (models.Transaction.date.desc(), models.Transaction.id.desc()),
+    "date": (models.Transaction.date.asc(), models.Transaction.id.asc()),
+    "-amount": (models.Transaction.amount.desc(), models.Transaction.id.desc()),
+    "amount": (models.Transaction.amount.asc(), models.Transaction.id.asc()),
+}
+
+def _prefix_upper_bound(prefix: str) -> str:
+    """Menor cadena mayor que todas las que empiezan con prefix (para filtrar por rango en el índice)"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def transactions_filter_conditions(
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    categories: Optional[Sequence[str]] = None,
+    description: Optional[str] = None,
+    description_prefix: Optional[str] = None,
+    sign: Optional[str] = None,
+) -> list:
+    """Condiciones WHERE de /transactions/filter; todas empiezan por user_id para usar los índices compuestos"""
+    conditions = [models.Transaction.user_id == user_id]
+    if start_date:
+        conditions.append(models.Transaction.date >= start_date)
+    if end_date:
+        conditions.append(models.Transaction.date <= end_date)
+    if min_amount is not None:
+        conditions.append(models.Transaction.amount >= min_amount)
+    if max_amount is not None:
+        conditions.append(models.Transaction.amount <= max_amount)
+    if sign == "income":
+        conditions.append(models.Transaction.amount > 0)
+    elif sign == "expense":
+        conditions.append(models.Transaction.amount < 0)
+    if categories:
+        categories = list(dict.fromkeys(categories))
+        if len(categories) == 1:
+            conditions.append(models.Transaction.category == categories[0])
+        else:
+            conditions.append(models.Transaction.category.in_(categories))
+    if description_prefix:
+        # Rango sobre lower(description): lo resuelve ix_transactions_user_description_lower
+        prefix = description_prefix.lower()
+        lowered = func.lower(models.Transaction.description)
+        conditions.append(lowered >= prefix)
+        conditions.append(lowered < _prefix_upper_bound(prefix))
+    if description:
+        conditions.append(models.Transaction.description.icontains(description, autoescape=True))
+    return conditions
+
+def transactions_filter_statement(user_id: int, sort: str = "-date", **filters):
+    """Construye el SELECT de transacciones filtradas de un usuario (por defecto, fecha descendente)"""
+    return select(models.Transaction).where(
+        *transactions_filter_conditions(user_id, **filters)
+    ).order_by(*FILTER_SORTS[sort])
+
+def transactions_count_statement(user_id: int, **filters):
+    """Total de filas que cumplen los filtros (para la paginación)"""
+    return select(func.count()).select_from(models.Transaction).where(
+        *transactions_filter_conditions(user_id, **filters)
+    )
+
+def monthly_summary_statement(user_id: int):
+    """Totales por año y mes"""
+    year = extract('year', models.Transaction.date).label('year')
+    month = extract('month', models.Transaction.date).label('month')
+    return select(
+        year, month, func.sum(models.Transaction.amount).label('total')
+    ).where(
+        models.Transaction.user_id == user_id
+    ).group_by(year, month).order_by(year, month)
+
+def category_summary_statement(user_id: int):
+    """Total de gastos (amount negativo) por categoría"""
+    return select(
+        models.Transaction.category,
+        func.sum(models.Transaction.amount).label('total')
+    ).where(
+        models.Transaction.user_id == user_id,
+        models.Transaction.amount < 0
+    ).group_by(models.Transaction.category)
+
+def summary_table_statement(user_id: int):
+    """Total de gastos por año, mes y categoría"""
+    year = extract('year', models.Transaction.date).label('year')
+    month = extract('month', models.Transaction.date).label('month')
+    return select(
+        year, month, models.Transaction.category,
+        func.sum(models.Transaction.amount).label('total')
+    ).where(
+        models.Transaction.user_id == user_id,
+        models.Transaction.amount < 0
+    ).group_by(year, month, models.Transaction.category).order_by(year, month)
+
+BALANCE_INTERVALS = ("day", "week", "month")
+
+def balance_bucket_start(value: date, interval: str) -> date:
+    """Inicio del bucket que contiene la fecha (semanas de lunes a domingo)"""
+    if interval == "week":
+        return value - timedelta(days=value.weekday())
+    if interval == "month":
+        return value.replace(day=1)
+    return value
+
+def _balance_bucket(dialect_name: str, interval: str):
+    column = models.Transaction.date
+    if dialect_name == "sqlite":
+        # SQLite guarda las fechas como texto ISO: el bucket también es 'YYYY-MM-DD'
+        if interval == "week":
+            return func.date(column, "weekday 0", "-6 days")
+        if interval == "month":
+            return func.strftime("%Y-%m-01", column)
+        return column
+    if interval == "day":
+        return column
+    return cast(func.date_trunc(interval, column), Date)
+
+def balance_series_statement(
+    dialect_name: str,
+    user_id: int,
+    interval: str = "day",
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+):
+    """
+    Saldo acumulado por bucket: SUM(amount) por día/semana/mes y SUM() OVER (ORDER BY bucket).
+    La ventana corre sobre todos los buckets hasta end_date y el filtro por start_date se aplica
+    después, así el primer punto ya incluye el saldo anterior al rango.
+    """
+    bucket = _balance_bucket(dialect_name, interval).label("bucket")
+    conditions = [models.Transaction.user_id == user_id]
+    if end_date:
+        conditions.append(models.Transaction.date <= end_date)
+    per_bucket = select(
+        bucket,
+        func.sum(models.Transaction.amount).label("net"),
+        func.count().label("count"),
+    ).where(*conditions).group_by(bucket).subquery()
+    running = select(
+        per_bucket.c.bucket,
+        per_bucket.c.net,
+        per_bucket.c.count,
+        func.sum(per_bucket.c.net).over(order_by=per_bucket.c.bucket).label("balance"),
+    ).subquery()
+    stmt = select(running).order_by(running.c.bucket)
+    if start_date:
+        first_bucket = balance_bucket_start(start_date, interval)
+        stmt = stmt.where(running.c.bucket >= (first_bucket.isoformat() if dialect_name == "sqlite" else first_bucket))
+    return stmt
+
+def balance_before_statement(user_id: int, before: date):
+    """Saldo acumulado antes de una fecha"""
+    return select(func.sum(models.Transaction.amount)).where(
+        models.Transaction.user_id == user_id, models.Transaction.date < before
+    )
+
+def recurring_series_statement(user_id: int):
+    """Series marcadas como recurrentes, por confianza descendente"""
+    return select(models.RecurringSeries).where(
+        models.RecurringSeries.user_id == user_id, models.RecurringSeries.is_recurring.is_(True)
+    ).order_by(models.RecurringSeries.confidence.desc(), models.RecurringSeries.merchant_key)
+
+def latest_series_date_statement(user_id: int):
+    """Fecha más reciente vista en las series del usuario (referencia para `active`)"""
+    return select(func.max(models.RecurringSeries.last_date)).where(models.RecurringSeries.user_id == user_id)
+
+def anomalies_statement(user_id: int, kind: Optional[str] = None, limit: int = 100):
+    """Transacciones marcadas como inusuales, de la más reciente a la más antigua"""
+    stmt = select(models.Transaction, models.Anomaly).join(
+        models.Anomaly, models.Anomaly.transaction_id == models.Transaction.id
+    ).where(models.Anomaly.user_id == user_id)
+    if kind is not None:
+        stmt = stmt.where(models.Anomaly.kind == kind)
+    return stmt.order_by(models.Transaction.date.desc(), models.Transaction.id.desc()).limit(limit)
+
+# Versiones asíncronas para los endpoints de lectura
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    """Obtiene un usuario por email"""
+    result = await db.execute(select(models.User).where(models.User.email == email))
+    return result.scalars().first()
+
+async def get_user_async(db: AsyncSession, user_id: int):
+    """Obtiene un usuario por ID"""
+    return await db.get(models.User, user_id)
+
+async def user_from_snapshot_async(db: AsyncSession, snapshot: dict) -> models.User:
+    """Reconstruye el usuario cacheado y lo asocia a la sesión sin consultar la base"""
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+async def get_transactions_async(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100):
+    """Obtiene transacciones de un usuario"""
+    result = await db.execute(
+        select(models.Transaction).where(
+            models.Transaction.user_id == user_id
+        ).offset(skip).limit(limit)
+    )
+    return result.scalars().all()
+
+async def get_data_version_async(db: AsyncSession, user_id: int) -> int:
+    """Versión actual de los datos del usuario (0 si nunca ha escrito)"""
+    result = await db.execute(
+        select(models.UserDataVersion.version).where(models.UserDataVersion.user_id == user_id)
+    )
+    return result.scalar() or 0
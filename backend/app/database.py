@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -6,10 +6,106 @@ import os
 # Configuración de la base de datos
 DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///./pfm.db')
 
-engine = create_engine(
-    DATABASE_URL, 
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-)
+
+def _env_int(name: str, default: int) -> int:
+    """Lee un entero de una variable de entorno, usando el default si no es válido"""
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """Lee un booleano de una variable de entorno ('1', 'true', 'yes', 'on')"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def is_sqlite_memory(url: str) -> bool:
+    return url in ("sqlite://", "sqlite:///:memory:") or "mode=memory" in url
+
+
+def sqlite_pragmas() -> dict:
+    """
+    Pragmas aplicados a cada conexión SQLite nueva.
+    WAL permite que las lecturas (dashboard) no se bloqueen con las escrituras (uploads),
+    y synchronous=NORMAL es seguro en WAL reduciendo los fsync por commit.
+    """
+    return {
+        "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+        "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+        # Valor negativo = tamaño en KiB (64 MiB por defecto)
+        "cache_size": -_env_int("SQLITE_CACHE_SIZE_KB", 64000),
+        "mmap_size": _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024),
+        "busy_timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000),
+        "temp_store": "MEMORY",
+    }
+
+
+def pool_kwargs(url: str) -> dict:
+    """Parámetros del pool leídos del entorno (compartidos por el engine síncrono y el asíncrono)"""
+    # Las bases en memoria usan un pool de una sola conexión; no aceptan tamaño de pool
+    if is_sqlite(url) and is_sqlite_memory(url):
+        return {}
+    # pool_size + max_overflow cubre al menos los 40 hilos del threadpool de Starlette
+    return {
+        "pool_size": _env_int("DB_POOL_SIZE", 20),
+        "max_overflow": _env_int("DB_MAX_OVERFLOW", 30),
+        "pool_timeout": _env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": _env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", not is_sqlite(url)),
+    }
+
+
+def apply_sqlite_pragmas(engine, in_memory: bool = False):
+    """Registra los pragmas de sqlite_pragmas() para cada conexión nueva del engine"""
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                # WAL no aplica a bases en memoria
+                if name == "journal_mode" and in_memory:
+                    continue
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def create_db_engine(url: str = None, **engine_kwargs):
+    """
+    Crea el engine de SQLAlchemy.
+    Para SQLite aplica pragmas de rendimiento en cada conexión; el pool se configura
+    con DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE y DB_POOL_PRE_PING.
+    """
+    url = url or DATABASE_URL
+    kwargs = {}
+
+    if is_sqlite(url):
+        kwargs["connect_args"] = {
+            "check_same_thread": False,
+            # Timeout del driver (segundos) alineado con busy_timeout
+            "timeout": _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000) / 1000,
+        }
+
+    kwargs.update(pool_kwargs(url))
+    kwargs.update(engine_kwargs)
+    engine = create_engine(url, **kwargs)
+
+    if is_sqlite(url):
+        apply_sqlite_pragmas(engine, is_sqlite_memory(url))
+    return engine
+
+
+engine = create_db_engine(DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -0,0 +1,145 @@
+"""
+Exportación en streaming de transacciones (CSV, NDJSON y Parquet).
+
+Las filas se leen con un cursor del lado del servidor (`stream_results` + `yield_per`) y se
+escriben por lotes, así la memoria se mantiene constante sin importar cuántas filas haya.
+La sesión se abre dentro del generador porque vive mientras se envía la respuesta.
+"""
+import csv
+import io
+import json
+from typing import Iterator, List, Tuple
+
+from . import models
+from .database import SessionLocal
+
+EXPORT_BATCH_SIZE = 2000
+
+EXPORT_COLUMNS = [
+    models.Transaction.id,
+    models.Transaction.date,
+    models.Transaction.description,
+    models.Transaction.amount,
+    models.Transaction.category,
+]
+FIELD_NAMES = [column.key for column in EXPORT_COLUMNS]
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def iter_batches(stmt, batch_size: int = None) -> Iterator[List[Tuple]]:
+    """Recorre el SELECT en lotes de `batch_size` filas (tuplas, sin instancias ORM)"""
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    stmt = stmt.with_only_columns(*EXPORT_COLUMNS)
+    db = SessionLocal()
+    try:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=batch_size))
+        for partition in result.partitions():
+            yield partition
+    finally:
+        db.close()
+
+
+def stream_csv(stmt, batch_size: int = None) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELD_NAMES)
+    for batch in iter_batches(stmt, batch_size):
+        writer.writerows(
+            (row.id, row.date.isoformat(), row.description, row.amount, row.category or "")
+            for row in batch
+        )
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_ndjson(stmt, batch_size: int = None) -> Iterator[bytes]:
+    dumps = json.JSONEncoder(ensure_ascii=False).encode
+    for batch in iter_batches(stmt, batch_size):
+        yield "".join(
+            dumps({
+                "id": row.id,
+                "date": row.date.isoformat(),
+                "description": row.description,
+                "amount": row.amount,
+                "category": row.category,
+            }) + "\n"
+            for row in batch
+        ).encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Archivo de solo escritura que acumula bytes para entregarlos al generador"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def stream_parquet(stmt, batch_size: int = None) -> Iterator[bytes]:
+    """Un row group por lote; requiere pyarrow"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.int64()),
+        ("date", pa.date32()),
+        ("description", pa.string()),
+        ("amount", pa.float64()),
+        ("category", pa.string()),
+    ])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for batch in iter_batches(stmt, batch_size):
+            columns = list(zip(*batch))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+STREAMERS = {
+    "csv": stream_csv,
+    "ndjson": stream_ndjson,
+    "parquet": stream_parquet,
+}
@@ -0,0 +1,1064 @@
+"""
+Servicio de extracción de estados de cuenta en PDF: texto (pdfplumber), OCR (Tesseract,
+OpenCV, EasyOCR), detección de banco, parsers por banco y categorización con OpenAI.
+
+Las dependencias pesadas se importan dentro de las funciones que las usan, así que importar
+este módulo (y app.main) no carga pdfplumber, pytesseract, PIL ni openai: solo lo paga la
+primera subida de un PDF.
+"""
+import logging
+import os
+import re
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from . import artifacts, logs, telemetry, usage
+
+log = logs.get_logger("extraction")
+
+CATEGORY_MODEL = "gpt-3.5-turbo"
+
+# OCR adaptativo (ver _ocr_page_adaptive); OCR_ADAPTIVE=0 vuelve a 300 DPI en todas las páginas
+OCR_ADAPTIVE = os.getenv("OCR_ADAPTIVE", "1").lower() in ("1", "true", "yes")
+OCR_BASE_DPI = int(os.getenv("OCR_BASE_DPI", "150"))
+OCR_MAX_DPI = int(os.getenv("OCR_MAX_DPI", "300"))
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", "80"))
+OCR_PAGE_RETRY_FRACTION = float(os.getenv("OCR_PAGE_RETRY_FRACTION", "0.4"))
+OCR_REGION_PADDING_PT = 2.0
+
+
+def extract_plain_text(pdf_path: str) -> str:
+    """Texto de todas las páginas con pdfplumber, sin OCR"""
+    import pdfplumber
+
+    extracted_text = ""
+    with pdfplumber.open(pdf_path) as pdf:
+        for page in pdf.pages:
+            text = page.extract_text()
+            if text:
+                extracted_text += text + "\n"
+    return extracted_text
+
+def extract_text_with_ocr_fallback(pdf_path: str):
+    """
+    Extrae texto del PDF usando pdfplumber, y si el texto contiene códigos (cid:XXX),
+    usa OCR mejorado como fallback para obtener texto legible.
+    """
+    import pdfplumber
+
+    log.debug("Iniciando extracción de texto", extra={"path": pdf_path})
+    
+    try:
+        with pdfplumber.open(pdf_path) as pdf:
+            log.debug("PDF abierto", extra={"pages": len(pdf.pages)})
+            
+            # Intentar extracción normal primero
+            extracted_text = ""
+            with telemetry.span("extract", pages=len(pdf.pages)) as extract_span:
+                for i, page in enumerate(pdf.pages):
+                    page_text = page.extract_text()
+                    if page_text:
+                        extracted_text += page_text + "\n"
+                        logs.sampled(log, "extract.page", "Página extraída", page=i + 1, characters=len(page_text))
+                    else:
+                        log.debug("Página sin texto extraíble", extra={"page": i + 1})
+                extract_span.set(characters=len(extracted_text))
+            
+            # Verificar si el texto contiene códigos (cid:XXX) que indican texto ilegible
+            if not extracted_text.strip():
+                log.info("PDF sin texto extraíble, usando OCR", extra={"path": pdf_path})
+                return _extract_with_ocr(pdf)
+            elif "(cid:" in extracted_text:
+                log.info("Texto con códigos (cid:XXX), usando OCR", extra={"path": pdf_path})
+                return _extract_with_ocr(pdf)
+            else:
+                log.info("Texto extraído", extra={"characters": len(extracted_text)})
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Primeras líneas del texto extraído:\n%s", logs.preview(extracted_text))
+                return extracted_text
+                
+    except Exception as e:
+        log.error("Error abriendo PDF: %s", e, extra={"path": pdf_path})
+        return ""
+
+def _extract_with_ocr(pdf, adaptive: Optional[bool] = None):
+    """
+    Extrae texto usando OCR cuando la extracción normal falla.
+    Con OCR_ADAPTIVE (default) cada página se lee primero a OCR_BASE_DPI y solo lo dudoso se
+    repite a OCR_MAX_DPI (ver _ocr_page_adaptive); adaptive=False usa siempre 300 DPI.
+    """
+    adaptive = OCR_ADAPTIVE if adaptive is None else adaptive
+    ocr_text = ""
+    
+    for page_num, page in enumerate(pdf.pages):
+        logs.sampled(log, "ocr.page", "Procesando página con OCR", page=page_num + 1)
+        with telemetry.span("ocr_page", page=page_num + 1, pages=1) as ocr_span:
+            try:
+                page_text = _ocr_page_adaptive(page, ocr_span) if adaptive else _ocr_page_fixed(page)
+            
+                # Limpiar y mejorar el texto extraído
+                cleaned_text = clean_ocr_text(page_text)
+                ocr_text += cleaned_text + "\n"
+                ocr_span.set(characters=len(cleaned_text))
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("Primeras líneas OCR:\n%s", logs.preview(cleaned_text, 3), extra={"page": page_num + 1, "characters": len(cleaned_text)})
+                    
+            except Exception as e:
+                log.warning("Error en OCR, se usa el texto original de la página: %s", e, extra={"page": page_num + 1})
+                # Si OCR falla, mantener el texto original de esa página
+                page_original = page.extract_text() or ""
+                ocr_text += page_original + "\n"
+                ocr_span.set(characters=len(page_original), error=type(e).__name__)
+    
+    log.info("OCR completado", extra={"pages": len(pdf.pages), "characters": len(ocr_text)})
+    return ocr_text
+
+def _render(page, dpi: int):
+    """Página (o recorte de página) como imagen preprocesada para Tesseract"""
+    return preprocess_image_for_ocr(page.to_image(resolution=dpi).original.convert('RGB'))
+
+def _ocr_page_fixed(page) -> str:
+    """Página completa a 300 DPI con --psm 6 (lo más caro, pero sin segunda pasada)"""
+    import pytesseract
+
+    custom_config = r'--oem 3 --psm 6 -l spa+eng --dpi 300'
+    return pytesseract.image_to_string(_render(page, 300), config=custom_config)
+
+def _ocr_data(image, dpi: int, psm: int) -> dict:
+    """Palabras con su confianza (0-100, -1 en filas sin texto) y su caja, de pytesseract.image_to_data"""
+    import pytesseract
+
+    config = f'--oem 3 --psm {psm} -l spa+eng --dpi {dpi}'
+    return pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT)
+
+def ocr_lines(data: dict) -> List[Dict[str, Any]]:
+    """
+    Agrupa las palabras de image_to_data por línea: texto, confianza media (ponderada por
+    caracteres) y caja en píxeles (left, top, right, bottom), en el orden de Tesseract.
+    """
+    lines: "OrderedDict[tuple, dict]" = OrderedDict()
+    for i, word in enumerate(data["text"]):
+        confidence = float(data["conf"][i])
+        word = (word or "").strip()
+        if confidence < 0 or not word:
+            continue
+        key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        left, top = data["left"][i], data["top"][i]
+        right, bottom = left + data["width"][i], top + data["height"][i]
+        line = lines.get(key)
+        if line is None:
+            line = lines[key] = {"words": [], "weights": 0.0, "chars": 0, "box": [left, top, right, bottom]}
+        line["words"].append(word)
+        line["weights"] += confidence * len(word)
+        line["chars"] += len(word)
+        box = line["box"]
+        box[:] = [min(box[0], left), min(box[1], top), max(box[2], right), max(box[3], bottom)]
+    return [
+        {"text": " ".join(line["words"]), "confidence": line["weights"] / line["chars"], "box": tuple(line["box"])}
+        for line in lines.values()
+    ]
+
+def _mean_confidence(lines: List[Dict[str, Any]]) -> float:
+    chars = sum(len(line["text"]) for line in lines)
+    return sum(line["confidence"] * len(line["text"]) for line in lines) / chars if chars else 0.0
+
+def _ocr_region(page, box: tuple, dpi: int) -> Optional[Dict[str, Any]]:
+    """Relee a OCR_MAX_DPI una línea detectada a `dpi` (caja en píxeles), recortando la página en puntos"""
+    x0, top, x1, bottom = page.bbox
+    to_points = 72 / dpi
+    pad = OCR_REGION_PADDING_PT
+    region = page.crop((
+        max(x0, x0 + box[0] * to_points - pad), max(top, top + box[1] * to_points - pad),
+        min(x1, x0 + box[2] * to_points + pad), min(bottom, top + box[3] * to_points + pad),
+    ))
+    # --psm 7: una sola línea de texto
+    lines = ocr_lines(_ocr_data(_render(region, OCR_MAX_DPI), OCR_MAX_DPI, 7))
+    if not lines:
+        return None
+    return {"text": " ".join(line["text"] for line in lines), "confidence": _mean_confidence(lines), "box": box}
+
+def _ocr_page_adaptive(page, span=None) -> str:
+    """
+    OCR guiado por confianza: la página se lee a OCR_BASE_DPI y solo las líneas con confianza
+    menor a OCR_MIN_CONFIDENCE se releen a OCR_MAX_DPI (recortadas). Si son más de
+    OCR_PAGE_RETRY_FRACTION de las líneas (o no salió texto), se relee la página completa.
+    """
+    lines = ocr_lines(_ocr_data(_render(page, OCR_BASE_DPI), OCR_BASE_DPI, 6))
+    doubtful = [i for i, line in enumerate(lines) if line["confidence"] < OCR_MIN_CONFIDENCE]
+    dpi, regions = OCR_BASE_DPI, 0
+    if not lines or len(doubtful) > OCR_PAGE_RETRY_FRACTION * len(lines):
+        lines = ocr_lines(_ocr_data(_render(page, OCR_MAX_DPI), OCR_MAX_DPI, 6))
+        dpi = OCR_MAX_DPI
+    else:
+        for i in doubtful:
+            retry = _ocr_region(page, lines[i]["box"], OCR_BASE_DPI)
+            regions += 1
+            if retry is not None and retry["confidence"] > lines[i]["confidence"]:
+                lines[i] = retry
+    if span is not None:
+        span.set(dpi=dpi, regions=regions, confidence=round(_mean_confidence(lines), 1))
+    return "\n".join(line["text"] for line in lines)
+
+def preprocess_image_for_ocr(image):
+    """
+    Preprocesa la imagen para mejorar la calidad del OCR.
+    """
+    from PIL import Image, ImageEnhance, ImageFilter
+    import numpy as np
+    import cv2
+    
+    # Convertir PIL Image a numpy array para OpenCV
+    img_array = np.array(image)
+    
+    # Convertir a escala de grises
+    gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+    
+    # Aplicar filtro bilateral para reducir ruido manteniendo bordes
+    denoised = cv2.bilateralFilter(gray, 9, 75, 75)
+    
+    # Aplicar umbral adaptativo para mejorar contraste
+    thresh = cv2.adaptiveThreshold(denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+    
+    # Aplicar morfología para limpiar el texto
+    kernel = np.ones((1, 1), np.uint8)
+    cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
+    
+    # Convertir de vuelta a PIL Image
+    processed_img = Image.fromarray(cleaned)
+    
+    # Aplicar mejoras adicionales con PIL
+    # Aumentar contraste
+    enhancer = ImageEnhance.Contrast(processed_img)
+    processed_img = enhancer.enhance(1.5)
+    
+    # Aumentar nitidez
+    enhancer = ImageEnhance.Sharpness(processed_img)
+    processed_img = enhancer.enhance(1.2)
+    
+    return processed_img
+
+def clean_ocr_text(text):
+    """
+    Limpia y mejora el texto extraído por OCR.
+    """
+    import re
+    
+    # Dividir en líneas
+    lines = text.split('\n')
+    cleaned_lines = []
+    
+    for line in lines:
+        # Limpiar caracteres extraños comunes en OCR
+        cleaned = line.strip()
+        
+        # Corregir errores comunes de OCR
+        cleaned = re.sub(r'[|]{2,}', '|', cleaned)  # Múltiples pipes
+        cleaned = re.sub(r'[0]{3,}', '000', cleaned)  # Múltiples ceros
+        cleaned = re.sub(r'[l]{2,}', 'll', cleaned)  # Múltiples l's
+        cleaned = re.sub(r'[I]{2,}', 'II', cleaned)  # Múltiples I's
+        
+        # Corregir caracteres mal interpretados específicos que vemos en los logs
+        char_replacements = {
+            '0': '0', 'O': '0', 'o': '0',  # Normalizar ceros
+            'l': '1', 'I': '1', '|': '1',  # Normalizar unos
+            'S': '5', 's': '5',  # Normalizar cincos
+            'G': '6', 'g': '6',  # Normalizar seises
+            'B': '8', 'b': '8',  # Normalizar ochos
+            '1': '1',  # Mantener unos
+            '2': '2',  # Mantener doses
+            '3': '3',  # Mantener treses
+            '4': '4',  # Mantener cuatros
+            '5': '5',  # Mantener cincos
+            '6': '6',  # Mantener seises
+            '7': '7',  # Mantener sietes
+            '8': '8',  # Mantener ochos
+            '9': '9',  # Mantener nueves
+        }
+        
+        # Corregir caracteres específicos que vemos en los logs
+        # Ejemplo: "1a5e5oria1@1condu5ef1.1gob1.1mx1" -> "asesoria@condufef.gob.mx"
+        cleaned = re.sub(r'1a5e5oria1@1condu5ef1\.1gob1\.1mx1', 'asesoria@condufef.gob.mx', cleaned)
+        cleaned = re.sub(r'5UPAG0', 'SUPAGO', cleaned)
+        cleaned = re.sub(r'5PE1', 'SPEI', cleaned)
+        cleaned = re.sub(r'5PE1A', 'SPEIA', cleaned)
+        cleaned = re.sub(r'M00H680201JG0', 'MOOH680201JGO', cleaned)
+        cleaned = re.sub(r'V1VAAER0BU5', 'VIVAAEROBUS', cleaned)
+        cleaned = re.sub(r'RE5T', 'REST', cleaned)
+        cleaned = re.sub(r'ARB0_', 'ARBO', cleaned)
+        cleaned = re.sub(r'51H', 'SIH', cleaned)
+        cleaned = re.sub(r'V1VA', 'VIVA', cleaned)
+        cleaned = re.sub(r'C1B', 'CIB', cleaned)
+        
+        # Corregir patrones de caracteres repetidos
+        cleaned = re.sub(r'1{2,}', '11', cleaned)  # Múltiples unos
+        cleaned = re.sub(r'5{2,}', '55', cleaned)  # Múltiples cincos
+        
+        # Eliminar líneas muy cortas o que parezcan ruido
+        if len(cleaned) > 2 and not re.match(r'^[^\w]*$', cleaned):
+            cleaned_lines.append(cleaned)
+    
+    return '\n'.join(cleaned_lines)
+
+def ocr_region_with_multiple_methods(image):
+    """
+    Ejecuta OCR en una imagen usando varios modos PSM de Tesseract y EasyOCR.
+    Devuelve un diccionario con los resultados.
+    """
+    import pytesseract
+    import easyocr
+    import numpy as np
+    from PIL import Image
+    
+    results = {}
+    # Tesseract PSM modes
+    psm_modes = [4, 6, 11]
+    for psm in psm_modes:
+        config = f'--oem 3 --psm {psm} -l spa+eng --dpi 300'
+        text = pytesseract.image_to_string(image, config=config)
+        results[f'tesseract_psm_{psm}'] = text
+    
+    # EasyOCR
+    try:
+        reader = easyocr.Reader(['es', 'en'], gpu=False)
+        # Convert PIL image to numpy array
+        img_np = np.array(image)
+        easyocr_result = reader.readtext(img_np, detail=0, paragraph=True)
+        easyocr_text = '\n'.join(easyocr_result)
+        results['easyocr'] = easyocr_text
+    except Exception as e:
+        results['easyocr'] = f"[EasyOCR error: {e}]"
+    return results
+
+def extract_transaction_regions(pdf_path: str):
+    """
+    Extrae texto específicamente de regiones que probablemente contengan transacciones.
+    Para cada región, ejecuta OCR con varios métodos y muestra los resultados.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(pdf_path) as pdf:
+        transaction_text = ""
+        
+        for page_num, page in enumerate(pdf.pages):
+            log.debug("Analizando regiones de transacciones", extra={"page": page_num + 1})
+            width = page.width
+            height = page.height
+            center_region = page.crop((width * 0.1, height * 0.3, width * 0.9, height * 0.8))
+            bottom_region = page.crop((width * 0.1, height * 0.7, width * 0.9, height * 0.95))
+            regions_to_check = [
+                ("central", center_region),
+                ("inferior", bottom_region)
+            ]
+            for region_name, region in regions_to_check:
+                try:
+                    region_text = region.extract_text()
+                    if not region_text or "(cid:" in region_text:
+                        img = region.to_image(resolution=300)
+                        img_bytes = img.original.convert('RGB')
+                        processed_img = preprocess_image_for_ocr(img_bytes)
+                        # Multi-PSM + EasyOCR
+                        ocr_results = ocr_region_with_multiple_methods(processed_img)
+                        if log.isEnabledFor(logging.DEBUG):
+                            for method, text in ocr_results.items():
+                                log.debug("Resultado OCR %s:\n%s", method, logs.preview(text, 10), extra={"region": region_name, "page": page_num + 1})
+                        # Use the best result (for now, just pick Tesseract PSM 6)
+                        region_text = ocr_results.get('tesseract_psm_6', '')
+                    if region_text and region_text.strip():
+                        transaction_text += f"\n--- REGIÓN {region_name.upper()} PÁGINA {page_num + 1} ---\n"
+                        transaction_text += region_text + "\n"
+                        log.debug("Texto extraído de región", extra={"region": region_name, "page": page_num + 1})
+                except Exception as e:
+                    log.warning("Error procesando región: %s", e, extra={"region": region_name, "page": page_num + 1})
+                    continue
+        return transaction_text
+
+def process_bank_statement_pdf(file_path: str, api_key: str) -> Dict[str, Any]:
+    """
+    Process a bank statement PDF and extract transactions using agentic extraction.
+    """
+    log.info("Procesando PDF", extra={"path": file_path})
+    
+    # Extract text from PDF
+    extracted_text = extract_text_with_ocr_fallback(file_path)
+
+    # Texto extraído para depuración (solo con DEBUG_ARTIFACTS, comprimido y en segundo plano)
+    artifact_key = artifacts.submit(extracted_text, kind="ocr_text", source=file_path)
+    if artifact_key:
+        log.info("Texto extraído enviado a artefactos de depuración", extra={"key": artifact_key, "path": file_path})
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Inicio del texto extraído:\n%s", extracted_text[:1000])
+    
+    if not extracted_text.strip():
+        log.warning("No se pudo extraer texto del PDF", extra={"path": file_path})
+        return {
+            "banco": "Desconocido",
+            "transacciones": [],
+            "texto_extraido": "",
+            "metodo": "ninguno"
+        }
+    
+    # Detect bank
+    with telemetry.span("detect", characters=len(extracted_text)):
+        banco = detect_bank(extracted_text)
+    log.info("Banco detectado", extra={"bank": banco})
+    
+    # Intentar extracción con extractor agéntico
+    try:
+        from .agentic_extractor import AgenticDocumentExtractor
+        with telemetry.span("parse", method="extractor_agentico", characters=len(extracted_text)) as parse_span:
+            extractor = AgenticDocumentExtractor(api_key)
+            agentic_transactions = extractor.extract_transactions(extracted_text, banco)
+            parse_span.set(rows=len(agentic_transactions))
+        if agentic_transactions:
+            log.info("Extractor agéntico terminó", extra={"rows": len(agentic_transactions)})
+            _categorize_all(agentic_transactions, api_key)
+            return {
+                "banco": banco,
+                "transacciones": agentic_transactions,
+                "texto_extraido": extracted_text,
+                "metodo": "extractor_agentico"
+            }
+    except Exception as e:
+        log.warning("Error con extractor agéntico, se usan los parsers tradicionales: %s", e)
+    
+    # Parser estándar
+    log.debug("Usando parser estándar")
+    with telemetry.span("parse", method="parser_estandar", characters=len(extracted_text)) as parse_span:
+        standard_transactions = extract_standard_transactions(extracted_text)
+        parse_span.set(rows=len(standard_transactions))
+    
+    if standard_transactions:
+        log.info("Parser estándar terminó", extra={"rows": len(standard_transactions)})
+        _categorize_all(standard_transactions, api_key)
+        return {
+            "banco": banco,
+            "transacciones": standard_transactions,
+            "texto_extraido": extracted_text,
+            "metodo": "parser_estandar"
+        }
+    
+    # AI fallback simplificado (sin usar OpenAI para evitar errores de proxies)
+    log.debug("Usando fallback por banco y AI")
+    try:
+        # Intentar extracción básica con regex más agresivo
+        with telemetry.span("parse", method="fallback", characters=len(extracted_text)) as parse_span:
+            fallback_transactions = _fallback_extraction(extracted_text, banco, api_key)
+            parse_span.set(rows=len(fallback_transactions.get("transacciones", [])))
+        if fallback_transactions.get("transacciones"):
+            log.info("Fallback terminó", extra={"rows": len(fallback_transactions["transacciones"])})
+            return fallback_transactions
+    except Exception as e:
+        log.warning("Error en el fallback: %s", e)
+    
+    log.warning("No se pudieron extraer transacciones con ningún método", extra={"bank": banco})
+    return {
+        "banco": banco,
+        "transacciones": [],
+        "texto_extraido": extracted_text,
+        "metodo": "ninguno"
+    }
+
+def _fallback_extraction(extracted_text: str, banco: str, api_key: str) -> Dict[str, Any]:
+    """
+    Fallback extraction using traditional methods.
+    """
+    # Try specific bank parsers first
+    if banco == "HSBC":
+        log.debug("Usando parser específico", extra={"bank": banco})
+        transactions = extract_hsbc_transactions(extracted_text)
+        if transactions:
+            return {
+                "banco": banco,
+                "transacciones": transactions,
+                "texto_extraido": extracted_text
+            }
+    elif banco == "Santander":
+        log.debug("Usando parser específico", extra={"bank": banco})
+        transactions = extract_santander_transactions(extracted_text)
+        if transactions:
+            return {
+                "banco": banco,
+                "transacciones": transactions,
+                "texto_extraido": extracted_text
+            }
+    
+    # Try standard parser
+    log.debug("Usando parser estándar")
+    transactions = extract_standard_transactions(extracted_text)
+    
+    if transactions:
+        return {
+            "banco": banco,
+            "transacciones": transactions,
+            "texto_extraido": extracted_text
+        }
+    
+    # Final fallback: AI method with better token management
+    log.debug("Usando extracción con AI")
+    try:
+        from .auth import extract_transactions_with_ai
+        ai_transactions = extract_transactions_with_ai(extracted_text)
+        if ai_transactions:
+            log.info("Extracción con AI terminó", extra={"rows": len(ai_transactions)})
+            return {
+                "banco": banco,
+                "transacciones": ai_transactions,
+                "texto_extraido": extracted_text
+            }
+    except Exception as e:
+        log.warning("Error en la extracción con AI: %s", e)
+    
+    log.warning("No se pudieron extraer transacciones con ningún método", extra={"bank": banco})
+    return {
+        "banco": banco,
+        "transacciones": [],
+        "texto_extraido": extracted_text
+    }
+
+def _deduplicate_transactions(transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Elimina transacciones duplicadas basándose en fecha, descripción y monto.
+    """
+    seen = set()
+    unique_transactions = []
+    
+    for transaction in transactions:
+        # Crear una clave única para cada transacción
+        key = (
+            transaction.get('fecha_operacion', ''),
+            transaction.get('descripcion', ''),
+            transaction.get('monto', 0)
+        )
+        
+        if key not in seen:
+            seen.add(key)
+            unique_transactions.append(transaction)
+    
+    return unique_transactions
+
+def _categorize_all(transactions: List[Dict[str, Any]], api_key: str):
+    """Categoriza en sitio; los tokens de todas las llamadas se suman al span `categorize`"""
+    with telemetry.span("categorize", rows=len(transactions)):
+        for transaction in transactions:
+            transaction["categoria"] = categorize_transaction_openai(transaction["descripcion"], api_key)
+
+# Función para categorizar transacciones usando OpenAI
+
+def categorize_transaction_openai(descripcion: str, api_key: str):
+    try:
+        from openai import OpenAI
+        client = OpenAI(api_key=api_key)
+        prompt = f"""
+    Categoriza la siguiente transacción bancaria en una sola palabra (por ejemplo: supermercado, transporte, restaurante, ingreso, etc.):\n\n"{descripcion}"\n\nCategoría: """
+        response = usage.chat(
+            client,
+            "categorize_transaction_openai",
+            model=CATEGORY_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=3,
+            temperature=0
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        logs.sampled(log, "categorize.error", "Error en categorización OpenAI, se usan palabras clave: %s", e, level=logging.WARNING)
+        # Categorización básica basada en palabras clave
+        descripcion_lower = descripcion.lower()
+        if any(word in descripcion_lower for word in ['oxxo', 'seven', 'farmacia', 'gasolina', 'gas']):
+            return "conveniencia"
+        elif any(word in descripcion_lower for word in ['restaurante', 'pizza', 'hamburguesa', 'cafe']):
+            return "restaurante"
+        elif any(word in descripcion_lower for word in ['uber', 'taxi', 'transporte', 'metro']):
+            return "transporte"
+        elif any(word in descripcion_lower for word in ['pago', 'spei', 'transferencia', 'deposito']):
+            return "ingreso"
+        elif any(word in descripcion_lower for word in ['retiro', 'cajero', 'atm']):
+            return "retiro"
+        else:
+            return "otros"
+
+def parse_date(date_str: str):
+    # Convierte '04-Jun-2025' o '04-ABR-2025' a objeto date
+    if not date_str or not isinstance(date_str, str):
+        return None
+        
+    date_str = date_str.strip()
+    
+    try:
+        # Primero intentar con el formato original
+        return datetime.strptime(date_str, "%d-%b-%Y").date()
+    except ValueError:
+        # Si falla, intentar con formato en mayúsculas (como ABR, ENE, FEB, etc.)
+        # Mapear abreviaciones en mayúsculas a formato estándar
+        month_mapping = {
+            'ENE': 'Jan', 'FEB': 'Feb', 'MAR': 'Mar', 'ABR': 'Apr',
+            'MAY': 'May', 'JUN': 'Jun', 'JUL': 'Jul', 'AGO': 'Aug',
+            'SEP': 'Sep', 'OCT': 'Oct', 'NOV': 'Nov', 'DIC': 'Dec'
+        }
+        
+        # Buscar y reemplazar meses en español
+        for esp_month, eng_month in month_mapping.items():
+            if esp_month in date_str.upper():
+                date_str_fixed = date_str.upper().replace(esp_month, eng_month)
+                try:
+                    return datetime.strptime(date_str_fixed, "%d-%b-%Y").date()
+                except ValueError:
+                    continue
+        
+        # Si aún falla, intentar con formato numérico DD-MM-YYYY
+        try:
+            return datetime.strptime(date_str, "%d-%m-%Y").date()
+        except ValueError:
+            # Último intento: formato DD/MM/YYYY
+            try:
+                return datetime.strptime(date_str, "%d/%m/%Y").date()
+            except ValueError:
+                # Si todo falla, intentar con formato YYYY-MM-DD
+                try:
+                    return datetime.strptime(date_str, "%Y-%m-%d").date()
+                except ValueError:
+                    logs.sampled(log, "parse_date.error", "No se pudo parsear la fecha", level=logging.WARNING, value=date_str)
+                    return None
+
+def detect_bank(text: str) -> str:
+    """
+    Detecta el banco a partir del texto extraído, priorizando coincidencias exactas y robustas.
+    """
+    text_upper = text.upper()
+    # Prioridad: Santander > BBVA > HSBC > Banorte > Banamex > Banregio
+    if "SANTANDER" in text_upper:
+        return "Santander"
+    elif "BBVA" in text_upper:
+        return "BBVA"
+    elif "HSBC" in text_upper:
+        return "HSBC"
+    elif "BANORTE" in text_upper:
+        return "Banorte"
+    elif "BANAMEX" in text_upper or "CITIBANAMEX" in text_upper:
+        return "Banamex"
+    elif "BANREGIO" in text_upper:
+        return "Banregio"
+    else:
+        return "Desconocido"
+
+def extract_standard_transactions(text: str) -> List[Dict[str, Any]]:
+    """
+    Extract transactions using standard patterns.
+    """
+    transactions = []
+    lines = text.split("\n")
+    
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        # Patrones mejorados para diferentes formatos de transacción
+        patterns = [
+            # Dos fechas, descripción, signo, monto con $
+            r"(\d{2}-[A-Za-z]{3}-\d{4})\s+(\d{2}-[A-Za-z]{3}-\d{4})?\s+(.+?)\s+([+-])\s*\$([\d,]+\.\d{2})",
+            # Una fecha, descripción, signo, monto con $
+            r"(\d{2}-[A-Za-z]{3}-\d{4})\s+(.+?)\s+([+-])\s*\$([\d,]+\.\d{2})",
+            # Una fecha, descripción, monto con $ (sin signo)
+            r"(\d{2}-[A-Za-z]{3}-\d{4})\s+(.+?)\s+\$([\d,]+\.\d{2})",
+            # Una fecha, descripción, signo, monto sin $
+            r"(\d{2}-[A-Za-z]{3}-\d{4})\s+(.+?)\s+([+-])\s*([\d,]+\.\d{2})",
+        ]
+        for pattern in patterns:
+            match = re.search(pattern, line)
+            if match:
+                # Extraer los grupos según el patrón
+                if len(match.groups()) == 5:
+                    fecha_operacion = match.group(1)
+                    fecha_cargo = match.group(2) if match.group(2) else match.group(1)
+                    descripcion = match.group(3)
+                    signo = match.group(4)
+                    monto = match.group(5)
+                elif len(match.groups()) == 4:
+                    fecha_operacion = match.group(1)
+                    fecha_cargo = match.group(1)
+                    descripcion = match.group(2)
+                    signo = match.group(3)
+                    monto = match.group(4)
+                elif len(match.groups()) == 3:
+                    fecha_operacion = match.group(1)
+                    fecha_cargo = match.group(1)
+                    descripcion = match.group(2)
+                    signo = '+'
+                    monto = match.group(3)
+                else:
+                    continue
+                # Normalizar monto
+                monto = float(monto.replace(',', ''))
+                if signo == '-':
+                    monto = -monto
+                
+                # Determinar tipo basado en el signo del monto
+                tipo = "abono" if monto > 0 else "cargo"
+                
+                transactions.append({
+                    "fecha_operacion": fecha_operacion,
+                    "fecha_cargo": fecha_cargo,
+                    "descripcion": descripcion.strip(),
+                    "monto": monto,
+                    "tipo": tipo,
+                    "categoria": "sin_categoria"
+                })
+                break
+    return transactions
+
+def extract_hsbc_transactions(extracted_text: str) -> List[dict]:
+    """
+    Extrae transacciones de HSBC de líneas OCR, ultra-tolerante a errores de OCR.
+    """
+    import re
+    transactions = []
+    
+    # Validar que el texto no sea None o vacío
+    if not extracted_text or not isinstance(extracted_text, str):
+        log.warning("Texto extraído vacío o no es string")
+        return transactions
+    
+    lines = extracted_text.split('\n')
+    
+    log.debug("Buscando transacciones HSBC")
+    
+    # Limpiar y normalizar el texto
+    cleaned_lines = []
+    for line in lines:
+        # Validar que la línea no sea None
+        if line is None:
+            continue
+            
+        # Normalizar caracteres comunes de OCR
+        cleaned = line.strip()
+        if cleaned:  # Solo agregar líneas no vacías
+            cleaned = cleaned.replace('O', '0').replace('l', '1').replace('I', '1')
+            cleaned = cleaned.replace('|', '').replace('[', '').replace(']', '')
+            cleaned = cleaned.replace('S', '5').replace('s', '5')
+            cleaned_lines.append(cleaned)
+    
+    # Estrategia 1: Buscar patrones de transacciones HSBC específicos
+    # Patrón: fecha + descripción + monto (más flexible)
+    patterns = [
+        # Patrón original HSBC: dos fechas + descripción + monto
+        r"(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})\s+(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})\s+(.+?)\s*([+-])?\$?([\d,\.]+)",
+        # Patrón con una sola fecha + descripción + monto
+        r"(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})\s+(.+?)\s*([+-])?\$?([\d,\.]+)",
+        # Patrón más flexible: cualquier línea con fecha y monto
+        r"(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4}).*?([+-])?\$?([\d,\.]+)",
+        # Buscar montos con signo en cualquier parte de la línea
+        r".*?([+-])\$?([\d,\.]+).*?(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})",
+    ]
+    
+    for pattern in patterns:
+        for i, line in enumerate(cleaned_lines):
+            match = re.search(pattern, line)
+            if match:
+                try:
+                    if len(match.groups()) >= 4:  # Patrón con dos fechas
+                        fecha_operacion = match.group(1).replace('O', '0') if match.group(1) else None
+                        fecha_cargo = match.group(2).replace('O', '0') if match.group(2) else None
+                        descripcion = match.group(3).strip() if match.group(3) else ""
+                        signo = match.group(4) or '+'
+                        monto_str = match.group(5).replace(',', '').replace('O', '0') if match.group(5) else "0"
+                    elif len(match.groups()) == 4:  # Patrón con una fecha
+                        fecha_operacion = match.group(1).replace('O', '0') if match.group(1) else None
+                        fecha_cargo = fecha_operacion
+                        descripcion = match.group(2).strip() if match.group(2) else ""
+                        signo = match.group(3) or '+'
+                        monto_str = match.group(4).replace(',', '').replace('O', '0') if match.group(4) else "0"
+                    elif len(match.groups()) == 3:  # Patrón flexible
+                        if 'fecha' in pattern:
+                            fecha_operacion = match.group(1).replace('O', '0') if match.group(1) else None
+                            fecha_cargo = fecha_operacion
+                            signo = match.group(2) or '+'
+                            monto_str = match.group(3).replace(',', '').replace('O', '0') if match.group(3) else "0"
+                            descripcion = line[:match.start()].strip() if line else ""
+                        else:  # Monto primero
+                            signo = match.group(1) if match.group(1) else '+'
+                            monto_str = match.group(2).replace(',', '').replace('O', '0') if match.group(2) else "0"
+                            fecha_operacion = match.group(3).replace('O', '0') if match.group(3) else None
+                            fecha_cargo = fecha_operacion
+                            descripcion = line[:match.start()].strip() if line else ""
+                    
+                    # Validar que todos los campos necesarios estén presentes
+                    if not fecha_operacion or not monto_str or monto_str == "0":
+                        continue
+                        
+                    try:
+                        monto = float(monto_str)
+                    except ValueError:
+                        continue
+                        
+                    tipo = "abono" if signo == '+' else "cargo"
+                    if tipo == "cargo":
+                        monto = -monto
+                    
+                    # Validar que la descripción no esté vacía
+                    if descripcion and len(descripcion.strip()) > 2:
+                        transactions.append({
+                            "fecha_operacion": fecha_operacion,
+                            "fecha_cargo": fecha_cargo,
+                            "descripcion": descripcion,
+                            "monto": monto,
+                            "tipo": tipo,
+                            "categoria": "Sin categorizar"
+                        })
+                        logs.sampled(log, "hsbc.row", "Transacción encontrada", strategy=1, date=fecha_operacion, description=descripcion[:40], amount=f"{signo}{monto_str}")
+                except Exception as e:
+                    logs.sampled(log, "hsbc.error", "Error procesando línea: %s", e, line=line)
+                    continue
+    
+    # Estrategia 2: Buscar líneas que contengan montos y fechas por separado
+    if not transactions:
+        log.debug("HSBC estrategia 2: montos y fechas por separado")
+        for i, line in enumerate(cleaned_lines):
+            # Buscar montos con signo - más específico para evitar falsos positivos
+            monto_match = re.search(r'([+-])\$?([\d,]+\.\d{2})', line)  # Solo montos con decimales
+            if monto_match:
+                signo = monto_match.group(1)
+                monto_str = monto_match.group(2).replace(',', '').replace('O', '0')
+                
+                # Validar que el monto sea razonable (entre 1 y 1,000,000)
+                try:
+                    monto = float(monto_str)
+                    if monto < 1 or monto > 1000000:
+                        continue  # Saltar montos irrazonables
+                except:
+                    continue
+                
+                # Buscar fecha en la misma línea o líneas cercanas
+                fecha_encontrada = None
+                descripcion = line.replace(monto_match.group(0), '').strip()
+                
+                # Buscar fecha en la línea actual
+                fecha_match = re.search(r'(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})', line)
+                if fecha_match:
+                    fecha_encontrada = fecha_match.group(1).replace('O', '0')
+                    descripcion = descripcion.replace(fecha_match.group(0), '').strip()
+                
+                # Si no hay fecha en esta línea, buscar en líneas anteriores
+                if not fecha_encontrada and i > 0:
+                    for j in range(max(0, i-3), i):
+                        fecha_match = re.search(r'(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})', cleaned_lines[j])
+                        if fecha_match:
+                            fecha_encontrada = fecha_match.group(1).replace('O', '0')
+                            break
+                
+                try:
+                    tipo = "abono" if signo == '+' else "cargo"
+                    if tipo == "cargo":
+                        monto = -monto
+                    
+                    # Validaciones adicionales
+                    if (fecha_encontrada and 
+                        descripcion and 
+                        len(descripcion.strip()) > 2 and
+                        not descripcion.strip().isdigit() and  # No solo números
+                        not re.match(r'^\d+$', descripcion.strip())):  # No solo dígitos
+                        
+                        transactions.append({
+                            "fecha_operacion": fecha_encontrada,
+                            "fecha_cargo": fecha_encontrada,
+                            "descripcion": descripcion,
+                            "monto": monto,
+                            "tipo": tipo,
+                            "categoria": "Sin categorizar"
+                        })
+                        logs.sampled(log, "hsbc.row", "Transacción encontrada", strategy=2, date=fecha_encontrada, description=descripcion[:40], amount=f"{signo}{monto_str}")
+                except Exception as e:
+                    logs.sampled(log, "hsbc.error", "Error procesando monto: %s", e, line=line)
+                    continue
+    
+    # Estrategia 3: Buscar patrones específicos de HSBC en el texto
+    if not transactions:
+        log.debug("HSBC estrategia 3: secciones específicas")
+        
+        # Buscar secciones que contengan transacciones
+        text_lower = extracted_text.lower()
+        
+        # Buscar en secciones específicas del estado de cuenta
+        sections = [
+            "cargos, abonos y compras regulares",
+            "desglose de movimientos", 
+            "compras y cargos diferidos",
+            "distribución de tu saldo"
+        ]
+        
+        for section in sections:
+            if section in text_lower:
+                log.debug("Sección encontrada", extra={"section": section})
+                # Buscar líneas después de esta sección que contengan montos
+                lines = extracted_text.split('\n')
+                section_found = False
+                for i, line in enumerate(lines):
+                    if section in line.lower():
+                        section_found = True
+                        log.debug("Sección encontrada en línea", extra={"line_number": i + 1})
+                        # Buscar las siguientes líneas por montos
+                        for j in range(i+1, min(i+20, len(lines))):
+                            next_line = lines[j].strip()
+                            if next_line and len(next_line) > 5:
+                                # Buscar montos con decimales
+                                monto_match = re.search(r'([+-])\$?([\d,]+\.\d{2})', next_line)
+                                if monto_match:
+                                    logs.sampled(log, "hsbc.amount", "Monto encontrado", line_number=j + 1, line=next_line)
+                                    # Intentar extraer fecha y descripción
+                                    fecha_match = re.search(r'(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})', next_line)
+                                    if fecha_match:
+                                        fecha = fecha_match.group(1).replace('O', '0')
+                                        descripcion = next_line.replace(monto_match.group(0), '').replace(fecha_match.group(0), '').strip()
+                                        if descripcion and len(descripcion) > 2:
+                                            try:
+                                                monto = float(monto_match.group(2).replace(',', ''))
+                                                if 1 <= monto <= 1000000:
+                                                    signo = monto_match.group(1)
+                                                    tipo = "abono" if signo == '+' else "cargo"
+                                                    if tipo == "cargo":
+                                                        monto = -monto
+                                                    
+                                                    transactions.append({
+                                                        "fecha_operacion": fecha,
+                                                        "fecha_cargo": fecha,
+                                                        "descripcion": descripcion,
+                                                        "monto": monto,
+                                                        "tipo": tipo,
+                                                        "categoria": "Sin categorizar"
+                                                    })
+                                                    logs.sampled(log, "hsbc.row", "Transacción encontrada", strategy=3, date=fecha, description=descripcion[:40], amount=f"{signo}{monto_match.group(2)}")
+                                            except Exception as e:
+                                                logs.sampled(log, "hsbc.error", "Error procesando línea: %s", e, line_number=j + 1)
+                break
+    
+    log.info("Parser HSBC terminó", extra={"rows": len(transactions)})
+    return transactions
+
+def extract_santander_transactions(extracted_text: str) -> list:
+    """
+    Extrae transacciones de Santander del texto OCR.
+    Limpia descripciones, normaliza montos y fechas, y filtra duplicados y líneas basura.
+    """
+    import re
+    from datetime import datetime
+    transactions = []
+    seen = set()
+    if not extracted_text or not isinstance(extracted_text, str):
+        log.warning("Texto extraído vacío o no es string")
+        return transactions
+    lines = extracted_text.split('\n')
+    log.debug("Buscando transacciones Santander")
+    # Patrón: fecha, folio, descripción, monto
+    pattern = re.compile(r"(\d{2}-[A-Z]{3}-\d{4})[^\d]*(.+?)([\d,]+\.\d{2})")
+    for line in lines:
+        line = line.strip()
+        if not line or len(line) < 20:
+            continue
+        match = pattern.search(line)
+        if match:
+            fecha_raw, desc_raw, monto_raw = match.groups()
+            # Limpiar fecha
+            try:
+                fecha = fecha_raw.upper()
+                # Normalizar mes español a inglés si aplica
+                meses = {'ENE':'Jan','FEB':'Feb','MAR':'Mar','ABR':'Apr','MAY':'May','JUN':'Jun','JUL':'Jul','AGO':'Aug','SEP':'Sep','OCT':'Oct','NOV':'Nov','DIC':'Dec'}
+                for esp, eng in meses.items():
+                    if esp in fecha:
+                        fecha = fecha.replace(esp, eng)
+                fecha_dt = datetime.strptime(fecha, "%d-%b-%Y").date()
+            except Exception:
+                continue
+            # Limpiar descripción
+            desc = re.sub(r"[\[\]\|]+", " ", desc_raw)
+            desc = re.sub(r"\s+", " ", desc).strip()
+            # Limpiar monto
+            monto = float(monto_raw.replace(",", ""))
+            # Heurística: si la palabra 'abono' o 'deposito' está en la descripción, es abono
+            tipo = 'abono' if re.search(r"abono|deposito|ingreso", desc, re.I) else 'cargo'
+            # Firmar monto según tipo
+            monto = abs(monto) if tipo == 'abono' else -abs(monto)
+            # Evitar duplicados
+            key = (fecha_dt, desc, monto)
+            if key in seen:
+                continue
+            seen.add(key)
+            transactions.append({
+                'fecha_operacion': fecha_raw,  # Mantener formato original "01-ABR-2025"
+                'fecha_cargo': fecha_raw,      # Mantener formato original "01-ABR-2025"
+                'descripcion': desc,
+                'monto': monto,
+                'tipo': tipo,
+                'categoria': 'Sin categorizar'
+            })
+    log.info("Parser Santander terminó", extra={"rows": len(transactions)})
+    return transactions
+
+def _process_chunk_with_ai(chunk: str, api_key: str) -> List[Dict[str, Any]]:
+    """
+    Procesa un chunk de texto con AI.
+    """
+    try:
+        # Limpiar cualquier configuración global de OpenAI
+        import openai
+        if hasattr(openai, 'api_key'):
+            delattr(openai, 'api_key')
+        if hasattr(openai, '_client'):
+            delattr(openai, '_client')
+        
+        # Configurar OpenAI sin proxies usando el cliente
+        from openai import OpenAI
+        client = OpenAI(api_key=api_key)
+        
+        prompt = f"""
+        Extrae todas las transacciones bancarias del siguiente texto. 
+        Para cada transacción, identifica:
+        - fecha_operacion: fecha de la transacción (formato DD-MMM-YYYY)
+        - descripcion: descripción de la transacción
+        - monto: monto de la transacción (número con decimales)
+        - categoria: categoría de la transacción (supermercado, transporte, restaurante, etc.)
+
+        Responde SOLO con un JSON válido en este formato:
+        [
+            {{
+                "fecha_operacion": "DD-MMM-YYYY",
+                "descripcion": "descripción",
+                "monto": 123.45,
+                "categoria": "categoría"
+            }}
+        ]
+
+        Texto a analizar:
+        {chunk}
+        """
+        
+        with telemetry.span("llm_chunk", characters=len(chunk)):
+            response = usage.chat(
+                client,
+                "_process_chunk_with_ai",
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": "Eres un experto en extracción de transacciones bancarias. Responde SOLO con JSON válido."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.1,
+                max_tokens=2000
+            )
+        
+        content = response.choices[0].message.content.strip()
+        
+        # Intentar parsear JSON
+        try:
+            import json
+            transactions = json.loads(content)
+            if isinstance(transactions, list):
+                return transactions
+            else:
+                log.warning("Respuesta de OpenAI no es una lista", extra={"type": type(transactions).__name__})
+                return []
+        except json.JSONDecodeError as e:
+            log.warning("Error parseando JSON de OpenAI: %s", e)
+            log.debug("Respuesta cruda de OpenAI:\n%s", content)
+            return []
+            
+    except Exception as e:
+        log.error("Error procesando chunk con AI: %s", e)
+        return []
@@ -0,0 +1,326 @@
+"""
+Importación en streaming de exportaciones bancarias en CSV y OFX.
+
+Los archivos se leen de forma incremental (csv.reader sobre el stream; OFX por bloques de
+64 KiB) y cada banco tiene un perfil que mapea sus columnas. Los nombres de banco son los
+mismos que devuelve detect_bank; "Desconocido" usa un perfil genérico que reconoce los
+encabezados más comunes. El OFX se decodifica con la codificación que declara su cabecera
+(ENCODING/CHARSET en SGML, el prólogo en XML), o latin-1 si no declara ninguna.
+"""
+import codecs
+import csv
+import io
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from functools import lru_cache
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+
+# Misma categoría por omisión que las transacciones extraídas de PDFs
+UNCATEGORIZED = "Sin categorizar"
+
+
+class ImportFormatError(ValueError):
+    """El archivo no tiene el formato esperado (encabezados o estructura)"""
+
+
+@dataclass(frozen=True)
+class BankProfile:
+    name: str
+    # Encabezados candidatos (normalizados: minúsculas y sin acentos) para cada campo
+    date_columns: Tuple[str, ...] = ("fecha", "fecha operacion", "fecha de operacion", "date")
+    description_columns: Tuple[str, ...] = ("descripcion", "concepto", "description", "detalle", "movimiento")
+    amount_columns: Tuple[str, ...] = ("importe", "monto", "amount", "cantidad")
+    debit_columns: Tuple[str, ...] = ("cargo", "cargos", "retiro", "retiros", "debito")
+    credit_columns: Tuple[str, ...] = ("abono", "abonos", "deposito", "depositos", "credito")
+    category_columns: Tuple[str, ...] = ("categoria", "category")
+    date_formats: Tuple[str, ...] = ("%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d", "%d/%m/%y", "%d-%b-%Y")
+    delimiter: Optional[str] = None  # None = detectar a partir del encabezado
+    decimal_comma: bool = False
+    encoding: str = "utf-8-sig"
+
+
+GENERIC_PROFILE = BankProfile(name="Desconocido")
+
+BANK_PROFILES: Dict[str, BankProfile] = {
+    "Santander": BankProfile(
+        name="Santander",
+        description_columns=("descripcion", "concepto"),
+        debit_columns=("cargo", "retiro"),
+        credit_columns=("abono", "deposito"),
+    ),
+    "BBVA": BankProfile(
+        name="BBVA",
+        description_columns=("concepto / referencia", "concepto", "descripcion"),
+        debit_columns=("cargo", "cargos"),
+        credit_columns=("abono", "abonos"),
+    ),
+    "HSBC": BankProfile(
+        name="HSBC",
+        date_formats=("%d/%m/%Y", "%d-%b-%Y", "%Y-%m-%d"),
+        amount_columns=("importe", "monto"),
+    ),
+    "Banorte": BankProfile(
+        name="Banorte",
+        date_columns=("fecha", "fecha operacion"),
+        debit_columns=("retiros", "cargo"),
+        credit_columns=("depositos", "abono"),
+    ),
+    "Banamex": BankProfile(name="Banamex", debit_columns=("retiros", "cargos"), credit_columns=("depositos", "abonos")),
+    "Banregio": BankProfile(name="Banregio"),
+    "Desconocido": GENERIC_PROFILE,
+}
+
+
+def get_profile(bank: Optional[str]) -> BankProfile:
+    return BANK_PROFILES.get(bank or "Desconocido", GENERIC_PROFILE)
+
+
+_ACCENTS = str.maketrans("áéíóúüÁÉÍÓÚÜñÑ", "aeiouuAEIOUUnN")
+_SPANISH_MONTHS = {
+    "ENE": "Jan", "FEB": "Feb", "MAR": "Mar", "ABR": "Apr", "MAY": "May", "JUN": "Jun",
+    "JUL": "Jul", "AGO": "Aug", "SEP": "Sep", "OCT": "Oct", "NOV": "Nov", "DIC": "Dec",
+}
+
+
+def _normalize_header(value: str) -> str:
+    return re.sub(r"\s+", " ", (value or "").translate(_ACCENTS).strip().lower())
+
+
+@lru_cache(maxsize=8192)
+def parse_date(value: str, formats: Tuple[str, ...]) -> Optional[date]:
+    """Parsea la fecha probando los formatos del perfil (cacheado: las fechas se repiten mucho)"""
+    value = (value or "").strip()
+    if not value:
+        return None
+    candidates = [value]
+    upper = value.upper()
+    for esp, eng in _SPANISH_MONTHS.items():
+        if esp in upper:
+            candidates.append(upper.replace(esp, eng))
+            break
+    for candidate in candidates:
+        for fmt in formats:
+            try:
+                return datetime.strptime(candidate, fmt).date()
+            except ValueError:
+                continue
+    return None
+
+
+def parse_amount(value: str, decimal_comma: bool = False) -> Optional[float]:
+    """Convierte '$1,234.56', '-1234.56', '(1,234.56)' o '1.234,56' (decimal_comma) a float"""
+    value = (value or "").strip()
+    if not value:
+        return None
+    negative = value.startswith("(") and value.endswith(")")
+    value = value.strip("()").replace("$", "").replace(" ", "")
+    if decimal_comma:
+        value = value.replace(".", "").replace(",", ".")
+    else:
+        value = value.replace(",", "")
+    try:
+        amount = float(value)
+    except ValueError:
+        return None
+    return -abs(amount) if negative else amount
+
+
+@dataclass
+class ImportStats:
+    rows_read: int = 0
+    rows_skipped: int = 0
+    skipped_examples: List[str] = field(default_factory=list)
+
+    def skip(self, reason: str):
+        self.rows_skipped += 1
+        if len(self.skipped_examples) < 5:
+            self.skipped_examples.append(reason)
+
+
+def _find_column(headers: List[str], candidates: Tuple[str, ...]) -> Optional[int]:
+    for candidate in candidates:
+        if candidate in headers:
+            return headers.index(candidate)
+    return None
+
+
+def _detect_delimiter(sample: str, profile: BankProfile) -> str:
+    """Elige el delimitador con el que alguna de las primeras líneas parece el encabezado"""
+    for line in sample.splitlines()[:20]:
+        for delimiter in (",", ";", "\t", "|"):
+            cells = [_normalize_header(c) for c in next(csv.reader([line], delimiter=delimiter), [])]
+            if (_find_column(cells, profile.date_columns) is not None
+                    and _find_column(cells, profile.description_columns) is not None):
+                return delimiter
+    return ","
+
+
+def iter_csv_transactions(stream: BinaryIO, profile: BankProfile, stats: ImportStats) -> Iterator[dict]:
+    """Recorre el CSV fila por fila y produce dicts con description, amount, date y category"""
+    text = io.TextIOWrapper(stream, encoding=profile.encoding, errors="replace", newline="")
+    try:
+        yield from _iter_csv_rows(text, profile, stats)
+    finally:
+        # Soltar el stream sin cerrarlo (pertenece al UploadFile)
+        text.detach()
+
+
+def _iter_csv_rows(text: io.TextIOWrapper, profile: BankProfile, stats: ImportStats) -> Iterator[dict]:
+    delimiter = profile.delimiter
+    if delimiter is None:
+        sample = text.read(8192)
+        text.seek(0)
+        delimiter = _detect_delimiter(sample, profile)
+    reader = csv.reader(text, delimiter=delimiter)
+
+    # Algunos bancos ponen líneas de título antes del encabezado: buscarlo en las primeras filas
+    headers = None
+    for _ in range(20):
+        row = next(reader, None)
+        if row is None:
+            break
+        normalized = [_normalize_header(cell) for cell in row]
+        if _find_column(normalized, profile.date_columns) is not None:
+            headers = normalized
+            break
+    if headers is None:
+        raise ImportFormatError("No se encontró el encabezado con la columna de fecha")
+
+    date_idx = _find_column(headers, profile.date_columns)
+    desc_idx = _find_column(headers, profile.description_columns)
+    amount_idx = _find_column(headers, profile.amount_columns)
+    debit_idx = _find_column(headers, profile.debit_columns)
+    credit_idx = _find_column(headers, profile.credit_columns)
+    category_idx = _find_column(headers, profile.category_columns)
+    if desc_idx is None or (amount_idx is None and debit_idx is None and credit_idx is None):
+        raise ImportFormatError("El CSV debe tener columnas de descripción y de monto (o cargo/abono)")
+
+    def cell(row, idx):
+        return row[idx] if idx is not None and idx < len(row) else ""
+
+    for row in reader:
+        if not any(c.strip() for c in row):
+            continue
+        stats.rows_read += 1
+        parsed_date = parse_date(cell(row, date_idx), profile.date_formats)
+        description = cell(row, desc_idx).strip()
+        if amount_idx is not None:
+            amount = parse_amount(cell(row, amount_idx), profile.decimal_comma)
+        else:
+            debit = parse_amount(cell(row, debit_idx), profile.decimal_comma)
+            credit = parse_amount(cell(row, credit_idx), profile.decimal_comma)
+            amount = None
+            if debit:
+                amount = -abs(debit)
+            elif credit:
+                amount = abs(credit)
+        if parsed_date is None or not description or amount is None:
+            stats.skip(f"fila {stats.rows_read}: {row[:4]}")
+            continue
+        yield {
+            "description": description,
+            "amount": amount,
+            "date": parsed_date,
+            "category": cell(row, category_idx).strip() or UNCATEGORIZED,
+        }
+
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9_.]+)>([^<]*)")
+_OFX_CHUNK_SIZE = 64 * 1024
+_OFX_HEADER_SIZE = 1024  # el primer bloque alcanza para la cabecera aunque los bloques sean chicos
+_OFX_XML_ENCODING = re.compile(rb"<\?xml[^>]*\bencoding=[\"']([A-Za-z0-9_.:-]+)[\"']", re.IGNORECASE)
+_OFX_SGML_HEADER = re.compile(rb"^[ \t]*(ENCODING|CHARSET)[ \t]*:[ \t]*([A-Za-z0-9_.:-]+)", re.IGNORECASE | re.MULTILINE)
+# CHARSET de OFX 1.x: página de código de Windows o ISO-8859-1 (NONE = no declarado)
+_OFX_CHARSETS = {"1252": "cp1252", "8859-1": "latin-1", "ISO-8859-1": "latin-1"}
+
+
+def _ofx_encoding(head: bytes) -> str:
+    """Codificación que declara la cabecera OFX (prólogo XML o ENCODING/CHARSET de SGML); latin-1 si no hay"""
+    match = _OFX_XML_ENCODING.search(head)
+    if match:
+        declared = match.group(1).decode("ascii")
+    else:
+        # La cabecera SGML son las líneas antes del primer tag
+        header = {
+            key.decode("ascii").upper(): value.decode("ascii").upper()
+            for key, value in _OFX_SGML_HEADER.findall(head.split(b"<", 1)[0])
+        }
+        charset = header.get("CHARSET", "NONE")
+        declared = "utf-8" if header.get("ENCODING") == "UTF-8" else _OFX_CHARSETS.get(charset, charset)
+    try:
+        return codecs.lookup(declared).name
+    except LookupError:
+        return "latin-1"
+
+
+def _iter_ofx_tags(stream: BinaryIO) -> Iterator[Tuple[bool, str, str]]:
+    """Tokeniza OFX (SGML o XML) por bloques: produce (es_cierre, TAG, valor)"""
+    buffer = ""
+    decoder = None
+    chunk = stream.read(max(_OFX_CHUNK_SIZE, _OFX_HEADER_SIZE))
+    if isinstance(chunk, bytes):
+        # Incremental: un carácter multibyte puede quedar partido entre bloques
+        decoder = codecs.getincrementaldecoder(_ofx_encoding(chunk))(errors="replace")
+    while chunk:
+        buffer += decoder.decode(chunk) if decoder is not None else chunk
+        # Procesar solo hasta el último '<' para no cortar un tag a la mitad
+        cut = buffer.rfind("<")
+        if cut > 0:
+            for match in _OFX_TAG.finditer(buffer, 0, cut):
+                yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+            buffer = buffer[cut:]
+        chunk = stream.read(_OFX_CHUNK_SIZE)
+    if decoder is not None:
+        buffer += decoder.decode(b"", final=True)
+    for match in _OFX_TAG.finditer(buffer):
+        yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+
+
+def _parse_ofx_date(value: str) -> Optional[date]:
+    # Formato OFX: YYYYMMDD[HHMMSS[.XXX][TZ]]
+    try:
+        return datetime.strptime(value[:8], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def iter_ofx_transactions(stream: BinaryIO, stats: ImportStats) -> Iterator[dict]:
+    """Produce una transacción por bloque <STMTTRN> (los montos OFX ya vienen con signo)"""
+    current = None
+    for closing, tag, value in _iter_ofx_tags(stream):
+        if tag == "STMTTRN":
+            if not closing:
+                current = {}
+                continue
+            if current is not None:
+                stats.rows_read += 1
+                parsed_date = _parse_ofx_date(current.get("DTPOSTED", ""))
+                amount = parse_amount(current.get("TRNAMT", ""))
+                description = current.get("NAME") or current.get("MEMO") or ""
+                memo = current.get("MEMO")
+                if memo and current.get("NAME") and memo != current["NAME"]:
+                    description = f"{description} {memo}"
+                if parsed_date is None or amount is None or not description:
+                    stats.skip(f"STMTTRN {stats.rows_read}: {current}")
+                else:
+                    yield {"description": description.strip(), "amount": amount, "date": parsed_date, "category": UNCATEGORIZED}
+            current = None
+        elif current is not None and not closing and value:
+            current[tag] = value
+
+
+def detect_format(filename: str) -> Optional[str]:
+    name = (filename or "").lower()
+    if name.endswith(".csv") or name.endswith(".txt"):
+        return "csv"
+    if name.endswith(".ofx") or name.endswith(".qfx"):
+        return "ofx"
+    return None
+
+
+def ofx_bank_hint(sample: str) -> str:
+    """Texto de la cabecera OFX útil para detectar el banco (ORG / FID)"""
+    match = re.search(r"<ORG>([^<\r\n]*)", sample, re.IGNORECASE)
+    return match.group(1) if match else sample
@@ -0,0 +1,120 @@
+"""
+Logging estructurado con niveles para la API y el pipeline de estados de cuenta.
+
+- Todos los loggers cuelgan de "pfm" (`get_logger("extraction")` -> "pfm.extraction").
+- LOG_LEVEL fija el nivel (INFO por defecto) y LOG_FORMAT el formato: "text" (mensaje
+  seguido de clave=valor) o "json" (un objeto por línea, para agregadores de logs).
+- El request solo encola el registro (QueueHandler); un hilo aparte (QueueListener) lo
+  formatea y lo escribe, así que un stdout lento no frena la subida de un PDF.
+- Los mensajes por fila o por página usan `sampled`: se registra el primero y después uno
+  de cada LOG_SAMPLE_EVERY, con el conteo en el campo `seen`.
+
+Con LOG_LEVEL=INFO los `log.debug(...)` con argumentos % no formatean nada; las vistas
+previas de texto y las respuestas crudas de OpenAI se arman solo si `isEnabledFor(DEBUG)`.
+"""
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from typing import Dict, Optional, TextIO
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_SAMPLE_EVERY = int(os.getenv("LOG_SAMPLE_EVERY", "100"))
+ROOT_LOGGER = "pfm"
+
+# Atributos propios de LogRecord: el resto son los campos pasados en `extra`
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+def _fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extra = " ".join(f"{key}={value!r}" for key, value in _fields(record).items())
+        return f"{line} {extra}" if extra else line
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_lock = threading.Lock()
+_sample_counters: Dict[str, "itertools.count"] = {}
+
+
+def configure(level: Optional[str] = None, fmt: Optional[str] = None, stream: Optional[TextIO] = None):
+    """Instala (o reinstala) la cola y el hilo escritor en el logger raíz "pfm"; idempotente"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+        root = logging.getLogger(ROOT_LOGGER)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        writer = logging.StreamHandler(stream)
+        writer.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else TextFormatter())
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        root.addHandler(logging.handlers.QueueHandler(records))
+        root.setLevel((level or LOG_LEVEL).upper())
+        root.propagate = False
+        _listener = logging.handlers.QueueListener(records, writer)
+        _listener.start()
+
+
+def shutdown():
+    """Vacía la cola y detiene el hilo escritor (al salir del proceso)"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown)
+
+
+def get_logger(name: str) -> logging.Logger:
+    if _listener is None:
+        configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def sampled(logger: logging.Logger, key: str, msg: str, *args, level: int = logging.DEBUG, every: Optional[int] = None, **fields):
+    """Registra el primer mensaje de `key` y luego uno de cada `every` (LOG_SAMPLE_EVERY)"""
+    if not logger.isEnabledFor(level):
+        return
+    every = every or LOG_SAMPLE_EVERY
+    counter = _sample_counters.get(key)
+    if counter is None:
+        counter = _sample_counters.setdefault(key, itertools.count())
+    seen = next(counter)
+    if seen % every:
+        return
+    logger.log(level, msg, *args, extra={**fields, "seen": seen + 1}, stacklevel=2)
+
+
+def preview(text: str, lines: int = 5) -> str:
+    """Primeras líneas no vacías de un texto (para logs de depuración)"""
+    return "\n".join([line.strip() for line in (text or "").splitlines() if line.strip()][:lines])
@@ -1,31 +1,26 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import delete, func, select
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Dict, Any, Optional
+import logging
 import os
+import uuid
 from dotenv import load_dotenv
-import pdfplumber
-import openai
-import re
-from datetime import datetime
-from sqlalchemy import extract, func
-import pytesseract
-from PIL import Image
-import io
-from .agentic_extractor import AgenticDocumentExtractor
+from datetime import date
 
 load_dotenv()
 
-UPLOAD_DIR = "uploaded_pdfs"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+from . import crud, models, schemas, auth, search, conditional, export, importers, analytics, recurring, anomalies, extraction, telemetry, logs, profiling, usage, blobs, retention, batch_upload
+from .database import SessionLocal, get_db
+from .async_database import get_async_db
 
-from . import crud, models, schemas, auth
-from .database import engine, get_db
+log = logs.get_logger("main")
 
-# Crear las tablas en la base de datos
-models.Base.metadata.create_all(bind=engine)
+# El esquema (tablas, índices, FTS y backfills) se crea con `python -m app.migrate`, no al importar
 
 app = FastAPI(title="PFM API", version="1.0.0")
 
@@ -36,8 +31,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count", "ETag", "X-Profile-Id"],
 )
 
+# Perfilado opt-in por request (header X-Profile: 1 o ?profile=1, solo administradores)
+app.add_middleware(profiling.ProfilingMiddleware)
+
+# GC de PDFs subidos en un hilo aparte (app/retention.py); UPLOAD_GC=0 lo desactiva
+@app.on_event("startup")
+def start_upload_gc():
+    retention.scheduler.start()
+
+@app.on_event("shutdown")
+def stop_upload_gc():
+    retention.scheduler.stop()
+    batch_upload.shutdown()
+
 # Dependency para obtener el usuario actual
 def get_current_user(db: Session = Depends(get_db), token: str = Depends(auth.oauth2_scheme)):
     credentials_exception = HTTPException(
@@ -50,11 +59,54 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(auth.oa
     if token_data is None or token_data.email is None:
         raise credentials_exception
     
-    user = crud.get_user_by_email(db, email=token_data.email)
+    # Camino rápido: usuario ya resuelto para este token
+    snapshot = auth.principal_cache.get(token_data.email, token_data.exp)
+    if snapshot is not None:
+        return crud.user_from_snapshot(db, snapshot)
+    
+    if token_data.user_id is not None:
+        user = crud.get_user(db, user_id=token_data.user_id)
+        if user is not None and user.email != token_data.email:
+            user = None
+    else:
+        user = crud.get_user_by_email(db, email=token_data.email)
+    if user is None:
+        raise credentials_exception
+    auth.principal_cache.put(token_data.email, token_data.exp, crud.user_snapshot(user))
+    return user
+
+# Variante asíncrona para los endpoints de lectura (no ocupa un hilo del threadpool)
+async def get_current_user_async(db: AsyncSession = Depends(get_async_db), token: str = Depends(auth.oauth2_scheme)):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    
+    token_data = auth.verify_token(token)
+    if token_data is None or token_data.email is None:
+        raise credentials_exception
+    
+    snapshot = auth.principal_cache.get(token_data.email, token_data.exp)
+    if snapshot is not None:
+        return await crud.user_from_snapshot_async(db, snapshot)
+    
+    if token_data.user_id is not None:
+        user = await crud.get_user_async(db, user_id=token_data.user_id)
+        if user is not None and user.email != token_data.email:
+            user = None
+    else:
+        user = await crud.get_user_by_email_async(db, email=token_data.email)
     if user is None:
         raise credentials_exception
+    auth.principal_cache.put(token_data.email, token_data.exp, crud.user_snapshot(user))
     return user
 
+def require_admin(current_user: models.User = Depends(get_current_user)):
+    if not auth.is_admin(current_user.email):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo administradores")
+    return current_user
+
 # Rutas de autenticación
 @app.post("/register", response_model=schemas.User)
 def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
@@ -75,7 +127,8 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token = auth.create_access_token(data={"sub": user.email})
+    # uid permite resolver el usuario por clave primaria cuando no está en caché
+    access_token = auth.create_access_token(data={"sub": user.email, "uid": user.id})
     return {
         "access_token": access_token, 
         "token_type": "bearer",
@@ -84,16 +137,250 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
 # Rutas de transacciones (requieren autenticación)
 @app.get("/transactions/", response_model=List[schemas.Transaction])
-def read_transactions(
+async def read_transactions(
+    request: Request,
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: models.User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtiene las transacciones del usuario actual"""
-    transactions = crud.get_transactions(db, user_id=current_user.id, skip=skip, limit=limit)
+    not_modified = await conditional.check_not_modified(request, response, db, current_user.id)
+    if not_modified is not None:
+        return not_modified
+    transactions = await crud.get_transactions_async(db, user_id=current_user.id, skip=skip, limit=limit)
+    return transactions
+
+def _parse_filter_date(value: str, field: str):
+    """DD-MM-YYYY partido a mano (strptime es mucho más lento y no aporta validación extra)"""
+    try:
+        day, month, year = value.split("-")
+        if len(year) != 4:
+            raise ValueError(value)
+        return date(int(year), int(month), int(day))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{field} debe tener formato DD-MM-YYYY")
+
+# Dependency con los filtros compartidos por /transactions/filter y /transactions/export
+def transaction_filters(
+    start_date: str = None,
+    end_date: str = None,
+    min_amount: float = None,
+    max_amount: float = None,
+    category: List[str] = Query(None, description="Una o varias categorías (repetir el parámetro o separar por comas)"),
+    description: str = Query(None, min_length=1, description="Subcadena de la descripción, sin distinguir mayúsculas"),
+    description_prefix: str = Query(None, min_length=1, description="Prefijo de la descripción, sin distinguir mayúsculas"),
+    sign: str = Query(None, pattern="^(income|expense)$"),
+    sort: str = Query("-date", pattern="^-?(date|amount)$"),
+) -> Dict[str, Any]:
+    categories = [c.strip() for value in category or [] for c in value.split(",") if c.strip()]
+    return {
+        "start_date": _parse_filter_date(start_date, "start_date") if start_date else None,
+        "end_date": _parse_filter_date(end_date, "end_date") if end_date else None,
+        "min_amount": min_amount,
+        "max_amount": max_amount,
+        "categories": categories or None,
+        "description": description,
+        "description_prefix": description_prefix,
+        "sign": sign,
+        "sort": sort,
+    }
+
+@app.get("/transactions/filter", response_model=List[schemas.Transaction])
+async def filter_transactions(
+    request: Request,
+    response: Response,
+    filters: Dict[str, Any] = Depends(transaction_filters),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    current_user: models.User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Obtiene una página de transacciones filtradas por fecha, monto, categorías, descripción y signo.
+    El total de filas que cumplen los filtros va en el header X-Total-Count.
+    """
+    not_modified = await conditional.check_not_modified(request, response, db, current_user.id)
+    if not_modified is not None:
+        return not_modified
+    stmt = crud.transactions_filter_statement(current_user.id, **filters).limit(limit).offset(offset)
+    transactions = (await db.execute(stmt)).scalars().all()
+    if offset == 0 and len(transactions) < limit:
+        total = len(transactions)
+    else:
+        count_filters = {key: value for key, value in filters.items() if key != "sort"}
+        total = (await db.execute(crud.transactions_count_statement(current_user.id, **count_filters))).scalar()
+    response.headers["X-Total-Count"] = str(total)
     return transactions
 
+@app.get("/transactions/export")
+def export_transactions(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    filters: Dict[str, Any] = Depends(transaction_filters),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Exporta en streaming las transacciones filtradas (mismos filtros que /transactions/filter) en CSV, NDJSON o Parquet"""
+    if format == "parquet" and not export.parquet_available():
+        raise HTTPException(status_code=400, detail="La exportación Parquet requiere pyarrow instalado")
+    stmt = crud.transactions_filter_statement(current_user.id, **filters)
+    filename = f"transacciones.{format}"
+    return StreamingResponse(
+        export.STREAMERS[format](stmt),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/transactions/search", response_model=List[schemas.Transaction])
+async def search_transactions(
+    request: Request,
+    response: Response,
+    q: str,
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    current_user: models.User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Busca transacciones del usuario por descripción (prefijos, ordenadas por relevancia)"""
+    not_modified = await conditional.check_not_modified(request, response, db, current_user.id)
+    if not_modified is not None:
+        return not_modified
+    stmt = search.search_statement(db.bind.dialect.name, current_user.id, q, limit=limit, offset=offset)
+    if stmt is None:
+        return []
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def _analytics_frame(request: Request, db: AsyncSession, user_id: int):
+    """Frame columnar del usuario para la versión de datos que ya leyó check_not_modified"""
+    return await analytics.get_frame(db, user_id, request.state.data_version)
+
+@app.get("/transactions/summary/monthly")
+async def monthly_summary(request: Request, response: Response, current_user: models.User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    """Devuelve totales mensuales de ingresos y gastos agrupados por mes y tipo (abono/cargo)"""
+    not_modified = await conditional.check_not_modified(request, response, db, current_user.id)
+    if not_modified is not None:
+        return not_modified
+    frame = await _analytics_frame(request, db, current_user.id)
+    return frame.monthly_totals()
+
+@app.get("/transactions/summary/category")
+async def category_summary(request: Request, response: Response, current_user: models.User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    """Devuelve la proporción de gasto por categoría (solo gastos, amount negativo)"""
+    not_modified = await conditional.check_not_modified(request, response, db, current_user.id)
+    if not_modified is not None:
+        return not_modified
+    frame = await _analytics_frame(request, db, current_user.id)
+    # Para gráfico de pastel, usar valor absoluto
+    return [{"category": row["category"], "total": abs(row["total"])} for row in frame.category_totals()]
+
+@app.get("/transactions/summary/table")
+async def summary_table(request: Request, response: Response, current_user: models.User = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    """Devuelve una tabla resumen del total gastado por categoría y por mes (solo gastos)"""
+    not_modified = await conditional.check_not_modified(request, response, db, current_user.id)
+    if not_modified is not None:
+        return not_modified
+    frame = await _analytics_frame(request, db, current_user.id)
+    return [{**row, "total": abs(row["total"])} for row in frame.category_month_totals()]
+
+@app.get("/transactions/summary/range")
+async def range_summary(
+    request: Request,
+    response: Response,
+    start_date: str = None,
+    end_date: str = None,
+    current_user: models.User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Ingresos, gastos y desglose de gastos por categoría entre dos fechas (DD-MM-YYYY, inclusivas)"""
+    start = _parse_filter_date(start_date, "start_date") if start_date else None
+    end = _parse_filter_date(end_date, "end_date") if end_date else None
+    not_modified = await conditional.check_not_modified(request, response, db, current_user.id)
+    if not_modified is not None:
+        return not_modified
+    frame = await _analytics_frame(request, db, current_user.id)
+    return {
+        **frame.range_totals(start, end),
+        "by_category": [
+            {**row, "total": abs(row["total"])} for row in frame.category_totals(start, end)
+        ],
+    }
+
+@app.get("/transactions/balance")
+async def balance_series(
+    request: Request,
+    response: Response,
+    interval: str = Query("day", pattern="^(day|week|month)$"),
+    start_date: str = None,
+    end_date: str = None,
+    current_user: models.User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Serie de saldo acumulado por día, semana o mes (DD-MM-YYYY); solo incluye buckets con movimientos"""
+    start = _parse_filter_date(start_date, "start_date") if start_date else None
+    end = _parse_filter_date(end_date, "end_date") if end_date else None
+    not_modified = await conditional.check_not_modified(request, response, db, current_user.id)
+    if not_modified is not None:
+        return not_modified
+    stmt = crud.balance_series_statement(db.bind.dialect.name, current_user.id, interval, start, end)
+    rows = (await db.execute(stmt)).all()
+    points = [
+        {
+            "date": str(row.bucket)[:10],
+            "net": round(float(row.net), 2),
+            "balance": round(float(row.balance), 2),
+            "count": int(row.count),
+        }
+        for row in rows
+    ]
+    if rows:
+        opening = rows[0].balance - rows[0].net
+    elif start:
+        # Rango sin movimientos: el saldo es todo lo anterior al primer bucket pedido
+        opening = (await db.execute(crud.balance_before_statement(current_user.id, crud.balance_bucket_start(start, interval)))).scalar()
+    else:
+        opening = 0
+    opening = round(float(opening or 0), 2)
+    return {"interval": interval, "opening_balance": opening, "points": points}
+
+@app.get("/transactions/recurring", response_model=List[schemas.RecurringSeries])
+async def recurring_series(
+    request: Request,
+    response: Response,
+    include_inactive: bool = False,
+    current_user: models.User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Cargos recurrentes/suscripciones e ingresos recurrentes detectados, por confianza descendente"""
+    not_modified = await conditional.check_not_modified(request, response, db, current_user.id)
+    if not_modified is not None:
+        return not_modified
+    reference = (await db.execute(crud.latest_series_date_statement(current_user.id))).scalar()
+    if reference is None:
+        return []
+    result = await db.execute(crud.recurring_series_statement(current_user.id))
+    detected = [recurring.serialize(series, reference) for series in result.scalars()]
+    return [series for series in detected if include_inactive or series["active"]]
+
+@app.get("/transactions/anomalies", response_model=List[schemas.Anomaly])
+async def anomalous_transactions(
+    request: Request,
+    response: Response,
+    kind: Optional[str] = Query(None, pattern="^(category_spike|new_merchant)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    current_user: models.User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Gastos inusuales detectados al subir estados de cuenta (picos por categoría y comercios nuevos)"""
+    not_modified = await conditional.check_not_modified(request, response, db, current_user.id)
+    if not_modified is not None:
+        return not_modified
+    result = await db.execute(crud.anomalies_statement(current_user.id, kind=kind, limit=limit))
+    return [
+        {**schemas.Transaction.model_validate(transaction).dict(), "kind": anomaly.kind, "score": anomaly.score, "expected": anomaly.expected}
+        for transaction, anomaly in result.all()
+    ]
+
 @app.post("/transactions/", response_model=schemas.Transaction)
 def create_transaction(
     transaction: schemas.TransactionCreate,
@@ -103,6 +390,15 @@ def create_transaction(
     """Crea una nueva transacción"""
     return crud.create_transaction(db=db, transaction=transaction, user_id=current_user.id)
 
+@app.post("/transactions/batch", response_model=schemas.BatchResponse)
+def batch_transactions(
+    batch: schemas.BatchRequest,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Aplica varias operaciones create/update/delete en una sola transacción, con resultado por operación"""
+    return crud.apply_transaction_batch(db, user_id=current_user.id, operations=batch.operations, atomic=batch.atomic)
+
 @app.get("/transactions/{transaction_id}", response_model=schemas.Transaction)
 def read_transaction(
     transaction_id: int,
@@ -142,568 +438,14 @@ def delete_transaction(
         raise HTTPException(status_code=404, detail="Transaction not found")
     return {"message": "Transaction deleted successfully"}
 
-@app.get("/transactions/filter", response_model=List[schemas.Transaction])
-def filter_transactions(
-    start_date: str = None,
-    end_date: str = None,
-    min_amount: float = None,
-    max_amount: float = None,
-    category: str = None,
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """Obtiene transacciones filtradas por fecha (DD-MM-YYYY), monto mínimo/máximo y categoría"""
-    query = db.query(models.Transaction).filter(models.Transaction.user_id == current_user.id)
-    if start_date:
-        start = datetime.strptime(start_date, "%d-%m-%Y").date()
-        query = query.filter(models.Transaction.date >= start)
-    if end_date:
-        end = datetime.strptime(end_date, "%d-%m-%Y").date()
-        query = query.filter(models.Transaction.date <= end)
-    if min_amount is not None:
-        query = query.filter(models.Transaction.amount >= min_amount)
-    if max_amount is not None:
-        query = query.filter(models.Transaction.amount <= max_amount)
-    if category:
-        query = query.filter(models.Transaction.category == category)
-    return query.order_by(models.Transaction.date.desc()).all()
-
-@app.get("/transactions/summary/monthly")
-def monthly_summary(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Devuelve totales mensuales de ingresos y gastos agrupados por mes y tipo (abono/cargo)"""
-    results = db.query(
-        extract('year', models.Transaction.date).label('year'),
-        extract('month', models.Transaction.date).label('month'),
-        func.sum(models.Transaction.amount).label('total'),
-    ).filter(
-        models.Transaction.user_id == current_user.id
-    ).group_by('year', 'month').order_by('year', 'month').all()
-    # Separar ingresos y gastos
-    summary = []
-    for row in results:
-        summary.append({
-            "year": int(row.year),
-            "month": int(row.month),
-            "total": float(row.total)
-        })
-    return summary
-
-@app.get("/transactions/summary/category")
-def category_summary(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Devuelve la proporción de gasto por categoría (solo gastos, amount negativo)"""
-    results = db.query(
-        models.Transaction.category,
-        func.sum(models.Transaction.amount).label('total')
-    ).filter(
-        models.Transaction.user_id == current_user.id,
-        models.Transaction.amount < 0
-    ).group_by(models.Transaction.category).all()
-    summary = []
-    for row in results:
-        summary.append({
-            "category": row.category,
-            "total": float(abs(row.total))  # Para gráfico de pastel, usar valor absoluto
-        })
-    return summary
-
-@app.get("/transactions/summary/table")
-def summary_table(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Devuelve una tabla resumen del total gastado por categoría y por mes (solo gastos)"""
-    results = db.query(
-        extract('year', models.Transaction.date).label('year'),
-        extract('month', models.Transaction.date).label('month'),
-        models.Transaction.category,
-        func.sum(models.Transaction.amount).label('total')
-    ).filter(
-        models.Transaction.user_id == current_user.id,
-        models.Transaction.amount < 0
-    ).group_by('year', 'month', models.Transaction.category).order_by('year', 'month').all()
-    summary = []
-    for row in results:
-        summary.append({
-            "year": int(row.year),
-            "month": int(row.month),
-            "category": row.category,
-            "total": float(abs(row.total))
-        })
-    return summary
-
-# Función para procesar el PDF y extraer transacciones
-
-def extract_text_with_ocr_fallback(pdf_path: str):
-    """
-    Extrae texto del PDF usando pdfplumber, y si el texto contiene códigos (cid:XXX),
-    usa OCR mejorado como fallback para obtener texto legible.
-    """
-    print(f"📄 Iniciando extracción de texto de: {pdf_path}")
-    
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            print(f"📄 PDF abierto correctamente. Páginas: {len(pdf.pages)}")
-            
-            # Intentar extracción normal primero
-            extracted_text = ""
-            for i, page in enumerate(pdf.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    extracted_text += page_text + "\n"
-                    print(f"✅ Página {i+1}: {len(page_text)} caracteres extraídos")
-                else:
-                    print(f"⚠️ Página {i+1}: No se pudo extraer texto")
-            
-            # Verificar si el texto contiene códigos (cid:XXX) que indican texto ilegible
-            if not extracted_text.strip():
-                print("❌ No se pudo extraer texto del PDF. Usando OCR...")
-                return _extract_with_ocr(pdf)
-            elif "(cid:" in extracted_text:
-                print("🔍 Texto extraído contiene códigos (cid:XXX). Usando OCR mejorado como fallback...")
-                return _extract_with_ocr(pdf)
-            else:
-                print(f"✅ Texto extraído exitosamente: {len(extracted_text)} caracteres")
-                # Debug: mostrar primeras líneas
-                lines = extracted_text.split('\n')[:5]
-                print("📄 Primeras líneas del texto extraído:")
-                for i, line in enumerate(lines):
-                    if line.strip():
-                        print(f"   {i+1}: {line.strip()}")
-                return extracted_text
-                
-    except Exception as e:
-        print(f"❌ Error abriendo PDF: {e}")
-        return ""
-
-def _extract_with_ocr(pdf):
-    """
-    Extrae texto usando OCR cuando la extracción normal falla.
-    """
-    ocr_text = ""
-    
-    for page_num, page in enumerate(pdf.pages):
-        print(f"🔍 Procesando página {page_num + 1} con OCR...")
-        
-        try:
-            # Convertir página a imagen con mejor resolución
-            img = page.to_image(resolution=300)  # Aumentar resolución
-            img_bytes = img.original.convert('RGB')
-            
-            # Preprocesar imagen para mejorar OCR
-            processed_img = preprocess_image_for_ocr(img_bytes)
-            
-            # Usar OCR mejorado para extraer texto
-            custom_config = r'--oem 3 --psm 6 -l spa+eng --dpi 300'
-            page_text = pytesseract.image_to_string(processed_img, config=custom_config)
-            
-            # Limpiar y mejorar el texto extraído
-            cleaned_text = clean_ocr_text(page_text)
-            ocr_text += cleaned_text + "\n"
-            print(f"✅ OCR completado para página {page_num + 1}: {len(cleaned_text)} caracteres")
-            
-            # Debug: mostrar primeras líneas del texto extraído
-            lines = cleaned_text.split('\n')[:3]
-            print(f"📄 Primeras líneas página {page_num + 1}:")
-            for i, line in enumerate(lines):
-                if line.strip():
-                    print(f"   {i+1}: {line.strip()}")
-                    
-        except Exception as e:
-            print(f"❌ Error en OCR para página {page_num + 1}: {e}")
-            # Si OCR falla, mantener el texto original de esa página
-            page_original = page.extract_text() or ""
-            ocr_text += page_original + "\n"
-    
-    print(f"🔍 OCR completado. Total: {len(ocr_text)} caracteres")
-    return ocr_text
-
-def preprocess_image_for_ocr(image):
-    """
-    Preprocesa la imagen para mejorar la calidad del OCR.
-    """
-    from PIL import Image, ImageEnhance, ImageFilter
-    import numpy as np
-    import cv2
-    
-    # Convertir PIL Image a numpy array para OpenCV
-    img_array = np.array(image)
-    
-    # Convertir a escala de grises
-    gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-    
-    # Aplicar filtro bilateral para reducir ruido manteniendo bordes
-    denoised = cv2.bilateralFilter(gray, 9, 75, 75)
-    
-    # Aplicar umbral adaptativo para mejorar contraste
-    thresh = cv2.adaptiveThreshold(denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-    
-    # Aplicar morfología para limpiar el texto
-    kernel = np.ones((1, 1), np.uint8)
-    cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
-    
-    # Convertir de vuelta a PIL Image
-    processed_img = Image.fromarray(cleaned)
-    
-    # Aplicar mejoras adicionales con PIL
-    # Aumentar contraste
-    enhancer = ImageEnhance.Contrast(processed_img)
-    processed_img = enhancer.enhance(1.5)
-    
-    # Aumentar nitidez
-    enhancer = ImageEnhance.Sharpness(processed_img)
-    processed_img = enhancer.enhance(1.2)
-    
-    return processed_img
-
-def clean_ocr_text(text):
-    """
-    Limpia y mejora el texto extraído por OCR.
-    """
-    import re
-    
-    # Dividir en líneas
-    lines = text.split('\n')
-    cleaned_lines = []
-    
-    for line in lines:
-        # Limpiar caracteres extraños comunes en OCR
-        cleaned = line.strip()
-        
-        # Corregir errores comunes de OCR
-        cleaned = re.sub(r'[|]{2,}', '|', cleaned)  # Múltiples pipes
-        cleaned = re.sub(r'[0]{3,}', '000', cleaned)  # Múltiples ceros
-        cleaned = re.sub(r'[l]{2,}', 'll', cleaned)  # Múltiples l's
-        cleaned = re.sub(r'[I]{2,}', 'II', cleaned)  # Múltiples I's
-        
-        # Corregir caracteres mal interpretados específicos que vemos en los logs
-        char_replacements = {
-            '0': '0', 'O': '0', 'o': '0',  # Normalizar ceros
-            'l': '1', 'I': '1', '|': '1',  # Normalizar unos
-            'S': '5', 's': '5',  # Normalizar cincos
-            'G': '6', 'g': '6',  # Normalizar seises
-            'B': '8', 'b': '8',  # Normalizar ochos
-            '1': '1',  # Mantener unos
-            '2': '2',  # Mantener doses
-            '3': '3',  # Mantener treses
-            '4': '4',  # Mantener cuatros
-            '5': '5',  # Mantener cincos
-            '6': '6',  # Mantener seises
-            '7': '7',  # Mantener sietes
-            '8': '8',  # Mantener ochos
-            '9': '9',  # Mantener nueves
-        }
-        
-        # Corregir caracteres específicos que vemos en los logs
-        # Ejemplo: "1a5e5oria1@1condu5ef1.1gob1.1mx1" -> "asesoria@condufef.gob.mx"
-        cleaned = re.sub(r'1a5e5oria1@1condu5ef1\.1gob1\.1mx1', 'asesoria@condufef.gob.mx', cleaned)
-        cleaned = re.sub(r'5UPAG0', 'SUPAGO', cleaned)
-        cleaned = re.sub(r'5PE1', 'SPEI', cleaned)
-        cleaned = re.sub(r'5PE1A', 'SPEIA', cleaned)
-        cleaned = re.sub(r'M00H680201JG0', 'MOOH680201JGO', cleaned)
-        cleaned = re.sub(r'V1VAAER0BU5', 'VIVAAEROBUS', cleaned)
-        cleaned = re.sub(r'RE5T', 'REST', cleaned)
-        cleaned = re.sub(r'ARB0_', 'ARBO', cleaned)
-        cleaned = re.sub(r'51H', 'SIH', cleaned)
-        cleaned = re.sub(r'V1VA', 'VIVA', cleaned)
-        cleaned = re.sub(r'C1B', 'CIB', cleaned)
-        
-        # Corregir patrones de caracteres repetidos
-        cleaned = re.sub(r'1{2,}', '11', cleaned)  # Múltiples unos
-        cleaned = re.sub(r'5{2,}', '55', cleaned)  # Múltiples cincos
-        
-        # Eliminar líneas muy cortas o que parezcan ruido
-        if len(cleaned) > 2 and not re.match(r'^[^\w]*$', cleaned):
-            cleaned_lines.append(cleaned)
-    
-    return '\n'.join(cleaned_lines)
-
-def ocr_region_with_multiple_methods(image):
-    """
-    Ejecuta OCR en una imagen usando varios modos PSM de Tesseract y EasyOCR.
-    Devuelve un diccionario con los resultados.
-    """
-    import pytesseract
-    import easyocr
-    import numpy as np
-    from PIL import Image
-    
-    results = {}
-    # Tesseract PSM modes
-    psm_modes = [4, 6, 11]
-    for psm in psm_modes:
-        config = f'--oem 3 --psm {psm} -l spa+eng --dpi 300'
-        text = pytesseract.image_to_string(image, config=config)
-        results[f'tesseract_psm_{psm}'] = text
-    
-    # EasyOCR
-    try:
-        reader = easyocr.Reader(['es', 'en'], gpu=False)
-        # Convert PIL image to numpy array
-        img_np = np.array(image)
-        easyocr_result = reader.readtext(img_np, detail=0, paragraph=True)
-        easyocr_text = '\n'.join(easyocr_result)
-        results['easyocr'] = easyocr_text
-    except Exception as e:
-        results['easyocr'] = f"[EasyOCR error: {e}]"
-    return results
-
-def extract_transaction_regions(pdf_path: str):
-    """
-    Extrae texto específicamente de regiones que probablemente contengan transacciones.
-    Para cada región, ejecuta OCR con varios métodos y muestra los resultados.
-    """
-    with pdfplumber.open(pdf_path) as pdf:
-        transaction_text = ""
-        
-        for page_num, page in enumerate(pdf.pages):
-            print(f"🔍 Analizando página {page_num + 1} para regiones de transacciones...")
-            width = page.width
-            height = page.height
-            center_region = page.crop((width * 0.1, height * 0.3, width * 0.9, height * 0.8))
-            bottom_region = page.crop((width * 0.1, height * 0.7, width * 0.9, height * 0.95))
-            regions_to_check = [
-                ("central", center_region),
-                ("inferior", bottom_region)
-            ]
-            for region_name, region in regions_to_check:
-                try:
-                    region_text = region.extract_text()
-                    if not region_text or "(cid:" in region_text:
-                        img = region.to_image(resolution=300)
-                        img_bytes = img.original.convert('RGB')
-                        processed_img = preprocess_image_for_ocr(img_bytes)
-                        # Multi-PSM + EasyOCR
-                        ocr_results = ocr_region_with_multiple_methods(processed_img)
-                        for method, text in ocr_results.items():
-                            print(f"\n--- {method.upper()} {region_name.upper()} PÁGINA {page_num + 1} ---")
-                            lines = text.split('\n')[:10]
-                            for i, line in enumerate(lines):
-                                if line.strip():
-                                    print(f"   {i+1}: {line.strip()}")
-                        # Use the best result (for now, just pick Tesseract PSM 6)
-                        region_text = ocr_results.get('tesseract_psm_6', '')
-                    if region_text and region_text.strip():
-                        transaction_text += f"\n--- REGIÓN {region_name.upper()} PÁGINA {page_num + 1} ---\n"
-                        transaction_text += region_text + "\n"
-                        print(f"✅ Texto extraído de región {region_name} en página {page_num + 1}")
-                except Exception as e:
-                    print(f"❌ Error procesando región {region_name} en página {page_num + 1}: {e}")
-                    continue
-        return transaction_text
-
-def process_bank_statement_pdf(file_path: str, api_key: str) -> Dict[str, Any]:
-    """
-    Process a bank statement PDF and extract transactions using agentic extraction.
-    """
-    print(f"📄 Procesando PDF: {file_path}")
-    
-    # Extract text from PDF
-    extracted_text = extract_text_with_ocr_fallback(file_path)
-
-    # Guardar el texto extraído para depuración
-    debug_txt_path = file_path + ".ocr.txt"
-    with open(debug_txt_path, "w", encoding="utf-8") as f:
-        f.write(extracted_text)
-    print(f"📝 Texto extraído guardado en: {debug_txt_path}")
-    print(f"--- INICIO TEXTO EXTRAÍDO ---\n{extracted_text[:1000]}\n--- FIN TEXTO EXTRAÍDO ---")
-    
-    if not extracted_text.strip():
-        print("❌ No se pudo extraer texto del PDF")
-        return {
-            "banco": "Desconocido",
-            "transacciones": [],
-            "texto_extraido": "",
-            "metodo": "ninguno"
-        }
-    
-    # Detect bank
-    banco = detect_bank(extracted_text)
-    print(f"🏦 Banco detectado: {banco}")
-    
-    # Intentar extracción con extractor agéntico
-    try:
-        from .agentic_extractor import AgenticDocumentExtractor
-        extractor = AgenticDocumentExtractor(api_key)
-        agentic_transactions = extractor.extract_transactions(extracted_text, banco)
-        if agentic_transactions:
-            print(f"🤖 Extractor agéntico encontró {len(agentic_transactions)} transacciones")
-            # Categorizar transacciones
-            for transaction in agentic_transactions:
-                transaction["categoria"] = categorize_transaction_openai(transaction["descripcion"], api_key)
-            return {
-                "banco": banco,
-                "transacciones": agentic_transactions,
-                "texto_extraido": extracted_text,
-                "metodo": "extractor_agentico"
-            }
-    except Exception as e:
-        print(f"❌ Error con extractor agéntico: {e}")
-        print("🔄 Fallback a métodos tradicionales...")
-    
-    # Parser estándar
-    print("🏦 Usando parser estándar...")
-    standard_transactions = extract_standard_transactions(extracted_text)
-    
-    if standard_transactions:
-        print(f"📊 Parser estándar encontró {len(standard_transactions)} transacciones")
-        # Categorizar transacciones
-        for transaction in standard_transactions:
-            transaction["categoria"] = categorize_transaction_openai(transaction["descripcion"], api_key)
-        return {
-            "banco": banco,
-            "transacciones": standard_transactions,
-            "texto_extraido": extracted_text,
-            "metodo": "parser_estandar"
-        }
-    
-    # AI fallback simplificado (sin usar OpenAI para evitar errores de proxies)
-    print("🤖 Usando AI fallback simplificado...")
-    try:
-        # Intentar extracción básica con regex más agresivo
-        fallback_transactions = _fallback_extraction(extracted_text, banco, api_key)
-        if fallback_transactions.get("transacciones"):
-            print(f"📊 AI fallback encontró {len(fallback_transactions['transacciones'])} transacciones")
-            return fallback_transactions
-    except Exception as e:
-        print(f"❌ Error con AI fallback simplificado: {e}")
-    
-    print("❌ No se pudieron extraer transacciones con ningún método")
-    return {
-        "banco": banco,
-        "transacciones": [],
-        "texto_extraido": extracted_text,
-        "metodo": "ninguno"
-    }
-
-def _fallback_extraction(extracted_text: str, banco: str, api_key: str) -> Dict[str, Any]:
-    """
-    Fallback extraction using traditional methods.
-    """
-    # Try specific bank parsers first
-    if banco == "HSBC":
-        print("🏦 Usando parser específico para HSBC...")
-        transactions = extract_hsbc_transactions(extracted_text)
-        if transactions:
-            return {
-                "banco": banco,
-                "transacciones": transactions,
-                "texto_extraido": extracted_text
-            }
-    elif banco == "Santander":
-        print("🏦 Usando parser específico para Santander...")
-        transactions = extract_santander_transactions(extracted_text)
-        if transactions:
-            return {
-                "banco": banco,
-                "transacciones": transactions,
-                "texto_extraido": extracted_text
-            }
-    
-    # Try standard parser
-    print("🏦 Usando parser estándar...")
-    transactions = extract_standard_transactions(extracted_text)
-    
-    if transactions:
-        return {
-            "banco": banco,
-            "transacciones": transactions,
-            "texto_extraido": extracted_text
-        }
-    
-    # Final fallback: AI method with better token management
-    print("🤖 Usando AI fallback con mejor manejo de tokens...")
-    try:
-        from .auth import extract_transactions_with_ai
-        ai_transactions = extract_transactions_with_ai(extracted_text)
-        if ai_transactions:
-            print(f"🤖 AI mejorado encontró {len(ai_transactions)} transacciones")
-            return {
-                "banco": banco,
-                "transacciones": ai_transactions,
-                "texto_extraido": extracted_text
-            }
-    except Exception as e:
-        print(f"❌ Error con AI fallback mejorado: {e}")
-    
-    print("❌ No se pudieron extraer transacciones con ningún método")
-    return {
-        "banco": banco,
-        "transacciones": [],
-        "texto_extraido": extracted_text
-    }
-
-def _deduplicate_transactions(transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """
-    Elimina transacciones duplicadas basándose en fecha, descripción y monto.
-    """
-    seen = set()
-    unique_transactions = []
-    
-    for transaction in transactions:
-        # Crear una clave única para cada transacción
-        key = (
-            transaction.get('fecha_operacion', ''),
-            transaction.get('descripcion', ''),
-            transaction.get('monto', 0)
-        )
-        
-        if key not in seen:
-            seen.add(key)
-            unique_transactions.append(transaction)
-    
-    return unique_transactions
-
-# Función para categorizar transacciones usando OpenAI
-
-def categorize_transaction_openai(descripcion: str, api_key: str):
-    try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-        prompt = f"""
-    Categoriza la siguiente transacción bancaria en una sola palabra (por ejemplo: supermercado, transporte, restaurante, ingreso, etc.):\n\n"{descripcion}"\n\nCategoría: """
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=3,
-            temperature=0
-        )
-        categoria = response.choices[0].message.content.strip()
-        return categoria
-    except Exception as e:
-        print(f"Error en categorización OpenAI: {e}")
-        # Categorización básica basada en palabras clave
-        descripcion_lower = descripcion.lower()
-        if any(word in descripcion_lower for word in ['oxxo', 'seven', 'farmacia', 'gasolina', 'gas']):
-            return "conveniencia"
-        elif any(word in descripcion_lower for word in ['restaurante', 'pizza', 'hamburguesa', 'cafe']):
-            return "restaurante"
-        elif any(word in descripcion_lower for word in ['uber', 'taxi', 'transporte', 'metro']):
-            return "transporte"
-        elif any(word in descripcion_lower for word in ['pago', 'spei', 'transferencia', 'deposito']):
-            return "ingreso"
-        elif any(word in descripcion_lower for word in ['retiro', 'cajero', 'atm']):
-            return "retiro"
-        else:
-            return "otros"
-
-@app.post("/upload_pdf")
-def upload_pdf(file: UploadFile = File(...), current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """Sube un archivo PDF de estado de cuenta bancario y guarda las transacciones extraídas en la base de datos"""
-    if not file.filename.endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF")
-    file_location = os.path.join(UPLOAD_DIR, file.filename)
-    with open(file_location, "wb") as f:
-        f.write(file.file.read())
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="No se encontró la API key de OpenAI")
-    # Procesar el PDF y categorizar transacciones
-    result = process_bank_statement_pdf(file_location, api_key)
-    transactions = result.get("transacciones", [])
-    banco = result.get("banco", "Desconocido")
-    transacciones_guardadas = []
+def _save_extracted_transactions(db: Session, user_id: int, transactions: List[Any]) -> list:
+    """Valida las transacciones extraídas de un PDF y las agrega sin commit; omite las inválidas"""
+    validas = []
     
     for t in transactions:
         # Validar que t sea un diccionario válido
         if not isinstance(t, dict):
-            print(f"❌ Transacción no es un diccionario: {type(t)} - {t}")
+            logs.sampled(log, "persist.invalid", "Transacción no es un diccionario", level=logging.WARNING, type=type(t).__name__)
             continue
             
         # Validar campos requeridos con mejor manejo de errores
@@ -715,71 +457,216 @@ def upload_pdf(file: UploadFile = File(...), current_user: models.User = Depends
             
             # Validar que los campos no estén vacíos
             if not descripcion or not fecha_operacion:
-                print(f"❌ Transacción faltan campos requeridos: {t}")
+                logs.sampled(log, "persist.invalid", "Transacción sin campos requeridos", level=logging.WARNING, row=t)
                 continue
                 
             # Parsear fecha
-            parsed_date = _parse_date(fecha_operacion)
+            parsed_date = extraction.parse_date(fecha_operacion)
             if parsed_date is None:
-                print(f"❌ No se pudo parsear la fecha: {fecha_operacion}")
+                logs.sampled(log, "persist.invalid", "No se pudo parsear la fecha", level=logging.WARNING, value=fecha_operacion)
                 continue
                 
             # Mapear campos al esquema TransactionCreate
-            transaction_data = schemas.TransactionCreate(
+            validas.append(schemas.TransactionCreate(
                 description=descripcion,
                 amount=monto,
                 date=parsed_date,
                 category=categoria
-            )
-            db_transaction = crud.create_transaction(db=db, transaction=transaction_data, user_id=current_user.id)
-            transacciones_guardadas.append(db_transaction)
-            print(f"✅ Transacción guardada: {descripcion[:30]}... - ${monto}")
+            ))
             
         except Exception as e:
-            print(f"Error guardando transacción: {e}")
-            print(f"Transacción problemática: {t}")
-            continue  # Si alguna transacción falla, sigue con las demás
+            logs.sampled(log, "persist.error", "Error validando transacción: %s", e, level=logging.WARNING, row=t)
+            continue  # Si alguna transacción es inválida, sigue con las demás
+
+    # Todas juntas y sin commit: la subida completa se guarda (o se revierte) en un solo commit
+    transacciones_guardadas = crud.add_transactions(db, user_id, validas)
+    for db_transaction in transacciones_guardadas:
+        logs.sampled(log, "persist.row", "Transacción guardada", id=db_transaction.id,
+                     description=db_transaction.description[:30], amount=db_transaction.amount)
+    return transacciones_guardadas
+
+def _persist_upload(db: Session, upload: models.Upload, result: Dict[str, Any], llm_calls: List[dict]):
+    """Guarda lo extraído de una subida y la marca como procesada (sin commit); devuelve (banco, guardadas, anomalías)"""
+    transactions = result.get("transacciones", [])
+    banco = result.get("banco", "Desconocido")
+    with telemetry.span("persist", rows=len(transactions)) as persist_span:
+        transacciones_guardadas = _save_extracted_transactions(db, upload.user_id, transactions)
+        # Revisar solo las transacciones nuevas contra las ventanas guardadas
+        detected = anomalies.scan_new(db, upload.user_id)
+        usage.persist(db, upload.user_id, upload.id, banco, llm_calls)
+        upload.status, upload.bank, upload.processed_at = "processed", banco, func.now()
+        upload.transactions_saved = len(transacciones_guardadas)
+        persist_span.set(saved=len(transacciones_guardadas))
+    return banco, transacciones_guardadas, detected
+
+@app.post("/upload_pdf")
+def upload_pdf(file: UploadFile = File(...), current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Sube un archivo PDF de estado de cuenta bancario y guarda las transacciones extraídas en la base de datos"""
+    if not file.filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF")
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="No se encontró la API key de OpenAI")
+    # El archivo se guarda por contenido (un PDF idéntico no se vuelve a escribir) y la subida lo referencia
+    blob = blobs.store(db, file.file)
+    upload_id = uuid.uuid4().hex
+    upload = models.Upload(id=upload_id, user_id=current_user.id, blob_sha256=blob.sha256, filename=file.filename)
+    db.add(upload)
+    db.commit()
+    file_location = blobs.path_for(blob)
+    # Procesar el PDF y categorizar transacciones; cada etapa (y cada llamada a OpenAI) queda en la traza
+    try:
+        with telemetry.trace() as pipeline:
+            result = extraction.process_bank_statement_pdf(file_location, api_key)
+            banco, transacciones_guardadas, detected = _persist_upload(db, upload, result, pipeline.llm_calls)
+            db.commit()
+    except Exception:
+        db.rollback()
+        upload.status, upload.processed_at = "failed", func.now()
+        db.commit()
+        raise
     
     return {
         "filename": file.filename,
+        "upload_id": upload_id,
         "banco": banco,
         "transacciones_guardadas": [
             {"id": tr.id, "description": tr.description, "amount": tr.amount, "date": tr.date.isoformat(), "category": tr.category}
             for tr in transacciones_guardadas
         ],
+        "anomalias_detectadas": len(detected),
+        "tiempos": pipeline.summary(),
+        "uso_llm": usage.totals(pipeline.llm_calls),
         "message": f"Archivo subido y {len(transacciones_guardadas)} transacciones guardadas en la base de datos"
     }
 
+def _persist_batch_item(upload_id: str, outcome):
+    """Resultado de un archivo del lote (en el hilo del lote, con su propia sesión)"""
+    with SessionLocal() as db:
+        upload = db.get(models.Upload, upload_id)
+        if isinstance(outcome, BaseException):
+            log.warning("Falló un archivo del lote: %s", outcome, extra={"upload_id": upload_id, "file": upload.filename})
+            upload.status, upload.processed_at = "failed", func.now()
+        else:
+            # Las etapas y llamadas se midieron en el worker: se suman a las métricas de este proceso
+            telemetry.record_spans(outcome["tiempos"]["spans"])
+            usage.record_calls(outcome["llm_calls"])
+            _persist_upload(db, upload, outcome, outcome["llm_calls"])
+        db.commit()
+
+@app.post("/upload_batch", status_code=202)
+def upload_batch(
+    files: List[UploadFile] = File(...),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Sube varios PDFs o ZIPs de estados de cuenta; se procesan en paralelo y el avance se consulta en /upload_batch/{batch_id}"""
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise HTTPException(status_code=500, detail="No se encontró la API key de OpenAI")
+    batch_id = uuid.uuid4().hex
+    items, written = [], []
+    try:
+        for file in files:
+            for filename, pdf in batch_upload.iter_pdfs(file.filename, file.file):
+                if len(items) >= batch_upload.BATCH_MAX_FILES:
+                    raise batch_upload.BatchError(f"El lote pasa de {batch_upload.BATCH_MAX_FILES} archivos")
+                blob = blobs.store(db, pdf, written=written)
+                upload = models.Upload(id=uuid.uuid4().hex, user_id=current_user.id, blob_sha256=blob.sha256, filename=filename)
+                db.add_all([upload, models.UploadBatchItem(upload_id=upload.id, batch_id=batch_id, position=len(items))])
+                items.append((upload.id, blobs.path_for(blob)))
+    except Exception as e:
+        # El rollback se lleva las filas de blobs; los archivos que escribió este lote se borran aquí
+        db.rollback()
+        blobs.discard(written)
+        if isinstance(e, batch_upload.BatchError):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
+    if not items:
+        raise HTTPException(status_code=400, detail="No se encontraron PDFs en los archivos subidos")
+    db.commit()
+    batch_upload.submit(batch_id, current_user.id, items, api_key, _persist_batch_item)
+    return batch_upload.progress(db, current_user.id, batch_id)
+
+@app.get("/upload_batch/{batch_id}")
+def upload_batch_progress(batch_id: str, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Avance de un lote: archivos pendientes, procesados y fallidos, y transacciones guardadas"""
+    progress = batch_upload.progress(db, current_user.id, batch_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Lote no encontrado")
+    return progress
+
+@app.post("/import_statement")
+def import_statement(
+    file: UploadFile = File(...),
+    bank: str = Form(None),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Importa un CSV u OFX exportado por el banco (sin OCR ni AI), insertando en lotes"""
+    formato = importers.detect_format(file.filename)
+    if formato is None:
+        raise HTTPException(status_code=400, detail="Solo se permiten archivos CSV u OFX")
+    if bank is not None and bank not in importers.BANK_PROFILES:
+        raise HTTPException(status_code=400, detail=f"Banco no soportado. Opciones: {', '.join(importers.BANK_PROFILES)}")
+
+    # Detectar el banco con la cabecera del archivo (mismos nombres que detect_bank)
+    if bank is None:
+        sample = file.file.read(8192).decode("utf-8", errors="ignore")
+        file.file.seek(0)
+        bank = extraction.detect_bank(importers.ofx_bank_hint(sample) if formato == "ofx" else sample)
+
+    stats = importers.ImportStats()
+    if formato == "csv":
+        rows = importers.iter_csv_transactions(file.file, importers.get_profile(bank), stats)
+    else:
+        rows = importers.iter_ofx_transactions(file.file, stats)
+    try:
+        total = crud.bulk_create_transactions(db, current_user.id, rows)
+    except importers.ImportFormatError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    detected = anomalies.scan_new(db, current_user.id)
+    db.commit()
+
+    return {
+        "filename": file.filename,
+        "banco": bank,
+        "formato": formato,
+        "transacciones_importadas": total,
+        "filas_omitidas": stats.rows_skipped,
+        "ejemplos_omitidos": stats.skipped_examples,
+        "anomalias_detectadas": len(detected),
+        "message": f"Archivo importado: {total} transacciones guardadas en la base de datos"
+    }
+
 @app.post("/test_upload_pdf")
-def test_upload_pdf(file: UploadFile = File(...)):
+def test_upload_pdf(file: UploadFile = File(...), db: Session = Depends(get_db)):
     """Endpoint de prueba para subir PDF sin autenticación - solo para testing"""
     if not file.filename.endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Solo se permiten archivos PDF")
     
-    file_location = os.path.join(UPLOAD_DIR, f"test_{file.filename}")
-    with open(file_location, "wb") as f:
-        f.write(file.file.read())
-    
     api_key = os.getenv("OPENAI_API_KEY")
     if not api_key:
         raise HTTPException(status_code=500, detail="No se encontró la API key de OpenAI")
     
+    # Sin subida que lo referencie: el blob queda con refcount 0 y lo recoge el GC
+    file_location = blobs.path_for(blobs.store(db, file.file, reference=False))
+    db.commit()
+    
     # Procesar el PDF y categorizar transacciones
-    transactions = process_bank_statement_pdf(file_location, api_key)
+    with telemetry.trace() as pipeline:
+        transactions = extraction.process_bank_statement_pdf(file_location, api_key)
     
     # Detectar banco del texto extraído
     extracted_text = ""
     try:
-        with pdfplumber.open(file_location) as pdf:
-            for page in pdf.pages:
-                text = page.extract_text()
-                if text:
-                    extracted_text += text + "\n"
+        extracted_text = extraction.extract_plain_text(file_location)
     except Exception as e:
-        print(f"Error extrayendo texto para detección de banco: {e}")
+        log.warning("Error extrayendo texto para detección de banco: %s", e)
     
     # Detectar banco
-    banco = detect_bank(extracted_text)
+    banco = extraction.detect_bank(extracted_text)
     
     # Simular transacciones guardadas (sin guardar en BD)
     transacciones_simuladas = []
@@ -797,493 +684,105 @@ def test_upload_pdf(file: UploadFile = File(...)):
         "banco": banco,
         "transacciones_extraidas": transacciones_simuladas,
         "texto_extraido": extracted_text[:500] + "..." if len(extracted_text) > 500 else extracted_text,
+        "tiempos": pipeline.summary(),
+        "uso_llm": usage.totals(pipeline.llm_calls),
         "message": f"Archivo procesado exitosamente. {len(transacciones_simuladas)} transacciones extraídas"
     }
 
+@app.get("/metrics")
+def metrics():
+    """Histogramas por etapa del pipeline de PDFs en formato de texto de Prometheus"""
+    return Response(content=telemetry.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
+@app.get("/usage/uploads")
+def usage_by_upload(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Tokens, latencia y costo de OpenAI por estado de cuenta subido"""
+    return [usage.serialize(row) for row in db.execute(usage.uploads_statement(current_user.id, limit))]
 
-def _parse_date(date_str: str):
-    # Convierte '04-Jun-2025' o '04-ABR-2025' a objeto date
-    if not date_str or not isinstance(date_str, str):
-        return None
-        
-    date_str = date_str.strip()
-    
-    try:
-        # Primero intentar con el formato original
-        return datetime.strptime(date_str, "%d-%b-%Y").date()
-    except ValueError:
-        # Si falla, intentar con formato en mayúsculas (como ABR, ENE, FEB, etc.)
-        # Mapear abreviaciones en mayúsculas a formato estándar
-        month_mapping = {
-            'ENE': 'Jan', 'FEB': 'Feb', 'MAR': 'Mar', 'ABR': 'Apr',
-            'MAY': 'May', 'JUN': 'Jun', 'JUL': 'Jul', 'AGO': 'Aug',
-            'SEP': 'Sep', 'OCT': 'Oct', 'NOV': 'Nov', 'DIC': 'Dec'
-        }
-        
-        # Buscar y reemplazar meses en español
-        for esp_month, eng_month in month_mapping.items():
-            if esp_month in date_str.upper():
-                date_str_fixed = date_str.upper().replace(esp_month, eng_month)
-                try:
-                    return datetime.strptime(date_str_fixed, "%d-%b-%Y").date()
-                except ValueError:
-                    continue
-        
-        # Si aún falla, intentar con formato numérico DD-MM-YYYY
-        try:
-            return datetime.strptime(date_str, "%d-%m-%Y").date()
-        except ValueError:
-            # Último intento: formato DD/MM/YYYY
-            try:
-                return datetime.strptime(date_str, "%d/%m/%Y").date()
-            except ValueError:
-                # Si todo falla, intentar con formato YYYY-MM-DD
-                try:
-                    return datetime.strptime(date_str, "%Y-%m-%d").date()
-                except ValueError:
-                    print(f"❌ No se pudo parsear la fecha: {date_str}")
-                    return None
-
-def detect_bank(text: str) -> str:
-    """
-    Detecta el banco a partir del texto extraído, priorizando coincidencias exactas y robustas.
-    """
-    text_upper = text.upper()
-    # Prioridad: Santander > BBVA > HSBC > Banorte > Banamex > Banregio
-    if "SANTANDER" in text_upper:
-        return "Santander"
-    elif "BBVA" in text_upper:
-        return "BBVA"
-    elif "HSBC" in text_upper:
-        return "HSBC"
-    elif "BANORTE" in text_upper:
-        return "Banorte"
-    elif "BANAMEX" in text_upper or "CITIBANAMEX" in text_upper:
-        return "Banamex"
-    elif "BANREGIO" in text_upper:
-        return "Banregio"
-    else:
-        return "Desconocido"
+@app.get("/usage/summary")
+def usage_summary(
+    group_by: str = Query("bank", pattern="^(bank|stage|model|call)$"),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Costo de OpenAI del usuario agrupado por banco, etapa del pipeline, modelo o función"""
+    return [usage.serialize(row) for row in db.execute(usage.summary_statement(group_by, current_user.id))]
 
-def extract_standard_transactions(text: str) -> List[Dict[str, Any]]:
-    """
-    Extract transactions using standard patterns.
-    """
-    transactions = []
-    lines = text.split("\n")
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        # Patrones mejorados para diferentes formatos de transacción
-        patterns = [
-            # Dos fechas, descripción, signo, monto con $
-            r"(\d{2}-[A-Za-z]{3}-\d{4})\s+(\d{2}-[A-Za-z]{3}-\d{4})?\s+(.+?)\s+([+-])\s*\$([\d,]+\.\d{2})",
-            # Una fecha, descripción, signo, monto con $
-            r"(\d{2}-[A-Za-z]{3}-\d{4})\s+(.+?)\s+([+-])\s*\$([\d,]+\.\d{2})",
-            # Una fecha, descripción, monto con $ (sin signo)
-            r"(\d{2}-[A-Za-z]{3}-\d{4})\s+(.+?)\s+\$([\d,]+\.\d{2})",
-            # Una fecha, descripción, signo, monto sin $
-            r"(\d{2}-[A-Za-z]{3}-\d{4})\s+(.+?)\s+([+-])\s*([\d,]+\.\d{2})",
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, line)
-            if match:
-                # Extraer los grupos según el patrón
-                if len(match.groups()) == 5:
-                    fecha_operacion = match.group(1)
-                    fecha_cargo = match.group(2) if match.group(2) else match.group(1)
-                    descripcion = match.group(3)
-                    signo = match.group(4)
-                    monto = match.group(5)
-                elif len(match.groups()) == 4:
-                    fecha_operacion = match.group(1)
-                    fecha_cargo = match.group(1)
-                    descripcion = match.group(2)
-                    signo = match.group(3)
-                    monto = match.group(4)
-                elif len(match.groups()) == 3:
-                    fecha_operacion = match.group(1)
-                    fecha_cargo = match.group(1)
-                    descripcion = match.group(2)
-                    signo = '+'
-                    monto = match.group(3)
-                else:
-                    continue
-                # Normalizar monto
-                monto = float(monto.replace(',', ''))
-                if signo == '-':
-                    monto = -monto
-                
-                # Determinar tipo basado en el signo del monto
-                tipo = "abono" if monto > 0 else "cargo"
-                
-                transactions.append({
-                    "fecha_operacion": fecha_operacion,
-                    "fecha_cargo": fecha_cargo,
-                    "descripcion": descripcion.strip(),
-                    "monto": monto,
-                    "tipo": tipo,
-                    "categoria": "sin_categoria"
-                })
-                break
-    return transactions
+@app.get("/admin/usage/summary")
+def usage_summary_all_users(
+    group_by: str = Query("bank", pattern="^(bank|stage|model|call)$"),
+    admin: models.User = Depends(require_admin),
+    db: Session = Depends(get_db)
+):
+    """Como /usage/summary pero de todos los usuarios"""
+    return [usage.serialize(row) for row in db.execute(usage.summary_statement(group_by))]
 
-def extract_hsbc_transactions(extracted_text: str) -> List[dict]:
-    """
-    Extrae transacciones de HSBC de líneas OCR, ultra-tolerante a errores de OCR.
-    """
-    import re
-    transactions = []
-    
-    # Validar que el texto no sea None o vacío
-    if not extracted_text or not isinstance(extracted_text, str):
-        print("❌ Texto extraído es None o no es string")
-        return transactions
-    
-    lines = extracted_text.split('\n')
-    
-    print("🔍 Buscando transacciones en texto HSBC...")
-    
-    # Limpiar y normalizar el texto
-    cleaned_lines = []
-    for line in lines:
-        # Validar que la línea no sea None
-        if line is None:
-            continue
-            
-        # Normalizar caracteres comunes de OCR
-        cleaned = line.strip()
-        if cleaned:  # Solo agregar líneas no vacías
-            cleaned = cleaned.replace('O', '0').replace('l', '1').replace('I', '1')
-            cleaned = cleaned.replace('|', '').replace('[', '').replace(']', '')
-            cleaned = cleaned.replace('S', '5').replace('s', '5')
-            cleaned_lines.append(cleaned)
-    
-    # Estrategia 1: Buscar patrones de transacciones HSBC específicos
-    # Patrón: fecha + descripción + monto (más flexible)
-    patterns = [
-        # Patrón original HSBC: dos fechas + descripción + monto
-        r"(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})\s+(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})\s+(.+?)\s*([+-])?\$?([\d,\.]+)",
-        # Patrón con una sola fecha + descripción + monto
-        r"(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})\s+(.+?)\s*([+-])?\$?([\d,\.]+)",
-        # Patrón más flexible: cualquier línea con fecha y monto
-        r"(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4}).*?([+-])?\$?([\d,\.]+)",
-        # Buscar montos con signo en cualquier parte de la línea
-        r".*?([+-])\$?([\d,\.]+).*?(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})",
+@app.get("/uploads")
+def list_uploads(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Estados de cuenta subidos por el usuario, del más reciente al más viejo (purged: el PDF ya se borró por retención)"""
+    rows = db.execute(
+        select(models.Upload, models.Blob.size)
+        .outerjoin(models.Blob, models.Upload.blob_sha256 == models.Blob.sha256)
+        .where(models.Upload.user_id == current_user.id)
+        .order_by(models.Upload.created_at.desc(), models.Upload.id)
+        .limit(limit)
+    ).all()
+    return [
+        {
+            "id": upload.id, "filename": upload.filename, "size": size, "sha256": upload.blob_sha256,
+            "status": upload.status, "bank": upload.bank, "transactions_saved": upload.transactions_saved,
+            "created_at": upload.created_at, "processed_at": upload.processed_at, "purged": size is None,
+        }
+        for upload, size in rows
     ]
-    
-    for pattern in patterns:
-        for i, line in enumerate(cleaned_lines):
-            match = re.search(pattern, line)
-            if match:
-                try:
-                    if len(match.groups()) >= 4:  # Patrón con dos fechas
-                        fecha_operacion = match.group(1).replace('O', '0') if match.group(1) else None
-                        fecha_cargo = match.group(2).replace('O', '0') if match.group(2) else None
-                        descripcion = match.group(3).strip() if match.group(3) else ""
-                        signo = match.group(4) or '+'
-                        monto_str = match.group(5).replace(',', '').replace('O', '0') if match.group(5) else "0"
-                    elif len(match.groups()) == 4:  # Patrón con una fecha
-                        fecha_operacion = match.group(1).replace('O', '0') if match.group(1) else None
-                        fecha_cargo = fecha_operacion
-                        descripcion = match.group(2).strip() if match.group(2) else ""
-                        signo = match.group(3) or '+'
-                        monto_str = match.group(4).replace(',', '').replace('O', '0') if match.group(4) else "0"
-                    elif len(match.groups()) == 3:  # Patrón flexible
-                        if 'fecha' in pattern:
-                            fecha_operacion = match.group(1).replace('O', '0') if match.group(1) else None
-                            fecha_cargo = fecha_operacion
-                            signo = match.group(2) or '+'
-                            monto_str = match.group(3).replace(',', '').replace('O', '0') if match.group(3) else "0"
-                            descripcion = line[:match.start()].strip() if line else ""
-                        else:  # Monto primero
-                            signo = match.group(1) if match.group(1) else '+'
-                            monto_str = match.group(2).replace(',', '').replace('O', '0') if match.group(2) else "0"
-                            fecha_operacion = match.group(3).replace('O', '0') if match.group(3) else None
-                            fecha_cargo = fecha_operacion
-                            descripcion = line[:match.start()].strip() if line else ""
-                    
-                    # Validar que todos los campos necesarios estén presentes
-                    if not fecha_operacion or not monto_str or monto_str == "0":
-                        continue
-                        
-                    try:
-                        monto = float(monto_str)
-                    except ValueError:
-                        continue
-                        
-                    tipo = "abono" if signo == '+' else "cargo"
-                    if tipo == "cargo":
-                        monto = -monto
-                    
-                    # Validar que la descripción no esté vacía
-                    if descripcion and len(descripcion.strip()) > 2:
-                        transactions.append({
-                            "fecha_operacion": fecha_operacion,
-                            "fecha_cargo": fecha_cargo,
-                            "descripcion": descripcion,
-                            "monto": monto,
-                            "tipo": tipo,
-                            "categoria": "Sin categorizar"
-                        })
-                        print(f"✅ Transacción encontrada: {fecha_operacion} - {descripcion[:40]} - {signo}${monto_str}")
-                except Exception as e:
-                    print(f"❌ Error procesando línea: {line} - {e}")
-                    continue
-    
-    # Estrategia 2: Buscar líneas que contengan montos y fechas por separado
-    if not transactions:
-        print("🔍 Estrategia 2: Buscando montos y fechas por separado...")
-        for i, line in enumerate(cleaned_lines):
-            # Buscar montos con signo - más específico para evitar falsos positivos
-            monto_match = re.search(r'([+-])\$?([\d,]+\.\d{2})', line)  # Solo montos con decimales
-            if monto_match:
-                signo = monto_match.group(1)
-                monto_str = monto_match.group(2).replace(',', '').replace('O', '0')
-                
-                # Validar que el monto sea razonable (entre 1 y 1,000,000)
-                try:
-                    monto = float(monto_str)
-                    if monto < 1 or monto > 1000000:
-                        continue  # Saltar montos irrazonables
-                except:
-                    continue
-                
-                # Buscar fecha en la misma línea o líneas cercanas
-                fecha_encontrada = None
-                descripcion = line.replace(monto_match.group(0), '').strip()
-                
-                # Buscar fecha en la línea actual
-                fecha_match = re.search(r'(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})', line)
-                if fecha_match:
-                    fecha_encontrada = fecha_match.group(1).replace('O', '0')
-                    descripcion = descripcion.replace(fecha_match.group(0), '').strip()
-                
-                # Si no hay fecha en esta línea, buscar en líneas anteriores
-                if not fecha_encontrada and i > 0:
-                    for j in range(max(0, i-3), i):
-                        fecha_match = re.search(r'(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})', cleaned_lines[j])
-                        if fecha_match:
-                            fecha_encontrada = fecha_match.group(1).replace('O', '0')
-                            break
-                
-                try:
-                    tipo = "abono" if signo == '+' else "cargo"
-                    if tipo == "cargo":
-                        monto = -monto
-                    
-                    # Validaciones adicionales
-                    if (fecha_encontrada and 
-                        descripcion and 
-                        len(descripcion.strip()) > 2 and
-                        not descripcion.strip().isdigit() and  # No solo números
-                        not re.match(r'^\d+$', descripcion.strip())):  # No solo dígitos
-                        
-                        transactions.append({
-                            "fecha_operacion": fecha_encontrada,
-                            "fecha_cargo": fecha_encontrada,
-                            "descripcion": descripcion,
-                            "monto": monto,
-                            "tipo": tipo,
-                            "categoria": "Sin categorizar"
-                        })
-                        print(f"✅ Transacción encontrada (estrategia 2): {fecha_encontrada} - {descripcion[:40]} - {signo}${monto_str}")
-                except Exception as e:
-                    print(f"❌ Error procesando monto: {line} - {e}")
-                    continue
-    
-    # Estrategia 3: Buscar patrones específicos de HSBC en el texto
-    if not transactions:
-        print("🔍 Estrategia 3: Buscando patrones específicos de HSBC...")
-        
-        # Buscar secciones que contengan transacciones
-        text_lower = extracted_text.lower()
-        
-        # Buscar en secciones específicas del estado de cuenta
-        sections = [
-            "cargos, abonos y compras regulares",
-            "desglose de movimientos", 
-            "compras y cargos diferidos",
-            "distribución de tu saldo"
-        ]
-        
-        for section in sections:
-            if section in text_lower:
-                print(f"📋 Encontrada sección: {section}")
-                # Buscar líneas después de esta sección que contengan montos
-                lines = extracted_text.split('\n')
-                section_found = False
-                for i, line in enumerate(lines):
-                    if section in line.lower():
-                        section_found = True
-                        print(f"📍 Sección encontrada en línea {i+1}")
-                        # Buscar las siguientes líneas por montos
-                        for j in range(i+1, min(i+20, len(lines))):
-                            next_line = lines[j].strip()
-                            if next_line and len(next_line) > 5:
-                                # Buscar montos con decimales
-                                monto_match = re.search(r'([+-])\$?([\d,]+\.\d{2})', next_line)
-                                if monto_match:
-                                    print(f"💰 Monto encontrado en línea {j+1}: {next_line}")
-                                    # Intentar extraer fecha y descripción
-                                    fecha_match = re.search(r'(\d{2}[-/\s][A-Za-z0-9]{3}[-/\s]\d{4})', next_line)
-                                    if fecha_match:
-                                        fecha = fecha_match.group(1).replace('O', '0')
-                                        descripcion = next_line.replace(monto_match.group(0), '').replace(fecha_match.group(0), '').strip()
-                                        if descripcion and len(descripcion) > 2:
-                                            try:
-                                                monto = float(monto_match.group(2).replace(',', ''))
-                                                if 1 <= monto <= 1000000:
-                                                    signo = monto_match.group(1)
-                                                    tipo = "abono" if signo == '+' else "cargo"
-                                                    if tipo == "cargo":
-                                                        monto = -monto
-                                                    
-                                                    transactions.append({
-                                                        "fecha_operacion": fecha,
-                                                        "fecha_cargo": fecha,
-                                                        "descripcion": descripcion,
-                                                        "monto": monto,
-                                                        "tipo": tipo,
-                                                        "categoria": "Sin categorizar"
-                                                    })
-                                                    print(f"✅ Transacción encontrada (estrategia 3): {fecha} - {descripcion[:40]} - {signo}${monto_match.group(2)}")
-                                            except Exception as e:
-                                                print(f"❌ Error procesando línea {j+1}: {e}")
-                break
-    
-    print(f"📊 Total de transacciones HSBC encontradas: {len(transactions)}")
-    return transactions
-
-def extract_santander_transactions(extracted_text: str) -> list:
-    """
-    Extrae transacciones de Santander del texto OCR.
-    Limpia descripciones, normaliza montos y fechas, y filtra duplicados y líneas basura.
-    """
-    import re
-    from datetime import datetime
-    transactions = []
-    seen = set()
-    if not extracted_text or not isinstance(extracted_text, str):
-        print("❌ Texto extraído es None o no es string")
-        return transactions
-    lines = extracted_text.split('\n')
-    print("🔍 Buscando transacciones en texto Santander (limpieza avanzada)...")
-    # Patrón: fecha, folio, descripción, monto
-    pattern = re.compile(r"(\d{2}-[A-Z]{3}-\d{4})[^\d]*(.+?)([\d,]+\.\d{2})")
-    for line in lines:
-        line = line.strip()
-        if not line or len(line) < 20:
-            continue
-        match = pattern.search(line)
-        if match:
-            fecha_raw, desc_raw, monto_raw = match.groups()
-            # Limpiar fecha
-            try:
-                fecha = fecha_raw.upper()
-                # Normalizar mes español a inglés si aplica
-                meses = {'ENE':'Jan','FEB':'Feb','MAR':'Mar','ABR':'Apr','MAY':'May','JUN':'Jun','JUL':'Jul','AGO':'Aug','SEP':'Sep','OCT':'Oct','NOV':'Nov','DIC':'Dec'}
-                for esp, eng in meses.items():
-                    if esp in fecha:
-                        fecha = fecha.replace(esp, eng)
-                fecha_dt = datetime.strptime(fecha, "%d-%b-%Y").date()
-            except Exception:
-                continue
-            # Limpiar descripción
-            desc = re.sub(r"[\[\]\|]+", " ", desc_raw)
-            desc = re.sub(r"\s+", " ", desc).strip()
-            # Limpiar monto
-            monto = float(monto_raw.replace(",", ""))
-            # Heurística: si la palabra 'abono' o 'deposito' está en la descripción, es abono
-            tipo = 'abono' if re.search(r"abono|deposito|ingreso", desc, re.I) else 'cargo'
-            # Firmar monto según tipo
-            monto = abs(monto) if tipo == 'abono' else -abs(monto)
-            # Evitar duplicados
-            key = (fecha_dt, desc, monto)
-            if key in seen:
-                continue
-            seen.add(key)
-            transactions.append({
-                'fecha_operacion': fecha_raw,  # Mantener formato original "01-ABR-2025"
-                'fecha_cargo': fecha_raw,      # Mantener formato original "01-ABR-2025"
-                'descripcion': desc,
-                'monto': monto,
-                'tipo': tipo,
-                'categoria': 'Sin categorizar'
-            })
-    print(f"📊 Total de transacciones Santander limpias encontradas: {len(transactions)}")
-    return transactions
-
-def _process_chunk_with_ai(chunk: str, api_key: str) -> List[Dict[str, Any]]:
-    """
-    Procesa un chunk de texto con AI.
-    """
-    try:
-        # Limpiar cualquier configuración global de OpenAI
-        import openai
-        if hasattr(openai, 'api_key'):
-            delattr(openai, 'api_key')
-        if hasattr(openai, '_client'):
-            delattr(openai, '_client')
-        
-        # Configurar OpenAI sin proxies usando el cliente
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-        
-        prompt = f"""
-        Extrae todas las transacciones bancarias del siguiente texto. 
-        Para cada transacción, identifica:
-        - fecha_operacion: fecha de la transacción (formato DD-MMM-YYYY)
-        - descripcion: descripción de la transacción
-        - monto: monto de la transacción (número con decimales)
-        - categoria: categoría de la transacción (supermercado, transporte, restaurante, etc.)
 
-        Responde SOLO con un JSON válido en este formato:
-        [
-            {{
-                "fecha_operacion": "DD-MMM-YYYY",
-                "descripcion": "descripción",
-                "monto": 123.45,
-                "categoria": "categoría"
-            }}
-        ]
-
-        Texto a analizar:
-        {chunk}
-        """
-        
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Eres un experto en extracción de transacciones bancarias. Responde SOLO con JSON válido."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,
-            max_tokens=2000
-        )
-        
-        content = response.choices[0].message.content.strip()
-        
-        # Intentar parsear JSON
-        try:
-            import json
-            transactions = json.loads(content)
-            if isinstance(transactions, list):
-                return transactions
-            else:
-                print(f"❌ Respuesta no es una lista: {type(transactions)}")
-                return []
-        except json.JSONDecodeError as e:
-            print(f"❌ Error parseando JSON: {e}")
-            print(f"🔎 Respuesta cruda: {content}")
-            return []
-            
-    except Exception as e:
-        print(f"❌ Error procesando chunk: {e}")
-        return []
+@app.delete("/uploads/{upload_id}")
+def delete_upload(upload_id: str, current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+    """Borra una subida (las transacciones guardadas se conservan); el PDF queda para el GC si nadie más lo usa"""
+    upload = db.get(models.Upload, upload_id)
+    if upload is None or upload.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Subida no encontrada")
+    if upload.status == "received":
+        raise HTTPException(status_code=409, detail="La subida todavía se está procesando")
+    db.execute(delete(models.UploadBatchItem).where(models.UploadBatchItem.upload_id == upload_id))
+    db.delete(upload)
+    blobs.release(db, upload.blob_sha256)
+    db.commit()
+    return {"message": "Upload deleted successfully"}
+
+@app.get("/admin/storage")
+def storage_report(admin: models.User = Depends(require_admin), db: Session = Depends(get_db)):
+    """Uso de disco del almacén de archivos: subidas, bytes guardados, deduplicación y blobs sin referencias"""
+    return blobs.storage_report(db)
+
+@app.post("/admin/storage/gc")
+def run_upload_gc(dry_run: bool = Query(False), admin: models.User = Depends(require_admin)):
+    """Corre ahora una pasada de retención (o solo la planifica con dry_run); 409 si ya hay una en curso"""
+    summary = retention.run_once(dry_run=dry_run)
+    if summary is None:
+        raise HTTPException(status_code=409, detail="Ya hay una pasada de GC en curso")
+    return {"dry_run": dry_run, "reclaimed": summary}
+
+@app.get("/admin/profiles")
+def list_profiles(admin: models.User = Depends(require_admin)):
+    """Perfiles de requests guardados, del más reciente al más viejo"""
+    return profiling.list_profiles()
+
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, admin: models.User = Depends(require_admin)):
+    """Pilas colapsadas del perfil (formato de flamegraph.pl / speedscope)"""
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=f"{profile_id}.folded")
 
 # Ruta de prueba
 @app.get("/")
@@ -0,0 +1,32 @@
+"""
+Paso explícito de migración: crea tablas, índices, el índice FTS y los backfills.
+
+Antes se hacía al importar app.main, así que cada worker de uvicorn (y cada reinicio con
+--reload) repetía el trabajo y abría escrituras al arrancar. Ahora se ejecuta una vez por
+despliegue, antes de levantar la API:
+
+    python -m app.migrate
+
+Todos los pasos son idempotentes.
+"""
+import time
+
+from sqlalchemy.engine import Engine
+
+from . import models, recurring, search
+from .database import engine as default_engine
+
+
+def run(engine: Engine = default_engine):
+    models.Base.metadata.create_all(bind=engine)
+    models.ensure_columns(engine)
+    models.ensure_indexes(engine)
+    search.ensure_search_index(engine)
+    recurring.ensure_merchant_keys(engine)
+    recurring.ensure_backfill(engine)
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    run()
+    print(f"✅ Esquema al día en {default_engine.url.render_as_string(hide_password=True)} ({time.perf_counter() - start:.2f}s)")
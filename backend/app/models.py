@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, inspect, Integer, String, Float, Date, ForeignKey, DateTime, Index, Boolean, UniqueConstraint, LargeBinary
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -15,6 +17,11 @@ class User(Base):
     # Relación con transacciones
     transactions = relationship("Transaction", back_populates="user")
 
+def _merchant_key_default(context):
+    # Inserciones Core (executemany de crud.bulk_create_transactions): se calcula por fila
+    from .recurring import merchant_key
+    return merchant_key(context.get_current_parameters()["description"])
+
 class Transaction(Base):
     __tablename__ = "transactions"
     
@@ -25,6 +32,153 @@ class Transaction(Base):
     category = Column(String, nullable=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # recurring.merchant_key(description): las series recurrentes leen solo su comercio
+    merchant_key = Column(String, nullable=True, default=_merchant_key_default)
     
     # Relación con usuario
     user = relationship("User", back_populates="transactions")
+
+    @validates("description")
+    def _set_merchant_key(self, key, description):
+        from .recurring import merchant_key
+        self.merchant_key = merchant_key(description)
+        return description
+
+# Índices compuestos para /transactions/filter: todas las consultas empiezan por user_id
+Index("ix_transactions_user_date", Transaction.user_id, Transaction.date)
+Index("ix_transactions_user_amount", Transaction.user_id, Transaction.amount)
+Index("ix_transactions_user_category_date", Transaction.user_id, Transaction.category, Transaction.date)
+# Búsqueda por prefijo sin distinguir mayúsculas (rango sobre lower(description))
+Index("ix_transactions_user_description_lower", Transaction.user_id, func.lower(Transaction.description))
+Index("ix_transactions_user_merchant_key", Transaction.user_id, Transaction.merchant_key)
+
+class UserDataVersion(Base):
+    """Versión de los datos de un usuario; se incrementa en cada escritura (base de los ETags)"""
+    __tablename__ = "user_data_versions"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class RecurringSeries(Base):
+    """Estado incremental de los cargos/ingresos recurrentes por comercio (ver app/recurring.py)"""
+    __tablename__ = "recurring_series"
+    __table_args__ = (UniqueConstraint("user_id", "merchant_key", "kind", name="uq_recurring_series_user_merchant_kind"),)
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    merchant_key = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # "expense" o "income"
+    description = Column(String, nullable=False)  # última descripción vista
+    occurrences = Column(Integer, nullable=False, default=0)
+    first_date = Column(Date, nullable=False)
+    last_date = Column(Date, nullable=False)
+    # Media y suma de cuadrados de desviaciones (Welford) de intervalos en días y de montos
+    interval_mean = Column(Float, nullable=False, default=0.0)
+    interval_m2 = Column(Float, nullable=False, default=0.0)
+    amount_mean = Column(Float, nullable=False, default=0.0)
+    amount_m2 = Column(Float, nullable=False, default=0.0)
+    cadence = Column(String, nullable=True)
+    is_recurring = Column(Boolean, nullable=False, default=False)
+    confidence = Column(Float, nullable=False, default=0.0)
+    next_date = Column(Date, nullable=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class AnomalyState(Base):
+    """Ventana móvil de gastos recientes por categoría ("*" = todas) para app/anomalies.py"""
+    __tablename__ = "anomaly_state"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    category = Column(String, primary_key=True)  # "" = sin categoría
+    window = Column(LargeBinary, nullable=False)  # int64 en centavos, del más viejo al más nuevo
+    last_transaction_id = Column(Integer, nullable=False, default=0)
+
+class Anomaly(Base):
+    """Transacción marcada como inusual"""
+    __tablename__ = "anomalies"
+    
+    id = Column(Integer, primary_key=True)
+    transaction_id = Column(Integer, ForeignKey("transactions.id", ondelete="CASCADE"), nullable=False, unique=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    kind = Column(String, nullable=False)  # "category_spike" o "new_merchant"
+    score = Column(Float, nullable=False)
+    expected = Column(Float, nullable=True)  # mediana de referencia (pesos, positivo)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Blob(Base):
+    """Archivo guardado una sola vez por contenido (sha256) en app/blobs.py"""
+    __tablename__ = "blobs"
+    
+    sha256 = Column(String, primary_key=True)
+    kind = Column(String, nullable=False, default="pdf")  # extensión del archivo
+    size = Column(Integer, nullable=False)  # bytes subidos
+    stored_size = Column(Integer, nullable=False)  # bytes en disco
+    refcount = Column(Integer, nullable=False, default=0)  # subidas que lo usan
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Upload(Base):
+    """Una subida de estado de cuenta: quién, con qué nombre y qué blob, y cómo terminó el proceso"""
+    __tablename__ = "uploads"
+    
+    id = Column(String, primary_key=True)  # uuid hex; es el upload_id de llm_usage
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # Sin FK: la retención (app/retention.py) borra el blob y deja la subida; ver blob_tombstones
+    blob_sha256 = Column(String, nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="received")  # received, processed, failed
+    bank = Column(String, nullable=True)
+    transactions_saved = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+
+class UploadBatchItem(Base):
+    """Subida que llegó en un lote de /upload_batch; el avance del lote sale del estado de cada subida"""
+    __tablename__ = "upload_batch_items"
+    
+    upload_id = Column(String, primary_key=True)
+    batch_id = Column(String, nullable=False, index=True)
+    position = Column(Integer, nullable=False)  # orden en que llegaron los archivos
+
+class BlobTombstone(Base):
+    """Archivo borrado por la retención de app/retention.py: qué era, cuánto ocupaba y por qué se borró"""
+    __tablename__ = "blob_tombstones"
+    
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String, nullable=True, index=True)  # None en archivos sueltos de antes del almacén por contenido
+    path = Column(String, nullable=False)
+    kind = Column(String, nullable=False)  # "pdf" o "legacy"
+    stored_size = Column(Integer, nullable=False)
+    reason = Column(String, nullable=False)  # orphan, age, size, legacy
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class LlmUsage(Base):
+    """Una llamada a OpenAI con sus tokens, latencia y costo, por subida y usuario"""
+    __tablename__ = "llm_usage"
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    upload_id = Column(String, nullable=True, index=True)  # una subida de estado de cuenta
+    bank = Column(String, nullable=True)
+    stage = Column(String, nullable=False)  # etapa del pipeline (llm_chunk, categorize)
+    call = Column(String, nullable=False)  # función que hizo la llamada
+    model = Column(String, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms = Column(Float, nullable=False, default=0.0)
+    cache_hit = Column(Boolean, nullable=False, default=False)  # OpenAI reutilizó parte del prompt (cached_tokens > 0)
+    cost_usd = Column(Float, nullable=False, default=0.0)  # con los precios vigentes al registrar
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+def ensure_columns(engine: Engine):
+    """Agrega en bases existentes las columnas nullable declaradas después de crear la tabla"""
+    with engine.begin() as conn:
+        existing = {column["name"] for column in inspect(conn).get_columns(Transaction.__tablename__)}
+        if "merchant_key" not in existing:
+            conn.exec_driver_sql("ALTER TABLE transactions ADD COLUMN merchant_key VARCHAR")
+
+def ensure_indexes(engine: Engine):
+    """Crea en bases existentes los índices declarados después de crear la tabla (create_all no lo hace)"""
+    # IF NOT EXISTS en lugar de checkfirst: la reflexión de SQLite no ve los índices de expresiones
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
@@ -0,0 +1,191 @@
+"""
+Perfilado bajo demanda de un request puntual (p. ej. el dashboard o la subida lenta de un usuario).
+
+Un administrador (email en ADMIN_EMAILS) agrega el header `X-Profile: 1` o `?profile=1` y el
+request corre bajo un profiler de muestreo: un hilo toma cada PROFILE_INTERVAL_MS la pila de
+todos los hilos ocupados (`sys._current_frames`), así que ve tanto el event loop como los hilos
+del threadpool donde corren los endpoints síncronos (cProfile en 3.11 solo ve su propio hilo).
+Las muestras de otros requests concurrentes también aparecen: conviene perfilar en calma.
+
+El perfil se guarda en PROFILE_DIR como pilas "colapsadas" (`a;b;c 12`, el formato de
+flamegraph.pl y speedscope) más un .json con los metadatos y las funciones más costosas;
+se conservan los PROFILE_MAX_FILES más recientes. La respuesta lleva X-Profile-Id. La escritura
+y la poda corren en el threadpool de anyio, fuera del event loop.
+
+Sin la bandera el middleware solo revisa la query y los headers y delega sin envolver nada.
+"""
+import collections
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+import anyio
+
+from . import auth, logs
+
+log = logs.get_logger("profiling")
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+HEADER = b"x-profile"
+
+# Hilos que esperan (selector del event loop, workers del threadpool sin trabajo) no cuentan
+_STDLIB_DIR = os.path.dirname(threading.__file__)
+_IDLE_FUNCTIONS = {"wait", "select", "poll", "get", "accept", "_wait_for_tstate_lock", "sleep"}
+
+
+def _is_idle(code) -> bool:
+    return code.co_name in _IDLE_FUNCTIONS and code.co_filename.startswith(_STDLIB_DIR)
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class Sampler:
+    """Profiler de muestreo: cuenta pilas (de la raíz a la hoja) de todos los hilos ocupados"""
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.stacks: collections.Counter = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="pfm-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == me or _is_idle(frame.f_code):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                self.stacks[tuple(reversed(stack))] += 1
+
+    def folded(self) -> str:
+        return "".join(f"{';'.join(_label(code) for code in stack)} {count}\n" for stack, count in self.stacks.most_common())
+
+    def top(self, limit: int = 20) -> List[dict]:
+        """Funciones con más muestras propias (hoja de la pila) y totales (en cualquier nivel)"""
+        own: collections.Counter = collections.Counter()
+        total: collections.Counter = collections.Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+            for code in set(stack):
+                total[code] += count
+        return [{"function": _label(code), "self": count, "total": total[code]} for code, count in own.most_common(limit)]
+
+
+# ----------- Almacén acotado en disco -----------
+def _path(profile_id: str, extension: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}.{extension}")
+
+
+def save(meta: dict, sampler: Sampler) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(_path(meta["id"], "folded"), "w", encoding="utf-8") as f:
+        f.write(sampler.folded())
+    with open(_path(meta["id"], "json"), "w", encoding="utf-8") as f:
+        json.dump({**meta, "samples": sampler.samples, "top": sampler.top()}, f, ensure_ascii=False)
+    _prune()
+    return meta["id"]
+
+
+def _prune():
+    for profile_id in [item["id"] for item in list_profiles()][PROFILE_MAX_FILES:]:
+        for extension in ("json", "folded"):
+            try:
+                os.remove(_path(profile_id, extension))
+            except FileNotFoundError:
+                pass
+
+
+def list_profiles() -> List[dict]:
+    """Metadatos de los perfiles guardados, del más reciente al más viejo"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if name.endswith(".json"):
+            try:
+                with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return profiles
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """Ruta del archivo colapsado, o None si no existe (o el id no es válido)"""
+    if not profile_id.replace("-", "").isalnum():
+        return None
+    path = _path(profile_id, "folded")
+    return path if os.path.exists(path) else None
+
+
+# ----------- Middleware ASGI -----------
+def _requested(scope) -> bool:
+    if b"profile=1" in scope.get("query_string", b"") and parse_qs(scope["query_string"].decode("latin-1")).get("profile") == ["1"]:
+        return True
+    return any(name == HEADER and value == b"1" for name, value in scope.get("headers", ()))
+
+
+def _admin_email(scope) -> Optional[str]:
+    for name, value in scope.get("headers", ()):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            token_data = auth.verify_token(token) if scheme.lower() == "bearer" else None
+            if token_data is not None and auth.is_admin(token_data.email):
+                return token_data.email
+    return None
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _requested(scope):
+            return await self.app(scope, receive, send)
+        email = _admin_email(scope)
+        if email is None:
+            return await self.app(scope, receive, send)
+
+        now = time.time_ns()  # el id ordena cronológicamente
+        profile_id = f"{time.strftime('%Y%m%d%H%M%S', time.localtime(now // 10**9))}{now % 10**9:09d}-{uuid.uuid4().hex[:6]}"
+        meta: Dict = {"id": profile_id, "method": scope["method"], "path": scope["path"], "user": email, "status": None}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                meta["status"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        sampler = Sampler()
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            sampler.stop()
+            meta["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            meta["created_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            # Armar las pilas, escribir y podar el directorio no bloquea a los demás requests
+            await anyio.to_thread.run_sync(save, meta, sampler)
+            log.info("Request perfilado", extra={"profile_id": profile_id, "path": scope["path"], "duration_ms": meta["duration_ms"]})
@@ -0,0 +1,245 @@
+"""
+Detección de cargos recurrentes y suscripciones (y de ingresos recurrentes como la nómina).
+
+Las transacciones se agrupan por comercio normalizado (`merchant_key`) y signo. Por grupo
+se guarda en `recurring_series` un estado incremental: fechas extremas, número de
+ocurrencias y media/varianza (Welford) de los intervalos en días y de los montos. Una
+transacción nueva con fecha posterior a la última del grupo se aplica en O(1). Si llega
+fuera de orden, o si se edita o borra una transacción, se recalcula solo ese grupo
+repasando su historial ordenado, que se lee filtrando por transactions.merchant_key (con
+índice) en lugar de recorrer todo el historial del usuario. Las importaciones masivas (crud.bulk_create_transactions)
+recalculan de una vez los grupos tocados con una sola lectura del historial.
+
+Un grupo es recurrente si tiene al menos MIN_OCCURRENCES ocurrencias, su intervalo medio cae
+cerca de una cadencia conocida y tanto los intervalos como los montos son casi constantes
+(coeficiente de variación acotado).
+"""
+import math
+import re
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models
+
+# Cadencias reconocidas (días) y tolerancia relativa sobre el intervalo medio
+CADENCES = (
+    ("weekly", 7.0),
+    ("biweekly", 14.0),
+    ("monthly", 30.44),
+    ("bimonthly", 60.88),
+    ("quarterly", 91.31),
+    ("semiannual", 182.62),
+    ("yearly", 365.25),
+)
+CADENCE_TOLERANCE = 0.2
+MIN_OCCURRENCES = 3
+MAX_INTERVAL_CV = 0.25
+MAX_AMOUNT_CV = 0.2
+
+SeriesKey = Tuple[str, str]
+
+_ACCENTS = str.maketrans("ÁÉÍÓÚÜÑ", "AEIOUUN")
+_SEPARATORS = re.compile(r"[^A-Z0-9]+")
+# Palabras que los bancos agregan a la descripción y no identifican al comercio
+_STOPWORDS = {
+    "PAGO", "COMPRA", "CARGO", "ABONO", "DOMICILIADO", "DOMICILIACION", "RECURRENTE", "REF",
+    "REFERENCIA", "TDC", "TDD", "POS", "SPEI", "TRANSFERENCIA", "MX", "MEX", "MEXICO", "CDMX",
+    "SA", "DE", "CV", "EN", "LINEA", "WWW", "COM", "INTERNET",
+}
+
+
+def merchant_key(description: str) -> str:
+    """Clave de comercio: mayúsculas, sin acentos, referencias ni ruido bancario; hasta 3 palabras"""
+    text = (description or "").upper().translate(_ACCENTS)
+    tokens = [
+        token for token in _SEPARATORS.split(text)
+        if len(token) > 1 and token.isalpha() and token not in _STOPWORDS
+    ]
+    return " ".join(tokens[:3]) or (description or "").strip().upper()[:40]
+
+
+def series_key(description: str, amount: float) -> SeriesKey:
+    return merchant_key(description), ("income" if amount > 0 else "expense")
+
+
+def _reset(series: models.RecurringSeries, row_date: date):
+    series.occurrences = 0
+    series.first_date = series.last_date = row_date
+    series.interval_mean = series.interval_m2 = 0.0
+    series.amount_mean = series.amount_m2 = 0.0
+
+
+def _apply(series: models.RecurringSeries, row_date: date, amount: float, description: str):
+    """Agrega una ocurrencia con fecha >= last_date (actualización de Welford en O(1))"""
+    if series.occurrences:
+        interval = (row_date - series.last_date).days
+        intervals = series.occurrences  # número de intervalos después de agregar este
+        delta = interval - series.interval_mean
+        series.interval_mean += delta / intervals
+        series.interval_m2 += delta * (interval - series.interval_mean)
+    series.occurrences += 1
+    delta = amount - series.amount_mean
+    series.amount_mean += delta / series.occurrences
+    series.amount_m2 += delta * (amount - series.amount_mean)
+    series.last_date = row_date
+    series.description = description
+
+
+def _classify(series: models.RecurringSeries):
+    series.cadence = None
+    series.is_recurring = False
+    series.confidence = 0.0
+    series.next_date = None
+    if series.occurrences < MIN_OCCURRENCES or series.interval_mean <= 0:
+        return
+    interval_cv = math.sqrt(series.interval_m2 / (series.occurrences - 1)) / series.interval_mean
+    amount_cv = math.sqrt(series.amount_m2 / series.occurrences) / abs(series.amount_mean) if series.amount_mean else 1.0
+    cadence = next(
+        (name for name, days in CADENCES if abs(series.interval_mean - days) <= days * CADENCE_TOLERANCE),
+        None,
+    )
+    if cadence is None or interval_cv > MAX_INTERVAL_CV or amount_cv > MAX_AMOUNT_CV:
+        return
+    series.cadence = cadence
+    series.is_recurring = True
+    series.confidence = round((1 - interval_cv) * (1 - amount_cv) * min(1.0, series.occurrences / 6), 3)
+    series.next_date = series.last_date + timedelta(days=round(series.interval_mean))
+
+
+def _load_series(db: Session, user_id: int, keys: Optional[Set[SeriesKey]]) -> Dict[SeriesKey, models.RecurringSeries]:
+    stmt = select(models.RecurringSeries).where(models.RecurringSeries.user_id == user_id)
+    if keys is not None:
+        if not keys:
+            return {}
+        stmt = stmt.where(tuple_(models.RecurringSeries.merchant_key, models.RecurringSeries.kind).in_(list(keys)))
+    return {(s.merchant_key, s.kind): s for s in db.scalars(stmt)}
+
+
+def observe(db: Session, user_id: int, rows: Iterable[dict]):
+    """
+    Aplica transacciones nuevas (dicts con description, amount y date) a las series del usuario.
+    Las filas ya deben estar en la sesión o en la base: si un grupo llega fuera de orden se
+    recalcula desde el historial, que ya las incluye.
+    """
+    groups: Dict[SeriesKey, List[Tuple[date, float, str]]] = {}
+    for row in rows:
+        groups.setdefault(series_key(row["description"], row["amount"]), []).append(
+            (row["date"], row["amount"], row["description"])
+        )
+    if not groups:
+        return
+    existing = _load_series(db, user_id, set(groups))
+    out_of_order = set()
+    for key, items in groups.items():
+        items.sort(key=lambda item: item[0])
+        series = existing.get(key)
+        if series is not None and items[0][0] < series.last_date:
+            out_of_order.add(key)
+            continue
+        if series is None:
+            series = models.RecurringSeries(user_id=user_id, merchant_key=key[0], kind=key[1])
+            _reset(series, items[0][0])
+            db.add(series)
+        for row_date, amount, description in items:
+            _apply(series, row_date, amount, description)
+        _classify(series)
+    # La sesión no hace autoflush: las series nuevas deben ser visibles para la siguiente consulta
+    db.flush()
+    if out_of_order:
+        rebuild(db, user_id, out_of_order)
+
+
+def rebuild(db: Session, user_id: int, keys: Optional[Set[SeriesKey]] = None):
+    """
+    Recalcula las series indicadas (o todas las del usuario) repasando su historial ordenado
+    por fecha. Es O(n log n) en el peor caso; se usa para backfill, ediciones y borrados.
+    """
+    if keys is not None:
+        keys = {key for key in keys if key is not None}
+        if not keys:
+            return
+    db.flush()  # el historial debe incluir las altas, ediciones y borrados pendientes
+    history: Dict[SeriesKey, List[Tuple[date, float, str]]] = {}
+    stmt = (
+        select(models.Transaction.date, models.Transaction.amount, models.Transaction.description, models.Transaction.merchant_key)
+        .where(models.Transaction.user_id == user_id)
+        .order_by(models.Transaction.date, models.Transaction.id)
+    )
+    if keys is not None:
+        # Solo el historial de los comercios afectados (índice user_id, merchant_key)
+        stmt = stmt.where(models.Transaction.merchant_key.in_({key[0] for key in keys}))
+    for row_date, amount, description, merchant in db.execute(stmt):
+        key = (merchant or merchant_key(description), "income" if amount > 0 else "expense")
+        if keys is None or key in keys:
+            history.setdefault(key, []).append((row_date, amount, description))
+
+    existing = _load_series(db, user_id, keys)
+    for key, series in existing.items():
+        if key not in history:
+            db.delete(series)
+    for key, items in history.items():
+        series = existing.get(key)
+        if series is None:
+            series = models.RecurringSeries(user_id=user_id, merchant_key=key[0], kind=key[1])
+            db.add(series)
+        _reset(series, items[0][0])
+        for row_date, amount, description in items:
+            _apply(series, row_date, amount, description)
+        _classify(series)
+    db.flush()
+
+
+def ensure_merchant_keys(engine: Engine, batch_size: int = 5000):
+    """Llena transactions.merchant_key en las filas de antes de existir la columna (idempotente)"""
+    with Session(bind=engine) as db:
+        while True:
+            rows = db.execute(
+                select(models.Transaction.id, models.Transaction.description)
+                .where(models.Transaction.merchant_key.is_(None))
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            db.execute(
+                update(models.Transaction).execution_options(synchronize_session=False),
+                [{"id": row.id, "merchant_key": merchant_key(row.description)} for row in rows],
+            )
+            db.commit()
+
+
+def ensure_backfill(engine: Engine):
+    """Calcula las series de todos los usuarios la primera vez que existe la tabla (idempotente)"""
+    with Session(bind=engine) as db:
+        if db.execute(select(models.RecurringSeries.id).limit(1)).first() is not None:
+            return
+        user_ids = db.scalars(select(models.Transaction.user_id).distinct()).all()
+        for user_id in user_ids:
+            rebuild(db, user_id)
+        db.commit()
+
+
+def serialize(series: models.RecurringSeries, reference: date) -> dict:
+    """
+    Serie para la API. `active` compara la próxima fecha esperada con la fecha más reciente
+    de los datos del usuario (no con hoy: los estados de cuenta pueden ser de meses atrás).
+    """
+    grace = max(3, round(series.interval_mean * CADENCE_TOLERANCE))
+    return {
+        "merchant_key": series.merchant_key,
+        "kind": series.kind,
+        "description": series.description,
+        "cadence": series.cadence,
+        "occurrences": series.occurrences,
+        "interval_days": round(series.interval_mean, 1),
+        "amount": round(series.amount_mean, 2),
+        "monthly_amount": round(series.amount_mean * 30.44 / series.interval_mean, 2),
+        "first_date": series.first_date,
+        "last_date": series.last_date,
+        "next_date": series.next_date,
+        "confidence": series.confidence,
+        "active": series.next_date + timedelta(days=grace) >= reference,
+    }
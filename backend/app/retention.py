@@ -0,0 +1,236 @@
+"""
+Retención y recolección de basura de los PDFs subidos.
+
+Antes nada se borraba de uploaded_pdfs/. Ahora un hilo del proceso (arranca con la API) hace
+una pasada cada UPLOAD_GC_INTERVAL_MINUTES y borra:
+
+- orphan: blobs sin referencias (p. ej. los de /test_upload_pdf) con más de UPLOAD_GC_GRACE_HOURS.
+- age: solo si se configura UPLOAD_RETENTION_DAYS / UPLOAD_FAILED_RETENTION_DAYS (0 por
+  omisión: los estados de cuenta no se borran sin que alguien lo pida), blobs cuyas subidas
+  terminaron todas (processed o failed) y cuya última subida es más vieja que ese plazo.
+  Las transacciones ya están en la base; el PDF solo servía para reprocesar.
+- size: solo con UPLOAD_MAX_MB, los blobs terminados más viejos primero hasta caber.
+- legacy: solo si se configura LEGACY_UPLOAD_DIR (vacío por omisión), archivos sueltos en
+  ese directorio (de antes del almacén por contenido) más viejos que UPLOAD_RETENTION_DAYS.
+
+Un blob con una subida en curso (received) no se borra, salvo que la subida lleve más de
+UPLOAD_STALE_HOURS en received (el proceso se cayó o se reinició): entonces cuenta como fallida. Se borra en lotes de UPLOAD_GC_BATCH,
+cada uno en su propia transacción corta y con una pausa entre lotes para no acaparar el
+escritor de SQLite. Cada borrado deja una fila en blob_tombstones; la fila de la subida se
+conserva. La fila del blob se borra solo si su refcount no cambió desde que se eligió (si
+llegó una subida con el mismo contenido, se salva).
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.orm import Session
+
+from . import blobs, logs, models, telemetry
+from .database import SessionLocal, _env_bool
+
+log = logs.get_logger("retention")
+
+UPLOAD_GC = _env_bool("UPLOAD_GC", True)
+UPLOAD_GC_INTERVAL_MINUTES = float(os.getenv("UPLOAD_GC_INTERVAL_MINUTES", "60"))
+UPLOAD_GC_BATCH = int(os.getenv("UPLOAD_GC_BATCH", "200"))
+UPLOAD_GC_PAUSE_MS = float(os.getenv("UPLOAD_GC_PAUSE_MS", "50"))
+UPLOAD_GC_GRACE_HOURS = float(os.getenv("UPLOAD_GC_GRACE_HOURS", "24"))
+UPLOAD_RETENTION_DAYS = float(os.getenv("UPLOAD_RETENTION_DAYS", "0"))  # 0 = sin límite
+UPLOAD_FAILED_RETENTION_DAYS = float(os.getenv("UPLOAD_FAILED_RETENTION_DAYS", "0"))  # 0 = sin límite
+UPLOAD_STALE_HOURS = float(os.getenv("UPLOAD_STALE_HOURS", "24"))
+UPLOAD_MAX_MB = float(os.getenv("UPLOAD_MAX_MB", "0"))  # 0 = sin límite
+LEGACY_UPLOAD_DIR = os.getenv("LEGACY_UPLOAD_DIR", "")  # vacío = no se barre
+
+RECLAIMED_BYTES = telemetry.registry.counter(
+    "pfm_upload_gc_reclaimed_bytes_total", "Bytes liberados por la retención de PDFs subidos", ("reason",)
+)
+RECLAIMED_FILES = telemetry.registry.counter(
+    "pfm_upload_gc_files_total", "Archivos borrados por la retención de PDFs subidos", ("reason",)
+)
+GC_SECONDS = telemetry.registry.histogram("pfm_upload_gc_seconds", "Duración de cada pasada del GC de subidas")
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    # SQLite devuelve fechas sin zona (func.now() es UTC)
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _older_than(value: Optional[datetime], now: datetime, days: float) -> bool:
+    return days > 0 and value is not None and _utc(value) < now - timedelta(days=days)
+
+
+def plan(db: Session, now: Optional[datetime] = None) -> List[dict]:
+    """Blobs a borrar en esta pasada, con su motivo (sin tocar nada)"""
+    now = now or datetime.now(timezone.utc)
+    upload = models.Upload
+    rows = db.execute(
+        select(
+            models.Blob,
+            func.max(upload.created_at),
+            func.count(upload.id),
+            func.sum(case((upload.status == "received", 1), else_=0)),
+            func.sum(case((upload.status == "failed", 1), else_=0)),
+            func.max(case((upload.status == "received", upload.created_at))),
+        )
+        .outerjoin(upload, upload.blob_sha256 == models.Blob.sha256)
+        .group_by(models.Blob.sha256)
+        .order_by(models.Blob.created_at, models.Blob.sha256)
+    ).all()
+
+    victims, finished = [], []
+    for blob, last_upload, uploads, received, failed, last_received in rows:
+        if received:
+            if not _older_than(last_received, now, UPLOAD_STALE_HOURS / 24):
+                continue  # subida en curso
+            failed += received  # se quedaron en received: el proceso no terminó
+        candidate = {"sha256": blob.sha256, "kind": blob.kind, "refcount": blob.refcount,
+                     "stored_size": blob.stored_size, "path": blobs.path_for(blob)}
+        if blob.refcount == 0 and _older_than(blob.created_at, now, UPLOAD_GC_GRACE_HOURS / 24):
+            victims.append(dict(candidate, reason="orphan"))
+            continue
+        if uploads:
+            # La retención del blob es la de la subida más protegida que lo usa
+            days = [UPLOAD_RETENTION_DAYS] * (uploads - failed) + [UPLOAD_FAILED_RETENTION_DAYS] * failed
+            if min(days) > 0 and _older_than(last_upload, now, max(days)):
+                victims.append(dict(candidate, reason="age"))
+                continue
+            finished.append((_utc(last_upload) or now, candidate))
+
+    if UPLOAD_MAX_MB > 0:
+        remaining = sum(blob.stored_size for blob, *_ in rows) - sum(v["stored_size"] for v in victims)
+        budget = UPLOAD_MAX_MB * 1024 * 1024
+        for _, candidate in sorted(finished, key=lambda item: item[0]):
+            if remaining <= budget:
+                break
+            victims.append(dict(candidate, reason="size"))
+            remaining -= candidate["stored_size"]
+    return victims
+
+
+def _legacy_files(now: datetime) -> List[dict]:
+    """Archivos sueltos (solo el primer nivel de LEGACY_UPLOAD_DIR) fuera de retención"""
+    if not LEGACY_UPLOAD_DIR or UPLOAD_RETENTION_DAYS <= 0:
+        return []
+    cutoff = (now - timedelta(days=UPLOAD_RETENTION_DAYS)).timestamp()
+    try:
+        with os.scandir(LEGACY_UPLOAD_DIR) as it:
+            entries = [entry for entry in it if entry.is_file(follow_symlinks=False)]
+    except FileNotFoundError:
+        return []
+    return [
+        {"sha256": None, "kind": "legacy", "path": entry.path, "stored_size": stat.st_size, "reason": "legacy"}
+        for entry in entries
+        for stat in (entry.stat(),)
+        if stat.st_mtime < cutoff
+    ]
+
+
+def _unlink(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _delete_batch(db: Session, batch: List[dict]) -> List[dict]:
+    """Borra un lote y deja sus tombstones; devuelve lo que efectivamente borró"""
+    deleted = []
+    for victim in batch:
+        if victim["sha256"] is None:
+            # Archivo suelto: gana quien lo borra (otro worker puede estar en la misma pasada)
+            if _unlink(victim["path"]):
+                deleted.append(victim)
+            continue
+        result = db.execute(
+            delete(models.Blob)
+            .where(models.Blob.sha256 == victim["sha256"], models.Blob.refcount == victim["refcount"])
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount:
+            deleted.append(victim)
+    db.add_all([
+        models.BlobTombstone(sha256=v["sha256"], path=v["path"], kind=v["kind"], stored_size=v["stored_size"], reason=v["reason"])
+        for v in deleted
+    ])
+    db.commit()
+    # El archivo se borra después del commit: si el commit falla, el blob sigue completo
+    for victim in deleted:
+        if victim["sha256"] is not None:
+            _unlink(victim["path"])
+        RECLAIMED_FILES.inc(reason=victim["reason"])
+        RECLAIMED_BYTES.inc(victim["stored_size"], reason=victim["reason"])
+    return deleted
+
+
+def collect(db: Session, now: Optional[datetime] = None, dry_run: bool = False) -> Dict[str, dict]:
+    """Una pasada completa; devuelve archivos y bytes borrados (o a borrar) por motivo"""
+    now = now or datetime.now(timezone.utc)
+    victims = plan(db, now) + _legacy_files(now)
+    if not dry_run:
+        deleted = []
+        for start in range(0, len(victims), UPLOAD_GC_BATCH):
+            if start:
+                time.sleep(UPLOAD_GC_PAUSE_MS / 1000)
+            deleted += _delete_batch(db, victims[start:start + UPLOAD_GC_BATCH])
+        victims = deleted
+    summary: Dict[str, dict] = {}
+    for victim in victims:
+        item = summary.setdefault(victim["reason"], {"files": 0, "bytes": 0})
+        item["files"] += 1
+        item["bytes"] += victim["stored_size"]
+    return summary
+
+
+_run_lock = threading.Lock()
+
+
+def run_once(dry_run: bool = False) -> Optional[Dict[str, dict]]:
+    """Pasada con su propia sesión; None si ya hay otra corriendo en este proceso"""
+    if not _run_lock.acquire(blocking=False):
+        return None
+    start = time.perf_counter()
+    try:
+        with SessionLocal() as db:
+            summary = collect(db, dry_run=dry_run)
+    finally:
+        _run_lock.release()
+    GC_SECONDS.observe(time.perf_counter() - start)
+    if summary and not dry_run:
+        log.info("GC de subidas", extra={"reclaimed": summary, "ms": round((time.perf_counter() - start) * 1000, 1)})
+    return summary
+
+
+class _Scheduler:
+    """Hilo que corre `run_once` cada UPLOAD_GC_INTERVAL_MINUTES hasta `stop()`"""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if not UPLOAD_GC or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="pfm-upload-gc", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # La primera pasada espera un intervalo: el arranque no compite con los primeros requests
+        while not self._stop.wait(UPLOAD_GC_INTERVAL_MINUTES * 60):
+            try:
+                run_once()
+            except Exception:
+                log.exception("Falló la pasada del GC de subidas")
+
+
+scheduler = _Scheduler()
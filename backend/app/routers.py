@@ -4,18 +4,15 @@ from . import crud, schemas, models, deps, auth
 from typing import List
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi import File, UploadFile
-import PyPDF2
 import io
 import re
 from datetime import datetime
 from .auth import extract_transactions_with_ai
-import pdfplumber
-import pytesseract
-from pdf2image import convert_from_bytes
-from PIL import Image
-import tempfile
+from . import logs
 import os
 
+log = logs.get_logger("routers")
+
 router = APIRouter()
 
 # Usuario
@@ -81,6 +78,8 @@ async def upload_pdf(usuario_id: int, file: UploadFile = File(...), db: Session
         pdf_file = io.BytesIO(content)
         
         # Intentar extraer texto del PDF usando pdfplumber
+        import pdfplumber
+
         text = ""
         with pdfplumber.open(pdf_file) as pdf:
             for page in pdf.pages:
@@ -90,12 +89,12 @@ async def upload_pdf(usuario_id: int, file: UploadFile = File(...), db: Session
         
         # Si el texto está vacío o es muy corto, usar OCR
         if not text or len(text.strip()) < 100:
-            print("Texto extraído muy corto o vacío, usando OCR...")
+            log.info("Texto extraído muy corto o vacío, usando OCR")
             text = extract_text_with_ocr(content)
         
         # Detectar texto ilegible (códigos como (cid:xxx), caracteres extraños)
         elif any(pattern in text for pattern in ['(cid:', 'ææł', 'ıæ', 'øı', 'łł', 'ææıı']):
-            print("Texto extraído contiene códigos ilegibles, usando OCR...")
+            log.info("Texto extraído con códigos ilegibles, usando OCR")
             text = extract_text_with_ocr(content)
         
         # Si aún no hay texto, devolver error
@@ -106,20 +105,19 @@ async def upload_pdf(usuario_id: int, file: UploadFile = File(...), db: Session
         max_length = 25000  # Aumentado de 10,000 a 25,000 caracteres
         short_text = text[:max_length]
         
-        print(f"Texto extraído: {len(text)} caracteres")
-        print(f"Texto enviado a AI: {len(short_text)} caracteres")
+        log.info("Texto listo para AI", extra={"characters": len(text), "sent_characters": len(short_text)})
         
         # Extraer transacciones con AI
         transactions = extract_transactions_with_ai(short_text)
         
         # Si no se encontraron transacciones y el texto es largo, intentar con chunks
         if not transactions and len(text) > 25000:
-            print("No se encontraron transacciones, intentando con chunks del texto...")
+            log.info("Sin transacciones, reintentando por chunks")
             chunks = [text[i:i+25000] for i in range(0, len(text), 20000)]  # Overlap de 5000 caracteres
             all_transactions = []
             
             for i, chunk in enumerate(chunks):
-                print(f"Procesando chunk {i+1}/{len(chunks)}...")
+                log.debug("Procesando chunk", extra={"chunk": i + 1, "chunks": len(chunks)})
                 chunk_transactions = extract_transactions_with_ai(chunk)
                 all_transactions.extend(chunk_transactions)
             
@@ -133,7 +131,7 @@ async def upload_pdf(usuario_id: int, file: UploadFile = File(...), db: Session
                     unique_transactions.append(txn)
             
             transactions = unique_transactions
-            print(f"Transacciones encontradas con chunks: {len(transactions)}")
+            log.info("Transacciones encontradas por chunks", extra={"rows": len(transactions)})
         
         return {
             "message": "PDF procesado exitosamente",
@@ -144,18 +142,22 @@ async def upload_pdf(usuario_id: int, file: UploadFile = File(...), db: Session
         }
         
     except Exception as e:
-        print(f"Error procesando PDF: {str(e)}")
+        log.exception("Error procesando PDF")
         raise HTTPException(status_code=500, detail=f"Error procesando PDF: {str(e)}")
 
 def extract_text_with_ocr(pdf_content: bytes) -> str:
     """Extrae texto de un PDF usando OCR con Tesseract"""
     try:
+        # Carga diferida: sin pytesseract/pdf2image el OCR devuelve "" como cualquier otra falla
+        import pytesseract
+        from pdf2image import convert_from_bytes
+
         # Convertir PDF a imágenes
         images = convert_from_bytes(pdf_content)
         text = ""
         
         for i, image in enumerate(images):
-            print(f"Procesando página {i+1} con OCR...")
+            logs.sampled(log, "routers.ocr_page", "Procesando página con OCR", page=i + 1)
             
             # Configurar Tesseract para español
             custom_config = r'--oem 3 --psm 6 -l spa'
@@ -166,5 +168,5 @@ def extract_text_with_ocr(pdf_content: bytes) -> str:
         
         return text
     except Exception as e:
-        print(f"Error en OCR: {str(e)}")
+        log.error("Error en OCR: %s", e)
         return ""
\ No newline at end of file
@@ -1,7 +1,11 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+import os
+from pydantic import BaseModel, EmailStr, Field
+from typing import Optional, List, Literal
 from datetime import date, datetime
 
+# Máximo de operaciones por request en /transactions/batch
+BATCH_MAX_OPERATIONS = int(os.getenv("BATCH_MAX_OPERATIONS", "500"))
+
 # Schemas para Usuario
 class UserBase(BaseModel):
     email: EmailStr
@@ -35,6 +39,70 @@ class Transaction(TransactionBase):
     class Config:
         from_attributes = True
 
+# Actualización parcial: solo se modifican los campos enviados
+class TransactionUpdate(BaseModel):
+    description: Optional[str] = None
+    amount: Optional[float] = None
+    date_: Optional[date] = Field(default=None, alias="date")
+    category: Optional[str] = None
+
+    class Config:
+        populate_by_name = True
+
+    def changes(self) -> dict:
+        """Campos enviados por el cliente, con los nombres de columna del modelo"""
+        values = self.dict(exclude_unset=True, by_alias=True)
+        for required in ("description", "amount", "date"):
+            if required in values and values[required] is None:
+                raise ValueError(f"{required} no puede ser nulo")
+        return values
+
+# Schemas para operaciones por lotes (data se valida por operación, ver crud.apply_transaction_batch)
+class BatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    data: Optional[dict] = None
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation] = Field(..., min_length=1, max_length=BATCH_MAX_OPERATIONS)
+    # atomic=True: si una operación falla no se aplica ninguna
+    atomic: bool = False
+
+class BatchItemResult(BaseModel):
+    index: int
+    op: str
+    status: int
+    id: Optional[int] = None
+    transaction: Optional[Transaction] = None
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    committed: bool
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
+
+# Serie recurrente detectada (ver app/recurring.py)
+class RecurringSeries(BaseModel):
+    merchant_key: str
+    kind: str
+    description: str
+    cadence: str
+    occurrences: int
+    interval_days: float
+    amount: float
+    monthly_amount: float
+    first_date: date
+    last_date: date
+    next_date: date
+    confidence: float
+    active: bool
+
+class Anomaly(Transaction):
+    kind: str
+    score: float
+    expected: Optional[float] = None
+
 # Schema para Token
 class Token(BaseModel):
     access_token: str
@@ -43,3 +111,5 @@ class Token(BaseModel):
 
 class TokenData(BaseModel):
     email: Optional[str] = None
+    user_id: Optional[int] = None
+    exp: Optional[int] = None
@@ -0,0 +1,130 @@
+"""
+Búsqueda de texto completo sobre la descripción de las transacciones.
+
+En SQLite se usa una tabla virtual FTS5 (`transactions_fts`) sincronizada con `transactions`
+mediante triggers. Cada fila indexa la descripción y un token `u<user_id>` para que el filtro
+por usuario se resuelva dentro del índice (intersección de listas) y no escaneando la tabla.
+En otros motores se usa un fallback con ILIKE.
+"""
+import re
+from typing import List
+
+from sqlalchemy import DDL, column, event, func, literal_column, or_, select, table, text
+from sqlalchemy.engine import Engine
+
+from . import models
+
+FTS_TABLE = "transactions_fts"
+
+# Referencia ligera a la tabla virtual (no forma parte de Base.metadata)
+transactions_fts = table(FTS_TABLE, column("rowid"))
+
+_CREATE_FTS = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    description,
+    user_key,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+)
+"""
+
+_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_ai AFTER INSERT ON transactions BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description, user_key) VALUES (new.id, new.description, 'u' || new.user_id);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_ad AFTER DELETE ON transactions BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transactions_fts_au AFTER UPDATE OF description, user_id ON transactions BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, description, user_key) VALUES (new.id, new.description, 'u' || new.user_id);
+    END
+    """,
+]
+
+_BACKFILL = f"""
+INSERT INTO {FTS_TABLE}(rowid, description, user_key)
+SELECT id, description, 'u' || user_id FROM transactions
+WHERE id NOT IN (SELECT rowid FROM {FTS_TABLE})
+"""
+
+# Crear índice y triggers junto con la tabla transactions (create_all)
+for _statement in [_CREATE_FTS] + _TRIGGERS:
+    event.listen(
+        models.Transaction.__table__,
+        "after_create",
+        DDL(_statement).execute_if(dialect="sqlite"),
+    )
+
+
+def ensure_search_index(engine: Engine):
+    """
+    Crea la tabla FTS5 y sus triggers en bases existentes y rellena las filas faltantes.
+    Es idempotente; en motores distintos de SQLite no hace nada.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    with engine.begin() as conn:
+        existed = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE},
+        ).first() is not None
+        conn.exec_driver_sql(_CREATE_FTS)
+        for trigger in _TRIGGERS:
+            conn.exec_driver_sql(trigger)
+        if not existed:
+            conn.exec_driver_sql(_BACKFILL)
+
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize_query(q: str) -> List[str]:
+    """Separa la consulta del usuario en tokens alfanuméricos (descarta la sintaxis de FTS5)"""
+    return _TOKEN_RE.findall(q or "")
+
+
+def build_match_expression(user_id: int, tokens: List[str]) -> str:
+    """
+    Expresión MATCH: todos los tokens como prefijo sobre la descripción,
+    restringida al token del usuario.
+    """
+    terms = " AND ".join(f'"{token}"*' for token in tokens)
+    return f'user_key:"u{int(user_id)}" AND description:({terms})'
+
+
+def search_statement(dialect_name: str, user_id: int, q: str, limit: int = 50, offset: int = 0):
+    """
+    SELECT de transacciones del usuario que coinciden con `q` (prefijos), ordenadas por relevancia.
+    Devuelve None si la consulta no tiene tokens.
+    """
+    tokens = tokenize_query(q)
+    if not tokens:
+        return None
+
+    if dialect_name == "sqlite":
+        # bm25 con peso 0 para user_key: todas las filas del usuario lo contienen
+        fts = literal_column(FTS_TABLE)
+        return (
+            select(models.Transaction)
+            .join(transactions_fts, transactions_fts.c.rowid == models.Transaction.id)
+            .where(fts.op("MATCH")(build_match_expression(user_id, tokens)))
+            .where(models.Transaction.user_id == user_id)
+            .order_by(func.bm25(fts, 1.0, 0.0), models.Transaction.date.desc())
+            .limit(limit)
+            .offset(offset)
+        )
+
+    # Fallback sin FTS: cada token debe aparecer como prefijo de alguna palabra
+    stmt = select(models.Transaction).where(models.Transaction.user_id == user_id)
+    for token in tokens:
+        stmt = stmt.where(or_(
+            models.Transaction.description.ilike(f"{token}%"),
+            models.Transaction.description.ilike(f"% {token}%"),
+        ))
+    return stmt.order_by(models.Transaction.date.desc()).limit(limit).offset(offset)
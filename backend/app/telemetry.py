@@ -0,0 +1,242 @@
+"""
+Trazas por etapa del pipeline de estados de cuenta y métricas en formato Prometheus.
+
+Cada etapa (extract, ocr_page, detect, parse, llm_chunk, categorize, persist) se mide con
+`span(stage, **atributos)`. Al cerrarse, el span se observa en los histogramas del proceso
+(duración, páginas, caracteres y tokens) y, si hay una traza activa (`trace()`), se agrega a
+ella para devolverla en el resultado de la subida. La traza y el span actual viajan en
+contextvars, así que las funciones internas no necesitan recibirlos como parámetro.
+
+Las métricas son por proceso: con varios workers de uvicorn cada uno expone las suyas en
+/metrics y Prometheus las suma por instancia. No depende de prometheus_client.
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+PAGES_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+CHARACTERS_BUCKETS = (100, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+TOKENS_BUCKETS = (50, 100, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Histograma Prometheus con etiquetas (buckets acumulados, _sum y _count)"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = [(key, list(counts), total, count) for key, (counts, total, count) in sorted(self._series.items())]
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Counter:
+    """Contador Prometheus con etiquetas"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = sorted(self._values.items())
+        lines += [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in snapshot]
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Formato de exposición de texto 0.0.4"""
+        return "\n".join(line for metric in self._metrics for line in metric.collect()) + "\n"
+
+
+registry = Registry()
+STAGE_SECONDS = registry.histogram("pfm_pipeline_stage_seconds", "Duración de cada etapa del pipeline de estados de cuenta", ("stage",))
+STAGE_PAGES = registry.histogram("pfm_pipeline_stage_pages", "Páginas procesadas por etapa", ("stage",), PAGES_BUCKETS)
+STAGE_CHARACTERS = registry.histogram("pfm_pipeline_stage_characters", "Caracteres de texto procesados por etapa", ("stage",), CHARACTERS_BUCKETS)
+LLM_TOKENS = registry.histogram("pfm_pipeline_llm_tokens", "Tokens de OpenAI por etapa (prompt o completion)", ("stage", "kind"), TOKENS_BUCKETS)
+STAGE_ERRORS = registry.counter("pfm_pipeline_stage_errors_total", "Etapas que terminaron con excepción", ("stage",))
+LLM_CALLS = registry.counter("pfm_llm_calls_total", "Llamadas a OpenAI por etapa y modelo, y si reutilizaron la caché de prompts", ("stage", "model", "cache"))
+LLM_COST = registry.counter("pfm_llm_cost_usd_total", "Costo estimado de OpenAI en USD por etapa y modelo", ("stage", "model"))
+
+
+class Span:
+    __slots__ = ("stage", "attributes", "duration")
+
+    def __init__(self, stage: str, attributes: dict):
+        self.stage = stage
+        self.attributes = attributes
+        self.duration = 0.0
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def add(self, **amounts):
+        """Suma contadores (tokens, filas) cuando la etapa hace varias llamadas"""
+        for key, amount in amounts.items():
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def as_dict(self) -> dict:
+        return {"stage": self.stage, "ms": round(self.duration * 1000, 1), **self.attributes}
+
+
+class Trace:
+    """Spans de una subida, en orden de cierre"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.llm_calls: List[dict] = []  # ver app/usage.py
+        self._start = time.perf_counter()
+
+    def summary(self) -> dict:
+        by_stage: Dict[str, dict] = {}
+        for span in self.spans:
+            stage = by_stage.setdefault(span.stage, {"ms": 0.0, "count": 0})
+            stage["ms"] = round(stage["ms"] + span.duration * 1000, 1)
+            stage["count"] += 1
+        return {
+            "total_ms": round((time.perf_counter() - self._start) * 1000, 1),
+            "stages": by_stage,
+            "spans": [span.as_dict() for span in self.spans],
+        }
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("pfm_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("pfm_span", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def trace() -> Iterator[Trace]:
+    current = Trace()
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(stage: str, **attributes) -> Iterator[Span]:
+    current = Span(stage, attributes)
+    token = _current_span.set(current)
+    start = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.duration = time.perf_counter() - start
+        _current_span.reset(token)
+        _record(current)
+
+
+def _record(current: Span):
+    attributes = current.attributes
+    STAGE_SECONDS.observe(current.duration, stage=current.stage)
+    if "pages" in attributes:
+        STAGE_PAGES.observe(attributes["pages"], stage=current.stage)
+    if "characters" in attributes:
+        STAGE_CHARACTERS.observe(attributes["characters"], stage=current.stage)
+    for kind in ("prompt", "completion"):
+        if f"{kind}_tokens" in attributes:
+            LLM_TOKENS.observe(attributes[f"{kind}_tokens"], stage=current.stage, kind=kind)
+    if "error" in attributes:
+        STAGE_ERRORS.inc(stage=current.stage)
+    pipeline = _current_trace.get()
+    if pipeline is not None:
+        pipeline.spans.append(current)
+
+
+def record_spans(spans: List[dict]):
+    """Registra en las métricas de este proceso los spans medidos en otro (workers de app/batch_upload.py)"""
+    for item in spans:
+        current = Span(item["stage"], {key: value for key, value in item.items() if key not in ("stage", "ms")})
+        current.duration = item["ms"] / 1000
+        _record(current)
+
+
+def record_usage(response):
+    """Suma al span actual los tokens que reporta una respuesta de chat.completions"""
+    current = _current_span.get()
+    usage = getattr(response, "usage", None)
+    if current is None or usage is None:
+        return
+    tokens = {f"{kind}_tokens": getattr(usage, f"{kind}_tokens", None) for kind in ("prompt", "completion")}
+    current.add(**{key: value for key, value in tokens.items() if isinstance(value, int)})
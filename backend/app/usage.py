@@ -0,0 +1,149 @@
+"""
+Contabilidad de tokens, latencia y costo de las llamadas a OpenAI.
+
+Todas las llamadas del pipeline pasan por `chat(client, call, **kwargs)`: mide la latencia,
+suma los tokens al span actual (telemetry) y deja el registro en la traza de la subida.
+Una llamada cuenta como acierto de caché si OpenAI reutilizó parte del prompt
+(`usage.prompt_tokens_details.cached_tokens` > 0, la caché automática de prompts).
+Al terminar la subida, `persist` guarda los registros en llm_usage con el usuario, el id de
+la subida y el banco, y los endpoints de /usage agregan el costo por estado de cuenta,
+banco, etapa o modelo.
+
+Precios en USD por millón de tokens (entrada, salida); LLM_PRICES (JSON) los reemplaza,
+p. ej. LLM_PRICES='{"gpt-4o-mini": [0.15, 0.6]}'.
+"""
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, cast, distinct, func, insert, select
+from sqlalchemy.orm import Session
+
+from . import models, telemetry
+
+PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (5.00, 15.00),
+    "gpt-4-turbo": (10.00, 30.00),
+}
+PRICES.update({model: tuple(price) for model, price in json.loads(os.getenv("LLM_PRICES", "{}")).items()})
+
+GROUP_COLUMNS = {
+    "bank": models.LlmUsage.bank,
+    "stage": models.LlmUsage.stage,
+    "model": models.LlmUsage.model,
+    "call": models.LlmUsage.call,
+}
+
+
+def cost_usd(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Costo con la tabla de precios; un modelo desconocido cuesta 0 (se ve en el reporte por modelo)"""
+    prompt_price, completion_price = PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def _record(call: str, model: str, prompt_tokens: int, completion_tokens: int, latency: float, hit: bool):
+    current_span = telemetry.current_span()
+    stage = current_span.stage if current_span is not None else call
+    cost = cost_usd(model, prompt_tokens, completion_tokens)
+    telemetry.LLM_CALLS.inc(stage=stage, model=model, cache="hit" if hit else "miss")
+    telemetry.LLM_COST.inc(cost, stage=stage, model=model)
+    pipeline = telemetry.current_trace()
+    if pipeline is not None:
+        pipeline.llm_calls.append({
+            "stage": stage,
+            "call": call,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": round(latency * 1000, 1),
+            "cache_hit": hit,
+            "cost_usd": cost,
+        })
+
+
+def record_calls(calls: List[dict]):
+    """Suma a los contadores de este proceso las llamadas hechas en otro (workers de app/batch_upload.py)"""
+    for c in calls:
+        telemetry.LLM_CALLS.inc(stage=c["stage"], model=c["model"], cache="hit" if c["cache_hit"] else "miss")
+        telemetry.LLM_COST.inc(c["cost_usd"], stage=c["stage"], model=c["model"])
+
+
+def chat(client, call: str, **kwargs):
+    """client.chat.completions.create(**kwargs) con tokens, latencia y costo registrados"""
+    start = time.perf_counter()
+    response = client.chat.completions.create(**kwargs)
+    latency = time.perf_counter() - start
+    telemetry.record_usage(response)
+    usage = getattr(response, "usage", None)
+    tokens = [getattr(usage, f"{kind}_tokens", 0) for kind in ("prompt", "completion")]
+    prompt_tokens, completion_tokens = [value if isinstance(value, int) else 0 for value in tokens]
+    cached_tokens = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", 0)
+    hit = isinstance(cached_tokens, int) and cached_tokens > 0
+    _record(call, kwargs.get("model", ""), prompt_tokens, completion_tokens, latency, hit)
+    return response
+
+
+def totals(calls: List[dict]) -> dict:
+    """Resumen de una subida para la respuesta del endpoint"""
+    return {
+        "llamadas": len(calls),
+        "aciertos_cache": sum(c["cache_hit"] for c in calls),
+        "prompt_tokens": sum(c["prompt_tokens"] for c in calls),
+        "completion_tokens": sum(c["completion_tokens"] for c in calls),
+        "costo_usd": round(sum(c["cost_usd"] for c in calls), 6),
+    }
+
+
+def persist(db: Session, user_id: Optional[int], upload_id: str, bank: Optional[str], calls: List[dict]):
+    """Guarda los registros de la traza (sin commit)"""
+    if calls:
+        db.execute(insert(models.LlmUsage), [{**c, "user_id": user_id, "upload_id": upload_id, "bank": bank} for c in calls])
+
+
+def _aggregates():
+    usage = models.LlmUsage
+    return [
+        func.count().label("calls"),
+        func.sum(cast(usage.cache_hit, Integer)).label("cache_hits"),
+        func.sum(usage.prompt_tokens).label("prompt_tokens"),
+        func.sum(usage.completion_tokens).label("completion_tokens"),
+        func.sum(usage.latency_ms).label("latency_ms"),
+        func.sum(usage.cost_usd).label("cost_usd"),
+    ]
+
+
+def uploads_statement(user_id: int, limit: int = 50):
+    """Costo por estado de cuenta del usuario, de la subida más reciente a la más vieja"""
+    usage = models.LlmUsage
+    return (
+        select(usage.upload_id, usage.bank, func.min(usage.created_at).label("created_at"), *_aggregates())
+        .where(usage.user_id == user_id, usage.upload_id.isnot(None))
+        .group_by(usage.upload_id, usage.bank)
+        .order_by(func.max(usage.id).desc())
+        .limit(limit)
+    )
+
+
+def summary_statement(group_by: str, user_id: Optional[int] = None):
+    """Totales por banco, etapa, modelo o función; con el número de estados de cuenta para el promedio"""
+    usage = models.LlmUsage
+    column = GROUP_COLUMNS[group_by]
+    stmt = select(
+        column.label("key"), *_aggregates(), func.count(distinct(usage.upload_id)).label("uploads")
+    ).group_by(column).order_by(func.sum(usage.cost_usd).desc())
+    if user_id is not None:
+        stmt = stmt.where(usage.user_id == user_id)
+    return stmt
+
+
+def serialize(row) -> dict:
+    data = dict(row._mapping)
+    data["cost_usd"] = round(data["cost_usd"] or 0.0, 6)
+    data["latency_ms"] = round(data["latency_ms"] or 0.0, 1)
+    data["cache_hits"] = int(data["cache_hits"] or 0)
+    if "uploads" in data:
+        data["cost_per_statement_usd"] = round(data["cost_usd"] / data["uploads"], 6) if data["uploads"] else None
+    return data
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los resúmenes: agregación en SQLite vs. motor columnar (NumPy) en caché.
+
+Mide por resumen el tiempo con la consulta SQL de crud, la carga en frío del frame y las
+reducciones sobre el frame ya cacheado.
+
+Uso:
+    python bench_analytics.py --rows 200000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='pfm_analytics_'), 'analytics.db')}"
+
+from sqlalchemy import insert
+
+from app import analytics, crud, models
+from app.database import SessionLocal, engine
+
+
+def seed(rows: int, batch: int = 50000):
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"id": 1, "email": "analytics@correo.com", "hashed_password": "x"}])
+    start = date(2018, 1, 1)
+    categories = ["supermercado", "transporte", "restaurantes", "servicios", None]
+    for offset in range(0, rows, batch):
+        with engine.begin() as conn:
+            conn.execute(insert(models.Transaction), [
+                {
+                    "description": f"COMERCIO {i % 1000}",
+                    "amount": round(random.uniform(-5000, 3000), 2),
+                    "date": start + timedelta(days=i % 3000),
+                    "category": random.choice(categories),
+                    "user_id": 1,
+                }
+                for i in range(offset, min(rows, offset + batch))
+            ])
+
+
+def timed_ms(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    args = parser.parse_args()
+
+    seed(args.rows)
+    db = SessionLocal()
+    load = lambda: analytics.UserFrame.from_rows(db.connection().execute(analytics.frame_statement(1)).tuples())
+    frame = load()
+
+    print(f"filas: {args.rows}   frame: {frame.nbytes / 1e6:.1f} MB   carga en frío: {timed_ms(load, 3):.1f} ms")
+    print(f"{'resumen':<12}{'SQL ms':>10}{'frame ms':>10}")
+    cases = [
+        ("mensual", crud.monthly_summary_statement(1), frame.monthly_totals),
+        ("categoría", crud.category_summary_statement(1), frame.category_totals),
+        ("tabla", crud.summary_table_statement(1), frame.category_month_totals),
+    ]
+    for name, stmt, reduce in cases:
+        sql_ms = timed_ms(lambda: db.execute(stmt).all())
+        print(f"{name:<12}{sql_ms:>10.2f}{timed_ms(reduce):>10.2f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
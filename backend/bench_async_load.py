@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de los endpoints de lectura: ruta síncrona (threadpool) vs ruta asíncrona.
+
+Crea una base SQLite temporal con transacciones sintéticas, registra "gemelos" síncronos
+de los endpoints de lectura (como estaban antes de usar AsyncSession) y dispara ambos en
+proceso con alta concurrencia. Reporta requests por segundo y latencias p50/p99.
+
+Uso:
+    python bench_async_load.py --concurrency 200 --requests 2000 --rows 50000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# La base temporal debe configurarse antes de importar la app
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='pfm_load_'), 'load.db')}"
+# Con la ruta síncrona cada request retiene su conexión mientras espera hilo del threadpool;
+# un timeout corto hace que el agotamiento del pool aparezca como errores en vez de bloquear la prueba
+os.environ.setdefault("DB_POOL_TIMEOUT", "5")
+
+import httpx
+from fastapi import Depends
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from app import auth, crud, models
+from app.async_database import async_engine
+from app.database import engine, get_db
+from app.main import app, get_current_user
+
+REQUEST_TIMEOUT = 30.0
+ENDPOINTS = ["/transactions/", "/transactions/summary/monthly", "/transactions/summary/category"]
+
+
+def register_sync_twins():
+    """Registra versiones síncronas de los endpoints bajo /bench/sync para comparar"""
+
+    @app.get("/bench/sync/transactions/")
+    def sync_list(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+        return [
+            {"id": t.id, "description": t.description, "amount": t.amount, "date": t.date.isoformat()}
+            for t in crud.get_transactions(db, user_id=current_user.id)
+        ]
+
+    @app.get("/bench/sync/transactions/summary/monthly")
+    def sync_monthly(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+        rows = db.execute(crud.monthly_summary_statement(current_user.id)).all()
+        return [{"year": int(r.year), "month": int(r.month), "total": float(r.total)} for r in rows]
+
+    @app.get("/bench/sync/transactions/summary/category")
+    def sync_category(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+        rows = db.execute(crud.category_summary_statement(current_user.id)).all()
+        return [{"category": r.category, "total": float(abs(r.total))} for r in rows]
+
+
+def seed(users: int, rows: int) -> list:
+    """Crea usuarios y transacciones; devuelve un token por usuario"""
+    models.Base.metadata.create_all(bind=engine)
+    start = date(2022, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": i + 1, "email": f"carga{i}@correo.com", "hashed_password": "x", "name": f"Carga {i}"}
+            for i in range(users)
+        ])
+        conn.execute(insert(models.Transaction), [
+            {
+                "description": f"COMERCIO {i % 300}",
+                "amount": round(random.uniform(-3000, 800), 2),
+                "date": start + timedelta(days=i % 1000),
+                "category": random.choice(["supermercado", "transporte", "restaurante", "ingreso", "otros"]),
+                "user_id": (i % users) + 1,
+            }
+            for i in range(rows)
+        ])
+    return [auth.create_access_token({"sub": f"carga{i}@correo.com"}) for i in range(users)]
+
+
+async def drive(client, paths: list, tokens: list, concurrency: int, total: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        path = paths[i % len(paths)]
+        headers = {"Authorization": f"Bearer {random.choice(tokens)}"}
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                response = await asyncio.wait_for(client.get(path, headers=headers), REQUEST_TIMEOUT)
+                ok = response.status_code == 200
+            except asyncio.TimeoutError:
+                ok = False
+            latencies.append(time.perf_counter() - t0)
+            if not ok:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "errors": errors,
+    }
+
+
+async def main_async(args):
+    tokens = seed(args.users, args.rows)
+    register_sync_twins()
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results = {}
+        for name, paths in (
+            ("sync", ["/bench/sync" + p for p in ENDPOINTS]),
+            ("async", ENDPOINTS),
+        ):
+            # Calentamiento para abrir conexiones del pool
+            await drive(client, paths, tokens, 10, 50)
+            print(f"⏱️ {name}: {args.requests} requests con concurrencia {args.concurrency}...")
+            results[name] = await drive(client, paths, tokens, args.concurrency, args.requests)
+    await async_engine.dispose()
+
+    print(f"\n{'ruta':<8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errores':>10}")
+    for name, r in results.items():
+        print(f"{name:<8}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errors']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=50000)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark del costo de autenticación por request (get_current_user).
+
+Mide, por llamada: decodificación del JWT sola, resolución sin caché (consulta por email,
+como antes), resolución sin caché con el claim uid (consulta por clave primaria) y
+resolución con la caché de principals.
+
+Uso:
+    python bench_auth.py --iterations 5000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='pfm_auth_'), 'auth.db')}"
+
+from app import auth, crud, models, schemas
+from app.database import SessionLocal, engine
+from app.main import get_current_user
+
+
+def per_call_us(fn, iterations: int) -> float:
+    for _ in range(min(100, iterations)):
+        fn()
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - t0) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    user = crud.create_user(db, schemas.UserCreate(email="bench_auth@correo.com", password="clave123"))
+    token_email = auth.create_access_token({"sub": user.email})
+    token_uid = auth.create_access_token({"sub": user.email, "uid": user.id})
+
+    def decode_only():
+        auth.verify_token(token_uid)
+
+    def uncached(token):
+        def call():
+            auth.principal_cache.clear()
+            get_current_user(db=db, token=token)
+            db.expunge_all()
+        return call
+
+    def cached():
+        get_current_user(db=db, token=token_uid)
+        db.expunge_all()
+
+    results = [
+        ("solo decodificar JWT", per_call_us(decode_only, args.iterations)),
+        ("sin caché (email)", per_call_us(uncached(token_email), args.iterations)),
+        ("sin caché (uid)", per_call_us(uncached(token_uid), args.iterations)),
+        ("con caché", per_call_us(cached, args.iterations)),
+    ]
+    db.close()
+
+    print(f"{'camino':<24}{'µs/request':>12}")
+    for name, us in results:
+        print(f"{name:<24}{us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark de concurrencia de la base de datos: N lectores + M escritores.
+
+Compara el engine por defecto (solo check_same_thread=False) contra el engine
+configurado por app.database.create_db_engine (WAL, synchronous=NORMAL, busy_timeout, pool).
+
+Uso:
+    python bench_db_concurrency.py --readers 8 --writers 2 --seconds 5 --rows 20000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, func, insert, select
+from sqlalchemy.exc import OperationalError
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.database import create_db_engine
+from app import models
+
+
+def seed(engine, rows: int, users: int = 10):
+    """Crea las tablas y carga transacciones sintéticas"""
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": i + 1, "email": f"bench{i}@correo.com", "hashed_password": "x", "name": f"Bench {i}"}
+            for i in range(users)
+        ])
+        start = date(2023, 1, 1)
+        conn.execute(insert(models.Transaction), [
+            {
+                "description": f"COMPRA COMERCIO {i % 500}",
+                "amount": round(random.uniform(-2000, 500), 2),
+                "date": start + timedelta(days=i % 700),
+                "category": random.choice(["supermercado", "transporte", "restaurante", "ingreso"]),
+                "user_id": (i % users) + 1,
+            }
+            for i in range(rows)
+        ])
+
+
+def run(engine, readers: int, writers: int, seconds: float, users: int = 10) -> dict:
+    """Ejecuta lectores (agregaciones del dashboard) y escritores (inserts de upload) en paralelo"""
+    stop = threading.Event()
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def reader():
+        local = 0
+        errors = 0
+        while not stop.is_set():
+            user_id = random.randint(1, users)
+            try:
+                with engine.connect() as conn:
+                    conn.execute(
+                        select(models.Transaction.category, func.sum(models.Transaction.amount))
+                        .where(models.Transaction.user_id == user_id)
+                        .group_by(models.Transaction.category)
+                    ).all()
+                local += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            counts["reads"] += local
+            counts["errors"] += errors
+
+    def writer():
+        local = 0
+        errors = 0
+        while not stop.is_set():
+            try:
+                with engine.begin() as conn:
+                    conn.execute(insert(models.Transaction), [
+                        {
+                            "description": "COMPRA BENCH",
+                            "amount": -100.0,
+                            "date": date(2024, 1, 1),
+                            "category": "otros",
+                            "user_id": random.randint(1, users),
+                        }
+                        for _ in range(20)
+                    ])
+                local += 1
+            except OperationalError:
+                errors += 1
+        with lock:
+            counts["writes"] += local
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    return {
+        "reads_per_s": counts["reads"] / seconds,
+        "writes_per_s": counts["writes"] / seconds,
+        "errors": counts["errors"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="pfm_bench_")
+    configs = [
+        ("default", lambda url: create_engine(url, connect_args={"check_same_thread": False})),
+        ("tuned", lambda url: create_db_engine(url)),
+    ]
+
+    results = {}
+    for name, factory in configs:
+        url = f"sqlite:///{os.path.join(workdir, name + '.db')}"
+        engine = factory(url)
+        seed(engine, args.rows)
+        print(f"⏱️ {name}: {args.readers} lectores + {args.writers} escritores durante {args.seconds}s...")
+        results[name] = run(engine, args.readers, args.writers, args.seconds)
+        engine.dispose()
+
+    print(f"\n{'config':<10}{'lecturas/s':>14}{'escrituras/s':>16}{'errores':>10}")
+    for name, r in results.items():
+        print(f"{name:<10}{r['reads_per_s']:>14.1f}{r['writes_per_s']:>16.1f}{r['errors']:>10}")
+
+    base, tuned = results["default"], results["tuned"]
+    if base["reads_per_s"]:
+        print(f"\n📊 Ganancia en lecturas: x{tuned['reads_per_s'] / base['reads_per_s']:.2f}")
+    if base["writes_per_s"]:
+        print(f"📊 Ganancia en escrituras: x{tuned['writes_per_s'] / base['writes_per_s']:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark de la exportación en streaming: filas por segundo y memoria pico por formato.
+
+Uso:
+    python bench_export.py --rows 500000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='pfm_export_'), 'export.db')}"
+
+from sqlalchemy import insert
+
+from app import crud, export, models
+from app.database import engine
+
+
+def seed(rows: int, batch: int = 50000):
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"id": 1, "email": "export@correo.com", "hashed_password": "x"}])
+    start = date(2018, 1, 1)
+    for offset in range(0, rows, batch):
+        with engine.begin() as conn:
+            conn.execute(insert(models.Transaction), [
+                {
+                    "description": f"COMERCIO {i % 1000} CIUDAD DE MEXICO",
+                    "amount": round(random.uniform(-5000, 5000), 2),
+                    "date": start + timedelta(days=i % 3000),
+                    "category": random.choice(["supermercado", "transporte", None]),
+                    "user_id": 1,
+                }
+                for i in range(offset, min(rows, offset + batch))
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500000)
+    args = parser.parse_args()
+
+    seed(args.rows)
+    formats = ["csv", "ndjson"] + (["parquet"] if export.parquet_available() else [])
+
+    print(f"{'formato':<10}{'filas/s':>12}{'MB':>10}{'pico MB':>10}")
+    for name in formats:
+        # Pasada de tiempo (sin tracemalloc, que ralentiza las asignaciones)
+        t0 = time.perf_counter()
+        total_bytes = sum(len(chunk) for chunk in export.STREAMERS[name](crud.transactions_filter_statement(1)))
+        elapsed = time.perf_counter() - t0
+
+        tracemalloc.start()
+        for _ in export.STREAMERS[name](crud.transactions_filter_statement(1)):
+            pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:<10}{args.rows / elapsed:>12.0f}{total_bytes / 1e6:>10.1f}{peak / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
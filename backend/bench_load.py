@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga repetible de la API sobre una base grande sembrada con datos realistas.
+
+1. Siembra (con semilla fija) muchos usuarios y millones de transacciones: nómina quincenal,
+   suscripciones mensuales, servicios y gasto diario en comercios con su categoría, con
+   usuarios de actividad desigual. Usa inserts por lotes sobre el engine de la app, así que
+   sirve para SQLite o Postgres (DATABASE_URL).
+2. Corre `app.migrate` (índices, FTS y backfills) y reporta cuánto tardó.
+3. Dispara en proceso (httpx + ASGI) cada endpoint con la concurrencia pedida: listado,
+   filtros, resúmenes y login; reporta req/s y latencias p50/p95/p99 por endpoint.
+
+Con --reuse y una DATABASE_URL existente se salta la siembra, para comparar cambios de base
+de datos o de caché sobre los mismos datos.
+
+Uso:
+    python bench_load.py --users 500 --rows 1000000 --concurrency 50 --requests 2000
+    DATABASE_URL=sqlite:///carga.db python bench_load.py --reuse --endpoints filter_category summary_monthly
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# La base debe configurarse antes de importar la app
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='pfm_bench_load_'), 'load.db')}")
+os.environ.setdefault("DB_POOL_TIMEOUT", "10")
+
+import httpx
+from sqlalchemy import func, insert, select
+
+from app import auth, logs, migrate, models
+from app.async_database import async_engine
+from app.database import engine
+from app.main import app
+
+REQUEST_TIMEOUT = 60.0
+EMAIL_PREFIX = "carga"
+PASSWORD = "claveDeCarga123"
+START = date(2022, 1, 1)
+DAYS = 3 * 365
+
+# (descripción, categoría, monto mínimo, monto máximo)
+MERCHANTS = [
+    ("OXXO", "supermercado", 15, 250), ("WALMART", "supermercado", 150, 3500), ("SORIANA", "supermercado", 100, 2500),
+    ("UBER", "transporte", 45, 400), ("DIDI", "transporte", 40, 350), ("PEMEX", "transporte", 300, 1200),
+    ("STARBUCKS", "restaurante", 60, 250), ("RAPPI", "restaurante", 120, 700), ("VIPS", "restaurante", 200, 900),
+    ("LIVERPOOL", "compras", 300, 6000), ("AMAZON MX", "compras", 100, 4000), ("CINEPOLIS", "entretenimiento", 80, 450),
+    ("FARMACIA GUADALAJARA", "salud", 50, 900),
+]
+PLACES = ["REFORMA", "CENTRO", "POLANCO", "CONDESA", "SATELITE", "COYOACAN", "ROMA", "NAPOLES"]
+SUBSCRIPTIONS = [("NETFLIX", 219.0), ("SPOTIFY", 129.0), ("AMAZON PRIME", 99.0), ("SMART FIT", 549.0)]
+UTILITIES = [("CFE SUMINISTRADOR", 350, 1800), ("TELMEX INFINITUM", 389, 389), ("TELCEL PLAN", 299, 599)]
+
+
+def _user_rows(user_id: int, count: int, rng: random.Random):
+    """Filas de un usuario: fijas (nómina, suscripciones, servicios) y gasto diario hasta `count`"""
+    rows = []
+    salary = round(rng.uniform(12000, 60000), -2)
+    for months in range(DAYS // 30):
+        first = date(START.year + (START.month - 1 + months) // 12, (START.month - 1 + months) % 12 + 1, 1)
+        for day in (1, 15):
+            rows.append(("DEPOSITO NOMINA SPEI", salary / 2, first.replace(day=day), "ingreso"))
+        for name, amount in rng.sample(SUBSCRIPTIONS, rng.randint(0, len(SUBSCRIPTIONS))):
+            rows.append((f"{name} SUSCRIPCION", -amount, first.replace(day=5), "suscripciones"))
+        for name, low, high in UTILITIES:
+            rows.append((name, -round(rng.uniform(low, high), 2), first.replace(day=20), "servicios"))
+    rows = rows[:count]
+    for _ in range(count - len(rows)):
+        name, category, low, high = rng.choice(MERCHANTS)
+        description = f"{name} {rng.choice(PLACES)} {rng.randint(1, 999):03d}"
+        rows.append((description, -round(rng.uniform(low, high), 2), START + timedelta(days=rng.randrange(DAYS)), category))
+    return [
+        {"description": d, "amount": amount, "date": day, "category": category, "user_id": user_id}
+        for d, amount, day, category in rows
+    ]
+
+
+def seed(users: int, rows: int, seed_value: int = 42, batch: int = 50000) -> list:
+    """Crea usuarios (todos con PASSWORD) y ~`rows` transacciones; devuelve los ids de usuario"""
+    rng = random.Random(seed_value)
+    models.Base.metadata.create_all(bind=engine)
+    hashed = auth.get_password_hash(PASSWORD)  # un solo bcrypt para todos
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"email": f"{EMAIL_PREFIX}{i}@correo.com", "hashed_password": hashed, "name": f"Carga {i}"} for i in range(users)
+        ])
+        user_ids = conn.execute(
+            select(models.User.id).where(models.User.email.like(f"{EMAIL_PREFIX}%@correo.com")).order_by(models.User.id)
+        ).scalars().all()
+    # Actividad desigual: pocos usuarios concentran muchas filas (como en producción)
+    weights = [rng.paretovariate(1.5) for _ in user_ids]
+    scale = rows / sum(weights)
+    pending = []
+    for user_id, weight in zip(user_ids, weights):
+        pending.extend(_user_rows(user_id, max(1, round(weight * scale)), rng))
+        if len(pending) >= batch:
+            with engine.begin() as conn:
+                conn.execute(insert(models.Transaction), pending)
+            pending = []
+    if pending:
+        with engine.begin() as conn:
+            conn.execute(insert(models.Transaction), pending)
+    return list(user_ids)
+
+
+def existing_users() -> list:
+    with engine.connect() as conn:
+        return conn.execute(
+            select(models.User.id).where(models.User.email.like(f"{EMAIL_PREFIX}%@correo.com")).order_by(models.User.id)
+        ).scalars().all()
+
+
+def endpoints(rng: random.Random) -> dict:
+    """Endpoint -> (método, función que arma la ruta o el formulario de cada request)"""
+    def filter_dates():
+        start = START + timedelta(days=rng.randrange(DAYS - 90))
+        end = start + timedelta(days=90)
+        return f"/transactions/filter?start_date={start:%d-%m-%Y}&end_date={end:%d-%m-%Y}"
+
+    return {
+        "list": ("GET", lambda: "/transactions/?limit=100"),
+        "list_page": ("GET", lambda: f"/transactions/?limit=100&skip={rng.randrange(0, 2000, 100)}"),
+        "filter_dates": ("GET", filter_dates),
+        "filter_category": ("GET", lambda: f"/transactions/filter?category={rng.choice(MERCHANTS)[1]}&sign=expense&limit=50"),
+        "filter_amount": ("GET", lambda: f"/transactions/filter?min_amount=-5000&max_amount=-{rng.randint(500, 3000)}&sort=amount"),
+        "filter_description": ("GET", lambda: f"/transactions/filter?description_prefix={rng.choice(MERCHANTS)[0].split()[0]}"),
+        "summary_monthly": ("GET", lambda: "/transactions/summary/monthly"),
+        "summary_category": ("GET", lambda: "/transactions/summary/category"),
+        "summary_table": ("GET", lambda: "/transactions/summary/table"),
+        "login": ("POST", None),
+    }
+
+
+def percentile(samples: list, q: float) -> float:
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    return samples[min(len(samples) - 1, max(0, int(round(q / 100 * len(samples))) - 1))]
+
+
+async def drive(client, method: str, make_path, user_ids: list, tokens: dict, concurrency: int, total: int, rng: random.Random) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        user_index = rng.randrange(len(user_ids))
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                if method == "POST":
+                    request = client.post("/login", data={"username": f"{EMAIL_PREFIX}{user_index}@correo.com", "password": PASSWORD})
+                else:
+                    request = client.get(make_path(), headers={"Authorization": f"Bearer {tokens[user_ids[user_index]]}"})
+                response = await asyncio.wait_for(request, REQUEST_TIMEOUT)
+                ok = response.status_code == 200
+            except asyncio.TimeoutError:
+                ok = False
+            latencies.append(time.perf_counter() - t0)
+            if not ok:
+                errors += 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "requests": total,
+        "rps": total / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "errors": errors,
+    }
+
+
+async def run_load(args, user_ids: list) -> dict:
+    rng = random.Random(args.seed)
+    tokens = {user_id: auth.create_access_token({"sub": f"{EMAIL_PREFIX}{i}@correo.com", "uid": user_id}) for i, user_id in enumerate(user_ids)}
+    specs = endpoints(rng)
+    selected = args.endpoints or list(specs)
+    results = {}
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in selected:
+            method, make_path = specs[name]
+            total = args.login_requests if name == "login" else args.requests
+            await drive(client, method, make_path, user_ids, tokens, min(10, args.concurrency), min(20, total), rng)  # calentamiento
+            results[name] = await drive(client, method, make_path, user_ids, tokens, args.concurrency, total, rng)
+            r = results[name]
+            print(f"{name:<20}{r['requests']:>9}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errors']:>9}")
+    await async_engine.dispose()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000, help="requests por endpoint")
+    parser.add_argument("--login-requests", type=int, default=200, help="el login paga bcrypt en cada request")
+    parser.add_argument("--endpoints", nargs="+", choices=list(endpoints(random.Random())))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reuse", action="store_true", help="no siembra si la base ya tiene usuarios de carga")
+    parser.add_argument("--json", help="guarda los resultados en este archivo")
+    args = parser.parse_args()
+
+    logs.configure(level="WARNING")
+    print(f"Base: {engine.url.render_as_string(hide_password=True)}")
+    models.Base.metadata.create_all(bind=engine)
+    user_ids = existing_users() if args.reuse else []
+    if user_ids:
+        print(f"♻️ Reutilizando {len(user_ids)} usuarios de carga")
+    else:
+        t0 = time.perf_counter()
+        user_ids = seed(args.users, args.rows, args.seed)
+        print(f"🌱 Siembra: {len(user_ids)} usuarios en {time.perf_counter() - t0:.1f}s")
+    t0 = time.perf_counter()
+    migrate.run(engine)
+    with engine.connect() as conn:
+        total_rows = conn.execute(select(func.count()).select_from(models.Transaction)).scalar()
+    print(f"🛠️ Migración (índices, FTS, backfills): {time.perf_counter() - t0:.1f}s   transacciones: {total_rows}")
+
+    print(f"\nconcurrencia {args.concurrency}")
+    print(f"{'endpoint':<20}{'requests':>9}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errores':>9}")
+    results = asyncio.run(run_load(args, user_ids))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": total_rows, "users": len(user_ids), "concurrency": args.concurrency, "endpoints": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
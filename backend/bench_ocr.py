@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark de precisión contra tiempo del OCR de estados de cuenta escaneados (app/extraction.py):
+OCR fijo (toda página a 300 DPI, --psm 6) contra OCR adaptativo (OCR_BASE_DPI y relectura a
+OCR_MAX_DPI solo de lo que Tesseract marca con baja confianza).
+
+Los "escaneos" se generan: un estado sintético (synthetic_statements.py) se rasteriza, se le
+agrega desenfoque, ruido y una rotación leve, y se guarda como PDF de imagen (sin capa de
+texto), así que el texto esperado se conoce. Con --pdf se agregan PDFs reales; su referencia
+es su capa de texto si es legible, si no, la salida del OCR fijo.
+
+Métricas: segundos por página, precisión por caracteres (difflib), y recall de montos y
+fechas (lo que importa para las transacciones).
+
+Requiere Tesseract (con los idiomas spa y eng), pytesseract y OpenCV.
+
+Uso:
+    python bench_ocr.py
+    python bench_ocr.py --pages 3 --banks generico hsbc --pdf uploaded_pdfs/estado.pdf
+    OCR_MIN_CONFIDENCE=70 OCR_BASE_DPI=200 python bench_ocr.py
+"""
+import argparse
+import difflib
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import extraction, logs, telemetry
+import synthetic_statements
+
+LINES_PER_PAGE = 60
+_AMOUNT = re.compile(r"\d{1,3}(?:,\d{3})*\.\d{2}")
+_DATE = re.compile(r"\d{2}-[A-Za-z]{3}-\d{4}")
+
+
+def scan_pdf(text_pdf: str, out_path: str, dpi: int = 200, seed: int = 42):
+    """Convierte un PDF de texto en un PDF de imagen con defectos de escáner"""
+    import pdfplumber
+    from PIL import Image, ImageFilter
+
+    rng = random.Random(seed)
+    images = []
+    with pdfplumber.open(text_pdf) as pdf:
+        for page in pdf.pages:
+            image = page.to_image(resolution=dpi).original.convert("L")
+            image = image.rotate(rng.uniform(-0.6, 0.6), resample=Image.BICUBIC, fillcolor=255)
+            image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0.4, 0.9)))
+            noise = Image.effect_noise(image.size, 40).point(lambda value: 255 if value > 90 else value)
+            images.append(Image.blend(image, noise, 0.12))
+    images[0].save(out_path, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+
+
+def _normalize(text: str) -> str:
+    return "\n".join(" ".join(line.split()) for line in text.splitlines() if line.strip())
+
+
+def char_accuracy(truth: str, text: str) -> float:
+    """Similitud por caracteres (0-1) ignorando espacios repetidos y líneas vacías"""
+    return difflib.SequenceMatcher(None, _normalize(truth), _normalize(text), autojunk=False).ratio()
+
+
+def field_recall(truth: str, text: str, pattern: re.Pattern = _AMOUNT) -> float:
+    """Fracción de los montos (o fechas) del texto esperado que aparecen en el OCR, con repeticiones"""
+    expected = Counter(pattern.findall(truth))
+    if not expected:
+        return 1.0
+    found = Counter(pattern.findall(text))
+    return sum(min(count, found[value]) for value, count in expected.items()) / sum(expected.values())
+
+
+def synthetic_cases(banks: List[str], pages: int, workdir: str) -> List[Tuple[str, str, str]]:
+    """(nombre, PDF escaneado, texto esperado) por banco"""
+    cases = []
+    for bank in banks:
+        text, _ = synthetic_statements.statement(bank, pages * LINES_PER_PAGE - 4)
+        text_pdf = os.path.join(workdir, f"{bank}.pdf")
+        scanned = os.path.join(workdir, f"{bank}_escaneado.pdf")
+        synthetic_statements.write_pdf(text, text_pdf, LINES_PER_PAGE)
+        scan_pdf(text_pdf, scanned)
+        cases.append((f"{bank}/{pages}p", scanned, text))
+    return cases
+
+
+def ocr(path: str, adaptive: bool) -> Tuple[str, float, Dict[str, int]]:
+    """Texto, segundos y resumen de relecturas del OCR de todas las páginas"""
+    import pdfplumber
+
+    with pdfplumber.open(path) as pdf, telemetry.trace() as pipeline:
+        start = time.perf_counter()
+        text = extraction._extract_with_ocr(pdf, adaptive=adaptive)
+        seconds = time.perf_counter() - start
+    spans = [span.attributes for span in pipeline.spans if span.stage == "ocr_page"]
+    retries = {
+        "pages": len(spans),
+        "pages_reread": sum(attrs.get("dpi") == extraction.OCR_MAX_DPI for attrs in spans) if adaptive else 0,
+        "regions_reread": sum(attrs.get("regions", 0) for attrs in spans),
+    }
+    return text, seconds, retries
+
+
+def reference(path: str) -> Optional[str]:
+    """Capa de texto de un PDF real, si es legible"""
+    text = extraction.extract_plain_text(path)
+    return text if text.strip() and "(cid:" not in text else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--banks", nargs="+", default=list(synthetic_statements.BANKS), choices=synthetic_statements.BANKS)
+    parser.add_argument("--pages", type=int, default=2)
+    parser.add_argument("--pdf", nargs="*", default=[], help="PDFs reales adicionales")
+    args = parser.parse_args()
+
+    try:
+        import cv2  # noqa: F401
+        import pytesseract
+
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        sys.exit(f"Se necesitan Tesseract, pytesseract y OpenCV para este benchmark: {e}")
+
+    logs.configure(level="WARNING")
+    workdir = tempfile.mkdtemp(prefix="pfm_bench_ocr_")
+    cases = synthetic_cases(args.banks, args.pages, workdir) + [(os.path.basename(p), p, None) for p in args.pdf]
+    print(f"base {extraction.OCR_BASE_DPI} DPI, relectura {extraction.OCR_MAX_DPI} DPI, "
+          f"confianza mínima {extraction.OCR_MIN_CONFIDENCE:g}, página completa si > {extraction.OCR_PAGE_RETRY_FRACTION:.0%} dudosas")
+    print(f"{'caso':<22}{'modo':<11}{'s/pág':>8}{'chars':>8}{'montos':>8}{'fechas':>8}{'págs+':>7}{'líneas+':>9}")
+    totals = {"fijo": [0.0, 0.0, 0], "adaptivo": [0.0, 0.0, 0]}
+    for name, path, truth in cases:
+        runs = {"fijo": ocr(path, adaptive=False), "adaptivo": ocr(path, adaptive=True)}
+        truth = truth or reference(path) or runs["fijo"][0]
+        for mode, (text, seconds, retries) in runs.items():
+            pages = max(1, retries["pages"])
+            accuracy = char_accuracy(truth, text)
+            totals[mode][0] += seconds
+            totals[mode][1] += accuracy
+            totals[mode][2] += 1
+            print(f"{name:<22}{mode:<11}{seconds / pages:>8.2f}{accuracy:>8.3f}"
+                  f"{field_recall(truth, text):>8.3f}{field_recall(truth, text, _DATE):>8.3f}"
+                  f"{retries['pages_reread']:>7}{retries['regions_reread']:>9}")
+    fixed, adaptive = totals["fijo"], totals["adaptivo"]
+    print(f"\nadaptivo: {adaptive[0] / fixed[0]:.2f}x el tiempo del fijo, "
+          f"precisión media {adaptive[1] / adaptive[2]:.3f} contra {fixed[1] / fixed[2]:.3f}")
+
+
+if __name__ == "__main__":
+    main()
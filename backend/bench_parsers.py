@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline de los parsers de estados de cuenta (app/extraction.py) sobre estados
+sintéticos de synthetic_statements.py: extract_standard_transactions, extract_hsbc_transactions,
+extract_santander_transactions, parse_date, clean_ocr_text y extract_plain_text (PDF generado).
+
+Los tiempos se guardan en bench_parsers_baselines.json divididos entre una carga de
+calibración medida en la misma corrida, para que la línea base sirva en otra máquina.
+test_parser_bench.py falla si un caso supera su línea base por más de PARSER_BENCH_TOLERANCE.
+
+Uso:
+    python bench_parsers.py                      # tabla contra la línea base
+    python bench_parsers.py --sizes 10 100 1000 --check
+    python bench_parsers.py --update-baselines   # después de una optimización intencional
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Tuple
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import extraction, logs
+import synthetic_statements
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_parsers_baselines.json")
+SIZES = (10, 100, 1000, 10000)
+TOLERANCE = float(os.getenv("PARSER_BENCH_TOLERANCE", "3.0"))
+
+_DATE_FORMATS = ("{d:02d}-{en}-{y}", "{d:02d}-{es}-{y}", "{d:02d}-{m:02d}-{y}", "{d:02d}/{m:02d}/{y}", "{y}-{m:02d}-{d:02d}")
+_MONTHS_EN = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+_MONTHS_ES = ("ENE", "FEB", "MAR", "ABR", "MAY", "JUN", "JUL", "AGO", "SEP", "OCT", "NOV", "DIC")
+
+
+def _dates(n: int, seed: int = 42) -> list:
+    """Fechas en los formatos que acepta parse_date (la mayoría pasa por el mapeo de meses)"""
+    rng = random.Random(seed)
+    values = []
+    for _ in range(n):
+        m, d = rng.randint(1, 12), rng.randint(1, 28)
+        fmt = rng.choice(_DATE_FORMATS)
+        values.append(fmt.format(d=d, m=m, y=2025, en=_MONTHS_EN[m - 1], es=_MONTHS_ES[m - 1]))
+    return values
+
+
+def _text_case(parser: Callable, bank: str) -> Callable[[int], Callable]:
+    def build(n: int):
+        text, _ = synthetic_statements.statement(bank, n)
+        return lambda: parser(text)
+    return build
+
+
+def _parse_date_case(n: int):
+    values = _dates(n)
+    return lambda: [extraction.parse_date(value) for value in values]
+
+
+def _clean_ocr_case(n: int):
+    text = synthetic_statements.ocr_noise(synthetic_statements.statement("hsbc", n)[0])
+    return lambda: extraction.clean_ocr_text(text)
+
+
+def _pdf_case(n: int):
+    path = os.path.join(tempfile.mkdtemp(prefix="pfm_bench_pdf_"), f"generico_{n}.pdf")
+    synthetic_statements.write_pdf(synthetic_statements.statement("generico", n)[0], path)
+    return lambda: extraction.extract_plain_text(path)
+
+
+CASES: Dict[str, Tuple[Callable, int]] = {
+    # nombre: (constructor(n) -> función a medir, tamaño máximo)
+    "standard": (_text_case(extraction.extract_standard_transactions, "generico"), 10000),
+    "santander": (_text_case(extraction.extract_santander_transactions, "santander"), 10000),
+    "hsbc": (_text_case(extraction.extract_hsbc_transactions, "hsbc"), 10000),
+    "parse_date": (_parse_date_case, 10000),
+    "clean_ocr_text": (_clean_ocr_case, 10000),
+    "pdf_plain_text": (_pdf_case, 1000),
+}
+
+
+def timed(fn: Callable, repeat: int) -> float:
+    """Mejor tiempo (segundos) de `repeat` corridas"""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def calibrate() -> float:
+    """Carga fija de regex + strings + ordenamiento en Python puro, para normalizar tiempos"""
+    rng = random.Random(7)
+    text = "\n".join(f"{rng.randint(1, 28):02d}-Mar-2025 COMERCIO {i} - ${rng.uniform(1, 9999):,.2f}" for i in range(5000))
+    pattern = re.compile(r"(\d{2}-[A-Za-z]{3}-\d{4})\s+(.+?)\s+([+-])\s*\$([\d,]+\.\d{2})")
+
+    def work():
+        rows = [pattern.search(line).groups() for line in text.split("\n")]
+        sorted(float(row[3].replace(",", "")) for row in rows)
+
+    return timed(work, 7)
+
+
+def repeat_for(size: int) -> int:
+    return 7 if size <= 100 else 5 if size <= 1000 else 3
+
+
+def run(sizes=SIZES, cases=None) -> Dict[str, float]:
+    """{"caso/tamaño": tiempo normalizado por la calibración}"""
+    unit = calibrate()
+    results = {}
+    for name, (build, max_size) in CASES.items():
+        if cases and name not in cases:
+            continue
+        for size in sizes:
+            if size > max_size:
+                continue
+            results[f"{name}/{size}"] = timed(build(size), repeat_for(size)) / unit
+    return results
+
+
+def load_baselines(path: str = BASELINES_PATH) -> Dict[str, float]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["cases"]
+
+
+def save_baselines(results: Dict[str, float], path: str = BASELINES_PATH):
+    baselines = load_baselines(path)
+    baselines.update({key: round(value, 4) for key, value in results.items()})
+    with open(path, "w") as f:
+        json.dump({"unit": "tiempo / calibrate()", "cases": dict(sorted(baselines.items()))}, f, indent=2)
+        f.write("\n")
+
+
+def regressions(results: Dict[str, float], baselines: Dict[str, float], tolerance: float = TOLERANCE) -> Dict[str, float]:
+    """Casos cuyo tiempo normalizado supera `tolerance` veces su línea base: {caso: razón}"""
+    return {
+        key: value / baselines[key]
+        for key, value in results.items()
+        if key in baselines and value > baselines[key] * tolerance
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES))
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--check", action="store_true", help="termina con código 1 si hay regresiones")
+    args = parser.parse_args()
+
+    logs.configure(level="WARNING")
+    unit_ms = calibrate() * 1000
+    results = run(args.sizes, args.cases)
+    baselines = load_baselines()
+    print(f"calibración: {unit_ms:.2f} ms   tolerancia: {TOLERANCE:.1f}x")
+    print(f"{'caso':<26}{'ms':>10}{'µs/fila':>10}{'normal.':>10}{'base':>10}{'razón':>8}")
+    for key, value in results.items():
+        size = int(key.split("/")[1])
+        base = baselines.get(key)
+        ratio = f"{value / base:>8.2f}" if base else f"{'-':>8}"
+        print(f"{key:<26}{value * unit_ms:>10.2f}{value * unit_ms * 1000 / size:>10.1f}{value:>10.3f}{base or 0:>10.3f}{ratio}")
+
+    if args.update_baselines:
+        save_baselines(results)
+        print(f"Líneas base actualizadas en {os.path.basename(BASELINES_PATH)}")
+    if args.check:
+        slow = regressions(results, baselines)
+        for key, ratio in slow.items():
+            print(f"❌ Regresión en {key}: {ratio:.2f}x la línea base")
+        sys.exit(1 if slow else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark de búsqueda por descripción: FTS5 (app.search) vs LIKE '%x%'.
+
+Uso:
+    python bench_search.py --rows 1000000 --users 200 --queries 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import insert, select
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import models, search
+from app.database import create_db_engine
+
+MERCHANTS = [
+    "OXXO", "WALMART", "SORIANA", "UBER", "DIDI", "NETFLIX", "SPOTIFY", "AMAZON", "LIVERPOOL",
+    "STARBUCKS", "CINEPOLIS", "TELCEL", "CFE", "PEMEX", "FARMACIA GUADALAJARA", "SANBORNS",
+]
+PLACES = ["REFORMA", "CENTRO", "POLANCO", "CONDESA", "SATELITE", "COYOACAN", "ROMA", "NAPOLES"]
+
+
+def seed(engine, rows: int, users: int, batch: int = 50000):
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": i + 1, "email": f"fts{i}@correo.com", "hashed_password": "x"} for i in range(users)
+        ])
+    start = date(2020, 1, 1)
+    for offset in range(0, rows, batch):
+        with engine.begin() as conn:
+            conn.execute(insert(models.Transaction), [
+                {
+                    "description": f"{random.choice(MERCHANTS)} {random.choice(PLACES)} {random.randint(1, 9999)}",
+                    "amount": -round(random.uniform(10, 3000), 2),
+                    "date": start + timedelta(days=i % 2000),
+                    "category": "otros",
+                    "user_id": random.randint(1, users),
+                }
+                for i in range(offset, min(rows, offset + batch))
+            ])
+
+
+def timed(fn, n: int) -> list:
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    engine = create_db_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='pfm_fts_'), 'fts.db')}")
+    t0 = time.perf_counter()
+    seed(engine, args.rows, args.users)
+    print(f"📦 {args.rows} transacciones cargadas en {time.perf_counter() - t0:.1f}s")
+
+    terms = ["oxx", "netflix", "farmacia gua", "uber roma", "starb"]
+
+    def fts_query():
+        stmt = search.search_statement("sqlite", random.randint(1, args.users), random.choice(terms), limit=50)
+        with engine.connect() as conn:
+            conn.execute(stmt).all()
+
+    def like_query():
+        term = random.choice(terms).split()[0]
+        stmt = select(models.Transaction).where(
+            models.Transaction.user_id == random.randint(1, args.users),
+            models.Transaction.description.ilike(f"%{term}%"),
+        ).limit(50)
+        with engine.connect() as conn:
+            conn.execute(stmt).all()
+
+    print(f"\n{'método':<8}{'p50 ms':>10}{'p95 ms':>10}{'máx ms':>10}")
+    for name, fn in (("fts5", fts_query), ("like", like_query)):
+        samples = timed(fn, args.queries)
+        p95 = samples[int(len(samples) * 0.95) - 1]
+        print(f"{name:<8}{statistics.median(samples):>10.2f}{p95:>10.2f}{samples[-1]:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Fixtures compartidas para las pruebas en proceso (sin servidor corriendo).
+Las pruebas que usan `requests` contra http://localhost:8000 no dependen de estos fixtures.
+"""
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# La base de pruebas debe configurarse antes de importar app.database
+_TEST_DB_DIR = tempfile.mkdtemp(prefix="pfm_test_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_TEST_DB_DIR, 'test_pfm.db')}")
+os.environ.setdefault("SECRET_KEY", "clave_de_pruebas")
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app.main import app as fastapi_app
+    from app import migrate
+
+    migrate.run()
+    return fastapi_app
+
+
+@pytest.fixture
+def db_session(app):
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def _register(client, name):
+    """Registra un usuario nuevo y devuelve (email, password)"""
+    email = f"usuario_{uuid.uuid4().hex[:8]}@correo.com"
+    password = "claveSegura123"
+    response = client.post("/register", json={"email": email, "password": password, "name": name})
+    assert response.status_code == 200, response.text
+    return email, password
+
+
+def _login(client, email, password):
+    response = client.post("/login", data={"username": email, "password": password})
+    assert response.status_code == 200, response.text
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def user_credentials(client):
+    """Registra un usuario nuevo y devuelve (email, password)"""
+    return _register(client, "Prueba")
+
+
+@pytest.fixture
+def auth_headers(client, user_credentials):
+    return _login(client, *user_credentials)
+
+
+@pytest.fixture
+def other_auth_headers(client):
+    """Encabezados de un segundo usuario, para probar el aislamiento entre cuentas"""
+    return _login(client, *_register(client, "Otra"))
@@ -41,6 +41,7 @@ class TestEnvironmentSetup:
             # Activar entorno virtual y ejecutar uvicorn
             cmd = [
                 "source", "venv/bin/activate", "&&",
+                "python", "-m", "app.migrate", "&&",
                 "python", "-m", "uvicorn", "app.main:app", 
                 "--reload", "--host", "0.0.0.0", "--port", "8000"
             ]
@@ -14,6 +14,8 @@ if [ ! -d "venv" ]; then
   exit 1
 fi
 source venv/bin/activate
+# Migrar el esquema una vez antes de arrancar (la API ya no lo hace al importar)
+python3 -m app.migrate || exit 1
 nohup python3 -m uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 > backend.log 2>&1 &
 BACKEND_PID=$!
 echo "Backend iniciado (PID $BACKEND_PID) en http://localhost:8000/"
@@ -0,0 +1,136 @@
+"""
+Generador determinista (con semilla) de estados de cuenta sintéticos para pruebas y benchmarks
+de los parsers de app/extraction.py, sin PDFs reales ni servidor.
+
+- Formatos: "generico" (BBVA, lo lee extract_standard_transactions), "santander" y "hsbc".
+- `statement(bank, n, seed)` devuelve el texto y las transacciones esperadas.
+- `ocr_noise(text, seed)` ensucia el texto como lo haría Tesseract (para clean_ocr_text).
+- `write_pdf(text, path)` escribe un PDF de texto (Courier, varias páginas) sin reportlab,
+  legible por pdfplumber.
+"""
+import random
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+BANKS = ("generico", "santander", "hsbc")
+
+_MONTHS_EN = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+_MONTHS_ES = ("ENE", "FEB", "MAR", "ABR", "MAY", "JUN", "JUL", "AGO", "SEP", "OCT", "NOV", "DIC")
+
+_MERCHANTS = (
+    "OXXO REFORMA", "WALMART SUPERCENTER", "UBER TRIP", "NETFLIX COM", "CFE SUMINISTRADOR",
+    "TELMEX PAGO", "STARBUCKS COFFEE", "LIVERPOOL POLANCO", "GASOLINERA PEMEX", "AMAZON MX",
+    "FARMACIA GUADALAJARA", "CINEPOLIS ANDARES", "SORIANA HIPER", "RAPPI RESTAURANTES", "SPOTIFY",
+)
+_DEPOSITS = ("DEPOSITO NOMINA", "ABONO TRANSFERENCIA SPEI", "DEPOSITO EFECTIVO")
+
+_HEADERS = {
+    "generico": ["BBVA MEXICO", "ESTADO DE CUENTA", "Fecha Operacion Fecha Cargo Descripcion Monto"],
+    "santander": ["BANCO SANTANDER MEXICO", "ESTADO DE CUENTA", "FECHA FOLIO DESCRIPCION MONTO SALDO"],
+    "hsbc": ["HSBC MEXICO", "ESTADO DE CUENTA", "CARGOS, ABONOS Y COMPRAS REGULARES"],
+}
+
+
+def _money(value: float) -> str:
+    return f"{value:,.2f}"
+
+
+def _rows(n: int, rng: random.Random) -> List[Tuple[date, str, float]]:
+    day = date(2025, 1, 1)
+    rows = []
+    for i in range(n):
+        day += timedelta(days=rng.random() < 0.3)
+        if rng.random() < 0.15:
+            rows.append((day, f"{rng.choice(_DEPOSITS)} REF{i:06d}", round(rng.uniform(1000, 30000), 2)))
+        else:
+            rows.append((day, f"{rng.choice(_MERCHANTS)} REF{i:06d}", -round(rng.uniform(10, 5000), 2)))
+    return rows
+
+
+def _line(bank: str, day: date, description: str, amount: float, balance: float, folio: int) -> str:
+    if bank == "generico":
+        fecha = f"{day.day:02d}-{_MONTHS_EN[day.month - 1]}-{day.year}"
+        sign = "+" if amount > 0 else "-"
+        return f"{fecha} {fecha} {description} {sign} ${_money(abs(amount))}"
+    fecha = f"{day.day:02d}-{_MONTHS_ES[day.month - 1]}-{day.year}"
+    if bank == "santander":
+        return f"{fecha} {folio:07d} {description} {_money(abs(amount))} {_money(balance)}"
+    sign = "+" if amount > 0 else "-"
+    return f"{fecha} {fecha} {description} {sign}${_money(abs(amount))}"
+
+
+def statement(bank: str, n: int, seed: int = 42) -> Tuple[str, List[Dict]]:
+    """Texto de un estado de cuenta con `n` movimientos y las transacciones que contiene"""
+    if bank not in BANKS:
+        raise ValueError(f"Banco no soportado: {bank}")
+    rng = random.Random(f"{bank}:{n}:{seed}")
+    lines = list(_HEADERS[bank])
+    expected = []
+    balance = 50000.0
+    for folio, (day, description, amount) in enumerate(_rows(n, rng), start=1000000):
+        balance = round(balance + amount, 2)
+        lines.append(_line(bank, day, description, amount, balance, folio))
+        expected.append({"date": day, "descripcion": description, "monto": amount})
+    lines.append(f"SALDO FINAL {_money(balance)}")
+    return "\n".join(lines) + "\n", expected
+
+
+_OCR_SWAPS = (("0", "O"), ("1", "l"), ("1", "I"), ("5", "S"), ("8", "B"))
+
+
+def ocr_noise(text: str, seed: int = 42, rate: float = 0.05) -> str:
+    """Introduce confusiones típicas de OCR (0/O, 1/l, 5/S), pipes y líneas basura"""
+    rng = random.Random(seed)
+    noisy = []
+    for line in text.splitlines():
+        chars = list(line)
+        for i, char in enumerate(chars):
+            if rng.random() < rate:
+                for original, swapped in _OCR_SWAPS:
+                    if char == original:
+                        chars[i] = swapped
+                        break
+        line = "".join(chars)
+        if rng.random() < rate:
+            line = f"|| {line} ||"
+        noisy.append(line)
+        if rng.random() < rate:
+            noisy.append(rng.choice(("~", "..", "|||", "_ _")))
+    return "\n".join(noisy) + "\n"
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(text: str, path: str, lines_per_page: int = 60):
+    """PDF mínimo (PDF 1.4, Courier 8 pt) con una línea de texto por renglón"""
+    lines = text.splitlines() or [""]
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+    # 1: catálogo, 2: árbol de páginas, 3: fuente; luego (página, contenido) por página
+    objects = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>"]
+    kids = []
+    for page in pages:
+        stream = "BT /F1 8 Tf 10 TL 36 756 Td\n" + "".join(f"({_escape(line)}) Tj T*\n" for line in page) + "ET"
+        data = stream.encode("latin-1", errors="replace")
+        page_id, content_id = len(objects) + 1, len(objects) + 2
+        kids.append(f"{page_id} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+            f"/Contents {content_id} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(data) + data + b"\nendstream")
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
@@ -0,0 +1,79 @@
+"""
+Pruebas del motor de analítica columnar y su caché por usuario.
+"""
+import random
+from datetime import date, timedelta
+
+from app import analytics, crud, schemas
+
+
+def _filas(n, seed=7):
+    rnd = random.Random(seed)
+    inicio = date(2023, 1, 1)
+    return [
+        (inicio + timedelta(days=rnd.randrange(500)), round(rnd.uniform(-900, 600), 2), rnd.choice(["comida", "renta", None, "ocio"]))
+        for _ in range(n)
+    ]
+
+
+def test_frame_coincide_con_sql(db_session, user_credentials):
+    user = crud.get_user_by_email(db_session, user_credentials[0])
+    crud.bulk_create_transactions(db_session, user.id, (
+        {"date": d, "amount": a, "category": c, "description": "MOV"} for d, a, c in _filas(2000)
+    ))
+    db_session.commit()
+    frame = analytics.UserFrame.from_rows(db_session.execute(analytics.frame_statement(user.id)).tuples())
+
+    mensual_sql = [(int(r.year), int(r.month), round(r.total, 2)) for r in db_session.execute(crud.monthly_summary_statement(user.id))]
+    assert [(r["year"], r["month"], round(r["total"], 2)) for r in frame.monthly_totals()] == mensual_sql
+
+    categorias_sql = [(r.category, round(r.total, 2)) for r in db_session.execute(crud.category_summary_statement(user.id))]
+    assert [(r["category"], r["total"]) for r in frame.category_totals()] == categorias_sql
+
+    tabla_sql = sorted((int(r.year), int(r.month), r.category or "", round(r.total, 2)) for r in db_session.execute(crud.summary_table_statement(user.id)))
+    assert sorted((r["year"], r["month"], r["category"] or "", r["total"]) for r in frame.category_month_totals()) == tabla_sql
+
+
+def test_totales_por_rango():
+    frame = analytics.UserFrame.from_rows([
+        (date(2024, 1, 31), -10.10, "a"),
+        (date(2024, 1, 1), 100.0, None),
+        (date(2024, 2, 1), -0.20, "b"),
+        (date(2024, 1, 15), -5.05, "a"),
+    ])
+    assert frame.range_totals(date(2024, 1, 1), date(2024, 1, 31)) == {"income": 100.0, "expenses": -15.15, "net": 84.85, "count": 3}
+    assert frame.range_totals(date(2025, 1, 1)) == {"income": 0.0, "expenses": 0.0, "net": 0.0, "count": 0}
+    assert frame.category_totals(end_date=date(2024, 1, 31)) == [{"category": "a", "total": -15.15, "count": 2}]
+
+
+def test_cache_lru_por_bytes_y_version():
+    frame = analytics.UserFrame.from_rows(_filas(100))
+    cache = analytics.AnalyticsCache(max_bytes=frame.nbytes * 2)
+    cache.put(1, 1, frame)
+    cache.put(2, 1, frame)
+    assert cache.get(1, 1) is frame  # 1 pasa a ser el más reciente
+    cache.put(3, 1, frame)
+    assert cache.get(2, 1) is None
+    assert cache.nbytes <= cache.max_bytes
+    assert cache.get(1, 2) is None  # otra versión de datos
+    cache.put(1, 5, frame)
+    cache.put(1, 4, frame)  # una carga más vieja no reemplaza a la nueva
+    assert cache.get(1, 5) is frame
+
+
+def test_escrituras_invalidan_y_endpoint_de_rango(client, auth_headers, db_session, user_credentials):
+    user = crud.get_user_by_email(db_session, user_credentials[0])
+    client.post("/transactions/", json={"description": "NOMINA", "amount": 1000, "date": "2025-05-01"}, headers=auth_headers)
+    assert client.get("/transactions/summary/category", headers=auth_headers).json() == []
+    assert user.id in analytics.analytics_cache._entries
+
+    client.post("/transactions/", json={"description": "CINE", "amount": -150.5, "date": "2025-05-03", "category": "ocio"}, headers=auth_headers)
+    assert user.id not in analytics.analytics_cache._entries
+    assert client.get("/transactions/summary/category", headers=auth_headers).json() == [{"category": "ocio", "total": 150.5}]
+
+    rango = client.get("/transactions/summary/range", params={"start_date": "02-05-2025"}, headers=auth_headers).json()
+    assert rango == {"income": 0.0, "expenses": -150.5, "net": -150.5, "count": 1,
+                     "by_category": [{"category": "ocio", "total": 150.5, "count": 1}]}
+    assert client.get("/transactions/summary/range", params={"end_date": "2025-05-02"}, headers=auth_headers).status_code == 400
+    crud.create_transaction(db_session, schemas.TransactionCreate(description="X", amount=-1, date=date(2025, 5, 4)), user.id)
+    assert client.get("/transactions/summary/range", headers=auth_headers).json()["count"] == 3
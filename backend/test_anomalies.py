@@ -0,0 +1,156 @@
+"""
+Pruebas de la detección de gastos inusuales (app/anomalies.py y /transactions/anomalies).
+"""
+import random
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import select
+
+from app import anomalies, crud, models
+
+
+def _spikes_ingenuo(history, cents):
+    """Mismo criterio fila por fila, sin vectorizar"""
+    valores = list(history)
+    encontrados = []
+    for i, monto in enumerate(cents):
+        previos = np.array(valores[-anomalies.WINDOW:], dtype=np.float64)
+        valores.append(monto)
+        if len(previos) < anomalies.MIN_HISTORY:
+            continue
+        mediana = np.median(previos)
+        escala = max(np.median(np.abs(previos - mediana)) * 1.4826, mediana * 0.05, 100.0)
+        z = (monto - mediana) / escala
+        if z >= anomalies.Z_THRESHOLD and monto >= mediana * anomalies.MIN_RATIO:
+            encontrados.append((i, round(z, 9), mediana))
+    return encontrados
+
+
+@pytest.mark.parametrize("semilla,historial", [(1, 0), (2, 3), (3, 40), (4, 5000)])
+def test_vectorizado_coincide_con_bucle(semilla, historial):
+    rnd = np.random.default_rng(semilla)
+    history = rnd.lognormal(10, 0.3, historial).astype(np.int64)
+    cents = rnd.lognormal(10, 0.6, 9000).astype(np.int64)  # más de un bloque
+    indices, z, mediana = anomalies.category_spikes(history, cents)
+    esperado = _spikes_ingenuo(history, cents)
+    assert len(esperado) > 0
+    assert list(zip(indices.tolist(), np.round(z, 9).tolist(), mediana.tolist())) == esperado
+
+
+def _gastos(inicio, dias, descripcion, monto, categoria, rnd):
+    return [
+        {"description": descripcion, "amount": -round(monto * rnd.uniform(0.9, 1.1), 2),
+         "date": inicio + timedelta(days=d), "category": categoria}
+        for d in range(dias)
+    ]
+
+
+def test_pico_de_categoria_y_comercio_nuevo(db_session, user_credentials):
+    user = crud.get_user_by_email(db_session, user_credentials[0])
+    rnd = random.Random(5)
+    crud.bulk_create_transactions(db_session, user.id, _gastos(date(2025, 1, 1), 40, "OXXO", 150.0, "conveniencia", rnd))
+    assert anomalies.scan_new(db_session, user.id) == []
+    db_session.commit()
+
+    nuevas = [
+        {"description": "OXXO", "amount": -2400.0, "date": date(2025, 2, 15), "category": "conveniencia"},
+        {"description": "OXXO", "amount": -160.0, "date": date(2025, 2, 16), "category": "conveniencia"},
+        {"description": "JOYERIA DIAMANTE", "amount": -8000.0, "date": date(2025, 2, 17), "category": "compras"},
+        {"description": "NOMINA", "amount": 30000.0, "date": date(2025, 2, 18), "category": "ingreso"},
+    ]
+    crud.bulk_create_transactions(db_session, user.id, nuevas)
+    encontradas = {(a.kind, db_session.get(models.Transaction, a.transaction_id).description) for a in anomalies.scan_new(db_session, user.id)}
+    db_session.commit()
+    assert encontradas == {("category_spike", "OXXO"), ("new_merchant", "JOYERIA DIAMANTE")}
+
+    # Sin filas nuevas no se vuelve a marcar nada
+    assert anomalies.scan_new(db_session, user.id) == []
+
+
+def test_incremental_coincide_con_revision_completa(db_session, user_credentials):
+    user = crud.get_user_by_email(db_session, user_credentials[0])
+    rnd = random.Random(8)
+    filas = []
+    for mes in range(6):
+        inicio = date(2024, 1 + mes, 1)
+        filas += _gastos(inicio, 25, "SUPER", 900.0, "comida", rnd) + _gastos(inicio, 4, "UBER", 120.0, "transporte", rnd)
+        filas.append({"description": f"TIENDA {mes} NUEVA", "amount": -rnd.choice([300.0, 5000.0]), "date": inicio + timedelta(days=26), "category": "comida"})
+    for mes in range(6):
+        crud.bulk_create_transactions(db_session, user.id, [f for f in filas if f["date"].month == mes + 1])
+        anomalies.scan_new(db_session, user.id)
+        db_session.commit()
+    incremental = db_session.execute(
+        select(models.Anomaly.transaction_id, models.Anomaly.kind, models.Anomaly.score).where(models.Anomaly.user_id == user.id)
+    ).all()
+
+    anomalies.reset(db_session, user.id)
+    anomalies.scan_new(db_session, user.id)
+    db_session.commit()
+    completo = db_session.execute(
+        select(models.Anomaly.transaction_id, models.Anomaly.kind, models.Anomaly.score).where(models.Anomaly.user_id == user.id)
+    ).all()
+    assert incremental and sorted(incremental) == sorted(completo)
+
+
+def test_endpoint_y_borrado(client, auth_headers):
+    rnd = random.Random(2)
+    csv = "Fecha,Descripción,Importe,Categoría\n" + "".join(
+        f"{d:02d}/03/2025,GASOLINERA,-{rnd.randint(600, 700)}.00,auto\n" for d in range(1, 21)
+    ) + "25/03/2025,GASOLINERA,-4000.00,auto\n"
+    body = client.post(
+        "/import_statement", files={"file": ("mov.csv", csv.encode("utf-8"), "text/plain")}, headers=auth_headers
+    ).json()
+    assert body["anomalias_detectadas"] == 1
+
+    response = client.get("/transactions/anomalies", headers=auth_headers)
+    assert response.status_code == 200 and "etag" in response.headers
+    [anomalia] = response.json()
+    assert (anomalia["description"], anomalia["amount"], anomalia["kind"]) == ("GASOLINERA", -4000.0, "category_spike")
+    assert 600 <= anomalia["expected"] <= 700
+    assert client.get("/transactions/anomalies", params={"kind": "new_merchant"}, headers=auth_headers).json() == []
+    assert client.get("/transactions/anomalies", params={"kind": "otro"}, headers=auth_headers).status_code == 422
+
+    client.delete(f"/transactions/{anomalia['id']}", headers=auth_headers)
+    assert client.get("/transactions/anomalies", headers=auth_headers).json() == []
+
+
+def test_anomalias_nuevas_invalidan_etag(client, auth_headers, db_session, user_credentials):
+    user = crud.get_user_by_email(db_session, user_credentials[0])
+    rnd = random.Random(3)
+    crud.bulk_create_transactions(db_session, user.id, _gastos(date(2025, 1, 1), 30, "FARMACIA", 300.0, "salud", rnd) + [
+        {"description": "FARMACIA", "amount": -5000.0, "date": date(2025, 2, 5), "category": "salud"},
+    ])
+    db_session.commit()
+    # Un cliente lee entre el commit de las transacciones y el de la revisión de anomalías
+    etag = client.get("/transactions/anomalies", headers=auth_headers).headers["etag"]
+    assert len(anomalies.scan_new(db_session, user.id)) == 1
+    db_session.commit()
+
+    response = client.get("/transactions/anomalies", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["etag"] != etag
+    assert [a["amount"] for a in response.json()] == [-5000.0]
+
+
+def test_editar_fila_revisada_recalcula(client, auth_headers):
+    rnd = random.Random(6)
+    csv = "Fecha,Descripción,Importe,Categoría\n" + "".join(
+        f"{d:02d}/04/2025,PAPELERIA,-{rnd.randint(200, 260)}.00,oficina\n" for d in range(1, 21)
+    ) + "25/04/2025,PAPELERIA,-3000.00,oficina\n26/04/2025,PAPELERIA,-2900.00,oficina\n"
+    client.post("/import_statement", files={"file": ("mov.csv", csv.encode("utf-8"), "text/plain")}, headers=auth_headers)
+    primera, segunda = sorted(client.get("/transactions/anomalies", headers=auth_headers).json(), key=lambda a: a["date"])
+    etag = client.get("/transactions/anomalies", headers=auth_headers).headers["etag"]
+
+    # El monto corregido ya no es un pico
+    datos = {"description": "PAPELERIA", "amount": -230.0, "date": primera["date"], "category": "oficina"}
+    assert client.put(f"/transactions/{primera['id']}", json=datos, headers=auth_headers).status_code == 200
+    response = client.get("/transactions/anomalies", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200 and [a["id"] for a in response.json()] == [segunda["id"]]
+
+    # Igual por lotes
+    response = client.post("/transactions/batch", headers=auth_headers, json={"operations": [
+        {"op": "update", "id": segunda["id"], "data": {"amount": -240.0}},
+    ]})
+    assert response.json()["committed"]
+    assert client.get("/transactions/anomalies", headers=auth_headers).json() == []
@@ -0,0 +1,78 @@
+"""
+Pruebas de los artefactos de depuración: opcionales, en segundo plano, comprimidos y con retención.
+"""
+import os
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app import artifacts, extraction
+
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "DEBUG_ARTIFACTS", True)
+    monkeypatch.setattr(artifacts, "ARTIFACT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_desactivados_por_defecto(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, "ARTIFACT_DIR", str(tmp_path))
+    monkeypatch.setattr(artifacts, "DEBUG_ARTIFACTS", False)
+    assert artifacts.submit("texto") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_comprimido_por_contenido_y_sin_duplicados(directorio):
+    texto = "05-Mar-2025 OXXO REFORMA - $125.50\n" * 200
+    clave = artifacts.submit(texto, source="estado.pdf")
+    assert artifacts.submit(texto, source="otro.pdf") == clave
+    artifacts.flush()
+    ruta = artifacts.artifact_path("ocr_text", clave)
+    assert ruta.startswith(os.path.join(str(directorio), "ocr_text", clave[:2]))
+    assert os.path.getsize(ruta) < len(texto) / 10
+    assert artifacts.read("ocr_text", clave) == texto
+    assert len(list(directorio.rglob("*.txt.*"))) == 1
+
+
+def test_cola_llena_descarta_sin_bloquear(directorio, monkeypatch):
+    escritor = artifacts._Writer()
+    escritor.queue.maxsize = 1
+    monkeypatch.setattr(escritor, "_run", lambda: time.sleep(0.5))  # hilo ocupado
+    monkeypatch.setattr(artifacts, "_writer", escritor)
+    assert artifacts.submit("uno") is not None
+    inicio = time.perf_counter()
+    assert artifacts.submit("dos") is None
+    assert time.perf_counter() - inicio < 0.1
+
+
+def test_retencion_por_edad_cantidad_y_tamano(directorio, monkeypatch):
+    claves = [artifacts.submit(f"texto {i} " * 50) for i in range(5)]
+    artifacts.flush()
+    ahora = time.time()
+    for edad, clave in enumerate(reversed(claves)):  # el primero es el más viejo
+        os.utime(artifacts.artifact_path("ocr_text", clave), (ahora - edad * 3600, ahora - edad * 3600))
+
+    monkeypatch.setattr(artifacts, "ARTIFACT_MAX_FILES", 3)
+    assert artifacts.prune(ahora) == 2
+    assert artifacts.read("ocr_text", claves[0]) is None and artifacts.read("ocr_text", claves[-1]) is not None
+
+    monkeypatch.setattr(artifacts, "ARTIFACT_MAX_AGE_DAYS", 1.5 / 24)
+    assert artifacts.prune(ahora) == 1
+    monkeypatch.setattr(artifacts, "ARTIFACT_MAX_MB", 0)
+    assert artifacts.prune(ahora) == 2 and list(directorio.rglob("*.txt.*")) == []
+
+
+def test_pipeline_no_escribe_junto_al_pdf(tmp_path, directorio):
+    pdf = str(tmp_path / "estado.pdf")
+    pagina = Mock()
+    pagina.extract_text.return_value = "BBVA MEXICO\n05-Mar-2025 OXXO REFORMA - $125.50\n"
+    with patch("pdfplumber.open") as abrir, \
+            patch("app.agentic_extractor.AgenticDocumentExtractor.extract_transactions", return_value=[]), \
+            patch("app.extraction.categorize_transaction_openai", return_value="otros"):
+        abrir.return_value.__enter__.return_value = Mock(pages=[pagina])
+        extraction.process_bank_statement_pdf(pdf, "clave")
+    artifacts.flush()
+    assert not os.path.exists(pdf + ".ocr.txt")
+    assert len(list(directorio.rglob("*.txt.*"))) == 1
@@ -0,0 +1,81 @@
+"""
+Pruebas de la serie de saldo acumulado (/transactions/balance).
+"""
+import random
+from datetime import date, timedelta
+from itertools import accumulate
+
+import pytest
+
+from app import crud
+from app.database import engine
+
+DATOS = [
+    {"description": "NOMINA", "amount": 1000.0, "date": "2025-03-03", "category": "ingreso"},   # lunes
+    {"description": "SUPER", "amount": -200.0, "date": "2025-03-09", "category": "comida"},     # domingo
+    {"description": "RENTA", "amount": -500.0, "date": "2025-03-10", "category": "renta"},     # lunes
+    {"description": "CINE", "amount": -50.25, "date": "2025-04-01", "category": "ocio"},
+]
+
+
+@pytest.fixture
+def con_datos(client, auth_headers):
+    for d in DATOS:
+        assert client.post("/transactions/", json=d, headers=auth_headers).status_code == 200
+    return auth_headers
+
+
+def _serie(client, headers, **params):
+    response = client.get("/transactions/balance", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_serie_diaria_semanal_mensual(client, con_datos):
+    diaria = _serie(client, con_datos)
+    assert [(p["date"], p["balance"]) for p in diaria["points"]] == [
+        ("2025-03-03", 1000.0), ("2025-03-09", 800.0), ("2025-03-10", 300.0), ("2025-04-01", 249.75),
+    ]
+    semanal = _serie(client, con_datos, interval="week")
+    assert [(p["date"], p["net"], p["count"]) for p in semanal["points"]] == [
+        ("2025-03-03", 800.0, 2), ("2025-03-10", -500.0, 1), ("2025-03-31", -50.25, 1),
+    ]
+    mensual = _serie(client, con_datos, interval="month")
+    assert [(p["date"], p["balance"]) for p in mensual["points"]] == [("2025-03-01", 300.0), ("2025-04-01", 249.75)]
+
+
+def test_rango_incluye_saldo_anterior(client, con_datos):
+    serie = _serie(client, con_datos, start_date="10-03-2025", end_date="31-03-2025")
+    assert serie["opening_balance"] == 800.0
+    assert [(p["date"], p["balance"]) for p in serie["points"]] == [("2025-03-10", 300.0)]
+
+    # La semana de start_date completa: el bucket empieza el lunes 3
+    serie = _serie(client, con_datos, interval="week", start_date="05-03-2025")
+    assert serie["opening_balance"] == 0.0 and serie["points"][0]["date"] == "2025-03-03"
+
+    vacia = _serie(client, con_datos, start_date="01-01-2026")
+    assert vacia == {"interval": "day", "opening_balance": 249.75, "points": []}
+
+
+def test_intervalo_invalido(client, auth_headers):
+    assert client.get("/transactions/balance", params={"interval": "year"}, headers=auth_headers).status_code == 422
+
+
+def test_ventana_coincide_con_suma_acumulada(db_session, user_credentials):
+    user = crud.get_user_by_email(db_session, user_credentials[0])
+    rnd = random.Random(3)
+    filas = [
+        {"description": "MOV", "amount": round(rnd.uniform(-300, 300), 2), "date": date(2024, 1, 1) + timedelta(days=rnd.randrange(400))}
+        for _ in range(1500)
+    ]
+    crud.bulk_create_transactions(db_session, user.id, filas)
+    db_session.commit()
+    for interval in crud.BALANCE_INTERVALS:
+        netos = {}
+        for fila in filas:
+            clave = crud.balance_bucket_start(fila["date"], interval)
+            netos[clave] = netos.get(clave, 0) + fila["amount"]
+        esperado = list(accumulate(netos[k] for k in sorted(netos)))
+        filas_sql = db_session.execute(crud.balance_series_statement(engine.dialect.name, user.id, interval)).all()
+        assert [str(r.bucket) for r in filas_sql] == [k.isoformat() for k in sorted(netos)]
+        assert [round(r.balance, 6) for r in filas_sql] == pytest.approx([round(v, 6) for v in esperado])
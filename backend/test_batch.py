@@ -0,0 +1,69 @@
+"""
+Pruebas del endpoint de operaciones por lotes (/transactions/batch).
+"""
+from app import schemas
+
+TRANSACCION = {"description": "WALMART NORTE", "amount": -320.5, "date": "2025-04-10", "category": "supermercado"}
+
+
+def _crear(client, auth_headers, n):
+    return [client.post("/transactions/", json=TRANSACCION, headers=auth_headers).json()["id"] for _ in range(n)]
+
+
+def test_lote_mixto_con_resultados_por_operacion(client, auth_headers):
+    a, b = _crear(client, auth_headers, 2)
+    response = client.post("/transactions/batch", headers=auth_headers, json={"operations": [
+        {"op": "create", "data": {**TRANSACCION, "description": "NUEVA"}},
+        {"op": "update", "id": a, "data": {"category": "despensa"}},
+        {"op": "delete", "id": b},
+        {"op": "delete", "id": 999999},
+        {"op": "create", "data": {"description": "SIN MONTO", "date": "2025-04-10"}},
+    ]})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["committed"] is True
+    assert (body["succeeded"], body["failed"]) == (3, 2)
+    assert [r["status"] for r in body["results"]] == [201, 200, 200, 404, 422]
+    assert body["results"][0]["transaction"]["description"] == "NUEVA"
+    assert body["results"][1]["transaction"]["category"] == "despensa"
+    # Actualización parcial: los demás campos no cambian
+    assert body["results"][1]["transaction"]["amount"] == TRANSACCION["amount"]
+
+    assert client.get(f"/transactions/{b}", headers=auth_headers).status_code == 404
+    assert client.get(f"/transactions/{a}", headers=auth_headers).json()["category"] == "despensa"
+
+
+def test_lote_atomico_revierte_todo(client, auth_headers):
+    (a,) = _crear(client, auth_headers, 1)
+    response = client.post("/transactions/batch", headers=auth_headers, json={"atomic": True, "operations": [
+        {"op": "update", "id": a, "data": {"category": "otra"}},
+        {"op": "update", "id": a, "data": {"amount": None}},
+        {"op": "delete", "id": a},
+    ]})
+    body = response.json()
+    assert body["committed"] is False
+    assert [r["status"] for r in body["results"]] == [424, 422, 424]
+    assert client.get(f"/transactions/{a}", headers=auth_headers).json()["category"] == "supermercado"
+
+
+def test_no_toca_transacciones_de_otro_usuario(client, auth_headers, other_auth_headers):
+    ajena = client.post("/transactions/", json=TRANSACCION, headers=other_auth_headers).json()["id"]
+
+    body = client.post("/transactions/batch", headers=auth_headers, json={"operations": [{"op": "delete", "id": ajena}]}).json()
+    assert body["results"][0]["status"] == 404
+    assert body["committed"] is False
+
+
+def test_tamano_maximo_del_lote(client, auth_headers):
+    operaciones = [{"op": "delete", "id": 1}] * (schemas.BATCH_MAX_OPERATIONS + 1)
+    response = client.post("/transactions/batch", headers=auth_headers, json={"operations": operaciones})
+    assert response.status_code == 422
+    assert client.post("/transactions/batch", headers=auth_headers, json={"operations": []}).status_code == 422
+
+
+def test_lote_invalida_etag(client, auth_headers):
+    etag = client.get("/transactions/", headers=auth_headers).headers["etag"]
+    client.post("/transactions/batch", headers=auth_headers, json={"operations": [{"op": "create", "data": TRANSACCION}]})
+    response = client.get("/transactions/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json()) == 1
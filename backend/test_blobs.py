@@ -0,0 +1,148 @@
+"""
+Pruebas del almacén de archivos por contenido (app/blobs.py) y de los endpoints de subidas.
+"""
+import io
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app import auth, batch_upload, blobs, retention
+from app.database import SessionLocal
+
+
+@pytest.fixture
+def directorio(tmp_path, monkeypatch):
+    monkeypatch.setattr(blobs, "BLOB_DIR", str(tmp_path))
+    monkeypatch.setenv("OPENAI_API_KEY", "clave_falsa")
+    return tmp_path
+
+
+def _subir(client, headers, contenido, nombre="estado.pdf"):
+    pagina = Mock()
+    pagina.extract_text.return_value = "BBVA MEXICO\n05-Mar-2025 OXXO REFORMA - $125.50\n"
+    with patch("pdfplumber.open") as abrir, \
+            patch("app.agentic_extractor.AgenticDocumentExtractor.extract_transactions", return_value=[]), \
+            patch("app.extraction.categorize_transaction_openai", return_value="otros"):
+        abrir.return_value.__enter__.return_value = Mock(pages=[pagina])
+        return client.post("/upload_pdf", files={"file": (nombre, contenido, "application/pdf")}, headers=headers)
+
+
+def _pdf(texto=""):
+    """Contenido único por prueba: la base de pruebas se comparte entre pruebas"""
+    return f"%PDF-1.4 {texto} {uuid.uuid4().hex}".encode()
+
+
+def test_ruta_por_hash_en_dos_niveles(directorio, db_session):
+    contenido = _pdf()
+    blob = blobs.store(db_session, io.BytesIO(contenido))
+    db_session.commit()
+    ruta = blobs.path_for(blob)
+    assert ruta == os.path.join(str(directorio), blob.sha256[:2], blob.sha256[2:4], f"{blob.sha256}.pdf")
+    assert open(ruta, "rb").read() == contenido
+    assert (blob.size, blob.refcount) == (len(contenido), 1)
+
+
+def test_contenido_repetido_se_guarda_una_vez(directorio, db_session):
+    contenido = _pdf()
+    primero = blobs.store(db_session, io.BytesIO(contenido))
+    segundo = blobs.store(db_session, io.BytesIO(contenido))
+    db_session.commit()
+    assert primero.sha256 == segundo.sha256 and segundo.refcount == 2
+    assert len([p for p in directorio.rglob("*") if p.is_file()]) == 1
+
+    blobs.release(db_session, segundo.sha256)
+    blobs.release(db_session, segundo.sha256)
+    blobs.release(db_session, segundo.sha256)  # nunca baja de cero
+    db_session.commit()
+    db_session.refresh(segundo)
+    assert segundo.refcount == 0
+
+
+def test_mismo_nombre_de_dos_usuarios_no_choca(client, auth_headers, other_auth_headers, directorio):
+    suyo = _pdf("de otra")
+    assert _subir(client, auth_headers, _pdf("de uno")).status_code == 200
+    assert _subir(client, other_auth_headers, suyo).status_code == 200
+    assert _subir(client, other_auth_headers, suyo).status_code == 200
+
+    (mia,) = client.get("/uploads", headers=auth_headers).json()
+    suyas = client.get("/uploads", headers=other_auth_headers).json()
+    assert mia["filename"] == "estado.pdf" and mia["status"] == "processed" and mia["bank"] == "BBVA"
+    assert len(suyas) == 2 and suyas[0]["sha256"] == suyas[1]["sha256"] != mia["sha256"]
+    assert len([p for p in directorio.rglob("*.pdf") if p.is_file()]) == 2
+
+
+def test_subida_fallida_queda_registrada(client, auth_headers, directorio):
+    with patch("app.extraction.process_bank_statement_pdf", side_effect=ValueError("PDF ilegible")):
+        with pytest.raises(ValueError):
+            client.post("/upload_pdf", files={"file": ("roto.pdf", _pdf("roto"), "application/pdf")}, headers=auth_headers)
+    (subida,) = client.get("/uploads", headers=auth_headers).json()
+    assert subida["status"] == "failed" and subida["processed_at"] is not None
+
+
+def test_falla_al_guardar_no_deja_transacciones(client, auth_headers, directorio):
+    version = client.get("/transactions/", headers=auth_headers).headers["etag"]
+    with patch("app.usage.persist", side_effect=RuntimeError("sin espacio")):
+        with pytest.raises(RuntimeError):
+            _subir(client, auth_headers, _pdf("a medias"))
+    (subida,) = client.get("/uploads", headers=auth_headers).json()
+    assert subida["status"] == "failed" and not subida["transactions_saved"]
+    response = client.get("/transactions/", headers={**auth_headers, "If-None-Match": version})
+    assert response.status_code == 304
+
+
+def test_borrar_subida_libera_el_blob(client, auth_headers, other_auth_headers, directorio, db_session):
+    contenido = _pdf("para borrar")
+    assert _subir(client, auth_headers, contenido).status_code == 200
+    assert _subir(client, auth_headers, contenido).status_code == 200
+    primera, segunda = client.get("/uploads", headers=auth_headers).json()
+    transacciones = client.get("/transactions/", headers=auth_headers).json()
+
+    assert client.delete(f"/uploads/{primera['id']}", headers=other_auth_headers).status_code == 404
+    assert client.delete(f"/uploads/{primera['id']}", headers=auth_headers).status_code == 200
+    assert client.delete(f"/uploads/{segunda['id']}", headers=auth_headers).status_code == 200
+    assert client.get("/uploads", headers=auth_headers).json() == []
+    assert client.get("/transactions/", headers=auth_headers).json() == transacciones
+
+    dentro_de_dos_dias = datetime.now(timezone.utc) + timedelta(days=2)
+    assert {"sha256": primera["sha256"], "reason": "orphan"} in [
+        {"sha256": v["sha256"], "reason": v["reason"]} for v in retention.plan(db_session, dentro_de_dos_dias)
+    ]
+
+
+def test_lote_rechazado_no_borra_el_archivo_de_otro_lote(client, auth_headers, directorio, monkeypatch):
+    monkeypatch.setattr(batch_upload, "BATCH_MAX_FILES", 1)
+    compartido = _pdf("en dos lotes")
+    descartar = blobs.discard
+
+    def otro_lote_guarda_primero(written):
+        # Otro lote con el mismo PDF confirma su fila entre la escritura y el rollback de este
+        with SessionLocal() as db:
+            blobs.store(db, io.BytesIO(compartido))
+            db.commit()
+        descartar(written)
+
+    monkeypatch.setattr(blobs, "discard", otro_lote_guarda_primero)
+    archivos = [("files", ("a.pdf", compartido, "application/pdf")), ("files", ("b.pdf", _pdf(), "application/pdf"))]
+    assert client.post("/upload_batch", files=archivos, headers=auth_headers).status_code == 400
+    (archivo,) = [p for p in directorio.rglob("*.pdf") if p.is_file()]
+    assert archivo.read_bytes() == compartido
+
+
+def test_reporte_de_almacenamiento(client, auth_headers, user_credentials, directorio, db_session, monkeypatch):
+    assert client.get("/admin/storage", headers=auth_headers).status_code == 403
+    monkeypatch.setattr(auth, "ADMIN_EMAILS", {user_credentials[0]})
+    antes = client.get("/admin/storage", headers=auth_headers).json()
+
+    contenido = _pdf("repetido")
+    _subir(client, auth_headers, contenido)
+    _subir(client, auth_headers, contenido)
+    blobs.store(db_session, io.BytesIO(_pdf("temporal")), reference=False)
+    db_session.commit()
+    despues = client.get("/admin/storage", headers=auth_headers).json()
+    delta = {clave: despues[clave] - antes[clave] for clave in antes if isinstance(antes[clave], int)}
+    assert (delta["uploads"], delta["blobs"], delta["unreferenced_blobs"]) == (2, 2, 1)
+    assert delta["uploaded_bytes"] == 2 * len(contenido)
+    assert delta["deduplicated_bytes"] == len(contenido)
@@ -0,0 +1,39 @@
+"""
+Pruebas de la configuración del engine (pragmas de SQLite y pool).
+"""
+from sqlalchemy import text
+
+from app.database import create_db_engine
+
+
+def test_sqlite_pragmas_applied(tmp_path):
+    """Cada conexión nueva debe quedar en WAL, synchronous=NORMAL y con busy_timeout"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'pragmas.db'}")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == "wal"
+        # NORMAL = 1
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -64000
+    engine.dispose()
+
+
+def test_pool_settings_from_environment(tmp_path, monkeypatch):
+    """El tamaño del pool se lee de las variables de entorno"""
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "7")
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT_MS", "1234")
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'pool.db'}")
+    assert engine.pool.size() == 3
+    assert engine.pool._max_overflow == 7
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 1234
+    engine.dispose()
+
+
+def test_memory_database_skips_pool_and_wal():
+    """Las bases en memoria funcionan sin parámetros de pool"""
+    engine = create_db_engine("sqlite://")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar().lower() == "memory"
+    engine.dispose()
@@ -0,0 +1,44 @@
+"""
+Pruebas de GET condicional (ETag / If-None-Match) en listados y resúmenes.
+"""
+
+TRANSACCION = {"description": "OXXO CENTRO", "amount": -50.0, "date": "2025-03-03", "category": "conveniencia"}
+
+
+def test_304_si_no_hay_cambios(client, auth_headers):
+    client.post("/transactions/", json=TRANSACCION, headers=auth_headers)
+    primera = client.get("/transactions/summary/monthly", headers=auth_headers)
+    etag = primera.headers["etag"]
+    assert etag.startswith('"') and not etag.startswith("W/")
+
+    segunda = client.get("/transactions/summary/monthly", headers={**auth_headers, "If-None-Match": etag})
+    assert segunda.status_code == 304
+    assert segunda.content == b""
+    assert segunda.headers["etag"] == etag
+
+
+def test_escritura_invalida_etag(client, auth_headers):
+    etag = client.get("/transactions/summary/category", headers=auth_headers).headers["etag"]
+    client.post("/transactions/", json=TRANSACCION, headers=auth_headers)
+
+    response = client.get("/transactions/summary/category", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json() == [{"category": "conveniencia", "total": 50.0}]
+
+
+def test_etag_distinto_por_endpoint_y_query(client, auth_headers):
+    mensual = client.get("/transactions/summary/monthly", headers=auth_headers).headers["etag"]
+    tabla = client.get("/transactions/summary/table", headers=auth_headers).headers["etag"]
+    pagina_1 = client.get("/transactions/", params={"limit": 10}, headers=auth_headers).headers["etag"]
+    pagina_2 = client.get("/transactions/", params={"limit": 20}, headers=auth_headers).headers["etag"]
+    assert len({mensual, tabla, pagina_1, pagina_2}) == 4
+
+
+def test_escritura_de_otro_usuario_no_invalida(client, auth_headers, other_auth_headers):
+    etag = client.get("/transactions/", headers=auth_headers).headers["etag"]
+
+    client.post("/transactions/", json=TRANSACCION, headers=other_auth_headers)
+
+    response = client.get("/transactions/", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 304
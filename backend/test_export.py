@@ -0,0 +1,65 @@
+"""
+Pruebas de la exportación en streaming (CSV, NDJSON, Parquet).
+"""
+import csv
+import io
+import json
+
+import pytest
+
+from app import export
+
+DATOS = [
+    {"description": "OXXO, CENTRO", "amount": -45.5, "date": "2025-02-01", "category": "conveniencia"},
+    {"description": "NOMINA", "amount": 20000.0, "date": "2025-02-15", "category": "ingreso"},
+    {"description": "UBER", "amount": -120.0, "date": "2025-03-02", "category": None},
+]
+
+
+@pytest.fixture
+def con_transacciones(client, auth_headers):
+    for d in DATOS:
+        assert client.post("/transactions/", json=d, headers=auth_headers).status_code == 200
+    return auth_headers
+
+
+def test_exportar_csv(client, con_transacciones):
+    response = client.get("/transactions/export", params={"format": "csv"}, headers=con_transacciones)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    filas = list(csv.DictReader(io.StringIO(response.text)))
+    assert [f["description"] for f in filas] == ["UBER", "NOMINA", "OXXO, CENTRO"]
+    assert filas[2]["amount"] == "-45.5"
+
+
+def test_exportar_ndjson_con_filtros(client, con_transacciones):
+    response = client.get(
+        "/transactions/export",
+        params={"format": "ndjson", "max_amount": 0, "start_date": "01-02-2025"},
+        headers=con_transacciones,
+    )
+    filas = [json.loads(linea) for linea in response.text.splitlines()]
+    assert [f["description"] for f in filas] == ["UBER", "OXXO, CENTRO"]
+    assert filas[0]["category"] is None
+
+
+def test_exportar_parquet(client, con_transacciones):
+    pq = pytest.importorskip("pyarrow.parquet")
+    response = client.get("/transactions/export", params={"format": "parquet"}, headers=con_transacciones)
+    assert response.status_code == 200
+    tabla = pq.read_table(io.BytesIO(response.content))
+    assert tabla.num_rows == 3
+    assert sorted(tabla.column("amount").to_pylist()) == [-120.0, -45.5, 20000.0]
+
+
+def test_lotes_pequenos(client, con_transacciones, monkeypatch):
+    """Con lotes de 1 fila se emite un fragmento por fila y el resultado es el mismo"""
+    monkeypatch.setattr(export, "EXPORT_BATCH_SIZE", 1)
+    response = client.get("/transactions/export", params={"format": "ndjson"}, headers=con_transacciones)
+    assert len(response.text.splitlines()) == 3
+
+
+def test_formato_o_fecha_invalidos(client, auth_headers):
+    assert client.get("/transactions/export", params={"format": "xml"}, headers=auth_headers).status_code == 422
+    response = client.get("/transactions/export", params={"start_date": "2025-01-01"}, headers=auth_headers)
+    assert response.status_code == 400
@@ -0,0 +1,101 @@
+"""
+Pruebas de /transactions/filter: filtros combinados, orden, paginación y planes de consulta.
+"""
+import itertools
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from app import crud
+from app.database import engine
+
+DATOS = [
+    {"description": "OXXO REFORMA", "amount": -120.5, "date": "2025-04-02", "category": "conveniencia"},
+    {"description": "UBER VIAJE", "amount": -80.0, "date": "2025-04-15", "category": "transporte"},
+    {"description": "SPEI NOMINA", "amount": 15000.0, "date": "2025-05-01", "category": "ingreso"},
+    {"description": "UBER EATS", "amount": -230.0, "date": "2025-05-20", "category": "restaurante"},
+    {"description": "Oxxo 50% desc", "amount": -15.0, "date": "2025-05-21", "category": "conveniencia"},
+]
+
+
+@pytest.fixture
+def con_datos(client, auth_headers):
+    for d in DATOS:
+        assert client.post("/transactions/", json=d, headers=auth_headers).status_code == 200
+    return auth_headers
+
+
+def _filtrar(client, headers, **params):
+    response = client.get("/transactions/filter", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return [t["description"] for t in response.json()], int(response.headers["x-total-count"])
+
+
+def test_multiples_categorias_y_signo(client, con_datos):
+    descripciones, total = _filtrar(client, con_datos, category=["transporte", "restaurante"])
+    assert descripciones == ["UBER EATS", "UBER VIAJE"] and total == 2
+    assert _filtrar(client, con_datos, category="transporte,ingreso")[1] == 2
+    assert _filtrar(client, con_datos, sign="income")[0] == ["SPEI NOMINA"]
+    assert _filtrar(client, con_datos, sign="expense")[1] == 4
+
+
+def test_descripcion_subcadena_y_prefijo(client, con_datos):
+    assert _filtrar(client, con_datos, description="uber")[0] == ["UBER EATS", "UBER VIAJE"]
+    # Los comodines de LIKE se escapan
+    assert _filtrar(client, con_datos, description="50%")[0] == ["Oxxo 50% desc"]
+    assert _filtrar(client, con_datos, description_prefix="oxxo")[0] == ["Oxxo 50% desc", "OXXO REFORMA"]
+    assert _filtrar(client, con_datos, description_prefix="XX")[0] == []
+
+
+def test_orden_paginacion_y_total(client, con_datos):
+    assert _filtrar(client, con_datos, sort="amount", sign="expense")[0] == ["UBER EATS", "OXXO REFORMA", "UBER VIAJE", "Oxxo 50% desc"]
+    pagina, total = _filtrar(client, con_datos, sort="date", limit=2, offset=2)
+    assert pagina == ["SPEI NOMINA", "UBER EATS"] and total == 5
+    pagina, total = _filtrar(client, con_datos, sort="-date", limit=2, offset=4)
+    assert pagina == ["OXXO REFORMA"] and total == 5
+    assert _filtrar(client, con_datos, start_date="01-05-2025", end_date="20-05-2025")[1] == 2
+
+
+def test_parametros_invalidos(client, con_datos):
+    for params in ({"sort": "description"}, {"sign": "cero"}, {"limit": 5000}, {"start_date": "2025-05-01"}):
+        assert client.get("/transactions/filter", params=params, headers=con_datos).status_code in (400, 422)
+
+
+# Cada combinación de filtros debe resolverse con una búsqueda por índice (SEARCH),
+# nunca con un recorrido completo de la tabla
+FILTROS = {
+    "fechas": {"start_date": date(2025, 1, 1), "end_date": date(2025, 6, 30)},
+    "montos": {"min_amount": -500.0, "max_amount": 0.0},
+    "categorias": {"categories": ["comida", "renta"]},
+    "prefijo": {"description_prefix": "uber"},
+    "subcadena": {"description": "eats"},
+    "signo": {"sign": "expense"},
+}
+
+
+def _plan(stmt):
+    compiled = stmt.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        return [row[3] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))]
+
+
+@pytest.mark.parametrize("combinacion", [
+    c for n in range(0, 3) for c in itertools.combinations(sorted(FILTROS), n)
+], ids=lambda c: "+".join(c) or "sin_filtros")
+@pytest.mark.parametrize("orden", sorted(crud.FILTER_SORTS))
+def test_plan_usa_indices(app, combinacion, orden):
+    filtros = {k: v for nombre in combinacion for k, v in FILTROS[nombre].items()}
+    plan = _plan(crud.transactions_filter_statement(1, sort=orden, **filtros))
+    accesos = [paso for paso in plan if "transactions" in paso]
+    assert accesos and all(paso.startswith("SEARCH transactions USING") for paso in accesos), plan
+
+    conteo = _plan(crud.transactions_count_statement(1, **filtros))
+    assert all(paso.startswith("SEARCH transactions USING") for paso in conteo if "transactions" in paso), conteo
+
+
+def test_orden_por_fecha_sin_ordenamiento_temporal(app):
+    """Con el índice (user_id, date) el orden por fecha sale del índice"""
+    for orden in ("date", "-date"):
+        plan = _plan(crud.transactions_filter_statement(1, sort=orden, start_date=date(2025, 1, 1)))
+        assert not any("TEMP B-TREE" in paso for paso in plan), plan
@@ -0,0 +1,121 @@
+"""
+Pruebas de la importación de CSV / OFX bancarios.
+"""
+import io
+from unittest.mock import patch
+
+import pytest
+
+from app import crud, importers
+
+CSV_GENERICO = """Fecha,Descripción,Importe,Categoría
+01/03/2025,OXXO REFORMA,"-1,250.50",conveniencia
+02/03/2025,NOMINA EMPRESA,"15,000.00",
+fecha-mala,FILA INVALIDA,10.00,
+"""
+
+CSV_SANTANDER = """Estado de cuenta Santander
+Cuenta: 1234
+Fecha;Descripción;Cargo;Abono
+05-ABR-2025;COMPRA WALMART;350.00;
+06-ABR-2025;DEPOSITO SPEI;;2000.00
+"""
+
+OFX = """OFXHEADER:100
+DATA:OFXSGML
+<OFX><SIGNONMSGSRSV1><SONRS><FI><ORG>HSBC MEXICO</ORG></FI></SONRS></SIGNONMSGSRSV1>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20250410120000[-6:CST]<TRNAMT>-99.90<NAME>NETFLIX<MEMO>SUSCRIPCION</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20250415<TRNAMT>500.00<NAME>ABONO</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+def _importar(client, headers, nombre, contenido, **data):
+    return client.post(
+        "/import_statement",
+        files={"file": (nombre, contenido.encode("utf-8"), "text/plain")},
+        data=data,
+        headers=headers,
+    )
+
+
+def test_csv_generico(client, auth_headers):
+    response = _importar(client, auth_headers, "movimientos.csv", CSV_GENERICO)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["transacciones_importadas"] == 2
+    assert body["filas_omitidas"] == 1
+
+    transacciones = {t["description"]: t for t in client.get("/transactions/", headers=auth_headers).json()}
+    assert transacciones["OXXO REFORMA"]["amount"] == -1250.5
+    assert transacciones["OXXO REFORMA"]["category"] == "conveniencia"
+    assert transacciones["NOMINA EMPRESA"]["date"] == "2025-03-02"
+    assert transacciones["NOMINA EMPRESA"]["category"] == "Sin categorizar"
+
+
+def test_importacion_y_revision_en_un_solo_commit(client, auth_headers):
+    with patch("app.anomalies.scan_new", side_effect=RuntimeError("falla la revisión")):
+        with pytest.raises(RuntimeError):
+            _importar(client, auth_headers, "movimientos.csv", CSV_GENERICO)
+    assert client.get("/transactions/", headers=auth_headers).json() == []
+
+
+def test_csv_perfil_santander_cargo_abono(client, auth_headers):
+    response = _importar(client, auth_headers, "santander.csv", CSV_SANTANDER)
+    body = response.json()
+    assert body["banco"] == "Santander"
+    assert body["transacciones_importadas"] == 2
+
+    montos = {t["description"]: t["amount"] for t in client.get("/transactions/", headers=auth_headers).json()}
+    assert montos == {"COMPRA WALMART": -350.0, "DEPOSITO SPEI": 2000.0}
+
+
+def test_ofx_sgml(client, auth_headers):
+    response = _importar(client, auth_headers, "estado.ofx", OFX)
+    body = response.json()
+    assert body["banco"] == "HSBC"
+    assert body["transacciones_importadas"] == 2
+
+    transacciones = client.get("/transactions/", headers=auth_headers).json()
+    assert {(t["description"], t["amount"], t["date"]) for t in transacciones} == {
+        ("NETFLIX SUSCRIPCION", -99.9, "2025-04-10"),
+        ("ABONO", 500.0, "2025-04-15"),
+    }
+
+
+def test_ofx_por_bloques_pequenos(monkeypatch):
+    """Los tags cortados entre bloques se reconstruyen"""
+    monkeypatch.setattr(importers, "_OFX_CHUNK_SIZE", 7)
+    stats = importers.ImportStats()
+    filas = list(importers.iter_ofx_transactions(io.BytesIO(OFX.encode()), stats))
+    assert [f["amount"] for f in filas] == [-99.9, 500.0]
+
+
+def test_ofx_respeta_la_codificacion_declarada(monkeypatch):
+    monkeypatch.setattr(importers, "_OFX_CHUNK_SIZE", 7)  # la "ñ" en UTF-8 queda partida entre bloques
+    transaccion = "<STMTTRN><DTPOSTED>20250410<TRNAMT>-80.00<NAME>PANADERÍA LA ESPAÑOLA</STMTTRN>"
+    casos = [
+        ("utf-8", "OFXHEADER:100\nDATA:OFXSGML\nENCODING:UTF-8\nCHARSET:NONE\n<OFX>" + transaccion + "</OFX>"),
+        ("cp1252", "OFXHEADER:100\nDATA:OFXSGML\nENCODING:USASCII\nCHARSET:1252\n<OFX>" + transaccion + "</OFX>"),
+        ("utf-8", '<?xml version="1.0" encoding="UTF-8"?>\n<?OFX OFXHEADER="200"?><OFX>' + transaccion + "</OFX>"),
+        ("latin-1", "OFXHEADER:100\nDATA:OFXSGML\n<OFX>" + transaccion + "</OFX>"),  # sin declarar
+    ]
+    for codificacion, contenido in casos:
+        (fila,) = importers.iter_ofx_transactions(io.BytesIO(contenido.encode(codificacion)), importers.ImportStats())
+        assert fila["description"] == "PANADERÍA LA ESPAÑOLA", codificacion
+
+
+def test_insercion_por_lotes(db_session):
+    filas = ({"description": f"FILA {i}", "amount": -1.0, "date": importers.parse_date("01/01/2025", ("%d/%m/%Y",)), "category": None} for i in range(25))
+    user = crud.create_user(db_session, crud.schemas.UserCreate(email="lotes@correo.com", password="x"))
+    assert crud.bulk_create_transactions(db_session, user.id, filas, batch_size=10) == 25
+    db_session.commit()
+    assert len(crud.get_transactions(db_session, user.id, limit=100)) == 25
+    assert crud.get_data_version(db_session, user.id) == 1
+
+
+def test_formato_no_soportado(client, auth_headers):
+    assert _importar(client, auth_headers, "estado.xls", "x").status_code == 400
+    response = _importar(client, auth_headers, "sin_encabezado.csv", "a,b\n1,2\n")
+    assert response.status_code == 400
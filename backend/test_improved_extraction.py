@@ -10,7 +10,7 @@ from pathlib import Path
 # Agregar el directorio actual al path para importar los módulos
 sys.path.append(str(Path(__file__).parent))
 
-from app.main import extract_text_with_ocr_fallback
+from app.extraction import extract_text_with_ocr_fallback
 from app.auth import extract_transactions_with_ai
 from dotenv import load_dotenv
 
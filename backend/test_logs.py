@@ -0,0 +1,57 @@
+"""
+Pruebas del logging estructurado: formato JSON, muestreo de mensajes por fila y niveles.
+"""
+import io
+import json
+import logging
+from unittest.mock import MagicMock
+
+import pytest
+
+from app import logs
+
+
+@pytest.fixture
+def salida():
+    stream = io.StringIO()
+    logs.configure(level="DEBUG", fmt="json", stream=stream)
+    yield stream
+    logs.configure()
+
+
+def _lineas(stream):
+    logs.shutdown()  # vacía la cola del hilo escritor
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_json_con_campos_extra(salida):
+    log = logs.get_logger("prueba")
+    log.info("Transacciones encontradas", extra={"rows": 3, "chunk": 1})
+    (linea,) = _lineas(salida)
+    assert linea["level"] == "INFO" and linea["logger"] == "pfm.prueba"
+    assert (linea["msg"], linea["rows"], linea["chunk"]) == ("Transacciones encontradas", 3, 1)
+
+
+def test_muestreo_primero_y_uno_de_cada_n(salida):
+    log = logs.get_logger("prueba")
+    for i in range(25):
+        logs.sampled(log, "prueba.fila", "Fila %s", i, every=10, amount=i)
+    lineas = _lineas(salida)
+    assert [linea["msg"] for linea in lineas] == ["Fila 0", "Fila 10", "Fila 20"]
+    assert [linea["seen"] for linea in lineas] == [1, 11, 21]
+
+
+def test_debug_no_cuesta_nada_en_info():
+    stream = io.StringIO()
+    logs.configure(level="INFO", stream=stream)
+    try:
+        log = logs.get_logger("prueba")
+        costoso = MagicMock()
+        logs.sampled(log, "prueba.debug", "Vista previa %s", costoso)
+        log.debug("Respuesta cruda %s", costoso)
+        logs.shutdown()
+        assert stream.getvalue() == ""
+        costoso.__str__.assert_not_called()
+        assert logging.getLogger("pfm").propagate is False
+    finally:
+        logs.configure()
@@ -0,0 +1,145 @@
+"""
+Pruebas del OCR adaptativo por confianza (app/extraction.py) y de las métricas de bench_ocr.py.
+Tesseract no se ejecuta: _render y _ocr_data se reemplazan por lecturas fijas.
+"""
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+
+import bench_ocr
+import synthetic_statements
+from app import extraction, telemetry
+
+
+def _data(*lines):
+    """Salida de image_to_data: una línea por (texto, confianza, top) a partir de left=10"""
+    data = {key: [] for key in ("text", "conf", "block_num", "par_num", "line_num", "left", "top", "width", "height")}
+    for number, (text, confidence, top) in enumerate(lines, start=1):
+        left = 10
+        for word in text.split():
+            row = {"text": word, "conf": confidence, "block_num": 1, "par_num": 1, "line_num": number,
+                   "left": left, "top": top, "width": 6 * len(word), "height": 12}
+            for key, value in row.items():
+                data[key].append(value)
+            left += 6 * len(word) + 5
+    return data
+
+
+class _Page:
+    """Página de pdfplumber con lo que usa el OCR adaptativo: bbox en puntos y crop"""
+
+    def __init__(self, bbox=(0, 0, 612, 792)):
+        self.bbox = bbox
+        self.crops = []
+
+    def crop(self, bbox):
+        self.crops.append(bbox)
+        return _Page(bbox)
+
+
+@pytest.fixture
+def lecturas(monkeypatch):
+    """Registra cada llamada a Tesseract; `respuestas[(dpi, psm)]` es lo que devuelve"""
+    llamadas, respuestas = [], {}
+    monkeypatch.setattr(extraction, "_render", lambda page, dpi: SimpleNamespace(page=page, dpi=dpi))
+    monkeypatch.setattr(extraction, "OCR_BASE_DPI", 150)
+    monkeypatch.setattr(extraction, "OCR_MAX_DPI", 300)
+    monkeypatch.setattr(extraction, "OCR_MIN_CONFIDENCE", 80)
+
+    def ocr_data(image, dpi, psm):
+        llamadas.append((dpi, psm))
+        return respuestas[(dpi, psm)]
+
+    monkeypatch.setattr(extraction, "_ocr_data", ocr_data)
+    return llamadas, respuestas
+
+
+def test_lineas_con_confianza_ponderada():
+    data = _data(("05-Mar-2025 OXXO", 90, 100), ("$125.50", 40, 120))
+    data["text"].append("")
+    data["conf"].append(-1)  # fila de bloque sin texto
+    for key in ("block_num", "par_num", "line_num", "left", "top", "width", "height"):
+        data[key].append(0)
+    primera, segunda = extraction.ocr_lines(data)
+    assert primera["text"] == "05-Mar-2025 OXXO" and primera["confidence"] == 90
+    assert primera["box"] == (10, 100, 10 + 66 + 5 + 24, 112)
+    assert (segunda["text"], segunda["confidence"]) == ("$125.50", 40)
+    assert extraction._mean_confidence([primera, segunda]) == pytest.approx((90 * 16 + 40 * 7) / 23)
+
+
+def test_pagina_confiable_no_se_relee(lecturas):
+    llamadas, respuestas = lecturas
+    respuestas[(150, 6)] = _data(("BBVA MEXICO", 95, 10), ("05-Mar-2025 OXXO - $125.50", 88, 30))
+    with telemetry.trace() as traza, telemetry.span("ocr_page") as span:
+        texto = extraction._ocr_page_adaptive(_Page(), span)
+    assert texto == "BBVA MEXICO\n05-Mar-2025 OXXO - $125.50"
+    assert llamadas == [(150, 6)]
+    assert (traza.spans[0].attributes["dpi"], traza.spans[0].attributes["regions"]) == (150, 0)
+
+
+def test_solo_las_lineas_dudosas_se_releen(lecturas):
+    llamadas, respuestas = lecturas
+    respuestas[(150, 6)] = _data(
+        ("BBVA MEXICO", 95, 10), ("05-Mar-2025 OXXO - $l25.S0", 45, 300), ("06-Mar-2025 UBER - $80.00", 90, 320),
+    )
+    respuestas[(300, 7)] = _data(("05-Mar-2025 OXXO - $125.50", 91, 6))
+    pagina = _Page()
+    texto = extraction._ocr_page_adaptive(pagina)
+    assert texto.splitlines()[1] == "05-Mar-2025 OXXO - $125.50"
+    assert llamadas == [(150, 6), (300, 7)]
+    # Caja en píxeles a 150 DPI -> puntos (72/150) con 2 pt de margen
+    (x0, top, x1, bottom), = pagina.crops
+    assert (x0, top, bottom) == pytest.approx((10 * 0.48 - 2, 300 * 0.48 - 2, 312 * 0.48 + 2))
+    assert x1 > x0
+
+
+def test_relectura_peor_no_reemplaza(lecturas):
+    llamadas, respuestas = lecturas
+    respuestas[(150, 6)] = _data(("BBVA", 95, 10), ("MEXICO", 95, 30), ("SALDO 1,234.00", 70, 50))
+    respuestas[(300, 7)] = _data(("SALD0 1.234,O0", 60, 6))
+    assert extraction._ocr_page_adaptive(_Page()).splitlines()[-1] == "SALDO 1,234.00"
+
+
+def test_pagina_mayormente_dudosa_se_relee_completa(lecturas):
+    llamadas, respuestas = lecturas
+    respuestas[(150, 6)] = _data(("B8VA", 40, 10), ("0XX0", 50, 30), ("SALDO", 90, 50))
+    respuestas[(300, 6)] = _data(("BBVA", 92, 20), ("OXXO", 93, 60), ("SALDO", 95, 100))
+    with telemetry.trace() as traza, telemetry.span("ocr_page") as span:
+        texto = extraction._ocr_page_adaptive(_Page(), span)
+    assert texto == "BBVA\nOXXO\nSALDO"
+    assert llamadas == [(150, 6), (300, 6)]
+    assert traza.spans[0].attributes["dpi"] == 300
+
+
+def test_pagina_vacia_a_baja_resolucion(lecturas):
+    llamadas, respuestas = lecturas
+    respuestas[(150, 6)] = _data()
+    respuestas[(300, 6)] = _data(("TEXTO CHICO", 85, 10))
+    assert extraction._ocr_page_adaptive(_Page()) == "TEXTO CHICO"
+
+
+def test_modo_fijo_disponible():
+    pagina = SimpleNamespace(extract_text=lambda: "texto original")
+    with patch("app.extraction._ocr_page_fixed", return_value="fijo") as fijo, \
+            patch("app.extraction._ocr_page_adaptive") as adaptivo:
+        assert extraction._extract_with_ocr(SimpleNamespace(pages=[pagina]), adaptive=False) == "fijo\n"
+    fijo.assert_called_once_with(pagina)
+    adaptivo.assert_not_called()
+
+
+def test_metricas_del_benchmark():
+    verdad = "05-Mar-2025 OXXO - $125.50\n06-Mar-2025 UBER - $1,080.00\n"
+    assert bench_ocr.char_accuracy(verdad, "05-Mar-2025  OXXO - $125.50\n\n06-Mar-2025 UBER - $1,080.00") == 1.0
+    assert bench_ocr.char_accuracy(verdad, "") == 0.0
+    assert bench_ocr.field_recall(verdad, "05-Mar-2025 0XX0 - $125.50 06-Mar-2025 UBER - $1.080,00") == 0.5
+    assert bench_ocr.field_recall(verdad, "O5-Mar-2025 06-Mar-2025", bench_ocr._DATE) == 0.5
+
+
+def test_escaneo_sintetico_sin_capa_de_texto(tmp_path):
+    pdfplumber = pytest.importorskip("pdfplumber")
+    texto, _ = synthetic_statements.statement("generico", 20)
+    synthetic_statements.write_pdf(texto, str(tmp_path / "texto.pdf"))
+    bench_ocr.scan_pdf(str(tmp_path / "texto.pdf"), str(tmp_path / "escaneo.pdf"), dpi=72)
+    with pdfplumber.open(str(tmp_path / "escaneo.pdf")) as pdf:
+        assert len(pdf.pages) == 1 and not (pdf.pages[0].extract_text() or "").strip()
@@ -2,7 +2,7 @@ import os
 import sys
 sys.path.append('.')
 
-from app.main import extract_text_with_ocr_fallback
+from app.extraction import extract_text_with_ocr_fallback
 
 def test_ocr_function():
     """Prueba específicamente la función OCR"""
@@ -0,0 +1,60 @@
+"""
+Pruebas offline de los parsers sobre estados sintéticos y control de regresiones de rendimiento
+contra bench_parsers_baselines.json (ver bench_parsers.py).
+"""
+from datetime import date
+
+import pytest
+
+import bench_parsers
+import synthetic_statements
+from app import extraction
+
+
+def test_generador_determinista():
+    assert synthetic_statements.statement("hsbc", 50, seed=1) == synthetic_statements.statement("hsbc", 50, seed=1)
+    assert synthetic_statements.statement("hsbc", 50, seed=1) != synthetic_statements.statement("hsbc", 50, seed=2)
+    with pytest.raises(ValueError):
+        synthetic_statements.statement("banco_x", 10)
+
+
+@pytest.mark.parametrize("bank, parser", [
+    ("generico", extraction.extract_standard_transactions),
+    ("santander", extraction.extract_santander_transactions),
+])
+def test_parsers_recuperan_todas_las_filas(bank, parser):
+    text, expected = synthetic_statements.statement(bank, 300)
+    transactions = parser(text)
+    assert [t["monto"] for t in transactions] == [row["monto"] for row in expected]
+    assert [extraction.parse_date(t["fecha_operacion"]) for t in transactions] == [row["date"] for row in expected]
+
+
+def test_parser_hsbc_sobre_texto_sintetico():
+    text, _ = synthetic_statements.statement("hsbc", 300)
+    transactions = extraction.extract_hsbc_transactions(text)
+    assert transactions and all(extraction.parse_date(t["fecha_operacion"]) for t in transactions)
+
+
+def test_fechas_y_limpieza_ocr():
+    assert {extraction.parse_date(value) for value in ("04-Abr-2025", "04-ABR-2025", "04-04-2025", "04/04/2025", "2025-04-04")} == {date(2025, 4, 4)}
+    assert all(extraction.parse_date(value) for value in bench_parsers._dates(200))
+    noisy = synthetic_statements.ocr_noise(synthetic_statements.statement("hsbc", 200)[0], rate=0.2)
+    cleaned = extraction.clean_ocr_text(noisy).splitlines()
+    assert "|||" not in cleaned and "~" not in cleaned and len(cleaned) >= 200
+
+
+def test_pdf_sintetico_con_varias_paginas(tmp_path):
+    pytest.importorskip("pdfplumber")
+    text, expected = synthetic_statements.statement("generico", 150)
+    path = str(tmp_path / "generico.pdf")
+    synthetic_statements.write_pdf(text, path)
+    assert len(extraction.extract_standard_transactions(extraction.extract_plain_text(path))) == len(expected)
+
+
+def test_sin_regresiones_contra_linea_base():
+    """Tamaños hasta 1000 filas; los de 10000 se revisan con `python bench_parsers.py --check`"""
+    baselines = bench_parsers.load_baselines()
+    cases = [name for name in bench_parsers.CASES if name != "pdf_plain_text"]
+    results = bench_parsers.run(sizes=(10, 100, 1000), cases=cases)
+    assert set(results) <= set(baselines), "faltan líneas base: python bench_parsers.py --update-baselines"
+    assert bench_parsers.regressions(results, baselines) == {}
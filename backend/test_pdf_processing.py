@@ -10,7 +10,7 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Importar las funciones desde el módulo correcto
-from app.main import (
+from app.extraction import (
     process_bank_statement_pdf, 
     categorize_transaction_openai, 
     detect_bank,
@@ -43,7 +43,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = "BBVA MEXICO ESTADO DE CUENTA"
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -60,7 +60,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = "Santander México Estado de Cuenta"
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -75,7 +75,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = "Banorte Estado de Cuenta"
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -90,7 +90,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = "Banco Desconocido Estado de Cuenta"
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -111,7 +111,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = transaction_text
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -132,7 +132,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = transaction_text
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -274,8 +274,8 @@ class TestAITransactionExtraction:
 class TestOCRTextExtraction:
     """Pruebas para la extracción de texto con OCR"""
 
-    @patch('app.routers.convert_from_bytes')
-    @patch('app.routers.pytesseract.image_to_string')
+    @patch('pdf2image.convert_from_bytes')
+    @patch('pytesseract.image_to_string')
     def test_extract_text_with_ocr_success(self, mock_tesseract, mock_convert):
         """Prueba la extracción exitosa de texto con OCR"""
         # Configurar mocks
@@ -289,7 +289,7 @@ class TestOCRTextExtraction:
         mock_convert.assert_called_once_with(b"fake_pdf_content")
         mock_tesseract.assert_called_once()
 
-    @patch('app.routers.convert_from_bytes')
+    @patch('pdf2image.convert_from_bytes')
     def test_extract_text_with_ocr_conversion_error(self, mock_convert):
         """Prueba que se maneje correctamente un error en la conversión de PDF a imagen"""
         mock_convert.side_effect = Exception("Conversion error")
@@ -298,8 +298,8 @@ class TestOCRTextExtraction:
         
         assert text == ""
 
-    @patch('app.routers.convert_from_bytes')
-    @patch('app.routers.pytesseract.image_to_string')
+    @patch('pdf2image.convert_from_bytes')
+    @patch('pytesseract.image_to_string')
     def test_extract_text_with_ocr_tesseract_error(self, mock_tesseract, mock_convert):
         """Prueba que se maneje correctamente un error de Tesseract"""
         mock_image = Mock()
@@ -333,7 +333,7 @@ class TestPDFProcessingIntegration:
                 """
                 mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
                 
-                with patch('app.main.categorize_transaction_openai') as mock_categorize:
+                with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                     mock_categorize.return_value = "supermercado"
                     
                     result = process_bank_statement_pdf(temp_pdf_path, "fake_api_key")
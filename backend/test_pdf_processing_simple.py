@@ -6,7 +6,7 @@ from datetime import datetime
 import json
 
 # Importar solo las funciones que sabemos que funcionan
-from app.main import process_bank_statement_pdf, categorize_transaction_openai
+from app.extraction import process_bank_statement_pdf, categorize_transaction_openai
 
 
 class TestPDFProcessing:
@@ -21,7 +21,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = "BBVA MEXICO ESTADO DE CUENTA"
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -38,7 +38,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = "Santander México Estado de Cuenta"
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -53,7 +53,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = "Banorte Estado de Cuenta"
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -68,7 +68,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = "Banco Desconocido Estado de Cuenta"
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -89,7 +89,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = transaction_text
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -113,7 +113,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = transaction_text
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -136,7 +136,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = transaction_text
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -155,7 +155,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = transaction_text
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
@@ -204,7 +204,7 @@ class TestPDFProcessing:
             mock_pdf_instance.pages[0].extract_text.return_value = transaction_text
             mock_pdf.return_value.__enter__.return_value = mock_pdf_instance
             
-            with patch('app.main.categorize_transaction_openai') as mock_categorize:
+            with patch('app.extraction.categorize_transaction_openai') as mock_categorize:
                 mock_categorize.return_value = "supermercado"
                 
                 result = process_bank_statement_pdf("fake_path.pdf", "fake_api_key")
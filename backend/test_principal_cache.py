@@ -0,0 +1,69 @@
+"""
+Pruebas de la caché de usuarios resueltos en get_current_user.
+"""
+import time
+
+from sqlalchemy import event
+
+from app import auth
+from app.database import engine
+
+
+EXP = int(time.time()) + 3600
+EXP_2 = EXP + 60
+
+
+def test_lru_y_ttl():
+    cache = auth.PrincipalCache(maxsize=2, ttl=60)
+    cache.put("a@correo.com", EXP, {"id": 1, "email": "a@correo.com"})
+    cache.put("b@correo.com", EXP, {"id": 2, "email": "b@correo.com"})
+    assert cache.get("a@correo.com", EXP)["id"] == 1
+    cache.put("c@correo.com", EXP, {"id": 3, "email": "c@correo.com"})
+    # "b" era el menos usado
+    assert cache.get("b@correo.com", EXP) is None
+    assert cache.get("a@correo.com", EXP) is not None
+
+    expirada = auth.PrincipalCache(maxsize=10, ttl=60)
+    expirada.put("d@correo.com", int(time.time()) - 1, {"id": 4, "email": "d@correo.com"})
+    assert expirada.get("d@correo.com", int(time.time()) - 1) is None
+
+
+def test_invalidacion():
+    cache = auth.PrincipalCache(maxsize=10, ttl=60)
+    cache.put("a@correo.com", EXP, {"id": 1, "email": "a@correo.com"})
+    cache.put("a@correo.com", EXP_2, {"id": 1, "email": "a@correo.com"})
+    cache.invalidate(user_id=1)
+    assert cache.get("a@correo.com", EXP) is None
+    assert cache.get("a@correo.com", EXP_2) is None
+
+
+def test_token_incluye_uid(client, user_credentials):
+    email, password = user_credentials
+    login = client.post("/login", data={"username": email, "password": password}).json()
+    token_data = auth.verify_token(login["access_token"])
+    assert token_data.email == email
+    assert token_data.user_id == login["user_id"]
+
+
+def test_camino_caliente_sin_consulta_de_usuario(client, auth_headers):
+    """Con el usuario en caché, el endpoint no consulta la tabla users"""
+    creada = client.post(
+        "/transactions/",
+        json={"description": "PRUEBA", "amount": -1.0, "date": "2025-01-01"},
+        headers=auth_headers,
+    ).json()
+
+    consultas = []
+
+    def contar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+
+    event.listen(engine, "before_cursor_execute", contar)
+    try:
+        response = client.get(f"/transactions/{creada['id']}", headers=auth_headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", contar)
+
+    assert response.status_code == 200
+    assert not any("FROM users" in sql for sql in consultas)
+    assert any("FROM transactions" in sql for sql in consultas)
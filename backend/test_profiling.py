@@ -0,0 +1,64 @@
+"""
+Pruebas del perfilado bajo demanda: solo administradores, almacén acotado y endpoints /admin.
+"""
+import pytest
+
+from app import auth, profiling
+
+
+@pytest.fixture
+def perfiles(tmp_path, monkeypatch, user_credentials):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_MAX_FILES", 2)
+    monkeypatch.setattr(auth, "ADMIN_EMAILS", {user_credentials[0]})
+    return tmp_path
+
+
+def test_sin_bandera_no_se_perfila(client, auth_headers, perfiles, monkeypatch):
+    monkeypatch.setattr(profiling, "Sampler", None)  # fallaría si se instanciara
+    response = client.get("/transactions/summary/monthly", headers=auth_headers)
+    assert response.status_code == 200 and "x-profile-id" not in response.headers
+    assert list(perfiles.iterdir()) == []
+
+
+def test_usuario_no_admin_ignora_la_bandera(client, auth_headers, perfiles, monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_EMAILS", {"otra@correo.com"})
+    response = client.get("/transactions/?profile=1", headers=auth_headers)
+    assert response.status_code == 200 and "x-profile-id" not in response.headers
+    assert client.get("/admin/profiles", headers=auth_headers).status_code == 403
+
+
+def test_admin_perfila_lista_y_descarga(client, auth_headers, perfiles):
+    ids = []
+    for i in range(3):
+        response = client.get("/transactions/summary/category", headers={**auth_headers, "X-Profile": "1"})
+        assert response.status_code == 200
+        ids.append(response.headers["x-profile-id"])
+
+    listado = client.get("/admin/profiles", headers=auth_headers).json()
+    assert [p["id"] for p in listado] == ids[:0:-1]  # solo los 2 más recientes
+    assert listado[0]["path"] == "/transactions/summary/category" and listado[0]["status"] == 200
+    assert listado[0]["duration_ms"] > 0 and "top" in listado[0]
+
+    perfil = client.get(f"/admin/profiles/{ids[-1]}", headers=auth_headers)
+    assert perfil.status_code == 200 and perfil.headers["content-type"].startswith("text/plain")
+    assert client.get(f"/admin/profiles/{ids[0]}", headers=auth_headers).status_code == 404
+
+
+def test_sampler_cuenta_pilas_de_otros_hilos():
+    import threading
+    import time
+
+    def ocupado(hasta):
+        while time.perf_counter() < hasta:
+            sum(range(1000))
+
+    sampler = profiling.Sampler(interval_ms=1)
+    worker = threading.Thread(target=ocupado, args=(time.perf_counter() + 0.2,))
+    sampler.start()
+    worker.start()
+    worker.join()
+    sampler.stop()
+    assert sampler.samples > 0
+    assert any(row["function"].startswith("ocupado") for row in sampler.top())
+    assert "ocupado (test_profiling.py" in sampler.folded()
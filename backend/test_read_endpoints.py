@@ -0,0 +1,63 @@
+"""
+Pruebas en proceso de los endpoints de lectura (listado, filtro y resúmenes).
+"""
+
+
+def _crear_transacciones(client, headers):
+    datos = [
+        {"description": "OXXO REFORMA", "amount": -120.5, "date": "2025-04-02", "category": "conveniencia"},
+        {"description": "UBER VIAJE", "amount": -80.0, "date": "2025-04-15", "category": "transporte"},
+        {"description": "SPEI NOMINA", "amount": 15000.0, "date": "2025-05-01", "category": "ingreso"},
+        {"description": "UBER EATS", "amount": -230.0, "date": "2025-05-20", "category": "restaurante"},
+    ]
+    for d in datos:
+        response = client.post("/transactions/", json=d, headers=headers)
+        assert response.status_code == 200, response.text
+    return datos
+
+
+def test_listar_transacciones(client, auth_headers):
+    """El listado asíncrono devuelve solo las transacciones del usuario"""
+    datos = _crear_transacciones(client, auth_headers)
+    response = client.get("/transactions/", headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.json()) == len(datos)
+
+
+def test_filtrar_transacciones(client, auth_headers):
+    """El filtro por fecha, monto y categoría no choca con /transactions/{transaction_id}"""
+    _crear_transacciones(client, auth_headers)
+    response = client.get(
+        "/transactions/filter",
+        params={"start_date": "01-05-2025", "end_date": "31-05-2025", "max_amount": 0},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200, response.text
+    assert [t["description"] for t in response.json()] == ["UBER EATS"]
+
+    response = client.get("/transactions/filter", params={"category": "transporte"}, headers=auth_headers)
+    assert [t["description"] for t in response.json()] == ["UBER VIAJE"]
+
+
+def test_resumenes(client, auth_headers):
+    """Los resúmenes mensual, por categoría y tabla agregan correctamente"""
+    _crear_transacciones(client, auth_headers)
+
+    mensual = client.get("/transactions/summary/monthly", headers=auth_headers).json()
+    assert mensual == [
+        {"year": 2025, "month": 4, "total": -200.5},
+        {"year": 2025, "month": 5, "total": 14770.0},
+    ]
+
+    categorias = client.get("/transactions/summary/category", headers=auth_headers).json()
+    assert {c["category"]: c["total"] for c in categorias} == {
+        "conveniencia": 120.5, "transporte": 80.0, "restaurante": 230.0
+    }
+
+    tabla = client.get("/transactions/summary/table", headers=auth_headers).json()
+    assert {"year": 2025, "month": 5, "category": "restaurante", "total": 230.0} in tabla
+    assert all(fila["category"] != "ingreso" for fila in tabla)
+
+
+def test_requiere_autenticacion(client):
+    assert client.get("/transactions/summary/monthly").status_code == 401
@@ -0,0 +1,137 @@
+"""
+Pruebas del detector de cargos recurrentes y suscripciones.
+"""
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, select
+
+from app import crud, migrate, models, recurring, schemas
+
+
+def _mensual(descripcion, monto, inicio, meses, jitter=0):
+    rnd = random.Random(descripcion)
+    return [
+        {"description": f"{descripcion} {rnd.randrange(10**6)}", "amount": monto,
+         "date": inicio + timedelta(days=round(30.44 * i) + rnd.randint(-jitter, jitter))}
+        for i in range(meses)
+    ]
+
+
+def _series(db, user_id):
+    return {
+        (s.merchant_key, s.kind): s
+        for s in db.scalars(select(models.RecurringSeries).where(models.RecurringSeries.user_id == user_id))
+    }
+
+
+@pytest.mark.parametrize("descripcion,clave", [
+    ("PAGO DOMICILIADO NETFLIX.COM 123456 CDMX", "NETFLIX"),
+    ("COMPRA POS SPOTIFY P1234ABC", "SPOTIFY"),
+    ("Telcel Recarga 5512345678", "TELCEL RECARGA"),
+    ("SPEI NÓMINA EMPRESA SA DE CV", "NOMINA EMPRESA"),
+])
+def test_merchant_key(descripcion, clave):
+    assert recurring.merchant_key(descripcion) == clave
+
+
+def test_detecta_suscripciones_y_descarta_ruido(db_session, user_credentials):
+    user = crud.get_user_by_email(db_session, user_credentials[0])
+    rnd = random.Random(1)
+    filas = (
+        _mensual("NETFLIX", -219.0, date(2024, 1, 5), 12, jitter=2)
+        + _mensual("SPEI NOMINA ACME", 25000.0, date(2024, 1, 15), 12)
+        + [{"description": "OXXO", "amount": -round(rnd.uniform(20, 400), 2), "date": date(2024, 1, 1) + timedelta(days=rnd.randrange(360))} for _ in range(60)]
+        + [{"description": "GASOLINERA", "amount": -800.0, "date": date(2024, m, 1)} for m in (1, 2, 7, 8)]
+    )
+    rnd.shuffle(filas)
+    crud.bulk_create_transactions(db_session, user.id, filas, batch_size=25)
+    db_session.commit()
+
+    series = _series(db_session, user.id)
+    netflix = series[("NETFLIX", "expense")]
+    assert netflix.is_recurring and netflix.cadence == "monthly" and netflix.occurrences == 12
+    assert netflix.amount_mean == pytest.approx(-219.0)
+    nomina = series[("NOMINA ACME", "income")]
+    assert nomina.is_recurring and nomina.cadence == "monthly"
+    assert not series[("OXXO", "expense")].is_recurring
+    assert not series[("GASOLINERA", "expense")].is_recurring
+
+
+def test_incremental_coincide_con_recalculo(db_session, user_credentials):
+    """Alta por alta y en desorden (como upload_pdf) da lo mismo que recalcular desde cero"""
+    user = crud.get_user_by_email(db_session, user_credentials[0])
+    filas = _mensual("SPOTIFY", -115.0, date(2023, 3, 1), 20, jitter=3) + _mensual("GYM SPORT", -650.0, date(2023, 6, 10), 9)
+    filas.sort(key=lambda f: f["date"])
+    filas[5], filas[9] = filas[9], filas[5]  # una fila fuera de orden fuerza el recálculo del grupo
+    for fila in filas:
+        crud.create_transaction(db_session, schemas.TransactionCreate(**fila), user.id)
+    incremental = {k: (s.occurrences, s.first_date, s.last_date, round(s.interval_mean, 9), round(s.amount_m2, 6), s.cadence)
+                   for k, s in _series(db_session, user.id).items()}
+
+    recurring.rebuild(db_session, user.id)
+    db_session.commit()
+    recalculado = {k: (s.occurrences, s.first_date, s.last_date, round(s.interval_mean, 9), round(s.amount_m2, 6), s.cadence)
+                   for k, s in _series(db_session, user.id).items()}
+    assert incremental == recalculado
+    assert recalculado[("SPOTIFY", "expense")][0] == 20
+
+
+def test_endpoint_y_edicion(client, auth_headers):
+    filas = _mensual("AMAZON PRIME", -99.0, date(2025, 1, 3), 5)
+    operaciones = [{"op": "create", "data": {**f, "date": f["date"].isoformat()}} for f in filas]
+    body = client.post("/transactions/batch", json={"operations": operaciones}, headers=auth_headers).json()
+    assert body["succeeded"] == 5
+
+    series = client.get("/transactions/recurring", headers=auth_headers).json()
+    assert [(s["merchant_key"], s["cadence"], s["occurrences"], s["active"]) for s in series] == [("AMAZON PRIME", "monthly", 5, True)]
+    assert series[0]["monthly_amount"] == pytest.approx(-99.0, abs=1.5)
+
+    # Cambiar el monto de un cargo lo vuelve irregular; borrar tres deja muy pocas ocurrencias
+    ids = [r["id"] for r in body["results"]]
+    client.put(f"/transactions/{ids[2]}", json={**operaciones[2]["data"], "amount": -500.0}, headers=auth_headers)
+    assert client.get("/transactions/recurring", headers=auth_headers).json() == []
+    client.put(f"/transactions/{ids[2]}", json=operaciones[2]["data"], headers=auth_headers)
+    assert len(client.get("/transactions/recurring", headers=auth_headers).json()) == 1
+    for transaction_id in ids[:3]:
+        client.delete(f"/transactions/{transaction_id}", headers=auth_headers)
+    assert client.get("/transactions/recurring", params={"include_inactive": True}, headers=auth_headers).json() == []
+
+
+def test_edicion_lee_solo_el_historial_del_comercio(db_session, user_credentials):
+    user = crud.get_user_by_email(db_session, user_credentials[0])
+    filas = _mensual("NETFLIX", -219.0, date(2024, 1, 5), 6) + _mensual("DISNEY PLUS", -159.0, date(2024, 1, 8), 6)
+    crud.bulk_create_transactions(db_session, user.id, filas)
+    db_session.commit()
+    netflix = db_session.scalars(select(models.Transaction).where(
+        models.Transaction.user_id == user.id, models.Transaction.description.like("NETFLIX %"))).first()
+    assert netflix.merchant_key == "NETFLIX"
+
+    consultas = []
+    escuchar = lambda conn, cursor, sql, params, context, executemany: consultas.append((sql, params))
+    event.listen(db_session.bind, "before_cursor_execute", escuchar)
+    try:
+        crud.update_transaction(db_session, netflix.id, user.id, schemas.TransactionCreate(
+            description="NETFLIX PREMIUM", amount=-219.0, date=netflix.date, category=None))
+    finally:
+        event.remove(db_session.bind, "before_cursor_execute", escuchar)
+    historial = [(sql, params) for sql, params in consultas if "FROM transactions" in sql and "ORDER BY transactions.date" in sql]
+    assert historial and all("transactions.merchant_key IN" in sql for sql, _ in historial)
+    assert all("DISNEY PLUS" not in params for _, params in historial)
+    assert netflix.merchant_key == "NETFLIX PREMIUM"
+    assert _series(db_session, user.id)[("NETFLIX", "expense")].occurrences == 5
+
+
+def test_migracion_agrega_y_llena_merchant_key(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'vieja.db'}")
+    migrate.run(engine)
+    with engine.begin() as conn:
+        # Base de antes de la columna
+        conn.exec_driver_sql("DROP INDEX ix_transactions_user_merchant_key")
+        conn.exec_driver_sql("ALTER TABLE transactions DROP COLUMN merchant_key")
+        conn.exec_driver_sql("INSERT INTO transactions (description, amount, date, user_id) VALUES ('PAGO SPOTIFY MX', -115.0, '2025-01-01', 1)")
+    migrate.run(engine)
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT merchant_key FROM transactions").scalar() == "SPOTIFY"
+    engine.dispose()
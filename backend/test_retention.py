@@ -0,0 +1,163 @@
+"""
+Pruebas de la retención de PDFs subidos (app/retention.py): motivos, lotes, tombstones y métricas.
+"""
+import io
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app import blobs, migrate, models, retention
+
+AHORA = datetime(2026, 6, 1, tzinfo=timezone.utc)
+POR_OMISION = {nombre: getattr(retention, nombre) for nombre in ("UPLOAD_RETENTION_DAYS", "UPLOAD_FAILED_RETENTION_DAYS", "UPLOAD_MAX_MB")}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Base propia: el plan del GC mira todos los blobs y la base de pruebas se comparte"""
+    monkeypatch.setattr(blobs, "BLOB_DIR", str(tmp_path / "blobs"))
+    monkeypatch.setattr(retention, "LEGACY_UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(retention, "UPLOAD_GC_PAUSE_MS", 0)
+    monkeypatch.setattr(retention, "UPLOAD_RETENTION_DAYS", 90)
+    monkeypatch.setattr(retention, "UPLOAD_FAILED_RETENTION_DAYS", 30)
+    engine = create_engine(f"sqlite:///{tmp_path / 'gc.db'}")
+    migrate.run(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def _blob(db, dias, estado="processed", subidas=1):
+    """Blob con `subidas` subidas en `estado` hechas hace `dias` días"""
+    blob = blobs.store(db, io.BytesIO(uuid.uuid4().bytes * 100), reference=False)
+    blob.created_at = AHORA - timedelta(days=dias)
+    for _ in range(subidas):
+        blob.refcount += 1
+        db.add(models.Upload(id=uuid.uuid4().hex, user_id=1, blob_sha256=blob.sha256, filename="estado.pdf",
+                             status=estado, created_at=AHORA - timedelta(days=dias)))
+    db.commit()
+    return blob.sha256
+
+
+def _motivos(db):
+    return {v["sha256"]: v["reason"] for v in retention.plan(db, AHORA)}
+
+
+def test_motivos_de_borrado(db):
+    huerfano_viejo = _blob(db, 2, subidas=0)
+    huerfano_nuevo = _blob(db, 0.5, subidas=0)
+    procesado_viejo = _blob(db, 100)
+    procesado_nuevo = _blob(db, 10)
+    fallido_viejo = _blob(db, 40, estado="failed")
+    en_curso = _blob(db, 0.5, estado="received")
+    abandonada = _blob(db, 400, estado="received")  # el proceso se cayó a media subida
+    assert _motivos(db) == {huerfano_viejo: "orphan", procesado_viejo: "age", fallido_viejo: "age", abandonada: "age"}
+    assert {huerfano_nuevo, procesado_nuevo, en_curso}.isdisjoint(_motivos(db))
+
+
+def test_por_omision_solo_huerfanos(db, monkeypatch):
+    for nombre, valor in POR_OMISION.items():
+        monkeypatch.setattr(retention, nombre, valor)
+    huerfano = _blob(db, 2, subidas=0)
+    _blob(db, 1000)
+    _blob(db, 1000, estado="failed")
+    assert _motivos(db) == {huerfano: "orphan"}
+
+
+def test_sin_limite_de_edad(db, monkeypatch):
+    _blob(db, 1000)
+    monkeypatch.setattr(retention, "UPLOAD_RETENTION_DAYS", 0)
+    assert _motivos(db) == {}
+
+
+def test_presupuesto_de_disco_borra_los_mas_viejos(db, monkeypatch):
+    viejos = [_blob(db, dias) for dias in (30, 20)]
+    nuevo = _blob(db, 10)
+    _blob(db, 0.5, estado="received")
+    tamano = db.get(models.Blob, nuevo).stored_size
+    monkeypatch.setattr(retention, "UPLOAD_MAX_MB", 2.5 * tamano / 1024 / 1024)
+    assert _motivos(db) == {viejos[0]: "size", viejos[1]: "size"}
+
+
+def test_borra_en_lotes_con_tombstones_y_metricas(db, monkeypatch):
+    monkeypatch.setattr(retention, "UPLOAD_GC_BATCH", 1)
+    viejos = [_blob(db, 100) for _ in range(3)]
+    nuevo = _blob(db, 1)
+    rutas = {sha: blobs.path_for(db.get(models.Blob, sha)) for sha in viejos}
+    bytes_antes = retention.RECLAIMED_BYTES._values.get(("age",), 0)
+
+    assert retention.collect(db, AHORA, dry_run=True)["age"]["files"] == 3
+    assert all(os.path.exists(ruta) for ruta in rutas.values())
+
+    resumen = retention.collect(db, AHORA)
+    assert resumen["age"]["files"] == 3
+    assert not any(os.path.exists(ruta) for ruta in rutas.values())
+    assert retention.RECLAIMED_BYTES._values[("age",)] - bytes_antes == resumen["age"]["bytes"]
+
+    tombstones = db.scalars(select(models.BlobTombstone)).all()
+    assert sorted(t.sha256 for t in tombstones) == sorted(viejos) and {t.reason for t in tombstones} == {"age"}
+    assert db.scalar(select(models.Blob.sha256)) == nuevo
+    assert db.query(models.Upload).count() == 4  # las subidas se conservan
+    assert retention.collect(db, AHORA) == {}
+
+
+def test_subida_nueva_salva_al_blob(db, monkeypatch):
+    viejo = _blob(db, 100)
+    (victima,) = retention.plan(db, AHORA)
+    blob = db.get(models.Blob, viejo)
+    blob.refcount += 1  # llegó el mismo PDF entre el plan y el borrado
+    db.commit()
+    assert retention._delete_batch(db, [victima]) == []
+    assert os.path.exists(blobs.path_for(blob))
+
+    otro = blobs.store(db, io.BytesIO(b"%PDF-1.4 borrado a medias"))
+    db.commit()
+    os.remove(blobs.path_for(otro))  # el GC borró el archivo antes del upsert
+    blobs.store(db, io.BytesIO(b"%PDF-1.4 borrado a medias"))
+    assert blobs.read(otro) == b"%PDF-1.4 borrado a medias"
+
+
+def test_archivos_sueltos_de_antes(db, tmp_path):
+    viejo, nuevo = tmp_path / "estado.pdf", tmp_path / "test_estado.pdf"
+    viejo.write_bytes(b"%PDF-1.4 viejo")
+    nuevo.write_bytes(b"%PDF-1.4 nuevo")
+    hace = (AHORA - timedelta(days=200)).timestamp()
+    os.utime(viejo, (hace, hace))
+    os.utime(nuevo, (AHORA.timestamp(), AHORA.timestamp()))
+    _blob(db, 1)
+
+    assert retention.collect(db, AHORA) == {"legacy": {"files": 1, "bytes": 14}}
+    assert not viejo.exists() and nuevo.exists() and (tmp_path / "gc.db").exists()
+    (tombstone,) = db.scalars(select(models.BlobTombstone)).all()
+    assert (tombstone.sha256, tombstone.kind, tombstone.path) == (None, "legacy", str(viejo))
+
+
+def test_archivos_sueltos_solo_si_se_configura(db, tmp_path, monkeypatch):
+    viejo = tmp_path / "estado.pdf"
+    viejo.write_bytes(b"%PDF-1.4 viejo")
+    hace = (AHORA - timedelta(days=200)).timestamp()
+    os.utime(viejo, (hace, hace))
+    monkeypatch.setattr(retention, "LEGACY_UPLOAD_DIR", "")
+    assert retention.collect(db, AHORA) == {} and viejo.exists()
+
+
+def test_hilo_periodico(monkeypatch):
+    pasadas = []
+    monkeypatch.setattr(retention, "UPLOAD_GC", True)
+    monkeypatch.setattr(retention, "UPLOAD_GC_INTERVAL_MINUTES", 0.01 / 60)
+    monkeypatch.setattr(retention, "run_once", lambda: pasadas.append(1))
+    planificador = retention._Scheduler()
+    planificador.start()
+    time.sleep(0.1)
+    planificador.stop()
+    planificador._thread.join(1)
+    assert len(pasadas) >= 2 and not planificador._thread.is_alive()
+
+
+def test_endpoint_solo_administradores(client, auth_headers):
+    assert client.post("/admin/storage/gc?dry_run=true", headers=auth_headers).status_code == 403
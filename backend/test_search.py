@@ -0,0 +1,61 @@
+"""
+Pruebas de la búsqueda de texto completo (FTS5) sobre descripciones.
+"""
+
+
+def _crear(client, headers, description, amount=-100.0, date="2025-04-01"):
+    response = client.post(
+        "/transactions/",
+        json={"description": description, "amount": amount, "date": date, "category": "otros"},
+        headers=headers,
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_busqueda_por_prefijo(client, auth_headers):
+    """Los tokens se buscan como prefijo, sin importar mayúsculas ni acentos"""
+    _crear(client, auth_headers, "OXXO REFORMA 123")
+    _crear(client, auth_headers, "Cafetería Central")
+    _crear(client, auth_headers, "UBER TRIP")
+
+    response = client.get("/transactions/search", params={"q": "oxx"}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert [t["description"] for t in response.json()] == ["OXXO REFORMA 123"]
+
+    response = client.get("/transactions/search", params={"q": "cafeteria cen"}, headers=auth_headers)
+    assert [t["description"] for t in response.json()] == ["Cafetería Central"]
+
+
+def test_busqueda_limitada_al_usuario(client, auth_headers):
+    """Un usuario no ve coincidencias de otro"""
+    _crear(client, auth_headers, "NETFLIX MENSUAL")
+
+    client.post("/register", json={"email": "otro_fts@correo.com", "password": "clave123"})
+    token = client.post("/login", data={"username": "otro_fts@correo.com", "password": "clave123"}).json()["access_token"]
+    otros_headers = {"Authorization": f"Bearer {token}"}
+
+    assert client.get("/transactions/search", params={"q": "netflix"}, headers=otros_headers).json() == []
+    assert len(client.get("/transactions/search", params={"q": "netflix"}, headers=auth_headers).json()) == 1
+
+
+def test_triggers_sincronizan_update_y_delete(client, auth_headers):
+    """Actualizar o borrar la transacción actualiza el índice"""
+    t = _crear(client, auth_headers, "SPOTIFY PREMIUM")
+    client.put(
+        f"/transactions/{t['id']}",
+        json={"description": "AMAZON PRIME", "amount": -99.0, "date": "2025-04-01", "category": "otros"},
+        headers=auth_headers,
+    )
+    assert client.get("/transactions/search", params={"q": "spotify"}, headers=auth_headers).json() == []
+    assert len(client.get("/transactions/search", params={"q": "amazon"}, headers=auth_headers).json()) == 1
+
+    client.delete(f"/transactions/{t['id']}", headers=auth_headers)
+    assert client.get("/transactions/search", params={"q": "amazon"}, headers=auth_headers).json() == []
+
+
+def test_consulta_sin_tokens(client, auth_headers):
+    """La sintaxis de FTS5 se descarta; una consulta sin palabras devuelve vacío"""
+    response = client.get("/transactions/search", params={"q": '"*( )'}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == []
@@ -0,0 +1,78 @@
+"""
+Benchmark de arranque: importar app.main (lo que paga cada worker de uvicorn y cada reinicio
+con --reload) no debe cargar la pila de extracción ni tocar el esquema, y debe caber en un
+presupuesto de tiempo medido con `python -X importtime`.
+
+Presupuesto configurable con STARTUP_IMPORT_BUDGET_MS (por defecto 2000 ms, el mejor de 3 corridas).
+"""
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "2000"))
+# Solo deben cargarse al procesar un PDF (app/extraction.py)
+HEAVY_MODULES = {"pdfplumber", "pytesseract", "PIL", "openai", "cv2", "easyocr", "pdf2image", "PyPDF2"}
+
+
+def _importtime(db_path, module="app.main"):
+    """Ejecuta el import en un proceso limpio; devuelve {módulo: acumulado en µs}"""
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "SECRET_KEY": "clave_de_pruebas"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def _tables(db_path):
+    if not os.path.exists(db_path):
+        return set()
+    with sqlite3.connect(db_path) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_import_no_carga_extraccion_ni_crea_esquema(tmp_path):
+    db_path = str(tmp_path / "arranque.db")
+    modules = _importtime(db_path)
+    assert "app.main" in modules and "app.extraction" in modules
+    assert not HEAVY_MODULES & {name.split(".")[0] for name in modules}
+    assert "transactions" not in _tables(db_path)
+
+
+def test_presupuesto_de_importacion(tmp_path):
+    best_ms = min(_importtime(str(tmp_path / f"arranque_{i}.db"))["app.main"] for i in range(3)) / 1000
+    print(f"\nimport app.main: {best_ms:.0f} ms (presupuesto {BUDGET_MS:.0f} ms)")
+    assert best_ms <= BUDGET_MS
+
+
+def test_migracion_explicita_idempotente(tmp_path):
+    db_path = str(tmp_path / "migracion.db")
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{db_path}", "SECRET_KEY": "clave_de_pruebas"}
+    for _ in range(2):
+        result = subprocess.run([sys.executable, "-m", "app.migrate"], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120)
+        assert result.returncode == 0, result.stderr[-2000:]
+    assert {"users", "transactions", "recurring_series", "anomalies", "transactions_fts"} <= _tables(db_path)
+
+
+def test_extraccion_carga_bajo_demanda():
+    """El servicio de extracción importa pdfplumber al usarse, no al importarse"""
+    pytest.importorskip("pdfplumber")
+    code = (
+        "import sys, app.extraction as e\n"
+        "assert 'pdfplumber' not in sys.modules\n"
+        "try:\n    e.extract_plain_text('no_existe.pdf')\nexcept OSError:\n    pass\n"
+        "assert 'pdfplumber' in sys.modules\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-2000:]
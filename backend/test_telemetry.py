@@ -0,0 +1,76 @@
+"""
+Pruebas de las trazas por etapa del pipeline de PDFs y del endpoint /metrics.
+"""
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app import telemetry
+
+
+def test_histograma_formato_prometheus():
+    histograma = telemetry.Histogram("prueba_segundos", "Ayuda", ("stage",), buckets=(0.1, 1))
+    for valor in (0.05, 0.5, 0.5, 3):
+        histograma.observe(valor, stage="extract")
+    assert histograma.collect() == [
+        "# HELP prueba_segundos Ayuda",
+        "# TYPE prueba_segundos histogram",
+        'prueba_segundos_bucket{stage="extract",le="0.1"} 1',
+        'prueba_segundos_bucket{stage="extract",le="1"} 3',
+        'prueba_segundos_bucket{stage="extract",le="+Inf"} 4',
+        'prueba_segundos_sum{stage="extract"} 4.05',
+        'prueba_segundos_count{stage="extract"} 4',
+    ]
+
+
+def test_spans_anidados_tokens_y_errores():
+    respuesta = SimpleNamespace(usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30))
+    with telemetry.trace() as traza:
+        with telemetry.span("categorize", rows=2):
+            telemetry.record_usage(respuesta)
+            telemetry.record_usage(respuesta)
+        with pytest.raises(ValueError):
+            with telemetry.span("parse", method="parser_estandar"):
+                raise ValueError("sin transacciones")
+    telemetry.record_usage(respuesta)  # sin span activo no hace nada
+
+    resumen = traza.summary()
+    categorize, parse = resumen["spans"]
+    assert (categorize["rows"], categorize["prompt_tokens"], categorize["completion_tokens"]) == (2, 240, 60)
+    assert parse["error"] == "ValueError"
+    assert set(resumen["stages"]) == {"categorize", "parse"}
+    assert 'pfm_pipeline_llm_tokens_count{stage="categorize",kind="prompt"}' in telemetry.registry.render()
+
+
+def test_upload_pdf_devuelve_tiempos_y_exporta_metricas(client, auth_headers, tmp_path, monkeypatch):
+    from app import blobs
+
+    monkeypatch.setattr(blobs, "BLOB_DIR", str(tmp_path))
+    monkeypatch.setenv("OPENAI_API_KEY", "clave_falsa")
+    portada, movimientos = Mock(), Mock()
+    portada.extract_text.return_value = "BBVA MEXICO ESTADO DE CUENTA\n"
+    movimientos.extract_text.return_value = "05-Mar-2025 OXXO REFORMA - $125.50\n07-Mar-2025 DEPOSITO NOMINA + $15,000.00\n"
+    with patch("pdfplumber.open") as abrir, \
+            patch("app.agentic_extractor.AgenticDocumentExtractor.extract_transactions", return_value=[]), \
+            patch("app.extraction.categorize_transaction_openai", return_value="otros"):
+        abrir.return_value.__enter__.return_value = Mock(pages=[portada, movimientos])
+        response = client.post(
+            "/upload_pdf", files={"file": ("estado.pdf", b"%PDF-1.4", "application/pdf")}, headers=auth_headers
+        )
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert len(body["transacciones_guardadas"]) == 2
+
+    tiempos = body["tiempos"]
+    etapas = [span["stage"] for span in tiempos["spans"]]
+    assert etapas == ["extract", "detect", "parse", "parse", "categorize", "persist"]
+    extract = tiempos["spans"][0]
+    assert extract["pages"] == 2 and extract["characters"] > 0
+    assert tiempos["spans"][-1]["saved"] == 2
+    assert tiempos["total_ms"] >= sum(stage["ms"] for stage in tiempos["stages"].values()) - 1
+
+    metricas = client.get("/metrics")
+    assert metricas.status_code == 200 and metricas.headers["content-type"].startswith("text/plain")
+    assert 'pfm_pipeline_stage_seconds_count{stage="persist"}' in metricas.text
+    assert 'pfm_pipeline_stage_pages_bucket{stage="extract",le="2"}' in metricas.text
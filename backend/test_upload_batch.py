@@ -0,0 +1,147 @@
+"""
+Pruebas de la subida por lotes (app/batch_upload.py, /upload_batch): ZIP en streaming, límite por usuario, avance y pool de procesos.
+"""
+import io
+import threading
+import time
+import uuid
+import zipfile
+from unittest.mock import patch
+
+import pytest
+
+from app import batch_upload, blobs
+
+
+@pytest.fixture(autouse=True)
+def pool(monkeypatch, tmp_path):
+    monkeypatch.setattr(blobs, "BLOB_DIR", str(tmp_path))
+    monkeypatch.setattr(batch_upload, "BATCH_WORKERS", 0)  # hilos: los patch de las pruebas llegan al worker
+    monkeypatch.setattr(batch_upload, "_slots", {})
+    yield
+    batch_upload.shutdown()
+
+
+def _zip(miembros):
+    contenido = io.BytesIO()
+    with zipfile.ZipFile(contenido, "w", zipfile.ZIP_DEFLATED) as archivo:
+        for nombre, datos in miembros.items():
+            archivo.writestr(nombre, datos)
+    return contenido.getvalue()
+
+
+def _pdf():
+    return f"%PDF-1.4 {uuid.uuid4().hex}".encode()
+
+
+def test_zip_miembro_por_miembro():
+    datos = _zip({
+        "2025/enero.pdf": b"%PDF enero", "2025/febrero.PDF": b"%PDF febrero", "notas.txt": b"hola",
+        "__MACOSX/2025/._enero.pdf": b"basura", "2025/": b"",
+    })
+    vistos = [(nombre, pdf.read()) for nombre, pdf in batch_upload.iter_pdfs("estados.zip", io.BytesIO(datos))]
+    assert vistos == [("enero.pdf", b"%PDF enero"), ("febrero.PDF", b"%PDF febrero")]
+
+    with pytest.raises(batch_upload.BatchError):
+        list(batch_upload.iter_pdfs("estados.rar", io.BytesIO(datos)))
+    with pytest.raises(batch_upload.BatchError):
+        list(batch_upload.iter_pdfs("estados.zip", io.BytesIO(b"no es zip")))
+
+
+def test_zip_con_miembro_enorme(monkeypatch):
+    monkeypatch.setattr(batch_upload, "BATCH_MAX_FILE_MB", 0.001)
+    datos = _zip({"chico.pdf": b"%PDF", "grande.pdf": b"0" * 5000})
+    nombres = []
+    with pytest.raises(batch_upload.BatchError, match="grande.pdf"):
+        for nombre, _ in batch_upload.iter_pdfs("estados.zip", io.BytesIO(datos)):
+            nombres.append(nombre)
+    assert nombres == ["chico.pdf"]
+
+
+def test_limite_por_usuario(monkeypatch):
+    monkeypatch.setattr(batch_upload, "BATCH_PER_USER", 2)
+    en_vuelo, maximo, lock = {1: 0, 2: 0}, {1: 0, 2: 0}, threading.Lock()
+
+    def procesar(ruta, api_key):
+        usuario = int(ruta.split("-")[0])
+        with lock:
+            en_vuelo[usuario] += 1
+            maximo[usuario] = max(maximo[usuario], en_vuelo[usuario])
+        time.sleep(0.02)
+        with lock:
+            en_vuelo[usuario] -= 1
+        return {"ruta": ruta}
+
+    monkeypatch.setattr(batch_upload, "process", procesar)
+    resultados = []
+    hilos = [
+        batch_upload.submit(f"lote{lote}", usuario, [(f"{lote}-{i}", f"{usuario}-{i}") for i in range(6)], "clave",
+                            lambda upload_id, resultado: resultados.append(resultado))
+        for lote, usuario in ((1, 1), (2, 1), (3, 2))
+    ]
+    for hilo in hilos:
+        hilo.join(5)
+    assert len(resultados) == 18
+    assert maximo == {1: 2, 2: 2}  # el usuario 1 no pasa de 2 aunque tenga dos lotes
+
+
+def test_lote_por_endpoint_con_avance(client, auth_headers, other_auth_headers, monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "clave_falsa")
+    liberar = threading.Event()
+
+    def extraer(ruta, api_key):
+        liberar.wait(5)
+        if open(ruta, "rb").read().startswith(b"%PDF-roto"):
+            raise ValueError("PDF ilegible")
+        return {"banco": "BBVA", "transacciones": [
+            {"descripcion": f"OXXO {uuid.uuid4().hex[:6]}", "monto": -125.5, "fecha_operacion": "05-Mar-2025", "categoria": "otros"},
+        ]}
+
+    archivos = [
+        ("files", ("estados.zip", _zip({"enero.pdf": _pdf(), "febrero.pdf": _pdf()}), "application/zip")),
+        ("files", ("marzo.pdf", _pdf(), "application/pdf")),
+        ("files", ("abril.pdf", b"%PDF-roto " + uuid.uuid4().bytes, "application/pdf")),
+    ]
+    with patch("app.extraction.process_bank_statement_pdf", side_effect=extraer):
+        response = client.post("/upload_batch", files=archivos, headers=auth_headers)
+        assert response.status_code == 202, response.text
+        lote = response.json()
+        assert (lote["total"], lote["pending"], lote["progress"], lote["done"]) == (4, 4, 0, False)
+        assert [f["filename"] for f in lote["files"]] == ["enero.pdf", "febrero.pdf", "marzo.pdf", "abril.pdf"]
+
+        liberar.set()
+        for _ in range(100):
+            avance = client.get(f"/upload_batch/{lote['batch_id']}", headers=auth_headers).json()
+            if avance["done"]:
+                break
+            time.sleep(0.05)
+    assert (avance["processed"], avance["failed"], avance["progress"], avance["transactions_saved"]) == (3, 1, 1.0, 3)
+    assert avance["files"][-1]["status"] == "failed" and avance["files"][0]["bank"] == "BBVA"
+    assert len(client.get("/transactions", headers=auth_headers).json()) == 3
+    assert client.get(f"/upload_batch/{lote['batch_id']}", headers=other_auth_headers).status_code == 404
+
+
+def test_lote_rechazado(client, auth_headers, monkeypatch, tmp_path):
+    monkeypatch.setenv("OPENAI_API_KEY", "clave_falsa")
+    monkeypatch.setattr(batch_upload, "BATCH_MAX_FILES", 1)
+    archivos = [("files", ("a.pdf", _pdf(), "application/pdf")), ("files", ("b.pdf", _pdf(), "application/pdf"))]
+    assert client.post("/upload_batch", files=archivos, headers=auth_headers).status_code == 400
+    assert not [p for p in tmp_path.rglob("*") if p.is_file()]  # a.pdf alcanzó a escribirse y se borró
+    vacio = [("files", ("nada.zip", _zip({"notas.txt": b"hola"}), "application/zip"))]
+    assert client.post("/upload_batch", files=vacio, headers=auth_headers).status_code == 400
+
+
+def test_pool_de_procesos(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_upload, "BATCH_WORKERS", 2)
+    pdf = tmp_path / "ilegible.pdf"
+    pdf.write_bytes(b"no es un pdf")
+    resultados = {}
+    hilo = batch_upload.submit("lote", 1, [("a", str(pdf)), ("b", str(tmp_path / "no-existe.pdf"))], "clave",
+                                lambda upload_id, resultado: resultados.__setitem__(upload_id, resultado))
+    hilo.join(60)
+    assert isinstance(batch_upload._pool, batch_upload.ProcessPoolExecutor)
+    # Sin texto no hay transacciones ni llamadas a OpenAI; el resultado cruza el proceso con sus tiempos
+    for resultado in resultados.values():
+        assert (resultado["banco"], resultado["transacciones"], resultado["llm_calls"]) == ("Desconocido", [], [])
+        assert "total_ms" in resultado["tiempos"]
+    assert set(resultados) == {"a", "b"}
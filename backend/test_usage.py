@@ -0,0 +1,87 @@
+"""
+Pruebas de la contabilidad de tokens y costo de OpenAI (app/usage.py).
+"""
+from types import SimpleNamespace
+from unittest.mock import Mock, patch
+
+import pytest
+
+from app import extraction, telemetry, usage
+
+pytest.importorskip("openai")
+
+
+def _respuesta(contenido, prompt_tokens=60, completion_tokens=2, cached_tokens=0):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=contenido))],
+        usage=SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                              prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens)),
+    )
+
+
+def test_costo_por_modelo():
+    assert usage.cost_usd("gpt-4o-mini", 1_000_000, 1_000_000) == pytest.approx(0.75)
+    assert usage.cost_usd("gpt-3.5-turbo", 2000, 100) == pytest.approx(0.00115)
+    assert usage.cost_usd("modelo-desconocido", 1000, 1000) == 0
+
+
+def test_categorias_registran_cada_llamada():
+    with patch("openai.OpenAI") as cliente, telemetry.trace() as traza:
+        cliente.return_value.chat.completions.create.return_value = _respuesta("supermercado")
+        with telemetry.span("categorize"):
+            categorias = [
+                extraction.categorize_transaction_openai(descripcion, "clave")
+                for descripcion in ("WALMART SUPERCENTER 1234", "WALMART SUPERCENTER 9876", "UBER TRIP 55")
+            ]
+    assert categorias == ["supermercado"] * 3
+    assert cliente.return_value.chat.completions.create.call_count == 3
+    assert [(c["cache_hit"], c["stage"], c["call"]) for c in traza.llm_calls] == [
+        (False, "categorize", "categorize_transaction_openai"),
+    ] * 3
+    assert usage.totals(traza.llm_calls) == {
+        "llamadas": 3, "aciertos_cache": 0, "prompt_tokens": 180, "completion_tokens": 6,
+        "costo_usd": round(3 * usage.cost_usd("gpt-3.5-turbo", 60, 2), 6),
+    }
+
+
+def test_acierto_de_la_cache_de_prompts():
+    cliente = Mock()
+    cliente.chat.completions.create.side_effect = [_respuesta("a", 1200), _respuesta("b", 1200, cached_tokens=1024)]
+    with telemetry.trace() as traza:
+        for _ in range(2):
+            usage.chat(cliente, "extract_transactions_with_ai", model="gpt-4o-mini", messages=[])
+    assert [c["cache_hit"] for c in traza.llm_calls] == [False, True]
+    assert usage.totals(traza.llm_calls)["llamadas"] == 2 and usage.totals(traza.llm_calls)["aciertos_cache"] == 1
+
+
+def test_subida_registra_uso_y_reportes(client, auth_headers, tmp_path, monkeypatch):
+    from app import blobs
+
+    monkeypatch.setattr(blobs, "BLOB_DIR", str(tmp_path))
+    monkeypatch.setenv("OPENAI_API_KEY", "clave_falsa")
+    pagina = Mock()
+    pagina.extract_text.return_value = (
+        "BBVA MEXICO ESTADO DE CUENTA\n"
+        "05-Mar-2025 OXXO REFORMA 001 - $125.50\n"
+        "06-Mar-2025 OXXO REFORMA 002 - $80.00\n"
+        "07-Mar-2025 DEPOSITO NOMINA + $15,000.00\n"
+    )
+    with patch("pdfplumber.open") as abrir, patch("openai.OpenAI") as cliente, \
+            patch("app.agentic_extractor.AgenticDocumentExtractor.extract_transactions", return_value=[]):
+        abrir.return_value.__enter__.return_value = Mock(pages=[pagina])
+        cliente.return_value.chat.completions.create.return_value = _respuesta("otros", 80, 1)
+        response = client.post("/upload_pdf", files={"file": ("estado.pdf", b"%PDF-1.4", "application/pdf")}, headers=auth_headers)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["uso_llm"]["llamadas"] == 3 and body["uso_llm"]["aciertos_cache"] == 0
+
+    (subida,) = client.get("/usage/uploads", headers=auth_headers).json()
+    assert subida["upload_id"] == body["upload_id"] and subida["bank"] == "BBVA"
+    assert (subida["calls"], subida["cache_hits"], subida["prompt_tokens"]) == (3, 0, 240)
+    assert subida["cost_usd"] == pytest.approx(body["uso_llm"]["costo_usd"])
+
+    (etapa,) = client.get("/usage/summary?group_by=stage", headers=auth_headers).json()
+    assert etapa["key"] == "categorize" and etapa["uploads"] == 1
+    assert etapa["cost_per_statement_usd"] == pytest.approx(subida["cost_usd"])
+    assert client.get("/usage/summary?group_by=otra", headers=auth_headers).status_code == 422
+    assert client.get("/admin/usage/summary", headers=auth_headers).status_code == 403
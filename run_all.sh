@@ -24,6 +24,7 @@ fi
 echo "🔧 Iniciando backend..."
 cd backend
 source venv/bin/activate
+python -m app.migrate || exit 1
 python -m uvicorn app.main:app --reload --host 0.0.0.0 --port 8000 &
 BACKEND_PID=$!
 cd ..